@@ -8,6 +8,7 @@ from flask_wtf.csrf import validate_csrf
 from datetime import datetime
 from sqlalchemy import text
 from models import db
+from credit_ledger import ledger as credit_ledger, InsufficientCredits
 import logging
 from credit_notification_system import CreditNotificationService
 
@@ -102,59 +103,36 @@ class AdminCreditService:
             logger.error(f"Error fetching lead status summary: {e}")
             return []
     
+    @staticmethod
+    def _reference_id(prefix):
+        import uuid
+        timestamp = datetime.now().strftime('%Y%m%d')
+        short_uuid = str(uuid.uuid4()).replace('-', '').upper()[:8]
+        return f"{prefix}-{timestamp}-{short_uuid}"
+    
     @staticmethod
     def allocate_credits(clinic_id, credits, description, admin_user_id):
         """Manually allocate credits to a clinic."""
         try:
-            # Update clinic balance
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = credit_balance + :credits,
-                    total_credits_purchased = total_credits_purchased + :credits
-                WHERE id = :clinic_id
-            """), {"credits": credits, "clinic_id": clinic_id})
-            
-            # Generate reference ID
-            import uuid
-            timestamp = datetime.now().strftime('%Y%m%d')
-            short_uuid = str(uuid.uuid4()).replace('-', '').upper()[:8]
-            reference_id = f"TXN-{timestamp}-{short_uuid}"
-            
-            # Record transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions 
-                (clinic_id, transaction_type, amount, description, status, created_at, created_by, reference_id)
-                VALUES (:clinic_id, 'manual_allocation', :credits, :description, 'completed', :created_at, :admin_user_id, :reference_id)
-            """), {
-                "clinic_id": clinic_id,
-                "credits": credits,
-                "description": f"Admin allocation: {description} (by user {admin_user_id})",
-                "created_at": datetime.utcnow(),
-                "admin_user_id": admin_user_id,
-                "reference_id": reference_id
-            })
+            posting = credit_ledger.post(
+                clinic_id, credits, 'manual_allocation',
+                description=f"Admin allocation: {description} (by user {admin_user_id})",
+                created_by=admin_user_id,
+                reference_id=AdminCreditService._reference_id('TXN')
+            )
             
             # Commit the changes
             db.session.commit()
             
             # Create notification for the clinic
             try:
-                # Get the transaction ID for the notification
-                transaction_result = db.session.execute(text("""
-                    SELECT id FROM credit_transactions 
-                    WHERE clinic_id = :clinic_id 
-                    AND transaction_type = 'manual_allocation' 
-                    ORDER BY created_at DESC LIMIT 1
-                """), {"clinic_id": clinic_id}).fetchone()
-                
-                if transaction_result:
-                    CreditNotificationService.create_credit_notification(
-                        transaction_id=transaction_result.id,
-                        clinic_id=clinic_id,
-                        transaction_type='manual_allocation',
-                        amount=credits,
-                        description=description
-                    )
+                CreditNotificationService.create_credit_notification(
+                    transaction_id=posting['transaction_id'],
+                    clinic_id=clinic_id,
+                    transaction_type='manual_allocation',
+                    amount=credits,
+                    description=description
+                )
             except Exception as notif_error:
                 logger.warning(f"Failed to create notification for credit allocation: {notif_error}")
             
@@ -170,73 +148,41 @@ class AdminCreditService:
     def debit_credits(clinic_id, credits, description, admin_user_id):
         """Debit credits from a clinic for refund situations."""
         try:
-            # Check if clinic has enough credits
-            result = db.session.execute(text("""
-                SELECT credit_balance FROM clinics WHERE id = :clinic_id
-            """), {"clinic_id": clinic_id}).fetchone()
+            reference_id = AdminCreditService._reference_id('DEB')
             
-            if not result:
-                return False, "Clinic not found"
-            
-            current_balance = result.credit_balance or 0
-            if current_balance < credits:
-                return False, f"Insufficient credits. Current balance: {current_balance}, Requested debit: {credits}"
-            
-            # Generate reference ID
-            import uuid
-            from datetime import datetime
-            timestamp = datetime.now().strftime('%Y%m%d')
-            short_uuid = str(uuid.uuid4()).replace('-', '').upper()[:8]
-            reference_id = f"DEB-{timestamp}-{short_uuid}"
-            
-            # Deduct credits from clinic balance
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = credit_balance - :credits
-                WHERE id = :clinic_id
-            """), {"credits": credits, "clinic_id": clinic_id})
-            
-            # Record debit transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions 
-                (clinic_id, transaction_type, amount, description, status, created_at, created_by, reference_id)
-                VALUES (:clinic_id, 'debit_adjustment', :credits, :description, 'completed', :created_at, :admin_user_id, :reference_id)
-            """), {
-                "clinic_id": clinic_id,
-                "credits": -credits,  # Negative amount for debit
-                "description": f"Admin debit: {description} (by user {admin_user_id})",
-                "created_at": datetime.utcnow(),
-                "admin_user_id": admin_user_id,
-                "reference_id": reference_id
-            })
+            # The balance check and the debit are one statement, so concurrent debits cannot overdraw
+            posting = credit_ledger.post(
+                clinic_id, -credits, 'debit_adjustment',
+                description=f"Admin debit: {description} (by user {admin_user_id})",
+                allow_negative=False,
+                created_by=admin_user_id,
+                reference_id=reference_id
+            )
             
             # Commit the changes
             db.session.commit()
             
             # Create notification for the clinic
             try:
-                # Get the transaction ID for the notification
-                transaction_result = db.session.execute(text("""
-                    SELECT id FROM credit_transactions 
-                    WHERE clinic_id = :clinic_id 
-                    AND transaction_type = 'debit_adjustment' 
-                    ORDER BY created_at DESC LIMIT 1
-                """), {"clinic_id": clinic_id}).fetchone()
-                
-                if transaction_result:
-                    CreditNotificationService.create_credit_notification(
-                        transaction_id=transaction_result.id,
-                        clinic_id=clinic_id,
-                        transaction_type='debit_adjustment',
-                        amount=-credits,  # Negative amount for debit
-                        description=description
-                    )
+                CreditNotificationService.create_credit_notification(
+                    transaction_id=posting['transaction_id'],
+                    clinic_id=clinic_id,
+                    transaction_type='debit_adjustment',
+                    amount=-credits,  # Negative amount for debit
+                    description=description
+                )
             except Exception as notif_error:
                 logger.warning(f"Failed to create notification for credit debit: {notif_error}")
             
             logger.info(f"Successfully debited {credits} credits from clinic {clinic_id}")
             return True, f"Successfully debited {credits} credits. Reference: {reference_id}"
             
+        except InsufficientCredits as e:
+            db.session.rollback()
+            return False, f"Insufficient credits. Current balance: {e.balance}, Requested debit: {credits}"
+        except ValueError:
+            db.session.rollback()
+            return False, "Clinic not found"
         except Exception as e:
             logger.error(f"Error debiting credits: {e}")
             db.session.rollback()
@@ -246,59 +192,15 @@ class AdminCreditService:
     def transfer_credits(from_clinic_id, to_clinic_id, credits, description, admin_user_id):
         """Transfer credits between clinics."""
         try:
-            # Check if source clinic has enough credits
-            result = db.session.execute(text("""
-                SELECT credit_balance FROM clinics WHERE id = :clinic_id
-            """), {"clinic_id": from_clinic_id}).fetchone()
-            
-            if not result or (result.credit_balance or 0) < credits:
-                return False, "Insufficient credits in source clinic"
-            
-            # Deduct from source clinic
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = credit_balance - :credits
-                WHERE id = :clinic_id
-            """), {"credits": credits, "clinic_id": from_clinic_id})
-            
-            # Add to destination clinic
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = credit_balance + :credits
-                WHERE id = :clinic_id
-            """), {"credits": credits, "clinic_id": to_clinic_id})
-            
-            # Record transactions
-            timestamp = datetime.utcnow()
-            
-            # Deduction transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions 
-                (clinic_id, transaction_type, amount, description, status, created_at)
-                VALUES (:clinic_id, 'transfer_out', :credits, :description, 'completed', :created_at)
-            """), {
-                "clinic_id": from_clinic_id,
-                "credits": -credits,
-                "description": f"Transfer to clinic {to_clinic_id}: {description}",
-                "created_at": timestamp
-            })
-            
-            # Addition transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions 
-                (clinic_id, transaction_type, amount, description, status, created_at)
-                VALUES (:clinic_id, 'transfer_in', :credits, :description, 'completed', :created_at)
-            """), {
-                "clinic_id": to_clinic_id,
-                "credits": credits,
-                "description": f"Transfer from clinic {from_clinic_id}: {description}",
-                "created_at": timestamp
-            })
+            credit_ledger.transfer(from_clinic_id, to_clinic_id, credits, description, created_by=admin_user_id)
             
             # Commit all changes
             db.session.commit()
             return True, "Transfer completed successfully"
             
+        except InsufficientCredits:
+            db.session.rollback()
+            return False, "Insufficient credits in source clinic"
         except Exception as e:
             logger.error(f"Error transferring credits: {e}")
             db.session.rollback()
@@ -1,54 +1,38 @@
-
 # Advanced Caching Configuration
-import redis
+# Backed by the unified tiered cache (see cache_backend.py)
 from functools import wraps
-import json
 import hashlib
 
+from cache_backend import cache as tiered_cache
+
+NAMESPACE = 'advanced'
+
 class AdvancedCache:
-    def __init__(self):
-        try:
-            self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
-            self.redis_available = True
-        except:
-            self.redis_available = False
-            self.memory_cache = {}
-    
+    def __init__(self, backend=None):
+        self.backend = backend or tiered_cache
+
+    @property
+    def redis_available(self):
+        """True when the shared Redis tier is configured"""
+        return self.backend.remote is not None
+
     def cache_key(self, prefix, *args, **kwargs):
         """Generate cache key from function args"""
         key_data = str(args) + str(sorted(kwargs.items()))
         key_hash = hashlib.md5(key_data.encode()).hexdigest()
         return f"{prefix}:{key_hash}"
-    
+
     def get(self, key):
         """Get value from cache"""
-        if self.redis_available:
-            try:
-                value = self.redis_client.get(key)
-                return json.loads(value) if value else None
-            except:
-                pass
-        return self.memory_cache.get(key)
-    
+        return self.backend.get(NAMESPACE, key)
+
     def set(self, key, value, timeout=3600):
         """Set value in cache"""
-        if self.redis_available:
-            try:
-                self.redis_client.setex(key, timeout, json.dumps(value))
-                return
-            except:
-                pass
-        self.memory_cache[key] = value
-    
+        self.backend.set(NAMESPACE, key, value, ttl=timeout)
+
     def delete(self, key):
         """Delete key from cache"""
-        if self.redis_available:
-            try:
-                self.redis_client.delete(key)
-                return
-            except:
-                pass
-        self.memory_cache.pop(key, None)
+        self.backend.delete(NAMESPACE, key)
 
 # Global cache instance
 advanced_cache = AdvancedCache()
@@ -59,15 +43,10 @@ def cache_result(prefix, timeout=3600):
         @wraps(func)
         def wrapper(*args, **kwargs):
             cache_key = advanced_cache.cache_key(prefix, *args, **kwargs)
-            
-            # Try to get from cache
-            cached_result = advanced_cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            advanced_cache.set(cache_key, result, timeout)
-            return result
+
+            # Single-flight: concurrent misses share one execution
+            return advanced_cache.backend.get_or_set(
+                NAMESPACE, cache_key, lambda: func(*args, **kwargs), ttl=timeout
+            )
         return wrapper
     return decorator
@@ -3,10 +3,7 @@ Advanced Performance System
 Implements critical CSS inlining, resource hints, and optimized loading
 """
 
-import os
 import json
-import time
-from flask import Flask, render_template_string, request, make_response
 from pathlib import Path
 
 class AdvancedPerformanceSystem:
@@ -116,33 +113,6 @@ class AdvancedPerformanceSystem:
         )
         
         return template_content
-    
-    def register_performance_middleware(self, app):
-        """Register performance middleware with Flask app"""
-        
-        @app.before_request
-        def before_request():
-            """Pre-request performance optimizations"""
-            # Add performance timing headers
-            request.start_time = time.time()
-        
-        @app.after_request
-        def after_request(response):
-            """Post-request performance optimizations"""
-            # Add performance headers
-            response.headers['X-Frame-Options'] = 'DENY'
-            response.headers['X-Content-Type-Options'] = 'nosniff'
-            response.headers['X-XSS-Protection'] = '1; mode=block'
-            response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
-            
-            # Add timing headers
-            if hasattr(request, 'start_time'):
-                duration = (time.time() - request.start_time) * 1000
-                response.headers['X-Response-Time'] = f'{duration:.2f}ms'
-            
-            return response
-        
-        print("✅ Advanced performance middleware registered")
 
 def create_optimized_base_template():
     """Create optimized base template with performance enhancements"""
@@ -184,8 +154,7 @@ def register_advanced_performance_optimizations(app):
     """Register all advanced performance optimizations"""
     import time
     
-    perf_system = AdvancedPerformanceSystem()
-    perf_system.register_performance_middleware(app)
+    # Security and timing headers are response_pipeline stages (security_headers, response_pipeline)
     
     # Create optimized template
     create_optimized_base_template()
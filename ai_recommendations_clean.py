@@ -13,6 +13,8 @@ from google import genai
 from google.genai import types
 import random
 import traceback
+import json
+from query_analysis_cache import query_analysis_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -59,7 +61,7 @@ except Exception as e:
     client = None
 
 def analyze_user_query(query_text):
-    """Analyze user query using Gemini AI to extract health concerns."""
+    """Analyze user query using Gemini AI to extract health concerns (cached per normalized query)."""
     if not client:
         logger.warning("Gemini AI not available, using fallback analysis")
         return {
@@ -68,8 +70,11 @@ def analyze_user_query(query_text):
             'procedures': ['general cosmetic procedure']
         }
     
-    try:
-        prompt = f"""
+    return query_analysis_cache.analyze(query_text, gemini_query_analysis, keyword_query_analysis)
+
+def gemini_query_analysis(query_text):
+    """Ask Gemini for body parts, concerns and procedures; None if it returns nothing."""
+    prompt = f"""
         Analyze this health/cosmetic concern and extract key information:
         
         User Query: "{query_text}"
@@ -81,27 +86,25 @@ def analyze_user_query(query_text):
         
         Keep it simple and focus on cosmetic/aesthetic procedures.
         """
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config=types.GenerateContentConfig(
-                response_mime_type="application/json"
-            )
+    
+    response = client.models.generate_content(
+        model="gemini-2.5-flash",
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            response_mime_type="application/json"
         )
-        
-        if response.text:
-            import json
-            analysis = json.loads(response.text)
-            # Ensure language_detected field is present
-            if 'language_detected' not in analysis:
-                analysis['language_detected'] = 'English'
-            return analysis
-        
-    except Exception as e:
-        logger.error(f"Gemini analysis failed: {e}")
+    )
     
-    # Fallback analysis
+    if not response.text:
+        return None
+    analysis = json.loads(response.text)
+    # Ensure language_detected field is present
+    if 'language_detected' not in analysis:
+        analysis['language_detected'] = 'English'
+    return analysis
+
+def keyword_query_analysis(query_text):
+    """Keyword-based analysis used when Gemini fails or exceeds its time budget."""
     query_lower = query_text.lower()
     body_parts = []
     concerns = []
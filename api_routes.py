@@ -32,10 +32,19 @@ def track_interaction():
         if not fingerprint or not interaction_type or not content_type:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
+        try:
+            target_id = PersonalizationService.parse_target_id(content_id)
+        except ValueError:
+            return jsonify({'success': False, 'error': 'content_id must be an integer'}), 400
+        
         # Track the interaction
         PersonalizationService.track_interaction(
-            fingerprint, interaction_type, content_type, content_id, 
-            content_name, page_url, session_id
+            user_id=str(PersonalizationService.fingerprint_to_user_id(fingerprint)),
+            session_id=session_id,
+            interaction_type=interaction_type,
+            target_type=content_type,
+            target_id=target_id,
+            metadata={'content_name': content_name, 'page_url': page_url}
         )
         
         return jsonify({'success': True})
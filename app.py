@@ -122,18 +122,18 @@ def create_app():
     except ImportError as e:
         logger.warning(f"Phase 2 optimizations not available: {e}")
     
-    # Phase 3 performance optimizations
-    try:
-        from phase3_server_optimizer import ServerResponseOptimizer
-        
-        # Initialize server response optimization
-        server_optimizer = ServerResponseOptimizer()
-        server_optimizer.init_app(app)
-        
-        logger.info("Phase 3 server response optimizations initialized")
-        
-    except ImportError as e:
-        logger.warning(f"Phase 3 optimizations not available: {e}")
+    # Phase 3 performance optimizations - DISABLED: its timing, cache and security hooks are response_pipeline stages
+    # try:
+    #     from phase3_server_optimizer import ServerResponseOptimizer
+    #     
+    #     # Initialize server response optimization
+    #     server_optimizer = ServerResponseOptimizer()
+    #     server_optimizer.init_app(app)
+    #     
+    #     logger.info("Phase 3 server response optimizations initialized")
+    #     
+    # except ImportError as e:
+    #     logger.warning(f"Phase 3 optimizations not available: {e}")
     
     # Register responsive image routes
     try:
@@ -163,17 +163,17 @@ def create_app():
     #     logger.warning(f"Phase 4A static asset optimization not available: {e}")
     logger.info("Phase 4A static asset optimization disabled to prevent endpoint conflicts")
     
-    # Phase 4A Regression Fix: Server Response Optimization
-    try:
-        from server_response_fix import server_optimizer
-        
-        # Initialize server response optimization
-        server_optimizer.init_app(app)
-        
-        logger.info("Phase 4A server response optimization initialized")
-        
-    except ImportError as e:
-        logger.warning(f"Phase 4A server response optimization not available: {e}")
+    # Phase 4A Regression Fix: Server Response Optimization - DISABLED: timing and security headers are response_pipeline stages
+    # try:
+    #     from server_response_fix import server_optimizer
+    #     
+    #     # Initialize server response optimization
+    #     server_optimizer.init_app(app)
+    #     
+    #     logger.info("Phase 4A server response optimization initialized")
+    #     
+    # except ImportError as e:
+    #     logger.warning(f"Phase 4A server response optimization not available: {e}")
     
     # Apply advanced performance optimizations (CSS bundling, image optimization)
     try:
@@ -238,12 +238,12 @@ def create_app():
     # except ImportError as e:
     #     logger.warning(f"Manual production optimizations not available: {e}")
     
-    # Apply server response optimizations (reduce response time <200ms)
-    try:
-        from server_response_optimization import register_server_response_optimizations
-        register_server_response_optimizations(app)
-    except ImportError as e:
-        logger.warning(f"Server response optimizations not available: {e}")
+    # Apply server response optimizations - DISABLED: timing and security headers are response_pipeline stages
+    # try:
+    #     from server_response_optimization import register_server_response_optimizations
+    #     register_server_response_optimizations(app)
+    # except ImportError as e:
+    #     logger.warning(f"Server response optimizations not available: {e}")
     
     # Mobile 100% Performance Score Optimization - TEMPORARILY DISABLED
     # try:
@@ -324,6 +324,38 @@ def create_app():
     # Initialize Flask-Migrate
     migrate.init_app(app, db)
     
+    # Invalidate tagged cache entries when tracked models are committed
+    try:
+        from cache_invalidation import register_cache_invalidation
+        register_cache_invalidation(db.session)
+        logger.info("✅ Cache tag invalidation enabled")
+    except ImportError as e:
+        logger.warning(f"Cache tag invalidation not available: {e}")
+    
+    # Keep the in-memory autocomplete index in step with committed edits
+    try:
+        from autocomplete_index import register_autocomplete_updates
+        register_autocomplete_updates(db.session)
+        logger.info("✅ Autocomplete index updates enabled")
+    except ImportError as e:
+        logger.warning(f"Autocomplete index updates not available: {e}")
+    
+    # Maintain community reply/vote counters as rows change
+    try:
+        from community_counters import register_community_counters
+        register_community_counters()
+        logger.info("✅ Community counters enabled")
+    except ImportError as e:
+        logger.warning(f"Community counters not available: {e}")
+
+    # Map the offline-built related-item neighbour files (shared by workers after the fork)
+    try:
+        from item_similarity import init_app as init_item_similarity
+        init_item_similarity(app)
+        logger.info("✅ Item similarity model mapped")
+    except ImportError as e:
+        logger.warning(f"Item similarity not available: {e}")
+
     # ========== PERFORMANCE OPTIMIZATIONS ==========
     # Enable compression middleware for better performance
     try:
@@ -333,6 +365,14 @@ def create_app():
     except ImportError:
         logger.warning("Compression middleware not available")
     
+    # Fingerprint static URLs for immutable caching (after compression, so it wraps the static view)
+    try:
+        from asset_manifest import init_asset_manifest
+        init_asset_manifest(app)
+        logger.info("✅ Static asset manifest enabled")
+    except ImportError:
+        logger.warning("Static asset manifest not available")
+    
     # Register optimized static file serving
     try:
         from optimized_static_server import register_optimized_static
@@ -395,8 +435,12 @@ def create_app():
             # Track the interaction
             try:
                 PersonalizationService.track_interaction(
-                    fingerprint, interaction_type, content_type, int(content_id), 
-                    content_name, page_url
+                    user_id=str(PersonalizationService.fingerprint_to_user_id(fingerprint)),
+                    session_id=session_id,
+                    interaction_type=interaction_type,
+                    target_type=content_type,
+                    target_id=int(content_id) if content_id else None,
+                    metadata={'content_name': content_name, 'page_url': page_url}
                 )
             except Exception as e:
                 app.logger.warning(f"Failed to track interaction: {e}")
@@ -420,23 +464,20 @@ def create_app():
                 return jsonify({'success': False, 'message': 'Missing slide_id'}), 400
             
             from models import BannerSlide
+            from buffered_counters import counters
             slide_id = data['slide_id']
             slide = BannerSlide.query.get(slide_id)
             
             if not slide:
                 return jsonify({'success': False, 'message': 'Slide not found'}), 404
             
-            # Initialize impression count if None
-            if slide.impression_count is None:
-                slide.impression_count = 0
-            
-            slide.impression_count += 1
-            db.session.commit()
+            # Buffered; the periodic counter flush writes it
+            counters.increment('banner_impressions', slide.id)
             
             return jsonify({
                 'success': True,
                 'message': f'Impression recorded for slide {slide_id}',
-                'impression_count': slide.impression_count
+                'impression_count': (slide.impression_count or 0) + counters.pending('banner_impressions', slide.id)
             })
         except Exception as e:
             return jsonify({'success': False, 'message': str(e)}), 500
@@ -452,24 +493,23 @@ def create_app():
                 return jsonify({'success': False, 'message': 'Missing slide_id'}), 400
         
             from models import BannerSlide
+            from buffered_counters import counters
             slide_id = data['slide_id']
             slide = BannerSlide.query.get(slide_id)
             
             if not slide:
                 return jsonify({'success': False, 'message': 'Slide not found'}), 404
             
-            # Initialize impression count to avoid division by zero
-            if slide.impression_count is None:
-                slide.impression_count = 1
-            
-            slide.click_count += 1
-            db.session.commit()
+            # Buffered; the periodic counter flush writes it
+            counters.increment('banner_clicks', slide.id)
+            clicks = (slide.click_count or 0) + counters.pending('banner_clicks', slide.id)
+            impressions = (slide.impression_count or 0) + counters.pending('banner_impressions', slide.id)
             
             return jsonify({
                 'success': True,
                 'message': f'Click recorded for slide {slide_id}',
-                'click_count': slide.click_count,
-                'ctr': round((slide.click_count / slide.impression_count * 100), 2) if slide.impression_count > 0 else 0
+                'click_count': clicks,
+                'ctr': round((clicks / impressions * 100), 2) if impressions > 0 else 0
             })
         except Exception as e:
             return jsonify({'success': False, 'message': str(e)}), 500
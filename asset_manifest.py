@@ -0,0 +1,185 @@
+"""
+Content-hashed static asset manifest.
+
+Every file under ``static/`` (CSS, JS, images and the WebP variants written by
+``phase3_image_optimizer``) is fingerprinted with a short BLAKE2 digest of its
+contents, e.g. ``css/style.css`` -> ``css/style.3f17b944e0.css``.
+
+- ``url_for('static', filename=...)`` emits the hashed name through a
+  ``url_defaults`` hook, so existing templates need no changes;
+  ``asset_url(filename)`` does the same for template code that builds paths.
+- Hashed URLs are served with ``Cache-Control: public, max-age=31536000,
+  immutable``; a new deploy changes the URL, never the content behind it.
+- Hashed -> real path lookups are a dict hit built at boot; no request
+  checks the filesystem to find out what exists.
+
+The manifest is written to ``static/asset-manifest.json`` at build time
+(``python asset_manifest.py``). At boot it is loaded and only files whose
+size or mtime changed since are rehashed; without it the whole tree is
+hashed (a few tens of milliseconds). Upload directories are written at
+runtime and are never fingerprinted.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'asset-manifest.json'
+HASH_LENGTH = 10
+IMMUTABLE_MAX_AGE = 31536000  # 1 year
+
+# Written at runtime, so a boot-time fingerprint would go stale
+RUNTIME_DIRS = ('uploads/', 'media/', 'doctor_credentials/', 'package_results/')
+# Must keep a stable URL (service worker scope / update checks)
+STABLE_NAMES = frozenset({'sw.js', MANIFEST_NAME})
+DERIVED_SUFFIXES = ('.br', '.gz')
+
+
+def file_digest(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(filename, digest):
+    """``css/site.css`` + digest -> ``css/site.<digest>.css``"""
+    head, tail = os.path.split(filename)
+    stem, extension = os.path.splitext(tail)
+    return os.path.join(head, f"{stem}.{digest}{extension}").replace(os.sep, '/')
+
+
+class AssetManifest:
+    """Original path <-> fingerprinted path for everything under the static folder."""
+
+    def __init__(self):
+        self.folder = None
+        self.entries = {}   # original -> {'hashed', 'size', 'mtime'}
+        self.hashed = {}    # original -> hashed
+        self.original = {}  # hashed -> original
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprinted(relative):
+        return (not relative.startswith(RUNTIME_DIRS)
+                and relative not in STABLE_NAMES
+                and not relative.endswith(DERIVED_SUFFIXES)
+                and not os.path.basename(relative).startswith('.'))
+
+    def build(self, folder, previous=None):
+        """Fingerprint the tree, reusing ``previous`` entries whose size and mtime still match."""
+        previous = previous or {}
+        entries, rehashed = {}, 0
+        for root, _dirs, files in os.walk(folder):
+            for name in files:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, folder).replace(os.sep, '/')
+                if not self.fingerprinted(relative):
+                    continue
+                try:
+                    stat = os.stat(path)
+                    entry = previous.get(relative)
+                    if not entry or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+                        entry = {'hashed': hashed_name(relative, file_digest(path)),
+                                 'size': stat.st_size, 'mtime': stat.st_mtime}
+                        rehashed += 1
+                    entries[relative] = entry
+                except OSError as e:
+                    logger.warning(f"Could not fingerprint {path}: {e}")
+
+        with self._lock:
+            self.folder = folder
+            self.entries = entries
+            self.hashed = {relative: entry['hashed'] for relative, entry in entries.items()}
+            self.original = {entry['hashed']: relative for relative, entry in entries.items()}
+        return rehashed
+
+    def load(self, folder):
+        """Load the build-time manifest and refresh whatever changed since."""
+        previous = {}
+        try:
+            with open(os.path.join(folder, MANIFEST_NAME)) as f:
+                previous = json.load(f).get('assets', {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable asset manifest: {e}")
+        rehashed = self.build(folder, previous)
+        logger.info(f"Asset manifest: {len(self.entries)} files, {rehashed} fingerprinted at boot")
+        return rehashed
+
+    def save(self, folder=None):
+        folder = folder or self.folder
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.manifest-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'assets': self.entries}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, os.path.join(folder, MANIFEST_NAME))
+
+    def has(self, filename):
+        """Whether ``filename`` exists under the static folder, from memory where possible."""
+        if self.folder is None or filename.startswith(RUNTIME_DIRS):
+            return os.path.isfile(os.path.join(self.folder or 'static', filename))
+        return filename in self.hashed
+
+    def url_name(self, filename):
+        return self.hashed.get(filename, filename)
+
+    def resolve(self, filename):
+        """Real path for a fingerprinted name, or None if ``filename`` is not one."""
+        return self.original.get(filename)
+
+
+def init_asset_manifest(app):
+    """Fingerprint static URLs and serve them with immutable caching."""
+    app.config.setdefault('ASSET_MANIFEST_ENABLED', True)
+    if not app.config['ASSET_MANIFEST_ENABLED'] or not app.static_folder \
+            or not os.path.isdir(app.static_folder) or 'static' not in app.view_functions:
+        return None
+
+    asset_manifest.load(app.static_folder)
+    static_view = app.view_functions['static']
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = asset_manifest.url_name(values['filename'])
+
+    def hashed_static_view(filename):
+        original = asset_manifest.resolve(filename)
+        if original is None:
+            return static_view(filename=filename)
+        response = static_view(filename=original)
+        if response.status_code == 200:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        return response
+
+    app.view_functions['static'] = hashed_static_view
+
+    @app.template_global()
+    def asset_url(filename):
+        """Fingerprinted /static URL for a path relative to the static folder."""
+        return f"{app.static_url_path}/{asset_manifest.url_name(filename.lstrip('/'))}"
+
+    return asset_manifest
+
+
+asset_manifest = AssetManifest()
+
+
+if __name__ == "__main__":
+    # Build step: python asset_manifest.py [static_dir]
+    logging.basicConfig(level=logging.INFO)
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'static'
+    asset_manifest.load(folder)
+    asset_manifest.save(folder)
+    print(f"Wrote {os.path.join(folder, MANIFEST_NAME)} ({len(asset_manifest.entries)} assets)")
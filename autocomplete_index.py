@@ -0,0 +1,682 @@
+"""
+In-memory autocomplete index for the ``/autocomplete`` endpoint.
+
+Every keystroke used to run ``ILIKE '%q%'`` scans over procedures, doctors,
+threads and packages plus one ``COUNT(*)`` per returned thread. This module
+keeps all suggestion data in process:
+
+- a prefix index (a flattened trie: sorted ``(token, entry)`` pairs searched
+  with bisect) over every word of procedure names, alternative names, doctor
+  names/specialties, package titles/categories and thread titles
+- a second prefix index over the words of package descriptions and thread
+  bodies (the first ``BODY_CHARS`` characters); body-only matches rank after
+  every title match
+- a trigram index over titles used as a fallback for typos and infix matches
+- reply counts carried on thread entries (one grouped query at build time)
+
+Commits in this worker hand their changed ids to a background thread, which
+reloads just those rows and appends the ids to a per-kind change journal in
+the shared Redis tier (a file beside the tag versions without Redis) and
+bumps its tag; the committing request never waits on the journal lock.
+Commits that only touch hot counters (``COUNTER_COLUMNS``) are ignored, as
+cache_invalidation ignores them. Other workers notice the bumped tags and reload
+just the journaled ids in the background. Replies publish their parent
+thread, so reply counts follow within a second. A full rebuild of a kind
+only happens every ``FULL_REBUILD_INTERVAL`` or when the journal has nothing
+new for a tag bump or has gaps (trimmed or expired entries, a raw-SQL
+write that only called ``mark_dirty``; one landing in the same second as
+journaled commits waits for the interval). A kind's tag versions count as
+seen only once its refresh succeeded, so a failed refresh is retried.
+"""
+
+import os
+import re
+import sys
+import time
+import queue
+import bisect
+import fcntl
+import pickle
+import logging
+import tempfile
+import threading
+import unicodedata
+from collections import Counter
+from sqlalchemy import event, inspect, text, bindparam
+
+from cache_backend import cache, MISSING
+from cache_invalidation import PROCEDURES, DOCTORS, THREADS, COMMUNITY, PACKAGES, CLINICS, has_meaningful_changes
+
+logger = logging.getLogger(__name__)
+
+PROCEDURE = 'procedure'
+DOCTOR = 'doctor'
+THREAD = 'thread'
+COMMUNITY_THREAD = 'community'
+PACKAGE = 'package'
+KINDS = (PROCEDURE, DOCTOR, THREAD, COMMUNITY_THREAD, PACKAGE)
+
+# Cache tags whose version bumps mean a kind must be reloaded
+KIND_TAGS = {
+    PROCEDURE: (PROCEDURES,),
+    DOCTOR: (DOCTORS,),
+    THREAD: (THREADS,),
+    COMMUNITY_THREAD: (COMMUNITY,),
+    PACKAGE: (CLINICS, PACKAGES),
+}
+
+MIN_TRIGRAM_SIMILARITY = 0.3
+BODY_CHARS = 2000  # Leading characters of descriptions and thread bodies indexed for matching
+VERSION_CHECK_INTERVAL = 1.0  # seconds between tag version checks
+FULL_REBUILD_INTERVAL = int(os.environ.get('AUTOCOMPLETE_REBUILD_SECONDS', 900))
+FAILED_REFRESH_RETRY = 30     # seconds before a failed refresh of a kind is tried again
+
+CHANGES_NAMESPACE = 'autocomplete_changes'
+CHANGE_JOURNAL_LENGTH = 500
+CHANGE_JOURNAL_TTL = 2 * FULL_REBUILD_INTERVAL
+SYNC = 'sync'  # Queue marker: catch up with the change journal
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def normalize(value):
+    """Lowercase, strip accents and collapse punctuation to spaces."""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', str(value))
+    value = ''.join(ch for ch in value if not unicodedata.combining(ch))
+    return ' '.join(_TOKEN_RE.findall(value.casefold()))
+
+
+def body_tokens(value):
+    """Distinct words of the start of a description or thread body."""
+    return frozenset(sys.intern(token) for token in normalize((value or '')[:BODY_CHARS]).split())
+
+
+def changes_tag(kind):
+    return f"autocomplete-changes:{kind}"
+
+
+def trigrams(value):
+    padded = f"  {value} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AutocompleteEntry:
+    """One suggestion with everything needed to render it without SQL."""
+
+    __slots__ = ('kind', 'id', 'text', 'keys', 'order', 'data', 'body')
+
+    def __init__(self, kind, entity_id, text, keys, order, data, body=frozenset()):
+        self.kind = kind
+        self.id = entity_id
+        self.text = text            # Display text matched against the query
+        self.keys = keys            # Normalised strings indexed for this entry
+        self.order = order          # Tie-break key within a kind
+        self.data = data            # Extra suggestion fields
+        self.body = body            # Description/body words, matched after the keys
+
+
+class KindIndex:
+    """Prefix and trigram indexes over the entries of one entity kind."""
+
+    def __init__(self):
+        self.entries = {}
+        self._tokens = []          # sorted [(token, entity_id)]
+        self._body_tokens = []     # sorted [(token, entity_id)] from entry bodies
+        self._trigrams = {}        # trigram -> set(entity_id)
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self, entries):
+        """Replace the whole kind in one step (built outside the lock)."""
+        tokens = []
+        body_tokens = []
+        grams = {}
+        by_id = {}
+        for entry in entries:
+            by_id[entry.id] = entry
+            for token in self._entry_tokens(entry):
+                tokens.append((token, entry.id))
+            for token in entry.body:
+                body_tokens.append((token, entry.id))
+            for gram in self._entry_trigrams(entry):
+                grams.setdefault(gram, set()).add(entry.id)
+        tokens.sort()
+        body_tokens.sort()
+        with self._lock:
+            self.entries, self._tokens, self._body_tokens, self._trigrams = by_id, tokens, body_tokens, grams
+
+    def upsert(self, entry):
+        with self._lock:
+            self.remove(entry.id)
+            self.entries[entry.id] = entry
+            for token in self._entry_tokens(entry):
+                bisect.insort(self._tokens, (token, entry.id))
+            for token in entry.body:
+                bisect.insort(self._body_tokens, (token, entry.id))
+            for gram in self._entry_trigrams(entry):
+                self._trigrams.setdefault(gram, set()).add(entry.id)
+
+    def remove(self, entity_id):
+        with self._lock:
+            entry = self.entries.pop(entity_id, None)
+            if entry is None:
+                return
+            for tokens, entry_tokens in ((self._tokens, self._entry_tokens(entry)), (self._body_tokens, entry.body)):
+                for token in entry_tokens:
+                    pos = bisect.bisect_left(tokens, (token, entity_id))
+                    if pos < len(tokens) and tokens[pos] == (token, entity_id):
+                        del tokens[pos]
+            for gram in self._entry_trigrams(entry):
+                ids = self._trigrams.get(gram)
+                if ids is not None:
+                    ids.discard(entity_id)
+
+    @staticmethod
+    def _entry_tokens(entry):
+        return {token for key in entry.keys for token in key.split()}
+
+    @staticmethod
+    def _entry_trigrams(entry):
+        grams = set()
+        for key in entry.keys:
+            grams |= trigrams(key)
+        return grams
+
+    @staticmethod
+    def _prefix_ids(tokens, prefix):
+        ids = set()
+        pos = bisect.bisect_left(tokens, (prefix,))
+        while pos < len(tokens) and tokens[pos][0].startswith(prefix):
+            ids.add(tokens[pos][1])
+            pos += 1
+        return ids
+
+    def _matching_ids(self, words, with_body):
+        ids = None
+        for word in words:
+            matched = self._prefix_ids(self._tokens, word)
+            if with_body:
+                matched |= self._prefix_ids(self._body_tokens, word)
+            ids = matched if ids is None else ids & matched
+            if not ids:
+                break
+        return ids or set()
+
+    def search(self, query, limit):
+        """
+        Entries matching every query word as a prefix, best first: title
+        matches, then matches that need the body, then the trigram fallback.
+        """
+        words = query.split()
+        if not words:
+            return []
+        with self._lock:
+            ids = self._matching_ids(words, with_body=False)
+            ranked = sorted((self.entries[i] for i in ids), key=lambda e: self._rank(e, query))
+            if len(ranked) < limit and self._body_tokens:
+                body_ids = self._matching_ids(words, with_body=True) - ids
+                ranked.extend(sorted((self.entries[i] for i in body_ids), key=lambda e: e.order))
+            if len(ranked) < limit:
+                seen = {e.id for e in ranked}
+                ranked.extend(e for e in self._fuzzy(query) if e.id not in seen)
+            return ranked[:limit]
+
+    @staticmethod
+    def _rank(entry, query):
+        exact = 0 if any(key == query for key in entry.keys) else 1
+        starts = 0 if any(key.startswith(query) for key in entry.keys) else 1
+        return (exact, starts, entry.order)
+
+    def _fuzzy(self, query):
+        query_grams = trigrams(query)
+        counts = Counter()
+        for gram in query_grams:
+            counts.update(self._trigrams.get(gram, ()))
+        scored = []
+        for entity_id, shared in counts.items():
+            entry = self.entries.get(entity_id)
+            if entry is None:
+                continue
+            best = max(shared / len(query_grams | trigrams(key)) for key in entry.keys)
+            if best >= MIN_TRIGRAM_SIMILARITY:
+                scored.append((-best, entry.order, entry))
+        scored.sort(key=lambda item: (item[0], item[1]))
+        return [entry for _score, _order, entry in scored]
+
+
+# ---- loaders ---------------------------------------------------------------
+
+def _id_filter(ids, column):
+    return f" AND {column} IN :ids" if ids is not None else ""
+
+
+def _execute(db, sql, ids, params=None):
+    statement = text(sql)
+    params = dict(params or {})
+    if ids is not None:
+        statement = statement.bindparams(bindparam('ids', expanding=True))
+        params['ids'] = list(ids)
+    return db.session.execute(statement, params).fetchall()
+
+
+def _preview(content):
+    if content and len(content) > 100:
+        return content[:100] + "..."
+    return content
+
+
+def load_procedures(db, ids=None):
+    rows = _execute(db, """
+        SELECT id, procedure_name, alternative_names, procedure_types, body_part
+        FROM procedures WHERE 1=1""" + _id_filter(ids, 'id'), ids)
+    entries = []
+    for row in rows:
+        names = [row.procedure_name] + [n for n in re.split(r'[,;/]', row.alternative_names or '') if n.strip()]
+        procedure_type = "Surgical" if row.procedure_types and "surgical" in row.procedure_types.lower() else "Non-Surgical"
+        entries.append(AutocompleteEntry(
+            PROCEDURE, row.id, row.procedure_name, [normalize(n) for n in names if normalize(n)],
+            normalize(row.procedure_name), {'type': procedure_type, 'body_part': row.body_part}))
+    return entries
+
+
+def load_doctors(db, ids=None):
+    rows = _execute(db, """
+        SELECT id, name, specialty, city, state
+        FROM doctors WHERE 1=1""" + _id_filter(ids, 'id'), ids)
+    entries = []
+    for row in rows:
+        location = f"{row.city}{', ' + row.state if row.state else ''}"
+        keys = [k for k in (normalize(row.name), normalize(row.specialty)) if k]
+        entries.append(AutocompleteEntry(
+            DOCTOR, row.id, row.name, keys, normalize(row.name),
+            {'specialty': row.specialty, 'location': location}))
+    return entries
+
+
+def _thread_entries(kind, rows, reply_counts):
+    entries = []
+    for row in rows:
+        created_ts = row.created_at.timestamp() if row.created_at else 0
+        entries.append(AutocompleteEntry(
+            kind, row.id, row.title, [normalize(row.title)] if normalize(row.title) else [],
+            -created_ts,  # Newest first
+            {'date': row.created_at.strftime('%b %d, %Y') if row.created_at else '',
+             'content_preview': _preview(row.content),
+             'reply_count': reply_counts.get(row.id, 0)},
+            body_tokens(row.content)))
+    return entries
+
+
+def load_threads(db, ids=None):
+    rows = _execute(db, """
+        SELECT id, title, content, created_at
+        FROM threads WHERE 1=1""" + _id_filter(ids, 'id'), ids)
+    try:
+        # One grouped count instead of a COUNT(*) per suggestion
+        reply_counts = dict(_execute(db, """
+            SELECT thread_id, COUNT(*) FROM replies
+            WHERE 1=1""" + _id_filter(ids, 'thread_id') + " GROUP BY thread_id", ids))
+    except Exception as e:
+        logger.warning(f"Could not load thread reply counts: {e}")
+        db.session.rollback()
+        reply_counts = {}
+    return _thread_entries(THREAD, rows, reply_counts)
+
+
+def load_community_threads(db, ids=None):
+    rows = _execute(db, """
+        SELECT id, title, content, created_at
+        FROM community WHERE parent_id IS NULL""" + _id_filter(ids, 'id'), ids)
+    reply_counts = dict(_execute(db, """
+        SELECT parent_id, COUNT(*) FROM community
+        WHERE parent_id IS NOT NULL""" + _id_filter(ids, 'parent_id') + " GROUP BY parent_id", ids))
+    return _thread_entries(COMMUNITY_THREAD, rows, reply_counts)
+
+
+def _format_price(price_actual, price_discounted):
+    if price_discounted and price_actual and price_discounted < price_actual:
+        return f"₹{price_discounted:,.0f}"
+    if price_actual:
+        return f"₹{price_actual:,.0f}"
+    return "Contact for price"
+
+
+def load_packages(db, ids=None):
+    rows = _execute(db, """
+        SELECT p.id, p.title, p.slug, p.category, p.description, p.price_actual, p.price_discounted,
+               c.name as clinic_name, c.city as clinic_city
+        FROM packages p
+        JOIN clinics c ON p.clinic_id = c.id
+        WHERE p.is_active = true AND c.is_approved = true""" + _id_filter(ids, 'p.id'), ids)
+    entries = []
+    for row in rows:
+        keys = [k for k in (normalize(row.title), normalize(row.category)) if k]
+        entries.append(AutocompleteEntry(
+            PACKAGE, row.id, row.title, keys, normalize(row.title),
+            {'slug': row.slug,
+             'clinic_name': row.clinic_name or "Unknown Clinic",
+             'clinic_city': row.clinic_city or "",
+             'price': _format_price(row.price_actual, row.price_discounted),
+             'package_category': row.category or 'General'},
+            body_tokens(row.description)))
+    return entries
+
+
+LOADERS = {
+    PROCEDURE: load_procedures,
+    DOCTOR: load_doctors,
+    THREAD: load_threads,
+    COMMUNITY_THREAD: load_community_threads,
+    PACKAGE: load_packages,
+}
+
+
+# ---- index ------------------------------------------------------------------
+
+class AutocompleteIndex:
+    """All autocomplete kinds plus the background machinery keeping them fresh."""
+
+    def __init__(self):
+        self.kinds = {kind: KindIndex() for kind in KINDS}
+        self._versions = {}
+        self._applied = {}         # kind -> (journal epoch, last sequence reflected in the index)
+        self._built_at = {}
+        self._pending = set()      # kinds with a refresh queued or running
+        self._retry_at = {}
+        self._last_version_check = 0.0
+        self._build_lock = threading.Lock()
+        self._ready = False
+        self._queue = queue.Queue()
+        self._worker_pid = None
+        self._app = None
+
+    # -- building --
+
+    def build(self, db, kinds=KINDS):
+        """Load the given kinds from the database (a few grouped queries)."""
+        for kind in kinds:
+            start_time = time.time()
+            # Snapshot before loading so changes committed meanwhile are picked up next check
+            versions = current_versions(kind)
+            journal = read_journal(kind)
+            entries = LOADERS[kind](db)
+            self.kinds[kind].load(entries)
+            self._versions[kind] = versions
+            self._applied[kind] = (journal['epoch'], journal['entries'][-1][0]) if journal else (None, 0)
+            self._built_at[kind] = time.time()
+            logger.info(f"Autocomplete index loaded {len(entries)} {kind} entries "
+                        f"({(time.time() - start_time) * 1000:.1f}ms)")
+
+    def sync(self, db, kind):
+        """Reload the ids other workers journaled since the last refresh; full build when it has gaps."""
+        versions = current_versions(kind)
+        journal = read_journal(kind)
+        epoch, applied = self._applied.get(kind, (None, 0))
+        if journal and epoch not in (None, journal['epoch']):
+            journal = None  # Expired and restarted since the last refresh
+        entries = journal['entries'] if journal else []
+        changed = [ids for seq, ids in entries if seq > applied]
+        if not changed or entries[0][0] > applied + 1:
+            # The tags moved for changes the journal does not (or no longer) cover
+            self.build(db, (kind,))
+            return
+        ids = set().union(*changed)
+        self._reload_ids(db, kind, ids)
+        self._versions[kind] = versions
+        self._applied[kind] = (journal['epoch'], entries[-1][0])
+        logger.debug(f"Autocomplete index reloaded {len(ids)} changed {kind} entries")
+
+    def ensure_ready(self, app, db):
+        """Build once per worker; later freshness work happens in the background."""
+        self._app = app
+        self._ensure_worker()
+        if self._ready:
+            self._check_freshness()
+            return
+        with self._build_lock:
+            if not self._ready:
+                self.build(db)
+                self._ready = True
+
+    def _check_freshness(self):
+        now = time.time()
+        if now - self._last_version_check < VERSION_CHECK_INTERVAL:
+            return
+        self._last_version_check = now
+        for kind in KINDS:
+            if kind in self._pending or now < self._retry_at.get(kind, 0):
+                continue
+            if now - self._built_at.get(kind, 0) > FULL_REBUILD_INTERVAL:
+                job = (kind, None)
+            else:
+                versions = current_versions(kind)
+                if versions is None or versions == self._versions.get(kind):
+                    continue  # Unchanged, or the tag store is unreachable
+                job = (kind, SYNC)
+            # Versions are recorded by build()/sync() once they succeed; until then
+            # the pending flag keeps the refresh from being queued twice
+            self._pending.add(kind)
+            self._queue.put(job)
+
+    def schedule_changes(self, kind, ids):
+        """Publish ids changed by a commit in this worker, and reload them here, in the background."""
+        self._ensure_worker()
+        self._queue.put((kind, set(ids)))
+
+    # -- background worker --
+
+    def _ensure_worker(self):
+        # Threads do not survive gunicorn's fork with preload_app, so start lazily per process
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        self._queue = queue.Queue()
+        self._pending = set()
+        threading.Thread(target=self._run, daemon=True, name='autocomplete-index').start()
+
+    def _run(self):
+        from app import db
+        while True:
+            kind, ids = self._queue.get()
+            self._refresh(db, kind, ids)
+
+    def _refresh(self, db, kind, ids):
+        if ids is not None and ids != SYNC:
+            self._apply_changes(db, kind, ids)
+            return
+        try:
+            with self._app.app_context():
+                if ids is None:
+                    self.build(db, (kind,))
+                else:
+                    self.sync(db, kind)
+        except Exception as e:
+            logger.warning(f"Autocomplete index refresh for {kind} failed: {e}")
+            self._retry_at[kind] = time.time() + FAILED_REFRESH_RETRY
+        finally:
+            self._pending.discard(kind)
+
+    def _apply_changes(self, db, kind, ids):
+        try:
+            publish_changes(kind, ids)
+        except Exception as e:
+            logger.warning(f"Could not publish autocomplete changes for {kind}: {e}")
+        if not self._ready:
+            return  # Nothing to update here; the first build loads the current rows
+        try:
+            with self._app.app_context():
+                self._reload_ids(db, kind, ids)
+        except Exception as e:
+            logger.warning(f"Autocomplete index reload of {len(ids)} {kind} entries failed: {e}")
+
+    def _reload_ids(self, db, kind, ids):
+        index = self.kinds[kind]
+        fresh = {entry.id: entry for entry in LOADERS[kind](db, ids)}
+        for entity_id in ids:
+            if entity_id in fresh:
+                index.upsert(fresh[entity_id])
+            else:
+                index.remove(entity_id)  # Deleted, deactivated or no longer eligible
+
+    # -- lookup --
+
+    def suggest(self, query, kind, limit):
+        return self.kinds[kind].search(normalize(query), limit)
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def get_autocomplete_index():
+    """The worker's autocomplete index, built on first use."""
+    from flask import current_app
+    from app import db
+    autocomplete_index.ensure_ready(current_app._get_current_object(), db)
+    return autocomplete_index
+
+
+# ---- change journal shared by all workers ------------------------------------
+
+def current_versions(kind):
+    """Versions of the tags whose bump means ``kind`` changed (None when the tag store is unreachable)."""
+    return cache.tag_versions.current(KIND_TAGS[kind] + (changes_tag(kind),))
+
+
+def read_journal(kind):
+    """
+    ``{'epoch', 'entries': [(seq, ids), ...]}`` with entries oldest first, or
+    None before the first change or once it expired. Sequences start at 1 in
+    each epoch; a journal recreated after expiring gets a new epoch.
+    """
+    if cache.remote is not None:
+        journal = cache.remote.get(cache.full_key(CHANGES_NAMESPACE, kind), CHANGES_NAMESPACE)
+        return None if journal is MISSING else journal
+    path = _journal_path(kind)
+    if path is None:
+        return _local_journals.get(kind)
+    try:
+        if time.time() - os.stat(path).st_mtime > CHANGE_JOURNAL_TTL:
+            return None
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, pickle.UnpicklingError) as e:
+        logger.warning(f"Unreadable autocomplete change journal {path}: {e}")
+        return None
+
+
+def _journal_path(kind):
+    # Without Redis, tag versions live in a directory shared by the host's workers; so does the journal
+    directory = getattr(cache.tag_versions, 'directory', None)
+    return os.path.join(directory, f"{CHANGES_NAMESPACE}-{kind}.pickle") if directory else None
+
+
+_local_journals = {}  # Per-process tag versions: the journal only needs to reach this process
+_local_journal_lock = threading.Lock()
+
+
+def _appended(journal, ids):
+    journal = journal or {'epoch': os.urandom(8).hex(), 'entries': []}
+    entries = journal['entries']
+    seq = entries[-1][0] + 1 if entries else 1
+    return {'epoch': journal['epoch'], 'entries': (entries + [(seq, sorted(ids))])[-CHANGE_JOURNAL_LENGTH:]}
+
+
+def _lock_journal(full_key, timeout=0.5):
+    deadline = time.time() + timeout
+    while not cache.remote.acquire_lock(full_key, 5):
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def _publish_remote(kind, ids):
+    full_key = cache.full_key(CHANGES_NAMESPACE, kind)
+    if not _lock_journal(full_key):
+        logger.warning(f"Autocomplete change journal for {kind} is locked; other workers will rebuild")
+        return
+    try:
+        journal = _appended(read_journal(kind), ids)
+        cache.remote.set(full_key, pickle.dumps(journal, protocol=pickle.HIGHEST_PROTOCOL),
+                         CHANGE_JOURNAL_TTL, namespace=CHANGES_NAMESPACE)
+    finally:
+        cache.remote.release_lock(full_key)
+
+
+def _publish_file(path, kind, ids):
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        journal = _appended(read_journal(kind), ids)
+        # Written beside the journal and renamed, so a reader never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.autocomplete-')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            pickle.dump(journal, tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+
+def publish_changes(kind, ids):
+    """Journal ids of ``kind`` changed by a commit and tell the other workers."""
+    if cache.remote is not None:
+        _publish_remote(kind, ids)
+    elif _journal_path(kind) is not None:
+        _publish_file(_journal_path(kind), kind, ids)
+    else:
+        with _local_journal_lock:
+            _local_journals[kind] = _appended(_local_journals.get(kind), ids)
+    # Bumped even when nothing was journaled: readers fall back to a full build
+    cache.invalidate_tags(changes_tag(kind))
+
+
+# ---- incremental updates from this worker's commits ------------------------
+
+PENDING_KEY = 'antidote_autocomplete_changes'
+
+
+def _model_kinds():
+    from models import Procedure, Doctor, Thread, Community, Package
+    return {Procedure: PROCEDURE, Doctor: DOCTOR, Thread: THREAD,
+            Community: COMMUNITY_THREAD, Package: PACKAGE}
+
+
+def register_autocomplete_updates(session_target):
+    """Publish and reload changed rows after each commit (in the index's background thread)."""
+    model_kinds = _model_kinds()
+
+    def collect_changes(session, flush_context):
+        pending = session.info.setdefault(PENDING_KEY, set())
+        dirty = [instance for instance in session.dirty if has_meaningful_changes(instance)]
+        for instance in list(session.new) + dirty + list(session.deleted):
+            kind = model_kinds.get(type(instance))
+            if kind is None:
+                continue
+            if kind == COMMUNITY_THREAD and instance.parent_id is not None:
+                # A reply changes its parent thread's reply count
+                pending.add((kind, instance.parent_id))
+                continue
+            identity = inspect(instance).identity
+            if identity:
+                pending.add((kind, identity[0]))
+
+    def apply_changes(session):
+        changes = session.info.pop(PENDING_KEY, None)
+        if not changes:
+            return
+        by_kind = {}
+        for kind, entity_id in changes:
+            by_kind.setdefault(kind, set()).add(entity_id)
+        for kind, ids in by_kind.items():
+            autocomplete_index.schedule_changes(kind, ids)
+
+    def discard_changes(session):
+        session.info.pop(PENDING_KEY, None)
+
+    event.listen(session_target, 'after_flush', collect_changes)
+    event.listen(session_target, 'after_commit', apply_changes)
+    event.listen(session_target, 'after_rollback', discard_changes)
+    logger.info("Autocomplete index update listeners registered")
@@ -1,45 +1,33 @@
 """
 Banner caching system for instant hero banner loading.
 
-This module provides memory-based caching for banner data to eliminate
-database queries and provide instant banner loading.
+This module caches banner data in the unified tiered cache (cache_backend)
+to eliminate database queries and provide instant banner loading.
 """
 
 import os
-import time
 from flask import current_app
 from models import Banner, BannerSlide
+from cache_backend import cache as tiered_cache
+from cache_invalidation import BANNERS
 
 
 class BannerCache:
-    """In-memory cache for banner data."""
+    """Banner data cache on top of the unified tiered cache."""
     
-    def __init__(self):
-        self.cache = {}
-        self.cache_timeout = 300  # 5 minutes
-        self.last_updated = {}
+    namespace = 'banner'
     
-    def _is_cache_valid(self, key):
-        """Check if cache entry is still valid."""
-        if key not in self.cache or key not in self.last_updated:
-            return False
-        return time.time() - self.last_updated[key] < self.cache_timeout
+    def __init__(self, backend=None):
+        self.cache = backend or tiered_cache
+        self.cache_timeout = 21600  # 6 hours; banner edits invalidate via the 'banners' tag
     
     def get_hero_banner_data(self):
         """Get hero banner data from cache or database."""
-        cache_key = 'hero_banner'
-        
-        # Return cached data if valid
-        if self._is_cache_valid(cache_key):
-            return self.cache[cache_key]
-        
-        # Fetch from database and cache
-        banner_data = self._fetch_hero_banner_from_db()
-        if banner_data:
-            self.cache[cache_key] = banner_data
-            self.last_updated[cache_key] = time.time()
-        
-        return banner_data
+        # Missing banners (None) are not cached so a new banner shows up immediately
+        return self.cache.get_or_set(
+            self.namespace, 'hero_banner', self._fetch_hero_banner_from_db,
+            ttl=self.cache_timeout, tags=(BANNERS,)
+        )
     
     def _fetch_hero_banner_from_db(self):
         """Fetch hero banner data from database with optimized query."""
@@ -104,27 +92,21 @@ class BannerCache:
     def invalidate_cache(self, key=None):
         """Invalidate cache entries."""
         if key:
-            self.cache.pop(key, None)
-            self.last_updated.pop(key, None)
+            self.cache.delete(self.namespace, key)
         else:
-            self.cache.clear()
-            self.last_updated.clear()
+            self.cache.clear(self.namespace)
     
     def get_active_positions(self):
         """Get list of active banner positions (cached)."""
-        cache_key = 'active_positions'
-        
-        if self._is_cache_valid(cache_key):
-            return self.cache[cache_key]
-        
-        # For now, just check if hero banner exists
-        hero_data = self.get_hero_banner_data()
-        positions = ['hero_banner'] if hero_data else []
-        
-        self.cache[cache_key] = positions
-        self.last_updated[cache_key] = time.time()
+        def _compute_positions():
+            # For now, just check if hero banner exists
+            hero_data = self.get_hero_banner_data()
+            return ['hero_banner'] if hero_data else []
         
-        return positions
+        return self.cache.get_or_set(
+            self.namespace, 'active_positions', _compute_positions,
+            ttl=self.cache_timeout, tags=(BANNERS,)
+        )
 
 
 # Global cache instance
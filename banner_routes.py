@@ -18,6 +18,7 @@ from datetime import datetime
 
 from app import db
 from models import Banner, BannerSlide
+from buffered_counters import counters
 from routes import admin_required
 
 # Create the blueprints
@@ -430,13 +431,9 @@ def get_banner_by_position(position):
                 return webp_url
         return image_url
     
-    # Increment impression count for each active slide
+    # Count an impression for each active slide (buffered, written by the periodic counter flush)
     for slide in active_slides:
-        if slide.impression_count is not None:
-            slide.impression_count += 1
-        else:
-            # Initialize impression_count if it's None
-            slide.impression_count = 1
+        counters.increment('banner_impressions', slide.id)
         
         # Optimize image URLs for WebP (only for non-hero banners)
         if position != 'hero_banner':
@@ -444,8 +441,6 @@ def get_banner_by_position(position):
             if slide.mobile_image_url:
                 slide.mobile_image_url = optimize_image_url(slide.mobile_image_url)
     
-    db.session.commit()
-    
     response = jsonify({
         'success': True,
         'banner': banner.to_dict()
@@ -458,6 +453,18 @@ def get_banner_by_position(position):
     
     return response
 
+def record_click(slide):
+    """Count a click (buffered) and report counts that include this process's unwritten increments."""
+    counters.increment('banner_clicks', slide.id)
+    clicks = (slide.click_count or 0) + counters.pending('banner_clicks', slide.id)
+    impressions = (slide.impression_count or 0) + counters.pending('banner_impressions', slide.id)
+    return {
+        'success': True,
+        'message': f'Click recorded for slide {slide.id}',
+        'click_count': clicks,
+        'ctr': round((clicks / impressions * 100), 2) if impressions > 0 else 0
+    }
+
 @banner_api_bp.route('/impression', methods=['POST'])
 def record_banner_impression():
     """Record a banner impression."""
@@ -472,17 +479,12 @@ def record_banner_impression():
         if not slide:
             return jsonify({'success': False, 'message': 'Slide not found'}), 404
         
-        # Initialize impression count if None
-        if slide.impression_count is None:
-            slide.impression_count = 0
-        
-        slide.impression_count += 1
-        db.session.commit()
+        counters.increment('banner_impressions', slide.id)
         
         return jsonify({
             'success': True,
             'message': f'Impression recorded for slide {slide_id}',
-            'impression_count': slide.impression_count
+            'impression_count': (slide.impression_count or 0) + counters.pending('banner_impressions', slide.id)
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -501,21 +503,7 @@ def record_banner_click():
         if not slide:
             return jsonify({'success': False, 'message': 'Slide not found'}), 404
         
-        # Initialize counters if None
-        if slide.click_count is None:
-            slide.click_count = 0
-        if slide.impression_count is None:
-            slide.impression_count = 1
-        
-        slide.click_count += 1
-        db.session.commit()
-        
-        return jsonify({
-            'success': True,
-            'message': f'Click recorded for slide {slide_id}',
-            'click_count': slide.click_count,
-            'ctr': round((slide.click_count / slide.impression_count * 100), 2) if slide.impression_count > 0 else 0
-        })
+        return jsonify(record_click(slide))
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -528,18 +516,4 @@ def record_slide_click(slide_id):
     """
     slide = BannerSlide.query.get_or_404(slide_id)
     
-    # Initialize counters if they are None
-    if slide.click_count is None:
-        slide.click_count = 0
-    if slide.impression_count is None:
-        slide.impression_count = 1  # Set to 1 to avoid division by zero
-    
-    slide.click_count += 1
-    db.session.commit()
-    
-    return jsonify({
-        'success': True,
-        'message': f'Click recorded for slide {slide_id}',
-        'click_count': slide.click_count,
-        'ctr': round((slide.click_count / slide.impression_count * 100), 2) if slide.impression_count > 0 else 0
-    })
\ No newline at end of file
+    return jsonify(record_click(slide))
\ No newline at end of file
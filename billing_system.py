@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 from models import db, Clinic, Lead
 from sqlalchemy import text
 from sqlalchemy import desc
+from credit_ledger import ledger as credit_ledger, InsufficientCredits
+from lead_pricing_engine import lead_pricing
 import logging
 
 billing_bp = Blueprint('billing', __name__)
@@ -72,7 +74,7 @@ def clinic_billing_dashboard():
     }).scalar() or 0
     
     monthly_spend = db.session.execute(text("""
-        SELECT COALESCE(SUM(amount), 0) FROM credit_transactions 
+        SELECT COALESCE(-SUM(amount), 0) FROM credit_transactions 
         WHERE clinic_id = :clinic_id 
         AND transaction_type = 'deduction'
         AND created_at >= :start_date 
@@ -162,8 +164,12 @@ def payment_success():
         
         # Add credits to clinic
         total_credits = credits + bonus_credits
-        add_credits_to_clinic(clinic_id, total_credits, 'purchase', 
-                            f'Credit purchase - Order {order_id}')
+        if not add_credits_to_clinic(clinic_id, total_credits, 'purchase',
+                                     f'Credit purchase - Order {order_id}',
+                                     idempotency_key=f'razorpay:{payment_id}',
+                                     order_id=order_id, payment_id=payment_id):
+            flash('This payment has already been credited to your account.', 'info')
+            return redirect(url_for('billing.clinic_billing_dashboard'))
         
         # Record billing transaction
         billing_record = ClinicBilling(
@@ -198,55 +204,28 @@ def payment_failed():
 
 def get_clinic_credits(clinic_id):
     """Get current credit balance for a clinic."""
-    # Get total credits purchased
-    credits_purchased = db.session.execute(text("""
-        SELECT COALESCE(SUM(amount), 0) as total 
-        FROM credit_transactions 
-        WHERE clinic_id = :clinic_id AND transaction_type = 'credit'
-    """), {"clinic_id": clinic_id}).scalar() or 0
-    
-    # Get total credits used
-    credits_used = db.session.execute(text("""
-        SELECT COALESCE(SUM(amount), 0) as total 
-        FROM credit_transactions 
-        WHERE clinic_id = :clinic_id AND transaction_type = 'deduction'
-    """), {"clinic_id": clinic_id}).scalar() or 0
-    
-    return max(0, credits_purchased - credits_used)
+    return max(0, credit_ledger.balance(clinic_id))
 
-def add_credits_to_clinic(clinic_id, credits, transaction_type, description):
-    """Add credits to clinic account."""
-    db.session.execute(text("""
-        INSERT INTO credit_transactions (clinic_id, amount, transaction_type, description, created_at)
-        VALUES (:clinic_id, :amount, :transaction_type, :description, :created_at)
-    """), {
-        "clinic_id": clinic_id,
-        "amount": credits,
-        "transaction_type": transaction_type,
-        "description": description,
-        "created_at": datetime.utcnow()
-    })
+def add_credits_to_clinic(clinic_id, credits, transaction_type, description, idempotency_key=None, **columns):
+    """Add credits to clinic account; returns False if idempotency_key was already posted."""
+    posting = credit_ledger.post(clinic_id, credits, transaction_type, description=description,
+                                 idempotency_key=idempotency_key, **columns)
     db.session.commit()
+    return not posting['duplicate']
 
-def deduct_credits_for_lead(clinic_id, lead_type, description):
-    """Deduct credits when a lead is generated."""
-    credits_required = LEAD_PRICING.get(lead_type, 300)
-    current_credits = get_clinic_credits(clinic_id)
-    
-    if current_credits >= credits_required:
-        db.session.execute(text("""
-            INSERT INTO credit_transactions (clinic_id, amount, transaction_type, description, created_at)
-            VALUES (:clinic_id, :amount, :transaction_type, :description, :created_at)
-        """), {
-            "clinic_id": clinic_id,
-            "amount": credits_required,
-            "transaction_type": "deduction",
-            "description": description,
-            "created_at": datetime.utcnow()
-        })
+def deduct_credits_for_lead(clinic_id, lead_type, description, package_value=None):
+    """Deduct credits when a lead is generated (package-value pricing when the value is known)."""
+    if package_value is not None:
+        credits_required = lead_pricing.lead_cost(package_value)
+    else:
+        credits_required = LEAD_PRICING.get(lead_type, 300)
+    try:
+        credit_ledger.post(clinic_id, -credits_required, 'deduction', description=description,
+                           allow_negative=False)
         db.session.commit()
         return True, credits_required
-    else:
+    except InsufficientCredits:
+        db.session.rollback()
         return False, credits_required
 
 @billing_bp.route('/admin/billing-overview')
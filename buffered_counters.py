@@ -0,0 +1,106 @@
+"""
+Buffered counters for hot read paths.
+
+Page views, banner impressions and banner clicks used to commit an
+``UPDATE ... SET x = x + 1`` (or load, bump and commit an ORM row) on every
+request. ``counters.increment(name, row_id)`` only adds the delta to an
+in-process dict; the interaction ingest worker drains it every
+``INTERACTION_FLUSH_SECONDS`` and applies one
+``UPDATE ... SET x = x + v.delta FROM (VALUES ...)`` per counter column.
+
+Memory is bounded by the number of distinct rows touched between flushes,
+not by traffic, and nothing is dropped when the database is slow: a failed
+flush puts its deltas back for the next one, so stored counts are
+eventually exact (only a worker killed without its exit flush loses what it
+buffered). ``pending()`` lets an endpoint report a count that includes its
+own increments that are not written yet.
+"""
+
+import os
+import logging
+import threading
+from collections import Counter
+from sqlalchemy import text
+
+from interaction_ingest import ingestor, values_clause, ROWS_PER_STATEMENT
+
+logger = logging.getLogger(__name__)
+
+# Counter name -> (table, column); names are the only thing callers pass in
+COUNTERS = {
+    'community_views': ('community', 'view_count'),
+    'package_views': ('packages', 'view_count'),
+    'clinic_views': ('clinics', 'view_count'),
+    'banner_impressions': ('banner_slides', 'impression_count'),
+    'banner_clicks': ('banner_slides', 'click_count'),
+}
+
+
+class CounterBuffer:
+    """Per-process counter deltas, written by the interaction ingest worker."""
+
+    def __init__(self, columns=COUNTERS):
+        self.columns = dict(columns)
+        self._deltas = {}  # counter name -> Counter(row id -> delta)
+        self._pid = None
+        self._lock = threading.Lock()
+        self.counters = {'increments': 0, 'rows_written': 0, 'failed_flushes': 0}
+
+    def increment(self, name, row_id, delta=1):
+        """Count ``delta`` against one row without touching the database."""
+        if name not in self.columns:
+            raise KeyError(f"Unknown counter: {name}")
+        if row_id is None:
+            return
+        ingestor.start()
+        with self._lock:
+            if self._pid != os.getpid():
+                self._deltas, self._pid = {}, os.getpid()  # The parent's deltas are its own
+            self._deltas.setdefault(name, Counter())[row_id] += delta
+            self.counters['increments'] += 1
+
+    def pending(self, name, row_id):
+        """Increments buffered in this process and not yet written."""
+        with self._lock:
+            return self._deltas.get(name, {}).get(row_id, 0)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['pending_rows'] = sum(len(deltas) for deltas in self._deltas.values())
+        return stats
+
+    # -- ingest accumulator interface --
+
+    def drain(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+        return deltas
+
+    def restore(self, deltas):
+        with self._lock:
+            for name, row_deltas in deltas.items():
+                self._deltas.setdefault(name, Counter()).update(row_deltas)
+            self.counters['failed_flushes'] += 1
+
+    def write(self, conn, deltas):
+        """One UPDATE ... FROM (VALUES ...) per counter column and chunk of rows (also valid on SQLite)."""
+        written = 0
+        for name, row_deltas in deltas.items():
+            table, column = self.columns[name]
+            rows = [{'id': row_id, 'n': delta} for row_id, delta in row_deltas.items() if delta]
+            for start in range(0, len(rows), ROWS_PER_STATEMENT):
+                values_sql, params = values_clause(('id', 'n'), rows[start:start + ROWS_PER_STATEMENT])
+                conn.execute(text(f"""
+                    WITH v (id, n) AS (VALUES {values_sql})
+                    UPDATE {table} SET {column} = COALESCE({table}.{column}, 0) + v.n
+                    FROM v
+                    WHERE {table}.id = v.id
+                """), params)
+            written += len(rows)
+        with self._lock:
+            self.counters['rows_written'] += written
+
+
+counters = CounterBuffer()
+ingestor.register_accumulator('counters', counters)
@@ -9,7 +9,11 @@ This script reads clinic data from a CSV file and creates:
 CSV Format Required:
 clinic_name,contact_person,email,phone,address,city,state,pincode,website,specialties,description,password
 
-Usage: python bulk_clinic_upload.py clinics.csv
+Rows are imported in committed chunks (see csv_import_engine.py); an
+interrupted import resumes where it stopped when run again. Pass
+--restart to ignore the checkpoint.
+
+Usage: python bulk_clinic_upload.py clinics.csv [--restart]
 """
 
 import csv
@@ -20,6 +24,9 @@ import re
 import logging
 from werkzeug.security import generate_password_hash
 import psycopg2
+from psycopg2.extras import execute_values
+
+from csv_import_engine import run_import, ChunkResult, CHUNK_SIZE
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -45,227 +52,192 @@ def generate_slug(name):
     slug = re.sub(r'\s+', '-', slug.strip())
     return slug[:100]  # Limit length
 
-def user_exists(conn, email):
-    """Check if user with email already exists."""
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        result = cursor.fetchone()
-        cursor.close()
-        return result[0] if result else None
-    except Exception as e:
-        logger.error(f"Error checking user existence: {e}")
-        return None
+REQUIRED_COLUMNS = ['clinic_name', 'contact_person', 'email', 'phone', 'address', 'city', 'state']
+DEFAULT_PASSWORD = "clinic123"  # Default password - should be changed
+STARTING_CREDITS = 100
 
-def clinic_exists(conn, email):
-    """Check if clinic with email already exists."""
-    try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM clinics WHERE email = %s", (email,))
-        result = cursor.fetchone()
-        cursor.close()
-        return result[0] if result else None
-    except Exception as e:
-        logger.error(f"Error checking clinic existence: {e}")
-        return None
+def existing_emails(cursor, table, emails):
+    """{email: id} of the rows in ``table`` with any of ``emails`` (one query)."""
+    cursor.execute(f"SELECT email, id FROM {table} WHERE email = ANY(%s)", (list(emails),))
+    return dict(cursor.fetchall())
 
-def create_user_account(conn, name, email, phone_number, password=None):
-    """Create a user account for clinic owner."""
-    try:
-        cursor = conn.cursor()
-        
-        # Use provided password or generate default
-        if not password:
-            password = "clinic123"  # Default password - should be changed
-        
-        password_hash = generate_password_hash(password)
-        
-        # Insert user with provided phone number
-        cursor.execute("""
-            INSERT INTO users (name, email, password_hash, role, phone_number, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (name, email, password_hash, 'clinic', phone_number, datetime.utcnow()))
-        
-        user_id = cursor.fetchone()[0]
-        cursor.close()
-        
-        logger.info(f"Created user account for {name} (ID: {user_id})")
-        return user_id
-        
-    except Exception as e:
-        logger.error(f"Error creating user account for {email}: {e}")
-        return None
+def taken_slugs(cursor, base_slugs):
+    """Slugs already used by clinics that start with any of ``base_slugs`` (one query)."""
+    cursor.execute(
+        "SELECT slug FROM clinics WHERE slug = ANY(%s) OR slug LIKE ANY(%s)",
+        (list(base_slugs), [f"{slug}-%" for slug in base_slugs])
+    )
+    return {row[0] for row in cursor.fetchall()}
 
-def create_clinic_record(conn, user_id, clinic_data):
-    """Create clinic record linked to user."""
-    try:
-        cursor = conn.cursor()
-        
-        # Generate unique slug
-        base_slug = generate_slug(clinic_data['clinic_name'])
-        slug = base_slug
-        counter = 1
-        
-        # Ensure slug uniqueness
-        while True:
-            cursor.execute("SELECT id FROM clinics WHERE slug = %s", (slug,))
-            if not cursor.fetchone():
-                break
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-        
-        # Parse specialties
-        specialties = [s.strip() for s in clinic_data.get('specialties', '').split(',') if s.strip()]
-        
-        # Insert clinic
-        cursor.execute("""
-            INSERT INTO clinics (
-                owner_user_id, name, slug, address, city, state, pincode,
-                contact_number, email, website, description, specialties,
-                is_approved, verification_status, verification_date,
-                credit_balance, created_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            ) RETURNING id
-        """, (
-            user_id,
-            clinic_data['clinic_name'],
-            slug,
-            clinic_data['address'],
-            clinic_data['city'],
-            clinic_data['state'],
-            clinic_data.get('pincode', ''),
-            clinic_data['phone'],
-            clinic_data['email'],
-            clinic_data.get('website', ''),
-            clinic_data.get('description', ''),
+def unique_slug(base_slug, taken):
+    slug, counter = base_slug, 1
+    while slug in taken:
+        slug = f"{base_slug}-{counter}"
+        counter += 1
+    taken.add(slug)
+    return slug
+
+def import_clinic_chunk(conn, chunk, password_hashes=None):
+    """
+    Create the users and clinics of one chunk of CSV rows: bulk lookups of
+    existing emails and slugs, then one multi-row INSERT each for users,
+    clinics and the credit ledger rows behind their starting balance
+    (so reconciliation sees no drift). Rows whose clinic email already exists are skipped, so a
+    replayed chunk inserts nothing twice.
+    """
+    result = ChunkResult()
+    password_hashes = {} if password_hashes is None else password_hashes
+    
+    rows, seen = [], set()
+    for row_num, row in chunk:
+        missing_fields = [field for field in REQUIRED_COLUMNS if not (row.get(field) or '').strip()]
+        if missing_fields:
+            result.fail(row_num, f"Missing required fields: {', '.join(missing_fields)}")
+            continue
+        email = row['email'].strip().lower()
+        if email in seen:
+            result.fail(row_num, f"Duplicate email {email} in file")
+            continue
+        seen.add(email)
+        rows.append((row_num, email, row))
+    if not rows:
+        return result
+    
+    cursor = conn.cursor()
+    emails = [email for _, email, _ in rows]
+    clinic_ids = existing_emails(cursor, 'clinics', emails)
+    user_ids = existing_emails(cursor, 'users', emails)
+    
+    new_rows = []
+    for row_num, email, row in rows:
+        if email in clinic_ids:
+            logger.warning(f"Row {row_num}: Clinic with email {email} already exists")
+            result.skipped += 1
+        else:
+            new_rows.append((row_num, email, row))
+    if not new_rows:
+        cursor.close()
+        return result
+    
+    now = datetime.utcnow()
+    new_users = []
+    for row_num, email, row in new_rows:
+        if email in user_ids:
+            continue  # Use existing user account
+        password = (row.get('password') or '').strip()
+        if password:
+            password_hash = generate_password_hash(password)
+        else:
+            # Hashing is the slowest step of an import; every default account shares this one
+            if DEFAULT_PASSWORD not in password_hashes:
+                password_hashes[DEFAULT_PASSWORD] = generate_password_hash(DEFAULT_PASSWORD)
+            password_hash = password_hashes[DEFAULT_PASSWORD]
+        new_users.append((row['contact_person'].strip(), email, password_hash, 'clinic', row['phone'].strip(), now))
+    if new_users:
+        created = execute_values(cursor, """
+            INSERT INTO users (name, email, password_hash, role, phone_number, created_at)
+            VALUES %s
+            RETURNING email, id
+        """, new_users, page_size=len(new_users), fetch=True)
+        user_ids.update(dict(created))
+    
+    base_slugs = {row_num: generate_slug(row['clinic_name']) for row_num, _, row in new_rows}
+    taken = taken_slugs(cursor, set(base_slugs.values()))
+    clinics = []
+    for row_num, email, row in new_rows:
+        specialties = [s.strip() for s in (row.get('specialties') or '').split(',') if s.strip()]
+        clinics.append((
+            user_ids[email],
+            row['clinic_name'].strip(),
+            unique_slug(base_slugs[row_num], taken),
+            row['address'],
+            row['city'],
+            row['state'],
+            row.get('pincode') or '',
+            row['phone'],
+            email,
+            row.get('website') or '',
+            row.get('description') or '',
             specialties,
             True,  # Auto-approve bulk uploaded clinics
             'approved',
-            datetime.utcnow(),
-            100,  # Starting credit balance
-            datetime.utcnow()
+            now,
+            STARTING_CREDITS,
+            STARTING_CREDITS,
+            now
         ))
-        
-        clinic_id = cursor.fetchone()[0]
-        cursor.close()
-        
-        logger.info(f"Created clinic: {clinic_data['clinic_name']} (ID: {clinic_id})")
-        return clinic_id
-        
-    except Exception as e:
-        logger.error(f"Error creating clinic for {clinic_data.get('clinic_name', 'Unknown')}: {e}")
-        return None
+    clinic_ids = execute_values(cursor, """
+        INSERT INTO clinics (
+            owner_user_id, name, slug, address, city, state, pincode,
+            contact_number, email, website, description, specialties,
+            is_approved, verification_status, verification_date,
+            credit_balance, total_credits_purchased, created_at
+        ) VALUES %s
+        RETURNING id
+    """, clinics, page_size=len(clinics), fetch=True)
+    
+    # The ledger rows behind the starting balances (what credit_ledger.post would write for a bonus)
+    if STARTING_CREDITS:
+        execute_values(cursor, """
+            INSERT INTO credit_transactions (
+                clinic_id, transaction_type, amount, description, idempotency_key,
+                status, created_at, processed_at
+            ) VALUES %s
+            ON CONFLICT (idempotency_key) DO NOTHING
+        """, [
+            (clinic_id, 'bonus', STARTING_CREDITS, 'Starting credits for bulk uploaded clinic',
+             f'signup:{clinic_id}', 'completed', now, now)
+            for (clinic_id,) in clinic_ids
+        ], page_size=len(clinic_ids))
+    cursor.close()
+    
+    result.inserted += len(clinics)
+    return result
 
-def process_csv_file(csv_file_path):
-    """Process CSV file and create clinics with user accounts."""
+def process_csv_file(csv_file_path, chunk_size=CHUNK_SIZE, resume=True):
+    """Import clinics and their owner accounts from a CSV file, one committed chunk at a time."""
     if not os.path.exists(csv_file_path):
         logger.error(f"CSV file not found: {csv_file_path}")
-        return
+        return None
     
+    conn = get_db_connection()
+    password_hashes = {}
     try:
-        conn = get_db_connection()
-        success_count = 0
-        error_count = 0
-        errors = []
-        
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
-            
-            # Validate required columns
-            required_columns = ['clinic_name', 'contact_person', 'email', 'phone', 'address', 'city', 'state']
-            missing_columns = [col for col in required_columns if col not in csv_reader.fieldnames]
-            
-            if missing_columns:
-                logger.error(f"Missing required columns: {missing_columns}")
-                return
-            
-            for row_num, row in enumerate(csv_reader, start=2):
-                try:
-                    # Validate required fields
-                    missing_fields = [field for field in required_columns if not row.get(field, '').strip()]
-                    if missing_fields:
-                        error_msg = f"Row {row_num}: Missing required fields: {', '.join(missing_fields)}"
-                        errors.append(error_msg)
-                        error_count += 1
-                        continue
-                    
-                    email = row['email'].strip().lower()
-                    
-                    # Check if user already exists
-                    existing_user_id = user_exists(conn, email)
-                    if existing_user_id:
-                        logger.warning(f"Row {row_num}: User with email {email} already exists")
-                        
-                        # Check if clinic also exists
-                        if clinic_exists(conn, email):
-                            error_msg = f"Row {row_num}: Clinic with email {email} already exists"
-                            errors.append(error_msg)
-                            error_count += 1
-                            continue
-                        else:
-                            # Use existing user account
-                            user_id = existing_user_id
-                    else:
-                        # Create new user account
-                        user_id = create_user_account(
-                            conn,
-                            row['contact_person'].strip(),
-                            email,
-                            row['phone'].strip(),
-                            row.get('password', '').strip()
-                        )
-                        
-                        if not user_id:
-                            error_msg = f"Row {row_num}: Failed to create user account"
-                            errors.append(error_msg)
-                            error_count += 1
-                            continue
-                    
-                    # Create clinic record
-                    clinic_id = create_clinic_record(conn, user_id, row)
-                    
-                    if clinic_id:
-                        success_count += 1
-                        logger.info(f"✅ Successfully processed row {row_num}: {row['clinic_name']}")
-                    else:
-                        error_msg = f"Row {row_num}: Failed to create clinic record"
-                        errors.append(error_msg)
-                        error_count += 1
-                
-                except Exception as e:
-                    error_msg = f"Row {row_num}: Unexpected error - {str(e)}"
-                    errors.append(error_msg)
-                    error_count += 1
-                    logger.error(error_msg)
-                    continue
-        
-        # Commit all changes
-        conn.commit()
-        conn.close()
-        
-        # Print summary
-        logger.info("\n" + "="*50)
-        logger.info("BULK CLINIC UPLOAD SUMMARY")
-        logger.info("="*50)
-        logger.info(f"✅ Successfully created: {success_count} clinics")
-        logger.info(f"❌ Errors encountered: {error_count}")
-        
-        if errors:
-            logger.info("\nERROR DETAILS:")
-            for error in errors[:10]:  # Show first 10 errors
-                logger.info(f"  • {error}")
-            if len(errors) > 10:
-                logger.info(f"  ... and {len(errors) - 10} more errors")
-        
-        logger.info("="*50)
-        
+        stats = run_import(
+            csv_file_path, conn,
+            lambda conn, chunk: import_clinic_chunk(conn, chunk, password_hashes),
+            chunk_size=chunk_size, required_columns=REQUIRED_COLUMNS, resume=resume
+        )
+    except ValueError as e:
+        logger.error(str(e))
+        return None
     except Exception as e:
-        logger.error(f"Error processing CSV file: {e}")
-        if 'conn' in locals():
-            conn.rollback()
-            conn.close()
+        logger.error(f"Error processing CSV file (committed chunks are kept; rerun to resume): {e}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+    
+    # Print summary
+    logger.info("\n" + "="*50)
+    logger.info("BULK CLINIC UPLOAD SUMMARY")
+    logger.info("="*50)
+    if stats.resumed_from:
+        logger.info(f"↻ Resumed after {stats.resumed_from} rows")
+    logger.info(f"✅ Successfully created: {stats.inserted} clinics")
+    logger.info(f"⏭️  Already existed: {stats.skipped}")
+    logger.info(f"❌ Errors encountered: {stats.failed}")
+    logger.info(f"⚡ {stats.rows} rows in {stats.elapsed:.1f}s ({stats.rows_per_second:.0f} rows/sec)")
+    
+    if stats.errors:
+        logger.info("\nERROR DETAILS:")
+        for error in stats.errors[:10]:  # Show first 10 errors
+            logger.info(f"  • {error}")
+        if stats.failed > 10:
+            logger.info(f"  ... and {stats.failed - 10} more errors")
+    
+    logger.info("="*50)
+    return stats
 
 def create_sample_csv():
     """Create a sample CSV file with proper format."""
@@ -311,7 +283,7 @@ def create_sample_csv():
 def main():
     """Main function to handle command line arguments."""
     if len(sys.argv) < 2:
-        logger.info("Usage: python bulk_clinic_upload.py <csv_file_path>")
+        logger.info("Usage: python bulk_clinic_upload.py <csv_file_path> [--restart]")
         logger.info("Or: python bulk_clinic_upload.py --create-sample")
         return
     
@@ -320,7 +292,7 @@ def main():
         return
     
     csv_file_path = sys.argv[1]
-    process_csv_file(csv_file_path)
+    process_csv_file(csv_file_path, resume='--restart' not in sys.argv[2:])
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
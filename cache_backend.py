@@ -0,0 +1,688 @@
+"""
+Unified tiered cache backend for the Antidote platform.
+
+All in-process caches (advanced_cache, performance_cache, banner_cache,
+phase1_performance_cache and critical_performance_fix) sit on top of this
+module so that every gunicorn worker has one bounded memory footprint and
+one notion of freshness.
+
+Tiers:
+1. Bounded in-process LRU (entry and byte caps, per-namespace TTL)
+2. Optional Redis tier shared by all workers (REDIS_URL), with an
+   in-process stand-in (``memory://``) for tests and local development
+
+Recomputation is single-flight: concurrent misses for the same key wait for
+one leader instead of all hitting the database at once.
+
+Entries may carry dependency tags (e.g. ``clinic:42``). Each tag has a
+version shared by all workers (Redis, or files in /dev/shm without Redis);
+invalidating a tag bumps its version and every entry stored under an older
+version is treated as a miss on its next lookup.
+"""
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Sentinel for "not in cache" so that falsy values can be cached
+MISSING = object()
+
+DEFAULT_TTL = 300
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # 64MB per worker
+REMOTE_WAIT = 5  # Seconds a worker waits on another worker's recompute unless get_or_set says otherwise
+
+
+def make_key(*args, **kwargs):
+    """Build a stable hashed key from function arguments."""
+    key_data = str(args) + str(sorted(kwargs.items()))
+    return hashlib.md5(key_data.encode()).hexdigest()
+
+
+def _serialize(value):
+    """Pickle a value for the shared tier; returns None if it cannot be shared."""
+    try:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return None
+
+
+class CacheStats:
+    """Thread-safe hit/miss/eviction counters, totals and per namespace."""
+
+    FIELDS = ('hits', 'misses', 'sets', 'evictions', 'expirations',
+              'remote_hits', 'remote_errors', 'coalesced', 'stale', 'tag_invalidations')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = dict.fromkeys(self.FIELDS, 0)
+        self._namespaces = defaultdict(lambda: dict.fromkeys(self.FIELDS, 0))
+
+    def incr(self, field, namespace=None, amount=1):
+        with self._lock:
+            self._totals[field] += amount
+            if namespace is not None:
+                self._namespaces[namespace][field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            totals = dict(self._totals)
+            namespaces = {ns: dict(v) for ns, v in self._namespaces.items()}
+        lookups = totals['hits'] + totals['misses']
+        totals['hit_rate'] = round(totals['hits'] / lookups, 4) if lookups else 0.0
+        return {'totals': totals, 'namespaces': namespaces}
+
+    def reset(self):
+        with self._lock:
+            self._totals = dict.fromkeys(self.FIELDS, 0)
+            self._namespaces.clear()
+
+
+class LRUTier:
+    """Bounded in-process LRU with per-entry expiry and a byte budget."""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, stats=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = stats or CacheStats()
+        self._entries = OrderedDict()  # key -> (value, expires_at, size)
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def current_bytes(self):
+        return self._bytes
+
+    def get(self, key, namespace=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at, _size = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                self.stats.incr('expirations', namespace)
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, size=None, namespace=None):
+        if size is None:
+            size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            # Never let a single oversized value flush the whole tier
+            logger.debug(f"Cache value for '{key}' ({size} bytes) exceeds tier budget, not cached")
+            return False
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict(namespace)
+        return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key)
+
+    def clear(self, prefix=None):
+        with self._lock:
+            if prefix is None:
+                count = len(self._entries)
+                self._entries.clear()
+                self._bytes = 0
+                return count
+            doomed = [k for k in self._entries if k.startswith(prefix)]
+            for key in doomed:
+                self._remove(key)
+            return len(doomed)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[2]
+        return True
+
+    def _evict(self, namespace=None):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _key, (_value, _expires, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.stats.incr('evictions', namespace)
+
+
+class LocalRedis:
+    """
+    Minimal in-process stand-in for the redis-py client.
+
+    Implements only the commands used by RedisTier so tests and local runs
+    exercise the shared-tier code path without a Redis server.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        with self._lock:
+            return self._alive(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._alive(key) is not None:
+                return None
+            self._data[key] = (value, time.time() + ex if ex else None)
+            return True
+
+    def mget(self, keys):
+        with self._lock:
+            return [self._alive(key) for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._alive(key) or 0) + 1
+            self._data[key] = (str(value).encode(), None)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def scan_iter(self, match=None, count=None):
+        prefix = match[:-1] if match and match.endswith('*') else match
+        with self._lock:
+            keys = list(self._data)
+        return iter([k for k in keys if prefix is None or k.startswith(prefix)])
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisTier:
+    """Shared cache tier backed by Redis; every failure degrades to a miss."""
+
+    def __init__(self, client, key_prefix='antidote:cache:', stats=None):
+        self.client = client
+        self.key_prefix = key_prefix
+        self.stats = stats or CacheStats()
+
+    def _k(self, key):
+        return f"{self.key_prefix}{key}"
+
+    def get(self, key, namespace=None):
+        try:
+            raw = self.client.get(self._k(key))
+        except Exception as e:
+            self.stats.incr('remote_errors', namespace)
+            logger.debug(f"Redis get failed for '{key}': {e}")
+            return MISSING
+        if raw is None:
+            return MISSING
+        try:
+            return pickle.loads(raw)
+        except Exception:
+            return MISSING
+
+    def set(self, key, payload, ttl=None, namespace=None):
+        try:
+            self.client.set(self._k(key), payload, ex=int(ttl) if ttl else None)
+            return True
+        except Exception as e:
+            self.stats.incr('remote_errors', namespace)
+            logger.debug(f"Redis set failed for '{key}': {e}")
+            return False
+
+    def delete(self, key):
+        try:
+            return bool(self.client.delete(self._k(key)))
+        except Exception as e:
+            self.stats.incr('remote_errors')
+            logger.debug(f"Redis delete failed for '{key}': {e}")
+            return False
+
+    def clear(self, prefix=None):
+        try:
+            pattern = self._k(prefix or '') + '*'
+            keys = list(self.client.scan_iter(match=pattern, count=500))
+            if keys:
+                self.client.delete(*keys)
+            return len(keys)
+        except Exception as e:
+            self.stats.incr('remote_errors')
+            logger.debug(f"Redis clear failed for '{prefix}': {e}")
+            return 0
+
+    def acquire_lock(self, key, ttl):
+        """Cross-worker recompute lock (SET NX); True if this worker holds it."""
+        try:
+            return bool(self.client.set(self._k(f"lock:{key}"), b'1', ex=max(1, int(ttl)), nx=True))
+        except Exception:
+            return True  # If Redis is down, fall back to in-process single-flight only
+
+    def release_lock(self, key):
+        try:
+            self.client.delete(self._k(f"lock:{key}"))
+        except Exception:
+            pass
+
+
+class TaggedValue:
+    """Cached value together with the tag versions it was computed under."""
+
+    __slots__ = ('value', 'tags', 'versions')
+
+    def __init__(self, value, tags, versions):
+        self.value = value
+        self.tags = tags
+        self.versions = versions
+
+    def __getstate__(self):
+        return (self.value, self.tags, self.versions)
+
+    def __setstate__(self, state):
+        self.value, self.tags, self.versions = state
+
+
+class LocalTagVersions:
+    """Tag versions held in this process only (single worker and tests)."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def current(self, tags):
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def bump(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+
+class FileTagVersions:
+    """
+    Tag versions shared by all workers on one host without Redis.
+
+    A tag's version is the mtime (ns) of a marker file; stat() on tmpfs
+    costs about a microsecond, so lookups stay cheap.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, tag):
+        return os.path.join(self.directory, hashlib.md5(tag.encode()).hexdigest())
+
+    def current(self, tags):
+        versions = []
+        for tag in tags:
+            try:
+                versions.append(os.stat(self._path(tag)).st_mtime_ns)
+            except FileNotFoundError:
+                versions.append(0)
+        return tuple(versions)
+
+    def bump(self, tags):
+        for tag in tags:
+            path = self._path(tag)
+            try:
+                with open(path, 'a'):
+                    pass
+                now = time.time_ns()
+                os.utime(path, ns=(now, now))
+            except OSError as e:
+                logger.warning(f"Could not bump cache tag '{tag}': {e}")
+
+
+class RedisTagVersions:
+    """Tag versions kept as Redis counters, shared by every worker."""
+
+    def __init__(self, client, key_prefix='antidote:tag:'):
+        self.client = client
+        self.key_prefix = key_prefix
+
+    def current(self, tags):
+        if not tags:
+            return ()
+        try:
+            raw = self.client.mget([f"{self.key_prefix}{tag}" for tag in tags])
+        except Exception as e:
+            logger.debug(f"Redis tag lookup failed: {e}")
+            return None  # Unknown versions: callers treat tagged entries as stale
+        return tuple(int(v) if v is not None else 0 for v in raw)
+
+    def bump(self, tags):
+        for tag in tags:
+            try:
+                self.client.incr(f"{self.key_prefix}{tag}")
+            except Exception as e:
+                logger.warning(f"Could not bump cache tag '{tag}': {e}")
+
+
+class _Flight:
+    """A recomputation in progress that followers can wait on."""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = MISSING
+        self.error = None
+
+
+class TieredCache:
+    """
+    Two-tier cache: local LRU in front of an optional shared Redis tier.
+
+    Keys are addressed as (namespace, key). Each namespace may carry its own
+    default TTL; explicit ``ttl`` arguments always win.
+    """
+
+    def __init__(self, local=None, remote=None, default_ttl=DEFAULT_TTL,
+                 lock_timeout=30, stats=None, tag_versions=None):
+        self.stats = stats or CacheStats()
+        self.local = local if local is not None else LRUTier(stats=self.stats)
+        self.local.stats = self.stats
+        self.remote = remote
+        if self.remote is not None:
+            self.remote.stats = self.stats
+        if tag_versions is None:
+            tag_versions = RedisTagVersions(remote.client) if remote is not None else LocalTagVersions()
+        self.tag_versions = tag_versions
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        self._namespace_ttls = {}
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+    # ---- configuration -------------------------------------------------
+
+    def configure_namespace(self, namespace, ttl):
+        """Set the default TTL (seconds) for a namespace."""
+        self._namespace_ttls[namespace] = ttl
+
+    def ttl_for(self, namespace, ttl=None):
+        if ttl is not None:
+            return ttl
+        return self._namespace_ttls.get(namespace, self.default_ttl)
+
+    @staticmethod
+    def full_key(namespace, key):
+        return f"{namespace}:{key}"
+
+    # ---- basic operations ----------------------------------------------
+
+    def _unwrap(self, namespace, full_key, raw):
+        """Strip the tag envelope, or return MISSING if any tag moved on."""
+        if not isinstance(raw, TaggedValue):
+            return raw
+        current = self.tag_versions.current(raw.tags)
+        if current is None or current != raw.versions:
+            self.local.delete(full_key)
+            self.stats.incr('stale', namespace)
+            return MISSING
+        return raw.value
+
+    def lookup(self, namespace, key):
+        """Return the cached value or MISSING, promoting remote hits locally."""
+        full_key = self.full_key(namespace, key)
+        raw = self.local.get(full_key, namespace)
+        if raw is not MISSING:
+            value = self._unwrap(namespace, full_key, raw)
+            if value is not MISSING:
+                self.stats.incr('hits', namespace)
+                return value
+
+        if self.remote is not None:
+            raw = self.remote.get(full_key, namespace)
+            if raw is not MISSING:
+                value = self._unwrap(namespace, full_key, raw)
+                if value is not MISSING:
+                    self.stats.incr('hits', namespace)
+                    self.stats.incr('remote_hits', namespace)
+                    # Promote with the namespace TTL; the remote copy stays authoritative
+                    self.local.set(full_key, raw, self.ttl_for(namespace), namespace=namespace)
+                    return value
+
+        self.stats.incr('misses', namespace)
+        return MISSING
+
+    def get(self, namespace, key, default=None):
+        value = self.lookup(namespace, key)
+        return default if value is MISSING else value
+
+    def set(self, namespace, key, value, ttl=None, tags=None, versions=None):
+        """
+        Store a value. ``tags`` ties the entry to dependency tags; pass the
+        ``versions`` snapshot taken before computing the value so an
+        invalidation that lands mid-computation is not lost.
+        """
+        ttl = self.ttl_for(namespace, ttl)
+        full_key = self.full_key(namespace, key)
+        if tags:
+            tags = tuple(sorted(set(tags)))
+            if versions is None:
+                versions = self.tag_versions.current(tags)
+            if versions is None:
+                return  # Tag store unreachable; never cache what we cannot invalidate
+            value = TaggedValue(value, tags, versions)
+        # The pickled size doubles as the byte-budget estimate for the local tier
+        payload = _serialize(value)
+        size = len(payload) if payload is not None else sys.getsizeof(value)
+        self.local.set(full_key, value, ttl, size=size, namespace=namespace)
+        if self.remote is not None and payload is not None:
+            self.remote.set(full_key, payload, ttl, namespace=namespace)
+        self.stats.incr('sets', namespace)
+
+    def delete(self, namespace, key):
+        full_key = self.full_key(namespace, key)
+        self.local.delete(full_key)
+        if self.remote is not None:
+            self.remote.delete(full_key)
+
+    def clear(self, namespace=None):
+        """Clear one namespace, or everything when namespace is None."""
+        prefix = f"{namespace}:" if namespace is not None else None
+        count = self.local.clear(prefix)
+        if self.remote is not None:
+            self.remote.clear(prefix)
+        return count
+
+    def invalidate_tags(self, *tags):
+        """Invalidate every entry depending on any of ``tags``, in all workers."""
+        tags = tuple(sorted({tag for tag in tags if tag}))
+        if not tags:
+            return
+        self.tag_versions.bump(tags)
+        self.stats.incr('tag_invalidations', amount=len(tags))
+        logger.debug(f"Invalidated cache tags: {', '.join(tags)}")
+
+    # ---- single-flight recompute ---------------------------------------
+
+    def get_or_set(self, namespace, key, compute, ttl=None, cache_none=False, tags=None, wait=None):
+        """
+        Return the cached value, computing it at most once per key at a time.
+
+        Concurrent callers for the same key wait for the leader's result
+        instead of recomputing. With a Redis tier, a short SET NX lock also
+        keeps other workers from recomputing in parallel; they wait up to
+        ``wait`` seconds (``REMOTE_WAIT`` by default) for its result, so pass
+        at least ``compute``'s own time budget for slow computations.
+        """
+        value = self.lookup(namespace, key)
+        if value is not MISSING:
+            return value
+
+        full_key = self.full_key(namespace, key)
+        with self._flights_lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[full_key] = flight
+
+        if not leader:
+            self.stats.incr('coalesced', namespace)
+            if flight.event.wait(max(self.lock_timeout, wait or 0)):
+                if flight.error is not None:
+                    raise flight.error
+                if flight.value is not MISSING:
+                    return flight.value
+            # Leader timed out; compute without caching contention
+            return compute()
+
+        try:
+            value = self._compute_as_leader(namespace, key, full_key, compute, ttl, cache_none, tags, wait)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(full_key, None)
+            flight.event.set()
+
+    def _compute_as_leader(self, namespace, key, full_key, compute, ttl, cache_none, tags, wait=None):
+        holds_lock = True
+        if self.remote is not None:
+            wait = min(self.lock_timeout, REMOTE_WAIT) if wait is None else wait
+            # The lock must outlive the wait, or a second worker would start recomputing
+            holds_lock = self.remote.acquire_lock(full_key, max(self.lock_timeout, wait))
+            if not holds_lock:
+                # Another worker is recomputing; poll the shared tier for its result
+                deadline = time.time() + wait
+                while time.time() < deadline:
+                    raw = self.remote.get(full_key, namespace)
+                    if raw is not MISSING:
+                        value = self._unwrap(namespace, full_key, raw)
+                        if value is not MISSING:
+                            self.stats.incr('coalesced', namespace)
+                            self.local.set(full_key, raw, self.ttl_for(namespace, ttl), namespace=namespace)
+                            return value
+                    time.sleep(0.05)
+        try:
+            tags = tuple(sorted(set(tags))) if tags else None
+            versions = self.tag_versions.current(tags) if tags else None
+            value = compute()
+            if value is not None or cache_none:
+                self.set(namespace, key, value, ttl, tags=tags, versions=versions)
+            return value
+        finally:
+            if self.remote is not None and holds_lock:
+                self.remote.release_lock(full_key)
+
+    # ---- introspection -------------------------------------------------
+
+    def get_stats(self):
+        snapshot = self.stats.snapshot()
+        snapshot['local'] = {
+            'entries': len(self.local),
+            'bytes': self.local.current_bytes,
+            'max_entries': self.local.max_entries,
+            'max_bytes': self.local.max_bytes,
+        }
+        snapshot['remote_enabled'] = self.remote is not None
+        return snapshot
+
+
+def cached(namespace, ttl=None, key=None, cache_none=False, tags=None):
+    """
+    Decorator caching a function's result in the shared tiered cache.
+
+    ``key`` may be a fixed string; otherwise the key is derived from the
+    call arguments. ``tags`` lists the dependency tags of the result.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key if key is not None else make_key(func.__qualname__, *args, **kwargs)
+            return cache.get_or_set(namespace, cache_key, lambda: func(*args, **kwargs),
+                                    ttl=ttl, cache_none=cache_none, tags=tags)
+        return wrapper
+    return decorator
+
+
+def _build_remote_tier():
+    """Create the Redis tier from REDIS_URL, or None when not configured."""
+    redis_url = os.environ.get('REDIS_URL', '').strip()
+    if not redis_url:
+        return None
+    if redis_url.startswith('memory://'):
+        return RedisTier(LocalRedis())
+    try:
+        import redis
+        client = redis.Redis.from_url(redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        client.ping()
+        logger.info("Redis cache tier enabled")
+        return RedisTier(client)
+    except Exception as e:
+        logger.warning(f"Redis cache tier unavailable, using in-process cache only: {e}")
+        return None
+
+
+def _build_tag_versions(remote):
+    """Shared tag version store: Redis when available, else files on tmpfs."""
+    if remote is not None:
+        return RedisTagVersions(remote.client)
+    default_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    directory = os.environ.get('CACHE_TAG_DIR', os.path.join(default_dir, 'antidote-cache-tags'))
+    try:
+        return FileTagVersions(directory)
+    except OSError as e:
+        logger.warning(f"Cache tag directory unavailable, tags are per-worker only: {e}")
+        return LocalTagVersions()
+
+
+def build_cache():
+    """Create a TieredCache configured from the environment."""
+    stats = CacheStats()
+    local = LRUTier(
+        max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+        max_bytes=int(os.environ.get('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+        stats=stats,
+    )
+    remote = _build_remote_tier()
+    return TieredCache(local=local, remote=remote,
+                       default_ttl=int(os.environ.get('CACHE_DEFAULT_TTL', DEFAULT_TTL)),
+                       stats=stats, tag_versions=_build_tag_versions(remote))
+
+
+# Global cache instance shared by all cache facades
+cache = build_cache()
+
+# Namespace TTL defaults (seconds)
+cache.configure_namespace('advanced', 3600)
+cache.configure_namespace('performance', 3600)
+cache.configure_namespace('critical', 21600)  # tag-invalidated, see cache_invalidation.py
+cache.configure_namespace('banner', 21600)    # tag-invalidated, see cache_invalidation.py
+cache.configure_namespace('phase1', 1800)
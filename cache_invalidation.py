@@ -0,0 +1,192 @@
+"""
+Tag-based cache invalidation driven by SQLAlchemy model events.
+
+Cached entries declare the data they depend on as tags (``clinic:42``,
+``package-category:Hair Treatments``, ``banners``). When a session commits
+changes to a tracked model, the matching tags are bumped in the shared tag
+store so every gunicorn worker drops dependent entries on their next lookup.
+This lets homepage, banner and package caches use TTLs of hours.
+
+Writes made with raw SQL (``db.session.execute(text(...))``) bypass ORM
+events; call ``mark_dirty(...)`` alongside them.
+"""
+
+import logging
+from sqlalchemy import event, inspect
+
+from cache_backend import cache
+
+logger = logging.getLogger(__name__)
+
+PENDING_TAGS_KEY = 'antidote_cache_tags'
+
+# Collection tags for list-style cached data
+PACKAGES = 'packages'
+CLINICS = 'clinics'
+BANNERS = 'banners'
+PROCEDURES = 'procedures'
+DOCTORS = 'doctors'
+CATEGORIES = 'categories'
+COMMUNITY = 'community'
+THREADS = 'threads'
+LEAD_PRICING = 'lead-pricing'
+
+# Counter columns updated on hot paths; changes to only these never invalidate
+COUNTER_COLUMNS = frozenset({
+    'view_count', 'lead_count', 'conversion_rate', 'click_count', 'impression_count',
+    'reply_count', 'upvotes', 'downvotes', 'total_votes', 'trending_score',
+    'engagement_score', 'credit_balance', 'total_credits_purchased',
+    'total_credits_used', 'updated_at', 'last_review_sync',
+})
+
+
+def clinic_tag(clinic_id):
+    return f"clinic:{clinic_id}"
+
+
+def package_tag(package_id):
+    return f"package:{package_id}"
+
+
+def package_category_tag(category_name):
+    return f"package-category:{category_name}"
+
+
+def banner_tag(banner_id):
+    return f"banner:{banner_id}"
+
+
+def procedure_tag(procedure_id):
+    return f"procedure:{procedure_id}"
+
+
+def credit_balance_tag(clinic_id):
+    return f"credit-balance:{clinic_id}"
+
+
+def doctor_tag(doctor_id):
+    return f"doctor:{doctor_id}"
+
+
+def _old_and_new(instance, attr):
+    """Current value plus any value replaced in this flush."""
+    history = inspect(instance).attrs[attr].history
+    values = set(history.deleted or ()) | set(history.added or ()) | set(history.unchanged or ())
+    return {v for v in values if v is not None}
+
+
+def _package_tags(package):
+    tags = {PACKAGES, package_tag(package.id)}
+    tags.update(clinic_tag(cid) for cid in _old_and_new(package, 'clinic_id'))
+    tags.update(package_category_tag(name) for name in _old_and_new(package, 'category'))
+    return tags
+
+
+def _package_category_tags(package_category):
+    tags = {PACKAGES, package_tag(package_category.package_id)}
+    tags.update(package_category_tag(name) for name in _old_and_new(package_category, 'category_name'))
+    return tags
+
+
+def _clinic_tags(clinic):
+    return {CLINICS, PACKAGES, clinic_tag(clinic.id)}
+
+
+def _banner_tags(banner):
+    return {BANNERS, banner_tag(banner.id)}
+
+
+def _banner_slide_tags(slide):
+    return {BANNERS} | {banner_tag(bid) for bid in _old_and_new(slide, 'banner_id')}
+
+
+def _procedure_tags(procedure):
+    return {PROCEDURES, procedure_tag(procedure.id)}
+
+
+def _doctor_tags(doctor):
+    return {DOCTORS, doctor_tag(doctor.id)}
+
+
+def _category_tags(category):
+    return {CATEGORIES, PROCEDURES}
+
+
+def _community_tags(post):
+    # Only top-level threads appear in cached listings
+    if post.parent_id is not None:
+        return set()
+    return {COMMUNITY}
+
+
+def _thread_tags(thread):
+    return {THREADS}
+
+
+def _tag_builders():
+    from models import (Package, PackageCategory, Clinic, Banner, BannerSlide,
+                        Procedure, Doctor, Category, Community, Thread)
+    return {
+        Package: _package_tags,
+        PackageCategory: _package_category_tags,
+        Clinic: _clinic_tags,
+        Banner: _banner_tags,
+        BannerSlide: _banner_slide_tags,
+        Procedure: _procedure_tags,
+        Doctor: _doctor_tags,
+        Category: _category_tags,
+        Community: _community_tags,
+        Thread: _thread_tags,
+    }
+
+
+def has_meaningful_changes(instance):
+    """True if a dirty instance changed anything beyond hot counters."""
+    state = inspect(instance)
+    for attr in state.mapper.column_attrs:
+        if attr.key in COUNTER_COLUMNS:
+            continue
+        if state.attrs[attr.key].history.has_changes():
+            return True
+    return False
+
+
+def mark_dirty(*tags, session=None):
+    """Queue tags to invalidate when the current transaction commits."""
+    if session is None:
+        from app import db
+        session = db.session
+    session.info.setdefault(PENDING_TAGS_KEY, set()).update(tag for tag in tags if tag)
+
+
+def register_cache_invalidation(session_target):
+    """Attach flush/commit listeners to a session, scoped_session or Session class."""
+    builders = _tag_builders()
+
+    def collect_tags(session, flush_context):
+        pending = session.info.setdefault(PENDING_TAGS_KEY, set())
+        for collection, check_changes in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+            for instance in collection:
+                builder = builders.get(type(instance))
+                if builder is None:
+                    continue
+                if check_changes and not has_meaningful_changes(instance):
+                    continue
+                try:
+                    pending.update(builder(instance))
+                except Exception as e:
+                    logger.warning(f"Could not derive cache tags for {instance!r}: {e}")
+
+    def invalidate_on_commit(session):
+        tags = session.info.pop(PENDING_TAGS_KEY, None)
+        if tags:
+            cache.invalidate_tags(*tags)
+
+    def discard_on_rollback(session):
+        # Fires only for the outermost (real) rollback, not savepoints
+        session.info.pop(PENDING_TAGS_KEY, None)
+
+    event.listen(session_target, 'after_flush', collect_tags)
+    event.listen(session_target, 'after_commit', invalidate_on_commit)
+    event.listen(session_target, 'after_rollback', discard_on_rollback)
+    logger.info("Cache tag invalidation listeners registered")
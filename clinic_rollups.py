@@ -0,0 +1,230 @@
+"""
+Clinic daily rollups.
+
+``clinic_daily_rollups`` holds one row per clinic per day with lead, credit
+and package view totals (see ``migrations/007_create_clinic_daily_rollups.py``).
+Triggers on ``leads``, ``credit_transactions`` and ``packages`` keep it in
+step inside the writing transaction, so readers can trust today's row as
+much as last year's and the many raw ``INSERT INTO leads`` sites need no
+changes.
+
+Dashboards read it in a single pass:
+
+- ``get_dashboard_metrics(clinic_id)`` returns every clinic dashboard card
+  from one statement instead of one ``COUNT(*)`` per card;
+- ``lead_analytics(start_day, end_day)`` returns per-clinic and overall
+  funnel numbers for a date range from one ``GROUP BY ROLLUP`` scan of at
+  most (clinics x days) rows.
+
+Until the migration has run, both read the same columns straight from
+``leads`` so nothing breaks; ``rebuild()`` re-derives the lead and credit
+columns if the table is ever suspected to have drifted.
+"""
+
+import logging
+from datetime import date
+from sqlalchemy import text
+
+from models import db
+from credit_ledger import COMPLETED
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'clinic_daily_rollups'
+LEAD_COLUMNS = ('leads', 'pending_leads', 'contacted_leads', 'converted_leads', 'lead_credits', 'conversion_value')
+
+# Same shape as the rollup table, computed per lead row; used before the migration has run
+LEADS_SOURCE = """(
+    SELECT COALESCE(clinic_id, 0) AS clinic_id, created_at::date AS day, 1 AS leads,
+           COALESCE(status = 'new', false)::int AS pending_leads,
+           (contacted_at IS NOT NULL)::int AS contacted_leads,
+           (converted_at IS NOT NULL)::int AS converted_leads,
+           COALESCE(credit_cost, 0) AS lead_credits,
+           COALESCE(conversion_value, 0) AS conversion_value,
+           0 AS credits_added, 0 AS credits_used, 0 AS package_views
+    FROM leads
+)"""
+
+EMPTY_METRICS = {
+    'total_leads': 0,
+    'pending_leads': 0,
+    'monthly_leads': 0,
+    'monthly_credits_used': 0,
+    'monthly_package_views': 0,
+    'credit_balance': 0,
+    'package_count': 0,
+    'doctor_count': 0
+}
+
+_rollups_available = None
+
+
+def rollups_available(session=None):
+    """Whether the rollup table exists (checked once per process)."""
+    global _rollups_available
+    if _rollups_available is None:
+        session = session or db.session
+        _rollups_available = session.execute(
+            text("SELECT to_regclass(:table) IS NOT NULL"), {'table': ROLLUP_TABLE}
+        ).scalar()
+        if not _rollups_available:
+            logger.warning(f"{ROLLUP_TABLE} missing, aggregating leads directly (run migration 007)")
+    return _rollups_available
+
+
+def _source(session):
+    return ROLLUP_TABLE if rollups_available(session) else LEADS_SOURCE
+
+
+def get_dashboard_metrics(clinic_id, session=None):
+    """All clinic dashboard cards from one statement."""
+    session = session or db.session
+    row = session.execute(text(f"""
+        SELECT
+            COALESCE(SUM(r.leads), 0) AS total_leads,
+            COALESCE(SUM(r.pending_leads), 0) AS pending_leads,
+            COALESCE(SUM(r.leads) FILTER (WHERE r.day >= date_trunc('month', CURRENT_DATE)), 0) AS monthly_leads,
+            COALESCE(SUM(r.credits_used) FILTER (WHERE r.day >= date_trunc('month', CURRENT_DATE)), 0)
+                AS monthly_credits_used,
+            COALESCE(SUM(r.package_views) FILTER (WHERE r.day >= date_trunc('month', CURRENT_DATE)), 0)
+                AS monthly_package_views,
+            (SELECT COALESCE(credit_balance, 0) FROM clinics WHERE id = :clinic_id) AS credit_balance,
+            (SELECT COUNT(*) FROM packages WHERE clinic_id = :clinic_id AND is_active = true) AS package_count,
+            (SELECT COUNT(*) FROM doctors WHERE clinic_id = :clinic_id) AS doctor_count
+        FROM {_source(session)} r
+        WHERE r.clinic_id = :clinic_id
+    """), {'clinic_id': clinic_id}).fetchone()
+    return {key: int(value or 0) for key, value in row._mapping.items()}
+
+
+def _funnel(row):
+    """Lead funnel numbers with rates and ROI, in the shape the analytics template expects."""
+    total_leads = int(row.get('leads') or 0)
+    contacted_leads = int(row.get('contacted_leads') or 0)
+    converted_leads = int(row.get('converted_leads') or 0)
+    total_revenue = float(row.get('conversion_value') or 0)
+    total_credits_spent = int(row.get('lead_credits') or 0)
+    return {
+        'total_leads': total_leads,
+        'contacted_leads': contacted_leads,
+        'converted_leads': converted_leads,
+        'total_revenue': round(total_revenue, 2),
+        'total_credits_spent': total_credits_spent,
+        'contact_rate': round(contacted_leads * 100.0 / total_leads, 2) if total_leads else 0.0,
+        'conversion_rate': round(converted_leads * 100.0 / total_leads, 2) if total_leads else 0.0,
+        'roi': round((total_revenue - total_credits_spent) * 100.0 / total_credits_spent, 2) if total_credits_spent else 0.0,
+        'avg_lead_value': round(total_revenue / converted_leads, 2) if converted_leads else 0.0
+    }
+
+
+def lead_analytics(start_day=None, end_day=None, clinic_id=None, clinics=None, session=None):
+    """
+    Lead funnel for whole days ``start_day`` .. ``end_day`` (inclusive, either
+    may be None for an open range), optionally for one clinic.
+
+    Returns ``(analytics, clinic_metrics)``: the overall funnel across every
+    lead in range, and one funnel per clinic in ``clinics`` (dicts with
+    ``id``, ``name`` and ``credit_balance``; approved clinics by default),
+    busiest first.
+    """
+    session = session or db.session
+    conditions, params = [], {}
+    if start_day is not None:
+        conditions.append("r.day >= :start_day")
+        params['start_day'] = start_day
+    if end_day is not None:
+        conditions.append("r.day <= :end_day")
+        params['end_day'] = end_day
+    if clinic_id:
+        conditions.append("r.clinic_id = :clinic_id")
+        params['clinic_id'] = clinic_id
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    # One scan: per-clinic groups plus the grand total (clinic_id NULL from ROLLUP)
+    rows = session.execute(text(f"""
+        SELECT r.clinic_id, {', '.join(f'SUM(r.{column}) AS {column}' for column in LEAD_COLUMNS)}
+        FROM {_source(session)} r
+        {where}
+        GROUP BY ROLLUP (r.clinic_id)
+    """), params).fetchall()
+
+    totals, per_clinic = {}, {}
+    for row in rows:
+        row = dict(row._mapping)
+        if row['clinic_id'] is None:
+            totals = row
+        else:
+            per_clinic[row['clinic_id']] = row
+
+    if clinics is None:
+        clinics = [dict(row._mapping) for row in session.execute(text("""
+            SELECT id, name, COALESCE(credit_balance, 0) AS credit_balance
+            FROM clinics WHERE is_approved = true ORDER BY name
+        """)).fetchall()]
+
+    clinic_metrics = []
+    for clinic in clinics:
+        if clinic_id and clinic['id'] != clinic_id:
+            continue
+        funnel = _funnel(per_clinic.get(clinic['id'], {}))
+        funnel['roi_percentage'] = funnel.pop('roi')
+        clinic_metrics.append(dict(clinic, **funnel))
+    clinic_metrics.sort(key=lambda metrics: metrics['total_leads'], reverse=True)
+
+    return _funnel(totals), clinic_metrics
+
+
+def rebuild(session=None):
+    """
+    Re-derive the lead and credit columns from the raw tables.
+
+    Package views cannot be re-derived (only the running total is stored on
+    ``packages``) and are left as they are.
+    """
+    session = session or db.session
+    session.execute(text("LOCK TABLE leads, credit_transactions IN SHARE MODE"))
+    session.execute(text(f"""
+        UPDATE {ROLLUP_TABLE} SET leads = 0, pending_leads = 0, contacted_leads = 0, converted_leads = 0,
+            lead_credits = 0, conversion_value = 0, credits_added = 0, credits_used = 0
+    """))
+    session.execute(text(f"""
+        INSERT INTO {ROLLUP_TABLE} AS r ({', '.join(('clinic_id', 'day') + LEAD_COLUMNS)})
+        SELECT clinic_id, day, {', '.join(f'SUM({column})' for column in LEAD_COLUMNS)}
+        FROM {LEADS_SOURCE} l
+        WHERE day IS NOT NULL
+        GROUP BY clinic_id, day
+        ON CONFLICT (clinic_id, day) DO UPDATE SET
+            {', '.join(f'{column} = EXCLUDED.{column}' for column in LEAD_COLUMNS)}
+    """))
+    session.execute(text(f"""
+        INSERT INTO {ROLLUP_TABLE} AS r (clinic_id, day, credits_added, credits_used)
+        SELECT clinic_id, created_at::date,
+               COALESCE(SUM(amount) FILTER (WHERE amount > 0), 0),
+               COALESCE(-SUM(amount) FILTER (WHERE amount < 0), 0)
+        FROM credit_transactions
+        WHERE {COMPLETED} AND created_at IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (clinic_id, day) DO UPDATE SET
+            credits_added = EXCLUDED.credits_added,
+            credits_used = EXCLUDED.credits_used
+    """))
+    session.execute(text(f"""
+        DELETE FROM {ROLLUP_TABLE}
+        WHERE leads = 0 AND credits_added = 0 AND credits_used = 0 AND package_views = 0
+    """))
+    session.commit()
+    logger.info(f"Rebuilt {ROLLUP_TABLE} from leads and credit_transactions")
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app
+
+    with app.app_context():
+        if sys.argv[1:] == ['rebuild']:
+            rebuild()
+            print(f"✅ Rebuilt {ROLLUP_TABLE}")
+        else:
+            today = date.today()
+            analytics, _ = lead_analytics(today.replace(day=1), today)
+            print(f"Month to date: {analytics}")
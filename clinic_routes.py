@@ -9,6 +9,7 @@ from flask_login import login_required, current_user
 from sqlalchemy import desc, and_, or_, text
 from models import db, Clinic, Lead, CreditTransaction, User, Procedure, Category
 from credit_billing_system import CreditBillingService
+from buffered_counters import counters
 from datetime import datetime
 import logging
 import time
@@ -849,12 +850,8 @@ def clinic_detail(slug):
         
         google_reviews = [dict(row._mapping) for row in google_reviews_result]
         
-        # Update view count
-        db.session.execute(text("""
-            UPDATE clinics SET view_count = COALESCE(view_count, 0) + 1 
-            WHERE id = :clinic_id
-        """), {"clinic_id": clinic_id})
-        db.session.commit()
+        # Update view count (buffered, written by the periodic counter flush)
+        counters.increment('clinic_views', clinic_id)
         
         # Check if current user is the clinic owner for admin controls
         is_clinic_owner = (current_user.is_authenticated and 
@@ -1180,37 +1177,19 @@ def topup_credits():
         
         clinic_id = clinic_result[0]
         
-        # Create transaction record
-        transaction_id = db.session.execute(text("""
-            INSERT INTO credit_transactions (clinic_id, amount, transaction_type, status, payment_method, created_at)
-            VALUES (:clinic_id, :amount, 'topup', 'pending', :payment_method, CURRENT_TIMESTAMP)
-            RETURNING id
-        """), {
-            'clinic_id': clinic_id,
-            'amount': amount,
-            'payment_method': payment_method
-        }).fetchone()[0]
-        
-        # Simulate successful payment and update clinic balance
+        # Simulate successful payment and post it to the ledger
+        from credit_ledger import ledger as credit_ledger
+        posting = credit_ledger.post(clinic_id, amount, 'topup', payment_method=payment_method)
+        transaction_id = posting['transaction_id']
         db.session.execute(text("""
             UPDATE credit_transactions 
-            SET status = 'completed', transaction_reference = :ref
+            SET transaction_reference = :ref
             WHERE id = :transaction_id
         """), {
             'transaction_id': transaction_id,
             'ref': f'TXN_{transaction_id}_{int(datetime.now().timestamp())}'
         })
         
-        # Update clinic balance
-        db.session.execute(text("""
-            UPDATE clinics 
-            SET credit_balance = COALESCE(credit_balance, 0) + :amount
-            WHERE id = :clinic_id
-        """), {
-            'amount': amount,
-            'clinic_id': clinic_id
-        })
-        
         # Create notification
         db.session.execute(text("""
             INSERT INTO clinic_notifications (clinic_id, title, message, notification_type, created_at)
@@ -1226,7 +1205,7 @@ def topup_credits():
         return jsonify({
             'success': True, 
             'message': f'₹{amount:,.0f} credited successfully to your account',
-            'new_balance': amount
+            'new_balance': posting['new_balance']
         })
         
     except Exception as e:
@@ -1947,17 +1926,7 @@ def clinic_dashboard():
         recent_transactions_result = db.session.execute(text("SELECT * FROM credit_transactions WHERE clinic_id = :clinic_id ORDER BY created_at DESC LIMIT 15"), {'clinic_id': clinic['id']}).fetchall()
         recent_transactions = [dict(row._mapping) for row in recent_transactions_result]
         
-        # Get current credit balance using proper calculation
-        balance_result = db.session.execute(text("""
-            SELECT COALESCE(
-                (SELECT SUM(amount) FROM credit_transactions 
-                 WHERE clinic_id = :clinic_id AND transaction_type = 'credit') -
-                (SELECT ABS(SUM(amount)) FROM credit_transactions 
-                 WHERE clinic_id = :clinic_id AND transaction_type = 'deduction'),
-                0
-            ) as balance
-        """), {'clinic_id': clinic['id']}).fetchone()
-        clinic['credit_balance'] = balance_result[0] if balance_result else 0
+        clinic['credit_balance'] = credit_balance
         
         # Get credit spending this month
         monthly_spending = db.session.execute(text("""
@@ -0,0 +1,171 @@
+"""
+Denormalised community counters.
+
+``community.reply_count``, ``upvotes``, ``downvotes`` and ``total_votes`` are
+maintained incrementally by mapper events instead of being counted per
+thread on every page:
+
+- inserting or deleting a reply (a ``community`` row with a ``parent_id`` or
+  a ``community_replies`` row) bumps its thread's ``reply_count``;
+- inserting, deleting or flipping a ``thread_votes`` row bumps the thread's
+  vote columns (``total_votes`` = upvotes - downvotes).
+
+Each bump is one atomic ``UPDATE ... SET x = x + delta`` in the same flush as
+the row change, so concurrent replies and votes cannot lose updates, and the
+new values are copied onto the thread if it is loaded in the session.
+Reply counts written around the ORM (bulk imports) are corrected by
+``reconcile()``.
+
+Thread views are not written on the request path: ``record_view`` adds
+them to ``buffered_counters`` and the periodic flush applies one multi-row
+``UPDATE`` per batch.
+"""
+
+import logging
+from collections import Counter
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import get_history, set_committed_value
+
+from buffered_counters import counters
+
+logger = logging.getLogger(__name__)
+
+VOTE_DELTAS = {'upvote': {'upvotes': 1, 'total_votes': 1},
+               'downvote': {'downvotes': 1, 'total_votes': -1}}
+
+_registered = False
+
+
+def _bump(connection, target, thread_id, deltas):
+    """Apply counter deltas to one thread and refresh it in the session if loaded."""
+    deltas = {column: delta for column, delta in deltas.items() if delta}
+    if not thread_id or not deltas:
+        return
+    from models import Community
+    assignments = ', '.join(f"{column} = COALESCE({column}, 0) + :{column}" for column in deltas)
+    row = connection.execute(text(f"""
+        UPDATE community SET {assignments}
+        WHERE id = :thread_id
+        RETURNING {', '.join(deltas)}
+    """), dict(deltas, thread_id=thread_id)).fetchone()
+    session = object_session(target)
+    if row is None or session is None:
+        return
+    thread = session.identity_map.get(inspect(Community).identity_key_from_primary_key((thread_id,)))
+    if thread is not None:
+        # Committed value: the UPDATE above already wrote it
+        for column, value in row._mapping.items():
+            set_committed_value(thread, column, value)
+
+
+def _negate(deltas):
+    return {column: -delta for column, delta in deltas.items()}
+
+
+def _combine(*delta_sets):
+    combined = Counter()
+    for deltas in delta_sets:
+        combined.update(deltas)
+    return dict(combined)
+
+
+# ---- replies ----
+
+def _thread_reply_inserted(mapper, connection, target):
+    if target.parent_id is not None:
+        _bump(connection, target, target.parent_id, {'reply_count': 1})
+
+
+def _thread_reply_deleted(mapper, connection, target):
+    if target.parent_id is not None:
+        _bump(connection, target, target.parent_id, {'reply_count': -1})
+
+
+def _reply_inserted(mapper, connection, target):
+    _bump(connection, target, target.thread_id, {'reply_count': 1})
+
+
+def _reply_deleted(mapper, connection, target):
+    _bump(connection, target, target.thread_id, {'reply_count': -1})
+
+
+# ---- votes ----
+
+def _vote_inserted(mapper, connection, target):
+    _bump(connection, target, target.thread_id, VOTE_DELTAS.get(target.vote_type, {}))
+
+
+def _vote_deleted(mapper, connection, target):
+    _bump(connection, target, target.thread_id, _negate(VOTE_DELTAS.get(target.vote_type, {})))
+
+
+def _vote_type_set(target, value, oldvalue, initiator):
+    # Registered with active_history so the replaced vote type is loaded for _vote_updated
+    return value
+
+
+def _vote_updated(mapper, connection, target):
+    history = get_history(target, 'vote_type')
+    if not history.has_changes():
+        return
+    old_type = history.deleted[0] if history.deleted else None
+    _bump(connection, target, target.thread_id,
+          _combine(_negate(VOTE_DELTAS.get(old_type, {})), VOTE_DELTAS.get(target.vote_type, {})))
+
+
+def register_community_counters():
+    """Install the mapper events once per process."""
+    global _registered
+    if _registered:
+        return
+    from models import Community, CommunityReply, ThreadVote
+
+    event.listen(Community, 'after_insert', _thread_reply_inserted)
+    event.listen(Community, 'after_delete', _thread_reply_deleted)
+    event.listen(CommunityReply, 'after_insert', _reply_inserted)
+    event.listen(CommunityReply, 'after_delete', _reply_deleted)
+    event.listen(ThreadVote, 'after_insert', _vote_inserted)
+    event.listen(ThreadVote, 'after_delete', _vote_deleted)
+    event.listen(ThreadVote, 'after_update', _vote_updated)
+    event.listen(ThreadVote.vote_type, 'set', _vote_type_set, active_history=True, retval=True)
+    _registered = True
+
+
+# ---- buffered views ----
+
+def record_view(thread_id):
+    """Count a thread view without a write on the request path."""
+    counters.increment('community_views', thread_id)
+
+
+# ---- reconciliation ----
+
+def reconcile(fix=False, session=None):
+    """
+    Compare ``reply_count`` with a count of the reply rows.
+
+    Returns the threads that drifted (after bulk imports or raw SQL writes);
+    with ``fix=True`` the column is reset to the counted value. Vote columns
+    are not recounted: imported threads carry Reddit scores that have no
+    ``thread_votes`` rows behind them.
+    """
+    if session is None:
+        from app import db
+        session = db.session
+    drifted = session.execute(text("""
+        SELECT id, stored, counted FROM (
+            SELECT c.id, c.reply_count AS stored,
+                   (SELECT COUNT(*) FROM community r WHERE r.parent_id = c.id)
+                     + (SELECT COUNT(*) FROM community_replies cr WHERE cr.thread_id = c.id) AS counted
+            FROM community c
+        ) counts
+        WHERE COALESCE(stored, 0) <> counted
+    """)).fetchall()
+    drifted = [dict(row._mapping) for row in drifted]
+    if fix and drifted:
+        session.execute(text("UPDATE community SET reply_count = :counted WHERE id = :id"),
+                        [{'id': row['id'], 'counted': row['counted']} for row in drifted])
+        session.commit()
+        logger.info(f"Reset reply counts on {len(drifted)} community threads")
+    return drifted
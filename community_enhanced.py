@@ -11,6 +11,7 @@ from werkzeug.utils import secure_filename
 import os
 import uuid
 import logging
+from community_counters import record_view
 from models import (
     db, Community, CommunityReply, User, Category, Procedure, 
     ThreadVote, ReplyVote, ThreadSave, ThreadFollow, ThreadReaction,
@@ -283,9 +284,8 @@ def view_thread(thread_id):
             joinedload(Community.procedure)
         ).filter_by(id=thread_id, is_deleted=False).first_or_404()
         
-        # Increment view count
-        thread.view_count = (thread.view_count or 0) + 1
-        db.session.commit()
+        # Increment view count (buffered, written in batches)
+        record_view(thread.id)
         
         # Get nested replies with user data
         replies = CommunityReply.query.options(
@@ -409,30 +409,15 @@ def vote_thread():
             thread_id=thread_id
         ).first()
         
+        # Vote counts (upvotes, downvotes, total_votes) follow the vote rows via community_counters
         if existing_vote:
             if existing_vote.vote_type == vote_type:
                 # Remove vote if clicking same button
                 db.session.delete(existing_vote)
-                
-                # Update thread counts
-                if vote_type == 'upvote':
-                    thread.upvotes = max(0, (thread.upvotes or 0) - 1)
-                else:
-                    thread.downvotes = max(0, (thread.downvotes or 0) - 1)
-                
                 vote_type = None  # User removed their vote
             else:
                 # Change vote type
-                old_vote = existing_vote.vote_type
                 existing_vote.vote_type = vote_type
-                
-                # Update counts
-                if old_vote == 'upvote':
-                    thread.upvotes = max(0, (thread.upvotes or 0) - 1)
-                    thread.downvotes = (thread.downvotes or 0) + 1
-                else:
-                    thread.downvotes = max(0, (thread.downvotes or 0) - 1)
-                    thread.upvotes = (thread.upvotes or 0) + 1
         else:
             # Create new vote
             new_vote = ThreadVote(
@@ -442,17 +427,11 @@ def vote_thread():
             )
             db.session.add(new_vote)
             
-            # Update thread counts
-            if vote_type == 'upvote':
-                thread.upvotes = (thread.upvotes or 0) + 1
-                # Award reputation to thread author
-                if thread.user_id != current_user.id:
-                    award_reputation(thread.user_id, 'thread_upvote', 2, 'Thread received upvote')
-            else:
-                thread.downvotes = (thread.downvotes or 0) + 1
+            # Award reputation to thread author
+            if vote_type == 'upvote' and thread.user_id != current_user.id:
+                award_reputation(thread.user_id, 'thread_upvote', 2, 'Thread received upvote')
         
-        # Update total votes
-        thread.total_votes = (thread.upvotes or 0) - (thread.downvotes or 0)
+        db.session.flush()
         
         # Update trending score
         thread.trending_score = calculate_trending_score(thread)
@@ -670,8 +649,8 @@ def create_reply():
         
         db.session.add(reply)
         
-        # Update thread reply count
-        thread.reply_count = (thread.reply_count or 0) + 1
+        # Flush so community_counters bumps the thread's reply_count
+        db.session.flush()
         
         # Update trending score
         thread.trending_score = calculate_trending_score(thread)
@@ -6,6 +6,7 @@ Enhanced API endpoints for the new community interface
 from flask import Blueprint, request, jsonify, session
 from flask_login import login_required, current_user
 from sqlalchemy import desc, func, text, or_, and_
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 import json
 import logging
@@ -31,8 +32,10 @@ def get_posts():
         category_filter = request.args.get('category')
         source_filter = request.args.get('source')  # native, reddit, imported
         
-        # Base query - only get main posts (not replies)
-        query = db.session.query(Community).filter(
+        # Base query - only get main posts (not replies), with authors, categories and procedures
+        query = db.session.query(Community).options(
+            joinedload(Community.user), joinedload(Community.category), joinedload(Community.procedure)
+        ).filter(
             Community.is_deleted == False,
             Community.parent_id.is_(None)  # Only main posts, not replies
         )
@@ -66,17 +69,18 @@ def get_posts():
         offset = (page - 1) * per_page
         posts = query.offset(offset).limit(per_page).all()
         
+        # Get the user's votes on this page in one query
+        user_votes = {}
+        if current_user.is_authenticated and posts:
+            user_votes = dict(db.session.query(ThreadVote.thread_id, ThreadVote.vote_type).filter(
+                ThreadVote.user_id == current_user.id,
+                ThreadVote.thread_id.in_([post.id for post in posts])
+            ).all())
+        
         # Serialize posts
         posts_data = []
         for post in posts:
-            # Get user vote if authenticated
-            user_vote = None
-            if current_user.is_authenticated:
-                vote = ThreadVote.query.filter_by(
-                    user_id=current_user.id,
-                    thread_id=post.id
-                ).first()
-                user_vote = vote.vote_type if vote else None
+            user_vote = user_votes.get(post.id)
             
             post_data = {
                 'id': post.id,
@@ -151,51 +155,29 @@ def vote_post():
             thread_id=post_id
         ).first()
         
+        # Vote counts (upvotes, downvotes, total_votes) follow the vote rows via community_counters
         if existing_vote:
             if existing_vote.vote_type == vote_type:
                 # Remove vote (toggle off)
                 db.session.delete(existing_vote)
-                
-                # Update post vote counts
-                if vote_type == 'upvote':
-                    post.upvotes = max(0, (post.upvotes or 0) - 1)
-                else:
-                    post.downvotes = max(0, (post.downvotes or 0) - 1)
-                    
                 new_vote = None
             else:
                 # Change vote type
                 existing_vote.vote_type = vote_type
                 existing_vote.created_at = datetime.utcnow()
-                
-                # Update post vote counts
-                if vote_type == 'upvote':
-                    post.upvotes = (post.upvotes or 0) + 1
-                    post.downvotes = max(0, (post.downvotes or 0) - 1)
-                else:
-                    post.downvotes = (post.downvotes or 0) + 1
-                    post.upvotes = max(0, (post.upvotes or 0) - 1)
-                    
                 new_vote = vote_type
         else:
             # Create new vote
-            new_vote = ThreadVote(
+            db.session.add(ThreadVote(
                 user_id=current_user.id,
                 thread_id=post_id,
                 vote_type=vote_type
-            )
-            db.session.add(new_vote)
-            
-            # Update post vote counts
-            if vote_type == 'upvote':
-                post.upvotes = (post.upvotes or 0) + 1
-            else:
-                post.downvotes = (post.downvotes or 0) + 1
-                
+            ))
             new_vote = vote_type
         
-        # Update total votes and engagement score
-        post.total_votes = (post.upvotes or 0) - (post.downvotes or 0)
+        db.session.flush()
+        
+        # Update engagement score
         post.engagement_score = calculate_engagement_score(post)
         
         db.session.commit()
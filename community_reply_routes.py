@@ -111,12 +111,8 @@ def create_reply():
                 }), 404
             new_reply.parent_reply_id = data['parent_reply_id']
         
-        # Add to session and commit
+        # Add to session and commit (the thread's reply_count follows via community_counters)
         db.session.add(new_reply)
-        
-        # Increment reply count on thread
-        thread.reply_count = (thread.reply_count or 0) + 1
-        
         db.session.commit()
         logger.info(f"Reply created with ID: {new_reply.id} for thread {thread_id}")
         
@@ -203,16 +199,8 @@ def delete_reply(reply_id):
                 'message': 'Reply not found or you do not have permission to delete it'
             }), 404
             
-        # Get thread to update reply count
-        thread = Community.query.get(reply.thread_id)
-        
-        # Delete the reply from the database
+        # Delete the reply from the database (the thread's reply_count follows via community_counters)
         db.session.delete(reply)
-        
-        # Decrement reply count on thread
-        if thread and thread.reply_count > 0:
-            thread.reply_count -= 1
-            
         db.session.commit()
         logger.info(f"Reply {reply_id} deleted successfully")
         
@@ -324,12 +312,8 @@ def post_thread_reply(thread_id):
                 return jsonify({'success': False, 'message': 'Parent reply not found'}), 404
             new_reply.parent_reply_id = parent_reply_id
         
-        # Add to session and commit
+        # Add to session and commit (the thread's reply_count follows via community_counters)
         db.session.add(new_reply)
-        
-        # Increment reply count on thread
-        thread.reply_count = (thread.reply_count or 0) + 1
-        
         db.session.commit()
         logger.info(f"Reply created with ID: {new_reply.id} for thread {thread_id}")
         
@@ -415,12 +399,8 @@ def thread_reply_api(thread_id):
                 return jsonify({'success': False, 'message': 'Parent reply not found'}), 404
             new_reply.parent_reply_id = parent_reply_id
         
-        # Add to session and commit
+        # Add to session and commit (the thread's reply_count follows via community_counters)
         db.session.add(new_reply)
-        
-        # Increment reply count on thread
-        thread.reply_count = (thread.reply_count or 0) + 1
-        
         db.session.commit()
         logger.info(f"Reply created with ID: {new_reply.id} for thread {thread_id}")
         
@@ -578,12 +558,8 @@ def api_create_reply():
                 }), 404
             new_reply.parent_reply_id = data['parent_reply_id']
         
-        # Add to session and commit
+        # Add to session and commit (the thread's reply_count follows via community_counters)
         db.session.add(new_reply)
-        
-        # Increment reply count on thread
-        thread.reply_count = (thread.reply_count or 0) + 1
-        
         db.session.commit()
         logger.info(f"Reply created with ID: {new_reply.id} for thread {thread_id} via API")
         
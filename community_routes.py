@@ -5,6 +5,7 @@ from models import (
     Procedure, CommunityTagging, Notification, CommunityModeration
 )
 from app import db
+from community_counters import record_view
 from datetime import datetime
 import logging
 
@@ -144,9 +145,8 @@ def get_thread(thread_id):
                 'message': 'Thread not found'
             }), 404
             
-        # Increment view count
-        thread.view_count += 1
-        db.session.commit()
+        # Increment view count (buffered, written in batches)
+        record_view(thread.id)
         
         # Get child threads if any
         child_threads = []
@@ -241,16 +241,10 @@ def create_thread():
             created_at=datetime.utcnow()
         )
         
+        # A child thread bumps its parent's reply_count via community_counters
         db.session.add(new_thread)
         db.session.commit()
         
-        # If this is a child thread, update parent's reply count
-        if new_thread.parent_id:
-            parent = Community.query.get(new_thread.parent_id)
-            if parent:
-                parent.reply_count += 1
-                db.session.commit()
-        
         # Process tag mentions (@username)
         if data.get('mentioned_usernames'):
             for username in data.get('mentioned_usernames', []):
@@ -341,13 +335,7 @@ def delete_thread(thread_id):
                 'message': 'Thread not found'
             }), 404
         
-        # If this is a child thread, update parent's reply count
-        if thread.parent_id:
-            parent = Community.query.get(thread.parent_id)
-            if parent:
-                parent.reply_count = max(0, parent.reply_count - 1)
-                db.session.commit()
-        
+        # A child thread decrements its parent's reply_count via community_counters
         db.session.delete(thread)
         db.session.commit()
         
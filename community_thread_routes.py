@@ -7,6 +7,7 @@ from flask import Blueprint, render_template, request, jsonify, redirect, url_fo
 from flask_login import login_required, current_user
 from models import Community, CommunityReply, User
 from app import db
+from community_counters import record_view
 import logging
 from datetime import datetime
 
@@ -202,9 +203,8 @@ def community_thread_disabled(thread_id):
         if thread.user_id:
             thread.user = User.query.get(thread.user_id)
             
-        # Increment view count
-        thread.view_count = (thread.view_count or 0) + 1
-        db.session.commit()
+        # Increment view count (buffered, written in batches)
+        record_view(thread.id)
         
         # Get sort order from query parameters (defaulting to "oldest")
         sort_order = request.args.get('sort', 'oldest')
@@ -1,128 +1,400 @@
 """
 Server-side compression middleware for Flask
-Enables gzip compression for all static assets and responses
+Negotiates Brotli or gzip for static assets and dynamic responses.
+
+- Static assets: ``.br`` and ``.gz`` siblings are generated by
+  ``python compression_middleware.py`` before the app starts (Dockerfile,
+  Procfile and .ebextensions/07_static_assets.config all run it), or at
+  boot when ``COMPRESS_PRECOMPRESS_STATIC`` is set, and indexed in memory
+  together with WebP variants, so a static request never compresses or
+  stats anything; the sibling is sent as-is with ``Content-Encoding``.
+- Streamed responses are compressed chunk by chunk (each chunk is flushed,
+  so the client still receives it immediately) instead of being buffered.
+- Buffered responses are compressed in-request; repeated bodies on
+  cacheable paths (sitemaps, robots.txt, ``Cache-Control: public``) reuse
+  compressed bytes from an LRU keyed by encoding and body digest.
 """
-from flask import Flask, request, g
-import gzip
+from flask import Flask, request, send_from_directory
 import os
-from io import BytesIO
+import sys
+import gzip
+import zlib
+import hashlib
+import logging
+import mimetypes
+import tempfile
+import threading
+from functools import lru_cache
+
+from cache_backend import LRUTier, MISSING
+from response_pipeline import register_stage, ORDER_COMPRESSION
+
+# Brotli is optional; without it everything is served with gzip
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Server preference when the client weighs encodings equally
+ENCODINGS = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+SIBLING_SUFFIX = {'br': '.br', 'gzip': '.gz'}
+
+COMPRESSIBLE_EXTENSIONS = frozenset({
+    '.css', '.js', '.mjs', '.json', '.map', '.svg', '.xml', '.txt', '.html',
+    '.ico', '.webmanifest', '.ttf', '.otf', '.eot',
+})
+WEBP_SOURCE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png'})
+
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+MIN_SAVING = 0.9  # Skip siblings that are not at least 10% smaller
+
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(accept_encoding, available=ENCODINGS):
+    """
+    Pick the encoding to send for an Accept-Encoding header, or None.
+
+    Honours q-values (``gzip;q=0`` refuses gzip) and ``*``; ties go to the
+    server's preference order in ``available``.
+    """
+    weights = {}
+    for part in (accept_encoding or '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+
+    best, best_q = None, 0.0
+    for encoding in available:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress_bytes(data, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def feed(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, level):
+        self._compressor = brotli.Compressor(quality=level)
+
+    def feed(self, chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def compress_stream(chunks, encoding, level, charset='utf-8'):
+    """Compress a WSGI iterable chunk by chunk, flushing after each one."""
+    stream = _BrotliStream(level) if encoding == 'br' else _GzipStream(level)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            if not chunk:
+                continue
+            output = stream.feed(chunk)
+            if output:
+                yield output
+        yield stream.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class StaticVariants:
+    """Precompressed and WebP siblings under the static folder, indexed once per boot."""
+
+    def __init__(self):
+        self.folder = None
+        self.encoded = {}   # relative path -> frozenset of encodings with a fresh sibling
+        self.webp = set()   # relative paths of images with a .webp sibling
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _compressible(path, min_size):
+        return (os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+                and os.path.getsize(path) >= min_size)
+
+    @staticmethod
+    def _fresh(sibling, source_mtime):
+        try:
+            return os.stat(sibling).st_mtime >= source_mtime
+        except FileNotFoundError:
+            return False
+
+    def _sources(self, folder):
+        for root, _dirs, files in os.walk(folder):
+            for name in files:
+                if name.endswith(('.br', '.gz')):
+                    continue
+                path = os.path.join(root, name)
+                yield path, os.path.relpath(path, folder).replace(os.sep, '/')
+
+    def precompress(self, folder, min_size=500):
+        """Write missing or stale .br/.gz siblings; returns how many were written."""
+        written = 0
+        for path, _relative in self._sources(folder):
+            try:
+                if not self._compressible(path, min_size):
+                    continue
+                source_mtime = os.stat(path).st_mtime
+                data = None
+                for encoding in ENCODINGS:
+                    sibling = path + SIBLING_SUFFIX[encoding]
+                    if self._fresh(sibling, source_mtime):
+                        continue
+                    if data is None:
+                        with open(path, 'rb') as source_file:
+                            data = source_file.read()
+                    level = STATIC_BROTLI_QUALITY if encoding == 'br' else STATIC_GZIP_LEVEL
+                    compressed = compress_bytes(data, encoding, level)
+                    if len(compressed) > len(data) * MIN_SAVING:
+                        continue
+                    # Write beside the target and rename, so a worker never sends a partial file
+                    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.precompress-')
+                    with os.fdopen(fd, 'wb') as tmp_file:
+                        tmp_file.write(compressed)
+                    os.replace(tmp_path, sibling)
+                    written += 1
+            except OSError as e:
+                logger.warning(f"Could not precompress {path}: {e}")
+        return written
+
+    def scan(self, folder):
+        """Index fresh siblings so requests never touch the filesystem to find them."""
+        encoded, webp = {}, set()
+        for path, relative in self._sources(folder):
+            try:
+                extension = os.path.splitext(path)[1].lower()
+                if extension in WEBP_SOURCE_EXTENSIONS:
+                    if os.path.exists(os.path.splitext(path)[0] + '.webp'):
+                        webp.add(relative)
+                    continue
+                if extension not in COMPRESSIBLE_EXTENSIONS:
+                    continue
+                source_mtime = os.stat(path).st_mtime
+                available = frozenset(encoding for encoding in ENCODINGS
+                                      if self._fresh(path + SIBLING_SUFFIX[encoding], source_mtime))
+                if available:
+                    encoded[relative] = available
+            except OSError as e:
+                logger.warning(f"Could not index static file {path}: {e}")
+        with self._lock:
+            self.folder = folder
+            self.encoded = encoded
+            self.webp = webp
+        return len(encoded), len(webp)
+
+    def encodings(self, filename):
+        return self.encoded.get(filename, frozenset())
+
+    def has_webp(self, filename):
+        return filename in self.webp
+
 
 class CompressionMiddleware:
-    """Middleware to enable gzip compression"""
-    
+    """Middleware to negotiate Brotli/gzip compression"""
+
     def __init__(self, app=None):
         self.app = app
+        self.compressed_cache = None
+        self.counters = {'static': 0, 'buffered': 0, 'streamed': 0, 'cache_hits': 0}
         if app is not None:
             self.init_app(app)
-    
+
     def init_app(self, app: Flask):
         """Initialize compression middleware with Flask app"""
+        self.app = app
         app.config.setdefault('COMPRESS_MIMETYPES', [
             'text/html', 'text/css', 'text/xml', 'application/json',
             'application/javascript', 'text/javascript', 'application/xml',
             'text/plain', 'image/svg+xml'
         ])
-        
-        app.config.setdefault('COMPRESS_LEVEL', 6)
+
+        app.config.setdefault('COMPRESS_LEVEL', 6)      # gzip level for dynamic responses
+        app.config.setdefault('COMPRESS_BR_LEVEL', 5)   # Brotli quality for dynamic responses
         app.config.setdefault('COMPRESS_MIN_SIZE', 500)
-        
-        app.before_request(self.before_request)
-        app.after_request(self.after_request)
-        
-        # Add cache headers for static files
-        @app.after_request
-        def add_cache_headers(response):
-            """Add aggressive caching for static assets"""
-            if request.endpoint == 'static':
-                # Cache static files for 1 year
-                response.cache_control.max_age = 31536000
-                response.cache_control.public = True
-                
-                # Add immutable cache for CSS bundles
-                if 'optimized/' in request.path:
-                    response.cache_control.immutable = True
-                    
+        # Off by default so booting never writes into a checkout; the Docker build runs the build step
+        app.config.setdefault('COMPRESS_PRECOMPRESS_STATIC',
+                              os.environ.get('COMPRESS_PRECOMPRESS_STATIC', '').lower() in ('1', 'true', 'yes'))
+        app.config.setdefault('COMPRESS_CACHE_PATHS', ['/sitemap', '/robots.txt'])
+        app.config.setdefault('COMPRESS_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+        app.config.setdefault('COMPRESS_CACHE_TTL', 3600)
+
+        self.compressed_cache = LRUTier(max_entries=512, max_bytes=app.config['COMPRESS_CACHE_MAX_BYTES'])
+
+        if app.static_folder and os.path.isdir(app.static_folder):
+            if app.config['COMPRESS_PRECOMPRESS_STATIC']:
+                written = static_variants.precompress(app.static_folder, app.config['COMPRESS_MIN_SIZE'])
+                if written:
+                    logger.info(f"Precompressed {written} static asset variants")
+            encoded, webp = static_variants.scan(app.static_folder)
+            logger.info(f"Indexed {encoded} precompressed and {webp} WebP static assets "
+                        f"({'/'.join(ENCODINGS)})")
+            if 'static' in app.view_functions:
+                app.view_functions['static'] = self._static_view(app.view_functions['static'])
+
+        # Last response stage, after the cache policy and anything that rewrites the body
+        register_stage(app, 'compression', self.after_request, ORDER_COMPRESSION)
+
+    def _static_view(self, original_view):
+        """Wrap Flask's static view to send a precompressed sibling when one fits."""
+        app = self.app
+
+        def static_view(filename):
+            available = static_variants.encodings(filename)
+            if not available:
+                return original_view(filename=filename)
+            response = None
+            encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''),
+                                          tuple(e for e in ENCODINGS if e in available))
+            if encoding:
+                response = send_from_directory(
+                    app.static_folder, filename + SIBLING_SUFFIX[encoding],
+                    mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                    max_age=app.get_send_file_max_age(filename)
+                )
+                response.headers['Content-Encoding'] = encoding
+                self.counters['static'] += 1
+            else:
+                response = original_view(filename=filename)
+            response.vary.add('Accept-Encoding')
             return response
-    
+
+        return static_view
+
     def should_compress(self, response):
         """Check if response should be compressed"""
         if not response:
             return False
-            
+
         # Skip if response is in direct passthrough mode
         if response.direct_passthrough:
             return False
-            
+
         # Don't compress if already compressed
         if response.headers.get('Content-Encoding'):
             return False
-            
-        # Check content type  
+
+        # Check content type
         content_type = response.headers.get('Content-Type', '')
-        
-        # Use Flask's current_app to get config if self.app is not available
-        from flask import current_app
-        app_config = self.app.config if self.app else current_app.config
-        
-        compress_mimetypes = app_config.get('COMPRESS_MIMETYPES', [
+
+        compress_mimetypes = self.app.config.get('COMPRESS_MIMETYPES', [
             'text/html', 'text/css', 'text/javascript', 'application/javascript',
             'application/json', 'text/plain', 'application/xml', 'text/xml'
         ])
-        
+
         if not any(mt in content_type for mt in compress_mimetypes):
             return False
-            
-        # Check minimum size
-        content_length = response.calculate_content_length()
-        min_size = app_config.get('COMPRESS_MIN_SIZE', 500)
-        if content_length and content_length < min_size:
-            return False
-            
-        # Check if client accepts gzip
-        accept_encoding = request.headers.get('Accept-Encoding', '')
-        if 'gzip' not in accept_encoding:
-            return False
-            
+
+        # Check minimum size (unknown for streamed responses)
+        if not response.is_streamed:
+            content_length = response.calculate_content_length()
+            min_size = self.app.config.get('COMPRESS_MIN_SIZE', 500)
+            if content_length is not None and content_length < min_size:
+                return False
+
         return True
-    
-    def before_request(self):
-        """Set up compression context before request"""
-        g.compress_response = 'gzip' in request.headers.get('Accept-Encoding', '')
-    
+
+    def _cacheable(self, response):
+        path = request.path
+        if any(path.startswith(prefix) for prefix in self.app.config['COMPRESS_CACHE_PATHS']):
+            return True
+        return path.endswith('.xml') or bool(response.cache_control.public)
+
     def after_request(self, response):
         """Compress response if appropriate"""
         if not self.should_compress(response):
             return response
-            
-        # Skip if response is in direct passthrough mode
-        if response.direct_passthrough:
+
+        response.vary.add('Accept-Encoding')
+        encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        level = self.app.config['COMPRESS_BR_LEVEL'] if encoding == 'br' else self.app.config['COMPRESS_LEVEL']
+
+        if response.is_streamed:
+            response.response = compress_stream(response.response, encoding, level)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            self.counters['streamed'] += 1
             return response
-            
-        # Get response data
+
         data = response.get_data()
-        
-        # Compress data
-        from flask import current_app
-        app_config = self.app.config if self.app else current_app.config
-        compress_level = app_config.get('COMPRESS_LEVEL', 6)
-        
-        gzip_buffer = BytesIO()
-        with gzip.GzipFile(fileobj=gzip_buffer, mode='wb', 
-                          compresslevel=compress_level) as gz_file:
-            gz_file.write(data)
-        
-        compressed_data = gzip_buffer.getvalue()
-        
+        compressed = MISSING
+        cache_key = None
+        if self._cacheable(response):
+            cache_key = f"{encoding}:{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+            compressed = self.compressed_cache.get(cache_key)
+        if compressed is MISSING:
+            compressed = compress_bytes(data, encoding, level)
+            if cache_key:
+                self.compressed_cache.set(cache_key, compressed, ttl=self.app.config['COMPRESS_CACHE_TTL'],
+                                          size=len(compressed))
+        else:
+            self.counters['cache_hits'] += 1
+        self.counters['buffered'] += 1
+
         # Update response
-        response.set_data(compressed_data)
-        response.headers['Content-Encoding'] = 'gzip'
-        response.headers['Content-Length'] = len(compressed_data)
-        response.headers['Vary'] = 'Accept-Encoding'
-        
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = len(compressed)
+
         return response
 
+    def stats(self):
+        stats = dict(self.counters)
+        stats.update(encodings=list(ENCODINGS),
+                     static_precompressed=len(static_variants.encoded),
+                     cache_entries=len(self.compressed_cache) if self.compressed_cache else 0,
+                     cache_bytes=self.compressed_cache.current_bytes if self.compressed_cache else 0)
+        return stats
+
 def enable_compression(app: Flask):
     """Enable compression for Flask app"""
     compression = CompressionMiddleware()
     compression.init_app(app)
-    return compression
\ No newline at end of file
+    return compression
+
+
+static_variants = StaticVariants()
+
+
+if __name__ == "__main__":
+    # Build step: python compression_middleware.py [static_dir]
+    logging.basicConfig(level=logging.INFO)
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'static'
+    written = static_variants.precompress(folder)
+    encoded, webp = static_variants.scan(folder)
+    print(f"Wrote {written} compressed variants; {encoded} assets precompressed ({'/'.join(ENCODINGS)}), "
+          f"{webp} with WebP versions")
@@ -6,6 +6,8 @@ Handles dynamic lead pricing, credit deductions, and payment processing
 from datetime import datetime
 from sqlalchemy import text
 from app import db
+from credit_ledger import ledger as credit_ledger
+from lead_pricing_engine import lead_pricing
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,16 +15,6 @@ logger = logging.getLogger(__name__)
 class CreditBillingService:
     """Service class for managing credit-based billing system."""
     
-    # Lead pricing tiers based on package price ranges
-    PRICING_TIERS = {
-        (0, 5000): 100,           # < ₹5,000 → 100 credits
-        (5000, 10000): 180,       # ₹5,000-₹10,000 → 180 credits  
-        (10000, 20000): 250,      # ₹10,000-₹20,000 → 250 credits
-        (20000, 50000): 320,      # ₹20,000-₹50,000 → 320 credits
-        (50000, 100000): 400,     # ₹50,000-₹100,000 → 400 credits
-        (100000, float('inf')): 500  # ₹100,000+ → 500 credits
-    }
-    
     @staticmethod
     def calculate_lead_cost(package_price):
         """
@@ -34,8 +26,7 @@ class CreditBillingService:
         Returns:
             int: Credit cost for the lead
         """
-        from dynamic_lead_pricing import DynamicPricingService
-        return DynamicPricingService.calculate_lead_cost(package_price)
+        return lead_pricing.lead_cost(package_price)
     
     @staticmethod
     def get_clinic_credit_balance(clinic_id):
@@ -49,12 +40,7 @@ class CreditBillingService:
             int: Current credit balance
         """
         try:
-            result = db.session.execute(
-                text("SELECT credit_balance FROM clinics WHERE id = :clinic_id"),
-                {'clinic_id': clinic_id}
-            ).fetchone()
-            
-            return result[0] if result else 0
+            return credit_ledger.balance(clinic_id)
         except Exception as e:
             logger.error(f"Error getting credit balance for clinic {clinic_id}: {e}")
             return 0
@@ -91,45 +77,27 @@ class CreditBillingService:
             # Apply action type multiplier (if needed in future)
             credit_cost = base_cost
             
-            # Get current balance
-            current_balance = CreditBillingService.get_clinic_credit_balance(clinic_id)
-            
-            # Allow negative balance with alert (as per requirements)
-            new_balance = current_balance - credit_cost
-            
-            # Update clinic balance and stats
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = :new_balance,
-                    total_credits_used = COALESCE(total_credits_used, 0) + :cost,
-                    lead_count = COALESCE(lead_count, 0) + 1
-                WHERE id = :clinic_id
-            """), {
-                'new_balance': new_balance,
-                'cost': credit_cost,
-                'clinic_id': clinic_id
-            })
+            # Allow negative balance with alert (as per requirements). The lead id
+            # is the idempotency key, so a retried request charges the lead once.
+            posting = credit_ledger.post(
+                clinic_id, -credit_cost, 'deduction',
+                description=f'Lead generation cost for {action_type} action (Package ₹{package_price:,})',
+                idempotency_key=f'lead:{lead_id}',
+                lead_id=lead_id
+            )
+            if posting['duplicate']:
+                return {'success': False, 'message': 'Credits already deducted for this lead'}
             
-            # Create credit transaction record
             db.session.execute(text("""
-                INSERT INTO credit_transactions (
-                    clinic_id, amount, transaction_type, description, 
-                    lead_id, created_at, status
-                ) VALUES (
-                    :clinic_id, :amount, 'deduction', :description,
-                    :lead_id, :created_at, 'completed'
-                )
-            """), {
-                'clinic_id': clinic_id,
-                'amount': -credit_cost,  # Negative for deduction
-                'description': f'Lead generation cost for {action_type} action (Package ₹{package_price:,})',
-                'lead_id': lead_id,
-                'created_at': datetime.utcnow()
-            })
+                UPDATE clinics SET lead_count = COALESCE(lead_count, 0) + 1 WHERE id = :clinic_id
+            """), {'clinic_id': clinic_id})
             
             # Create lead quality tracking record
             CreditBillingService.create_lead_quality_tracking(lead_id)
             
+            new_balance = posting['new_balance']
+            current_balance = posting['previous_balance']
+            
             # Check if balance is negative and flag for alert
             low_balance_alert = new_balance < 0
             
@@ -245,50 +213,40 @@ class CreditBillingService:
             
             total_credits = amount + bonus_credits
             
-            # Get current balance
-            current_balance = CreditBillingService.get_clinic_credit_balance(clinic_id)
-            new_balance = current_balance + total_credits
-            
-            # Update clinic balance and stats
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = :new_balance,
-                    total_credits_purchased = COALESCE(total_credits_purchased, 0) + :total_credits
-                WHERE id = :clinic_id
-            """), {
-                'new_balance': new_balance,
-                'total_credits': total_credits,
-                'clinic_id': clinic_id
-            })
-            
-            # Create credit transaction record
-            db.session.execute(text("""
-                INSERT INTO credit_transactions (
-                    clinic_id, amount, transaction_type, description,
-                    order_id, payment_id, monetary_value, status, created_at, processed_at
-                ) VALUES (
-                    :clinic_id, :amount, 'purchase', :description,
-                    :order_id, :payment_id, :monetary_value, 'completed', :created_at, :processed_at
-                )
-            """), {
-                'clinic_id': clinic_id,
-                'amount': total_credits,
-                'description': f'Credit top-up ₹{amount:,}' + (f' + ₹{bonus_credits} bonus' if bonus_credits else ''),
-                'order_id': order_id,
-                'payment_id': payment_id,
-                'monetary_value': amount,  # INR value
-                'created_at': datetime.utcnow(),
-                'processed_at': datetime.utcnow()
-            })
-            
-            # Update promo code usage if applicable
-            if promo_code and bonus_credits > 0:
+            # A payment id posts once, however often the gateway retries
+            posting = credit_ledger.post(
+                clinic_id, total_credits, 'purchase',
+                description=f'Credit top-up ₹{amount:,}' + (f' + ₹{bonus_credits} bonus' if bonus_credits else ''),
+                idempotency_key=f'razorpay:{payment_id}' if payment_id else None,
+                order_id=order_id,
+                payment_id=payment_id,
+                monetary_value=amount  # INR value
+            )
+            current_balance = posting['previous_balance']
+            new_balance = posting['new_balance']
+            
+            # Update promo code usage if applicable (once, not on a replayed payment)
+            if promo_code and bonus_credits > 0 and not posting['duplicate']:
                 CreditBillingService.update_promo_usage(promo_code)
             
             db.session.commit()
             
+            if posting['duplicate']:
+                # Same shape as a first posting, so a refreshed verify page renders normally
+                return {
+                    'success': True,
+                    'duplicate': True,
+                    'credits_added': amount,
+                    'bonus_credits': bonus_credits,
+                    'total_credits': total_credits,
+                    'previous_balance': current_balance,
+                    'new_balance': new_balance,
+                    'message': 'Payment already credited'
+                }
+            
             return {
                 'success': True,
+                'duplicate': False,
                 'credits_added': amount,
                 'bonus_credits': bonus_credits,
                 'total_credits': total_credits,
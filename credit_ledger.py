@@ -0,0 +1,265 @@
+"""
+Credit ledger: the one place clinic credit balances change.
+
+``credit_transactions`` is the append-only source of truth; a clinic's
+balance is the sum of its completed transactions. ``clinics.credit_balance``
+is a materialised copy of that sum, kept in step by ``post()``:
+
+1. insert the transaction row (``ON CONFLICT (idempotency_key) DO NOTHING``,
+   so a replayed Razorpay webhook or a retried lead charge posts once);
+2. apply the amount to the materialised balance in a single
+   ``UPDATE ... SET credit_balance = credit_balance + :amount RETURNING``.
+   The row lock this takes serialises concurrent postings for a clinic, so
+   no deduction is lost and the returned balance is exact.
+
+Both statements run in a savepoint inside the caller's transaction; the
+caller commits. ``reconcile()`` compares every materialised balance with the
+ledger sum and can repair drift left by older code paths
+(reconcile_credit_balances.py runs it from cron). Balance reads go through
+``balance()``, cached per clinic and invalidated when a posting commits.
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import text
+
+from cache_backend import cache
+from cache_invalidation import credit_balance_tag, mark_dirty
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'credit_balance'
+BALANCE_TTL = 300
+
+# Positive postings of these types count towards total_credits_purchased
+PURCHASE_TYPES = frozenset({'purchase', 'credit', 'topup', 'bonus', 'manual_allocation'})
+# Negative postings of these types count towards total_credits_used
+USAGE_TYPES = frozenset({'deduction', 'lead_deduction'})
+
+# Optional credit_transactions columns callers may set on a posting
+EXTRA_COLUMNS = frozenset({'lead_id', 'order_id', 'payment_id', 'monetary_value', 'created_by',
+                           'reference_id', 'payment_method', 'transaction_reference'})
+
+COMPLETED = "COALESCE(status, 'completed') = 'completed'"
+
+
+class InsufficientCredits(Exception):
+    """A posting with allow_negative=False would take the balance below zero."""
+
+    def __init__(self, clinic_id, balance, amount):
+        super().__init__(f"Insufficient credits for clinic {clinic_id}: balance {balance}, requested {-amount}")
+        self.clinic_id = clinic_id
+        self.balance = balance
+        self.amount = amount
+
+
+def _default_session():
+    from app import db
+    return db.session
+
+
+class CreditLedger:
+    """Atomic postings, cached balance reads and reconciliation for clinic credits."""
+
+    def post(self, clinic_id, amount, transaction_type, description=None, idempotency_key=None,
+             allow_negative=True, session=None, **columns):
+        """
+        Append a completed transaction and apply it to the materialised balance.
+
+        Returns a dict with ``transaction_id``, ``amount``, ``previous_balance``,
+        ``new_balance`` and ``duplicate`` (True when ``idempotency_key`` was
+        already posted; nothing changes then). Raises ``InsufficientCredits``
+        for a debit beyond the balance when ``allow_negative`` is False and
+        ``ValueError`` for an unknown clinic; the savepoint is rolled back
+        either way. Does not commit.
+        """
+        unknown = set(columns) - EXTRA_COLUMNS
+        if unknown:
+            raise ValueError(f"Unknown credit transaction columns: {', '.join(sorted(unknown))}")
+        session = session or _default_session()
+        amount = int(amount)
+        now = datetime.utcnow()
+        params = dict(columns, clinic_id=clinic_id, amount=amount, transaction_type=transaction_type,
+                      description=description, idempotency_key=idempotency_key, now=now)
+        extra = sorted(columns)
+
+        with session.begin_nested():
+            transaction_id = session.execute(text(f"""
+                INSERT INTO credit_transactions (
+                    clinic_id, transaction_type, amount, description, idempotency_key,
+                    status, created_at, processed_at{''.join(f', {c}' for c in extra)}
+                ) VALUES (
+                    :clinic_id, :transaction_type, :amount, :description, :idempotency_key,
+                    'completed', :now, :now{''.join(f', :{c}' for c in extra)}
+                )
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING id
+            """), params).scalar()
+
+            if transaction_id is None:
+                return self._duplicate(session, clinic_id, idempotency_key)
+
+            purchased = amount if amount > 0 and transaction_type in PURCHASE_TYPES else 0
+            used = -amount if amount < 0 and transaction_type in USAGE_TYPES else 0
+            guard = '' if allow_negative or amount >= 0 else 'AND COALESCE(credit_balance, 0) + :amount >= 0'
+            new_balance = session.execute(text(f"""
+                UPDATE clinics
+                SET credit_balance = COALESCE(credit_balance, 0) + :amount,
+                    total_credits_purchased = COALESCE(total_credits_purchased, 0) + :purchased,
+                    total_credits_used = COALESCE(total_credits_used, 0) + :used
+                WHERE id = :clinic_id {guard}
+                RETURNING credit_balance
+            """), {'amount': amount, 'purchased': purchased, 'used': used, 'clinic_id': clinic_id}).scalar()
+
+            if new_balance is None:
+                balance = session.execute(text("SELECT COALESCE(credit_balance, 0) FROM clinics WHERE id = :clinic_id"),
+                                          {'clinic_id': clinic_id}).scalar()
+                if balance is None:
+                    raise ValueError(f"Clinic {clinic_id} not found")
+                raise InsufficientCredits(clinic_id, balance, amount)
+
+        mark_dirty(credit_balance_tag(clinic_id), session=session)
+        logger.info(f"Posted {transaction_type} of {amount} credits for clinic {clinic_id} "
+                    f"(transaction {transaction_id}); balance {new_balance}")
+        return {
+            'transaction_id': transaction_id,
+            'amount': amount,
+            'previous_balance': new_balance - amount,
+            'new_balance': new_balance,
+            'duplicate': False,
+        }
+
+    def _duplicate(self, session, clinic_id, idempotency_key):
+        row = session.execute(text("""
+            SELECT ct.id, ct.clinic_id, ct.amount, COALESCE(c.credit_balance, 0) AS balance
+            FROM credit_transactions ct JOIN clinics c ON c.id = ct.clinic_id
+            WHERE ct.idempotency_key = :key
+        """), {'key': idempotency_key}).fetchone()
+        if row.clinic_id != clinic_id:
+            logger.error(f"Idempotency key {idempotency_key} reused for clinic {clinic_id} "
+                         f"(posted for clinic {row.clinic_id})")
+        logger.info(f"Skipped duplicate credit posting {idempotency_key} (transaction {row.id})")
+        return {
+            'transaction_id': row.id,
+            'amount': row.amount,
+            'previous_balance': row.balance,
+            'new_balance': row.balance,
+            'duplicate': True,
+        }
+
+    def transfer(self, from_clinic_id, to_clinic_id, credits, description, session=None, **columns):
+        """Move credits between clinics in one transaction; the source may not go negative."""
+        session = session or _default_session()
+        # Lock both clinics in id order so opposite transfers cannot deadlock
+        for clinic_id in sorted({from_clinic_id, to_clinic_id}):
+            session.execute(text("UPDATE clinics SET credit_balance = credit_balance WHERE id = :clinic_id"),
+                            {'clinic_id': clinic_id})
+        debit = self.post(from_clinic_id, -credits, 'transfer_out',
+                          f"Transfer to clinic {to_clinic_id}: {description}",
+                          allow_negative=False, session=session, **columns)
+        credit = self.post(to_clinic_id, credits, 'transfer_in',
+                           f"Transfer from clinic {from_clinic_id}: {description}",
+                           session=session, **columns)
+        return debit, credit
+
+    def fail_payment(self, payment_id, session=None):
+        """
+        Record a failed gateway payment. Pending rows are marked failed (they
+        never counted towards the balance); a completed posting for the payment
+        is reversed with an opposite entry instead of being edited, so ledger
+        and materialised balance stay in step. Safe to replay. Does not commit.
+        """
+        session = session or _default_session()
+        session.execute(text("""
+            UPDATE credit_transactions SET status = 'failed'
+            WHERE payment_id = :payment_id AND status = 'pending'
+        """), {'payment_id': payment_id})
+        postings = session.execute(text(f"""
+            SELECT id, clinic_id, amount FROM credit_transactions
+            WHERE payment_id = :payment_id AND transaction_type <> 'reversal' AND amount <> 0 AND {COMPLETED}
+        """), {'payment_id': payment_id}).fetchall()
+        return [
+            self.post(row.clinic_id, -row.amount, 'reversal', f"Reversal of transaction {row.id}: payment failed",
+                      idempotency_key=f'reversal:{row.id}', payment_id=payment_id, session=session)
+            for row in postings
+        ]
+
+    # ---- reads -----------------------------------------------------------
+
+    def balance(self, clinic_id, session=None):
+        """Materialised balance, cached until the next committed posting for the clinic."""
+        def load():
+            return self.materialised_balance(clinic_id, session=session)
+        return cache.get_or_set(NAMESPACE, str(clinic_id), load, ttl=BALANCE_TTL,
+                                tags=[credit_balance_tag(clinic_id)])
+
+    def materialised_balance(self, clinic_id, session=None):
+        session = session or _default_session()
+        balance = session.execute(text("SELECT COALESCE(credit_balance, 0) FROM clinics WHERE id = :clinic_id"),
+                                  {'clinic_id': clinic_id}).scalar()
+        return balance or 0
+
+    def ledger_balance(self, clinic_id, session=None):
+        """Balance recomputed from the ledger (the source of truth)."""
+        session = session or _default_session()
+        return session.execute(text(f"""
+            SELECT COALESCE(SUM(amount), 0) FROM credit_transactions
+            WHERE clinic_id = :clinic_id AND {COMPLETED}
+        """), {'clinic_id': clinic_id}).scalar() or 0
+
+    # ---- reconciliation --------------------------------------------------
+
+    def find_drift(self, session=None):
+        """Clinics whose materialised balance differs from their ledger sum."""
+        session = session or _default_session()
+        rows = session.execute(text(f"""
+            SELECT c.id AS clinic_id,
+                   COALESCE(c.credit_balance, 0) AS materialised,
+                   COALESCE(l.total, 0) AS ledger
+            FROM clinics c
+            LEFT JOIN (
+                SELECT clinic_id, SUM(amount) AS total
+                FROM credit_transactions
+                WHERE {COMPLETED}
+                GROUP BY clinic_id
+            ) l ON l.clinic_id = c.id
+            WHERE COALESCE(c.credit_balance, 0) <> COALESCE(l.total, 0)
+            ORDER BY c.id
+        """)).fetchall()
+        return [{'clinic_id': row.clinic_id, 'materialised': row.materialised, 'ledger': row.ledger,
+                 'drift': row.materialised - row.ledger} for row in rows]
+
+    def reconcile(self, fix=False, session=None):
+        """
+        Verify materialised balances against the ledger.
+
+        Returns the drifted clinics. With ``fix``, each is reset to its ledger
+        sum under the clinic row lock (postings in flight apply their delta
+        after it, so none is lost) and committed.
+        """
+        session = session or _default_session()
+        drifted = self.find_drift(session=session)
+        for entry in drifted:
+            logger.warning(f"Credit balance drift for clinic {entry['clinic_id']}: materialised "
+                           f"{entry['materialised']}, ledger {entry['ledger']} ({entry['drift']:+d})")
+        if not fix:
+            return drifted
+
+        for entry in drifted:
+            clinic_id = entry['clinic_id']
+            try:
+                session.execute(text("UPDATE clinics SET credit_balance = credit_balance WHERE id = :clinic_id"),
+                                {'clinic_id': clinic_id})
+                ledger = self.ledger_balance(clinic_id, session=session)
+                session.execute(text("UPDATE clinics SET credit_balance = :ledger WHERE id = :clinic_id"),
+                                {'ledger': ledger, 'clinic_id': clinic_id})
+                mark_dirty(credit_balance_tag(clinic_id), session=session)
+                session.commit()
+                entry['fixed_to'] = ledger
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Could not repair credit balance for clinic {clinic_id}: {e}")
+        return drifted
+
+
+ledger = CreditLedger()
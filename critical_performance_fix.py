@@ -10,39 +10,44 @@ Key optimizations:
 """
 
 import logging
-from datetime import datetime, timedelta
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request
 from sqlalchemy import text
 from app import db
+from cache_backend import cache as tiered_cache
+from cache_invalidation import PACKAGES, CLINICS, PROCEDURES, DOCTORS, CATEGORIES, COMMUNITY
 
 logger = logging.getLogger(__name__)
 
 class CriticalPerformanceOptimizer:
-    def __init__(self):
-        self.cache = {}
+    def __init__(self, backend=None):
+        # Entries live in the unified tiered cache under the 'critical' namespace
+        self.cache = backend or tiered_cache
+        self.cache_namespace = 'critical'
         self.cache_timeout = 300  # 5 minutes
         
-    def cached_response(self, cache_key, timeout=300):
-        """Decorator for caching expensive database queries."""
+    def cached_response(self, cache_key, timeout=300, tags=None):
+        """Decorator for caching expensive database queries.
+        
+        ``tags`` ties the entry to model changes (see cache_invalidation.py).
+        """
         def decorator(f):
             @wraps(f)
             def wrapper(*args, **kwargs):
-                # Check if we have cached data
-                if cache_key in self.cache:
-                    cached_data, timestamp = self.cache[cache_key]
-                    if datetime.now() - timestamp < timedelta(seconds=timeout):
-                        logger.info(f"Returning cached data for {cache_key}")
-                        return cached_data
-                
-                # Execute function and cache result
-                result = f(*args, **kwargs)
-                self.cache[cache_key] = (result, datetime.now())
-                logger.info(f"Cached new data for {cache_key}")
-                return result
+                # Single-flight: one request recomputes, concurrent ones wait for it
+                return self.cache.get_or_set(
+                    self.cache_namespace, cache_key, lambda: f(*args, **kwargs), ttl=timeout, tags=tags
+                )
             return wrapper
         return decorator
     
+    def invalidate(self, cache_key=None):
+        """Drop one cached response, or all of them."""
+        if cache_key:
+            self.cache.delete(self.cache_namespace, cache_key)
+        else:
+            self.cache.clear(self.cache_namespace)
+    
     def get_optimized_homepage_data(self):
         """
         Single optimized query to get all homepage data at once.
@@ -183,6 +188,9 @@ class CriticalPerformanceOptimizer:
             logger.error(f"❌ Error in optimized packages query: {e}")
             return {'affordable': []}
 
+# Homepage data depends on categories (with package counts), procedures, threads and doctors
+HOMEPAGE_TAGS = (CATEGORIES, PACKAGES, PROCEDURES, DOCTORS, COMMUNITY)
+
 # Global optimizer instance
 performance_optimizer = CriticalPerformanceOptimizer()
 
@@ -237,8 +245,11 @@ def register_critical_performance_optimizations(app):
     logger.info("✅ Critical performance optimizations registered")
 
 def get_cached_homepage_data():
-    """Get cached homepage data with fallback."""
-    @performance_optimizer.cached_response('homepage_data', timeout=300)
+    """Get cached homepage data with fallback.
+    
+    Cached for hours; admin edits invalidate it through model-event tags.
+    """
+    @performance_optimizer.cached_response('homepage_data', timeout=21600, tags=HOMEPAGE_TAGS)
     def _get_data():
         return performance_optimizer.get_optimized_homepage_data()
     
@@ -246,7 +257,7 @@ def get_cached_homepage_data():
 
 def get_cached_packages_data():
     """Get cached packages data with fallback."""
-    @performance_optimizer.cached_response('packages_data', timeout=300)
+    @performance_optimizer.cached_response('packages_data', timeout=21600, tags=(PACKAGES, CLINICS))
     def _get_data():
         return performance_optimizer.get_optimized_packages_data()
     
@@ -0,0 +1,212 @@
+"""
+Streaming, chunked and resumable CSV import engine.
+
+The import scripts each used to read the whole file, write it row by row
+and either commit once at the end or keep their own pickle of how far they
+got. ``run_import`` streams ``csv.DictReader`` rows in chunks of
+``chunk_size`` and hands each chunk to a handler that writes it with bulk
+statements; the engine commits once per chunk and then records the number
+of rows done in a JSON checkpoint file next to the CSV. Running the same
+import again resumes after the last committed chunk, as long as the file
+has not changed since (same size and mtime). ``max_rows`` stops a run
+early (for trial runs, or imports throttled per run); its checkpoint is
+kept so the next run carries on.
+
+A crash between a chunk's commit and its checkpoint replays that chunk, so
+handlers must skip rows that already exist (bulk_clinic_upload does by
+email). When a chunk fails, it is rolled back and its rows are retried
+one at a time so a single bad row costs only itself.
+
+Progress is logged per chunk with rows/sec, and ``ImportStats`` ends up
+with totals and the first ``MAX_ERRORS`` error messages.
+"""
+
+import os
+import csv
+import json
+import time
+import logging
+import tempfile
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+MAX_ERRORS = 100
+
+
+class ImportStats:
+    """Row counters and throughput for one import run."""
+
+    def __init__(self, rows_skipped_on_resume=0):
+        self.resumed_from = rows_skipped_on_resume
+        self.rows = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.failed = 0
+        self.chunks = 0
+        self.errors = []
+        self.finished = False
+        self.started = time.time()
+
+    def add(self, inserted=0, skipped=0, failed=0, errors=()):
+        self.inserted += inserted
+        self.skipped += skipped
+        self.failed += failed
+        for error in errors:
+            if len(self.errors) < MAX_ERRORS:
+                self.errors.append(error)
+
+    @property
+    def elapsed(self):
+        return time.time() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'chunks': self.chunks,
+            'resumed_from': self.resumed_from,
+            'finished': self.finished,
+            'seconds': round(self.elapsed, 2),
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': list(self.errors),
+        }
+
+
+class ChunkResult:
+    """What a handler did with one chunk; errors are human-readable, one per failed row."""
+
+    def __init__(self, inserted=0, skipped=0, failed=0, errors=None):
+        self.inserted = inserted
+        self.skipped = skipped
+        self.failed = failed
+        self.errors = errors or []
+
+    def fail(self, row_num, message):
+        self.failed += 1
+        self.errors.append(f"Row {row_num}: {message}")
+
+
+class ImportCheckpoint:
+    """Rows committed so far for one CSV file, kept in ``<csv>.checkpoint.json``."""
+
+    def __init__(self, csv_path, path=None):
+        self.csv_path = csv_path
+        self.path = path or f"{csv_path}.checkpoint.json"
+
+    def _fingerprint(self):
+        stat = os.stat(self.csv_path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def load(self):
+        """Rows already committed, or 0 when there is no checkpoint for this version of the file."""
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return 0
+        if saved.get('file') != self._fingerprint():
+            logger.warning(f"{self.csv_path} changed since checkpoint {self.path}; starting over")
+            return 0
+        return saved.get('rows_done', 0)
+
+    def save(self, rows_done):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.checkpoint-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'csv': self.csv_path, 'file': self._fingerprint(), 'rows_done': rows_done,
+                       'saved_at': time.time()}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def iter_chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _write_chunk(conn, handler, chunk):
+    try:
+        result = handler(conn, chunk)
+        conn.commit()
+        return result
+    except Exception as e:
+        conn.rollback()
+        if len(chunk) == 1:
+            result = ChunkResult()
+            result.fail(chunk[0][0], f"{type(e).__name__}: {e}")
+            return result
+        logger.warning(f"Chunk at row {chunk[0][0]} failed ({e}); retrying its rows one at a time")
+
+    combined = ChunkResult()
+    for row in chunk:
+        result = _write_chunk(conn, handler, [row])
+        combined.inserted += result.inserted
+        combined.skipped += result.skipped
+        combined.failed += result.failed
+        combined.errors.extend(result.errors)
+    return combined
+
+
+def run_import(csv_path, conn, handler, chunk_size=CHUNK_SIZE, required_columns=(), resume=True,
+               checkpoint_path=None, encoding='utf-8', max_rows=None):
+    """
+    Stream ``csv_path`` through ``handler(conn, [(row_num, row), ...]) -> ChunkResult``,
+    committing and checkpointing after every chunk. Row numbers are file line
+    numbers as spreadsheets show them (the header is row 1). At most
+    ``max_rows`` rows are imported by this run when given.
+    """
+    checkpoint = ImportCheckpoint(csv_path, checkpoint_path)
+    rows_done = checkpoint.load() if resume else 0
+    stats = ImportStats(rows_done)
+
+    with open(csv_path, 'r', encoding=encoding, newline='') as file:
+        reader = csv.DictReader(file)
+        missing_columns = [column for column in required_columns if column not in (reader.fieldnames or [])]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
+
+        rows = enumerate(reader, start=2)
+        if rows_done:
+            logger.info(f"Resuming {csv_path} after {rows_done} committed rows")
+            rows = islice(rows, rows_done, None)
+
+        batch = rows if max_rows is None else islice(rows, max_rows)
+        for chunk in iter_chunks(batch, chunk_size):
+            chunk_started = time.time()
+            result = _write_chunk(conn, handler, chunk)
+            rows_done += len(chunk)
+            checkpoint.save(rows_done)
+
+            stats.rows += len(chunk)
+            stats.chunks += 1
+            stats.add(result.inserted, result.skipped, result.failed, result.errors)
+            chunk_seconds = time.time() - chunk_started
+            logger.info(f"Rows {chunk[0][0]}-{chunk[-1][0]}: {result.inserted} inserted, {result.skipped} skipped, "
+                        f"{result.failed} failed ({len(chunk) / max(chunk_seconds, 1e-6):.0f} rows/sec, "
+                        f"{stats.rows_per_second:.0f} rows/sec overall)")
+        stats.finished = max_rows is None or next(rows, None) is None
+
+    if stats.finished:
+        # A finished import leaves nothing to resume; the next run of the file starts over
+        checkpoint.clear()
+    else:
+        logger.info(f"Stopped after {max_rows} rows; run again to continue from row {rows_done + 2}")
+    return stats
@@ -10,6 +10,7 @@ from sqlalchemy import text, and_, or_, desc
 from datetime import datetime, timedelta
 import logging
 from app import db
+from credit_ledger import ledger as credit_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -315,29 +316,16 @@ class DisputeService:
             if not dispute_info:
                 return {'success': False, 'message': 'Dispute not found'}
             
-            # Add credit back to clinic
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = credit_balance + :refund_amount 
-                WHERE id = :clinic_id
-            """), {
-                'refund_amount': refund_amount,
-                'clinic_id': dispute_info.clinic_id
-            })
-            
-            # Record the transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions 
-                (clinic_id, amount, transaction_type, description, created_by, reference_id, created_at)
-                VALUES 
-                (:clinic_id, :amount, 'dispute_refund', :description, :admin_id, :reference_id, NOW())
-            """), {
-                'clinic_id': dispute_info.clinic_id,
-                'amount': refund_amount,
-                'description': f'Refund for dispute #{dispute_id}',
-                'admin_id': current_user.id,
-                'reference_id': f'dispute_{dispute_id}'
-            })
+            # Add credit back to clinic; a dispute is refunded at most once
+            posting = credit_ledger.post(
+                dispute_info.clinic_id, refund_amount, 'dispute_refund',
+                description=f'Refund for dispute #{dispute_id}',
+                idempotency_key=f'dispute:{dispute_id}:refund',
+                created_by=current_user.id,
+                reference_id=f'dispute_{dispute_id}'
+            )
+            if posting['duplicate']:
+                return {'success': False, 'message': 'Dispute already refunded'}
             
             logger.info(f"Processed refund of {refund_amount} credits for dispute {dispute_id}")
             return {'success': True}
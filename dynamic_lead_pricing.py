@@ -6,51 +6,30 @@ Provides admin-configurable lead pricing based on package values.
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from flask_wtf.csrf import validate_csrf, CSRFError
-from datetime import datetime
 from sqlalchemy import text
 from models import db
+from lead_pricing_engine import lead_pricing, PricingTable, FALLBACK_TABLE, parse_package_value
 import logging
 import json
+import numpy as np
 
 pricing_bp = Blueprint('lead_pricing', __name__)
 logger = logging.getLogger(__name__)
 
+PREVIEW_SAMPLE = 20  # Packages listed in the preview; the summary covers all of them
+
 class DynamicPricingService:
     """Service for dynamic lead pricing calculations."""
     
-    _pricing_cache = None
-    _cache_timestamp = None
-    _cache_duration = 300  # 5 minutes
-    
     @classmethod
     def get_pricing_tiers(cls, force_refresh=False):
-        """Get all active pricing tiers with caching."""
-        current_time = datetime.now().timestamp()
-        
-        # Check if cache is valid
-        if (not force_refresh and 
-            cls._pricing_cache is not None and 
-            cls._cache_timestamp is not None and 
-            (current_time - cls._cache_timestamp) < cls._cache_duration):
-            return cls._pricing_cache
+        """Get all active pricing tiers (compiled and cached unless force_refresh)."""
+        if not force_refresh:
+            table = lead_pricing.table()
+            return [] if table is FALLBACK_TABLE else table.tiers
         
         try:
-            result = db.session.execute(text("""
-                SELECT id, tier_name, min_package_value, max_package_value, 
-                       credit_cost, is_active, created_at, updated_at
-                FROM lead_pricing_tiers 
-                WHERE is_active = TRUE 
-                ORDER BY min_package_value ASC
-            """))
-            
-            tiers = [dict(row._mapping) for row in result.fetchall()]
-            
-            # Update cache
-            cls._pricing_cache = tiers
-            cls._cache_timestamp = current_time
-            
-            return tiers
-            
+            return lead_pricing.load_tiers()
         except Exception as e:
             logger.error(f"Error fetching pricing tiers: {e}")
             return []
@@ -58,58 +37,12 @@ class DynamicPricingService:
     @classmethod
     def calculate_lead_cost(cls, package_value):
         """Calculate credit cost based on package value using dynamic pricing."""
-        try:
-            # Convert to integer if string
-            if isinstance(package_value, str):
-                package_value = int(float(package_value.replace(',', '')))
-            
-            package_value = int(package_value) if package_value else 0
-            
-            # Get pricing tiers
-            tiers = cls.get_pricing_tiers()
-            
-            if not tiers:
-                # Fallback to hardcoded pricing if no tiers configured
-                logger.warning("No pricing tiers found, using fallback pricing")
-                return cls._fallback_pricing(package_value)
-            
-            # Find matching tier
-            for tier in tiers:
-                min_val = tier['min_package_value']
-                max_val = tier['max_package_value']
-                
-                # Check if package value falls within this tier
-                if min_val <= package_value:
-                    if max_val is None or package_value <= max_val:
-                        logger.info(f"Package value {package_value} matched tier '{tier['tier_name']}' - Cost: {tier['credit_cost']} credits")
-                        return tier['credit_cost']
-            
-            # If no tier matches, use the highest tier
-            if tiers:
-                highest_tier = max(tiers, key=lambda x: x['min_package_value'])
-                logger.info(f"Package value {package_value} exceeded all tiers, using highest tier: {highest_tier['credit_cost']} credits")
-                return highest_tier['credit_cost']
-            
-            # Final fallback
-            return cls._fallback_pricing(package_value)
-            
-        except Exception as e:
-            logger.error(f"Error calculating lead cost for package value {package_value}: {e}")
-            return cls._fallback_pricing(package_value)
+        return lead_pricing.lead_cost(package_value)
     
     @classmethod
     def _fallback_pricing(cls, package_value):
         """Fallback pricing logic if dynamic tiers fail."""
-        if package_value <= 5000:
-            return 100
-        elif package_value <= 10000:
-            return 150
-        elif package_value <= 20000:
-            return 200
-        elif package_value <= 50000:
-            return 300
-        else:
-            return 400
+        return FALLBACK_TABLE.cost(package_value)
     
     @staticmethod
     def validate_tier_data(tier_data):
@@ -194,11 +127,10 @@ class DynamicPricingService:
                 "admin_user_id": admin_user_id
             })
             
+            # Recompile pricing in every worker once this commits
+            lead_pricing.invalidate()
             db.session.commit()
             
-            # Clear cache
-            DynamicPricingService._pricing_cache = None
-            
             logger.info(f"Created pricing tier '{tier_data['tier_name']}' by user {admin_user_id}")
             return True, tier_id
             
@@ -256,11 +188,10 @@ class DynamicPricingService:
                 "admin_user_id": admin_user_id
             })
             
+            # Recompile pricing in every worker once this commits
+            lead_pricing.invalidate()
             db.session.commit()
             
-            # Clear cache
-            DynamicPricingService._pricing_cache = None
-            
             logger.info(f"Updated pricing tier {tier_id} by user {admin_user_id}")
             return True, tier_id
             
@@ -293,11 +224,10 @@ class DynamicPricingService:
                 DELETE FROM lead_pricing_tiers WHERE id = :tier_id
             """), {"tier_id": tier_id})
             
+            # Recompile pricing in every worker once this commits
+            lead_pricing.invalidate()
             db.session.commit()
             
-            # Clear cache
-            DynamicPricingService._pricing_cache = None
-            
             logger.info(f"Deleted pricing tier '{existing_tier.tier_name}' (ID: {tier_id}) by user {admin_user_id}")
             return True, "Tier deleted successfully"
             
@@ -341,39 +271,47 @@ def preview_pricing_impact():
             SELECT id, name, price_actual 
             FROM packages 
             WHERE price_actual IS NOT NULL 
-            ORDER BY price_actual ASC 
-            LIMIT 20
+            ORDER BY price_actual ASC
         """))
         
         packages = [dict(row._mapping) for row in packages_result.fetchall()]
-        
-        # Calculate current vs new costs
-        preview_data = []
-        for package in packages:
-            current_cost = DynamicPricingService.calculate_lead_cost(package['price_actual'])
-            
-            # Calculate new cost using provided tiers
-            new_cost = current_cost  # Default to current if no matching tier
-            for tier in new_tiers:
-                min_val = int(tier.get('min_package_value', 0))
-                max_val = int(tier.get('max_package_value', 0)) if tier.get('max_package_value') else None
-                
-                if min_val <= package['price_actual']:
-                    if max_val is None or package['price_actual'] <= max_val:
-                        new_cost = int(tier.get('credit_cost', current_cost))
-                        break
-            
-            preview_data.append({
-                'package_name': package['name'],
-                'package_price': package['price_actual'],
-                'current_cost': current_cost,
-                'new_cost': new_cost,
-                'difference': new_cost - current_cost
-            })
+        prices = np.array([parse_package_value(package['price_actual']) for package in packages], dtype=np.int64)
+        
+        # Price every package under the current and the proposed tiers in one pass each
+        current_costs = lead_pricing.table().costs(prices)
+        proposed = [{
+            'tier_name': tier.get('tier_name', ''),
+            'min_package_value': int(tier.get('min_package_value', 0)),
+            'max_package_value': int(tier['max_package_value']) if tier.get('max_package_value') else None,
+            'credit_cost': int(tier.get('credit_cost', 0))
+        } for tier in new_tiers]
+        # Packages no proposed tier covers keep their current cost
+        new_costs = PricingTable(proposed).costs(prices, default=current_costs) if proposed else current_costs
+        differences = new_costs - current_costs
+        
+        preview_data = [{
+            'package_name': package['name'],
+            'package_price': package['price_actual'],
+            'current_cost': int(current_cost),
+            'new_cost': int(new_cost),
+            'difference': int(difference)
+        } for package, current_cost, new_cost, difference
+            in zip(packages[:PREVIEW_SAMPLE], current_costs, new_costs, differences)]
+        
+        summary = {
+            'package_count': len(packages),
+            'changed_count': int(np.count_nonzero(differences)),
+            'increased_count': int(np.count_nonzero(differences > 0)),
+            'decreased_count': int(np.count_nonzero(differences < 0)),
+            'current_total_cost': int(current_costs.sum()),
+            'new_total_cost': int(new_costs.sum()),
+            'average_difference': round(float(differences.mean()), 1) if len(packages) else 0.0
+        }
         
         return jsonify({
             'success': True,
-            'preview_data': preview_data
+            'preview_data': preview_data,
+            'summary': summary
         })
         
     except Exception as e:
@@ -1,18 +1,34 @@
 #!/usr/bin/env python3
 """
 Efficient clinic image import with batch processing and error handling.
+
+Each ``*_clinics.csv`` file is imported in committed chunks through
+csv_import_engine.run_import: one UPDATE per chunk sets ``profile_image``
+on the clinics (matched by name) that have none yet. An interrupted file
+resumes after its last committed chunk when the script is run again.
 """
 
-import csv
 import os
-import psycopg2
 import logging
 from glob import glob
-import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from csv_import_engine import run_import, ChunkResult
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 250
+IMAGE_URL_PREFIXES = (
+    'https://lh3.googleusercontent.com',
+    'https://lh4.googleusercontent.com',
+    'https://lh5.googleusercontent.com',
+    'https://streetviewpixels-pa.googleapis.com',
+    'https://maps.gstatic.com',
+)
+
 def get_db_connection():
     """Get database connection."""
     database_url = os.environ.get('DATABASE_URL')
@@ -26,91 +42,61 @@ def truncate_url(url, max_length=255):
         return url
     return url[:max_length]
 
-def process_csv_batch(csv_file_path, batch_size=50):
-    """Process CSV file in batches to avoid timeouts."""
+def update_image_chunk(conn, chunk):
+    """
+    Set ``profile_image`` for one chunk of CSV rows with a single UPDATE.
+    Only clinics without an image are touched, so a replayed chunk changes
+    nothing; ``inserted`` counts the clinics updated.
+    """
+    result = ChunkResult()
+    images = {}
+    for row_num, row in chunk:
+        name = (row.get('name') or '').strip()
+        profile_image = (row.get('profile_image') or '').strip()
+        if name and profile_image.startswith(IMAGE_URL_PREFIXES):
+            images.setdefault(name, truncate_url(profile_image))  # The first image for a name wins
+    if not images:
+        result.skipped = len(chunk)
+        return result
+
+    cursor = conn.cursor()
+    try:
+        updated = execute_values(cursor, """
+            UPDATE clinics c
+            SET profile_image = v.profile_image
+            FROM (VALUES %s) AS v(name, profile_image)
+            WHERE c.name = v.name AND (c.profile_image IS NULL OR c.profile_image = '')
+            RETURNING c.id
+        """, list(images.items()), page_size=len(images), fetch=True)
+    finally:
+        cursor.close()
+
+    result.inserted = len(updated)
+    result.skipped = max(len(chunk) - len(updated), 0)
+    return result
+
+def process_csv_batch(csv_file_path, chunk_size=CHUNK_SIZE, resume=True):
+    """Import the images of one CSV file; returns its ImportStats (None when it could not run)."""
     logger.info(f"Processing {csv_file_path}")
-    
+
     if not os.path.exists(csv_file_path):
         logger.warning(f"File not found: {csv_file_path}")
-        return 0, 0, 0
-
-    updated_count = 0
-    total_count = 0
-    images_found = 0
-    batch_count = 0
-    
-    try:
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            batch_data = []
-            
-            for row in reader:
-                total_count += 1
-                name = row.get('name', '').strip()
-                profile_image = row.get('profile_image', '').strip()
-                
-                if not name or not profile_image:
-                    continue
-                
-                # Check for valid image URLs
-                if (profile_image.startswith('https://lh3.googleusercontent.com') or 
-                    profile_image.startswith('https://streetviewpixels-pa.googleapis.com') or
-                    profile_image.startswith('https://lh5.googleusercontent.com') or
-                    profile_image.startswith('https://maps.gstatic.com') or
-                    profile_image.startswith('https://lh4.googleusercontent.com')):
-                    
-                    images_found += 1
-                    # Truncate URL to fit in database
-                    truncated_url = truncate_url(profile_image)
-                    batch_data.append((name, truncated_url))
-                    
-                    # Process batch when it reaches batch_size
-                    if len(batch_data) >= batch_size:
-                        updated_count += process_batch(batch_data)
-                        batch_data = []
-                        batch_count += 1
-                        logger.info(f"Processed batch {batch_count} from {csv_file_path}")
-            
-            # Process remaining data
-            if batch_data:
-                updated_count += process_batch(batch_data)
-                batch_count += 1
-        
-        logger.info(f"✓ {csv_file_path}: {updated_count} clinics updated ({images_found} images found, {total_count} total)")
-        
-    except Exception as e:
-        logger.error(f"Error processing {csv_file_path}: {e}")
-    
-    return updated_count, images_found, total_count
+        return None
 
-def process_batch(batch_data):
-    """Process a batch of updates."""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    updated_count = 0
-    
     try:
-        for name, profile_image in batch_data:
-            # Try exact match first
-            cursor.execute("""
-                UPDATE clinics 
-                SET profile_image = %s 
-                WHERE name = %s AND (profile_image IS NULL OR profile_image = '')
-            """, (profile_image, name))
-            
-            if cursor.rowcount > 0:
-                updated_count += 1
-        
-        conn.commit()
-        
+        stats = run_import(csv_file_path, conn, update_image_chunk, chunk_size=chunk_size,
+                           required_columns=['name', 'profile_image'], resume=resume)
     except Exception as e:
-        logger.error(f"Error in batch processing: {e}")
+        logger.error(f"Error processing {csv_file_path} (committed chunks are kept; rerun to resume): {e}")
         conn.rollback()
+        return None
     finally:
-        cursor.close()
         conn.close()
-    
-    return updated_count
+
+    logger.info(f"✓ {csv_file_path}: {stats.inserted} clinics updated ({stats.rows} rows, "
+                f"{stats.rows_per_second:.0f} rows/sec)")
+    return stats
 
 def main():
     """Main function to import all clinic images efficiently."""
@@ -126,68 +112,52 @@ def main():
         './ahmedabad_clinics.csv',
         './jaipur_clinics.csv'
     ]
-    
-    logger.info(f"Starting efficient clinic image import")
-    
+
+    logger.info("Starting efficient clinic image import")
+
+    # Priority files first, then any additional CSV files
+    priority_names = {os.path.normpath(f) for f in priority_files}
+    remaining_files = sorted(f for f in glob('*_clinics.csv') if os.path.normpath(f) not in priority_names)
+    files = [f for f in priority_files if os.path.exists(f)] + remaining_files
+
     total_updated = 0
-    total_images_found = 0
     total_records = 0
-    
-    # Process priority files first
-    for csv_file in priority_files:
-        if os.path.exists(csv_file):
-            logger.info(f"Processing priority file: {csv_file}")
-            updated, images, records = process_csv_batch(csv_file, batch_size=25)
-            total_updated += updated
-            total_images_found += images
-            total_records += records
-            
-            # Short delay between files
-            time.sleep(0.5)
-    
-    # Check for any additional CSV files
-    additional_files = glob('*_clinics.csv')
-    remaining_files = [f for f in additional_files if f not in priority_files and os.path.exists(f)]
-    
-    for csv_file in remaining_files:
-        logger.info(f"Processing additional file: {csv_file}")
-        updated, images, records = process_csv_batch(csv_file, batch_size=25)
-        total_updated += updated
-        total_images_found += images
-        total_records += records
-        time.sleep(0.5)
-    
-    logger.info(f"\n=== IMPORT COMPLETE ===")
-    logger.info(f"Total files processed: {len(priority_files) + len(remaining_files)}")
+    for csv_file in files:
+        stats = process_csv_batch(csv_file)
+        if stats:
+            total_updated += stats.inserted
+            total_records += stats.rows
+
+    logger.info("\n=== IMPORT COMPLETE ===")
+    logger.info(f"Total files processed: {len(files)}")
     logger.info(f"Total records processed: {total_records}")
-    logger.info(f"Total images found: {total_images_found}")
     logger.info(f"Total clinics updated: {total_updated}")
-    
+
     # Check final database status
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
-        
+
         cursor.execute("""
-            SELECT COUNT(*) as total_clinics, 
+            SELECT COUNT(*) as total_clinics,
                    COUNT(CASE WHEN profile_image IS NOT NULL AND profile_image != '' THEN 1 END) as clinics_with_images
             FROM clinics
         """)
-        
+
         result = cursor.fetchone()
         total_clinics, clinics_with_images = result
         coverage = (clinics_with_images / total_clinics * 100) if total_clinics > 0 else 0
-        
-        logger.info(f"Final database status:")
+
+        logger.info("Final database status:")
         logger.info(f"  Total clinics: {total_clinics}")
         logger.info(f"  Clinics with images: {clinics_with_images}")
         logger.info(f"  Coverage: {coverage:.1f}%")
-        
+
         cursor.close()
         conn.close()
-        
+
     except Exception as e:
         logger.error(f"Error checking final status: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -9,6 +9,8 @@ from models import Clinic, ClinicSpecialty, Category, ClinicAmenity
 from sqlalchemy import func, and_, or_
 import logging
 
+from geo_index import get_clinic_geo_index, haversine_km
+
 logger = logging.getLogger(__name__)
 
 enhanced_search_bp = Blueprint('enhanced_search', __name__, url_prefix='/search')
@@ -181,18 +183,11 @@ def api_search():
     if rating_min:
         query = query.filter(Clinic.overall_rating >= rating_min)
     
-    # Apply distance filter (simplified calculation)
+    # Apply distance filter from the spatial index instead of a bounding box on raw columns
+    geo_index = get_clinic_geo_index()
     if distance and user_lat and user_lng:
-        # Use a simple bounding box calculation for performance
-        lat_delta = distance / 111.0  # Approximate km per degree latitude
-        lng_delta = distance / (111.0 * abs(user_lat))  # Adjust for longitude
-        
-        query = query.filter(
-            and_(
-                Clinic.latitude.between(user_lat - lat_delta, user_lat + lat_delta),
-                Clinic.longitude.between(user_lng - lng_delta, user_lng + lng_delta)
-            )
-        )
+        _total, hits = geo_index.within_radius(user_lat, user_lng, distance)
+        query = query.filter(Clinic.id.in_([clinic_id for clinic_id, _distance in hits]))
     
     # Execute query
     clinics = query.all()
@@ -202,8 +197,9 @@ def api_search():
     for clinic in clinics:
         # Calculate distance if user location provided
         distance_km = None
-        if user_lat and user_lng and clinic.latitude and clinic.longitude:
-            distance_km = calculate_distance(user_lat, user_lng, clinic.latitude, clinic.longitude)
+        located = geo_index.payload(clinic.id)
+        if user_lat and user_lng and located:
+            distance_km = float(haversine_km(user_lat, user_lng, located['latitude'], located['longitude']))
         
         clinic_data = {
             'id': clinic.id,
@@ -258,32 +254,53 @@ def nearby_clinics():
     lat = request.args.get('lat', type=float)
     lng = request.args.get('lng', type=float)
     radius = request.args.get('radius', 10, type=int)  # Default 10km
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), 100)
     
     if not lat or not lng:
         return jsonify({'error': 'Location coordinates required'})
     
-    # Simple distance calculation for all clinics
-    clinics = db.session.query(Clinic).filter(
-        and_(Clinic.latitude.isnot(None), Clinic.longitude.isnot(None))
-    ).all()
+    # Grid lookup + vectorized haversine over nearby cells only
+    index = get_clinic_geo_index()
+    total, hits = index.within_radius(lat, lng, radius, offset=(page - 1) * per_page, limit=per_page)
     
-    nearby = []
-    for clinic in clinics:
-        distance = calculate_distance(lat, lng, clinic.latitude, clinic.longitude)
-        if distance <= radius:
-            nearby.append({
-                'id': clinic.id,
-                'name': clinic.name,
-                'distance_km': round(distance, 1),
-                'rating': clinic.overall_rating,
-                'address': f"{clinic.area}, {clinic.city}",
-                'specialties': [s.category.name for s in clinic.specialties[:3] if s.category]
-            })
+    nearby = [_nearby_clinic_json(index.payload(clinic_id), distance) for clinic_id, distance in hits]
+    
+    return jsonify({
+        'nearby_clinics': nearby,
+        'total_count': total,
+        'page': page,
+        'per_page': per_page,
+        'has_more': page * per_page < total
+    })
+
+@enhanced_search_bp.route('/api/nearest-clinics')
+def nearest_clinics():
+    """Find the k nearest clinics to user location, however far away"""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
     
-    # Sort by distance
-    nearby.sort(key=lambda x: x['distance_km'])
+    if not lat or not lng:
+        return jsonify({'error': 'Location coordinates required'})
+    
+    index = get_clinic_geo_index()
+    nearest = [_nearby_clinic_json(index.payload(clinic_id), distance)
+               for clinic_id, distance in index.nearest(lat, lng, k)]
     
-    return jsonify({'nearby_clinics': nearby})
+    return jsonify({'nearest_clinics': nearest})
+
+def _nearby_clinic_json(clinic, distance):
+    address = ", ".join(part for part in (clinic['area'], clinic['city']) if part)
+    return {
+        'id': clinic['id'],
+        'name': clinic['name'],
+        'slug': clinic['slug'],
+        'distance_km': round(distance, 1),
+        'rating': clinic['rating'],
+        'address': address,
+        'specialties': clinic['specialties'][:3]
+    }
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points using Haversine formula"""
@@ -7,6 +7,8 @@ from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from models import db, Clinic, Lead, CreditTransaction, Package
 from sqlalchemy import desc, func, text
+from credit_ledger import ledger as credit_ledger
+from lead_pricing_engine import lead_pricing
 import logging
 import razorpay
 import os
@@ -23,16 +25,6 @@ razorpay_client = razorpay.Client(auth=(
 class EnhancedCreditBillingService:
     """Enhanced service class for managing credit-based billing system."""
     
-    # Lead pricing tiers based on package price ranges
-    PRICING_TIERS = {
-        (0, 5000): 100,           # < ₹5,000 → 100 credits
-        (5000, 10000): 180,       # ₹5,000-₹10,000 → 180 credits  
-        (10000, 20000): 250,      # ₹10,000-₹20,000 → 250 credits
-        (20000, 50000): 320,      # ₹20,000-₹50,000 → 320 credits
-        (50000, 100000): 400,     # ₹50,000-₹100,000 → 400 credits
-        (100000, float('inf')): 500  # ₹100,000+ → 500 credits
-    }
-    
     # Promotional bonus structure
     BONUS_TIERS = {
         1000: 0,      # ₹1,000 → 0 bonus
@@ -45,65 +37,32 @@ class EnhancedCreditBillingService:
     @staticmethod
     def calculate_lead_cost(package_price):
         """Calculate lead cost based on package price range."""
-        for (min_price, max_price), cost in EnhancedCreditBillingService.PRICING_TIERS.items():
-            if min_price <= package_price < max_price:
-                return cost
-        return 500
+        return lead_pricing.lead_cost(package_price)
     
     @staticmethod
     def get_clinic_credit_balance(clinic_id):
         """Get current credit balance for a clinic."""
         try:
-            result = db.session.execute(text("""
-                SELECT COALESCE(
-                    (SELECT SUM(amount) FROM credit_transactions 
-                     WHERE clinic_id = :clinic_id AND transaction_type IN ('credit', 'bonus', 'refund')) -
-                    (SELECT SUM(ABS(amount)) FROM credit_transactions 
-                     WHERE clinic_id = :clinic_id AND transaction_type = 'deduction'), 
-                    0
-                ) as balance
-            """), {"clinic_id": clinic_id}).scalar()
-            
-            # Update clinic table with current balance
-            db.session.execute(text("""
-                UPDATE clinics SET credit_balance = :balance WHERE id = :clinic_id
-            """), {"balance": result, "clinic_id": clinic_id})
-            db.session.commit()
-            
-            return result or 0
-            
+            return credit_ledger.balance(clinic_id)
         except Exception as e:
             logger.error(f"Error getting credit balance for clinic {clinic_id}: {e}")
-            db.session.rollback()
             return 0
     
     @staticmethod
     def deduct_credits_for_lead(clinic_id, lead_id, package_price, description=None):
-        """Deduct credits when a lead is generated."""
+        """Deduct credits when a lead is generated (allows a negative balance)."""
         try:
             # Calculate cost
             credit_cost = EnhancedCreditBillingService.calculate_lead_cost(package_price)
             
-            # Check current balance (allow negative)
-            current_balance = EnhancedCreditBillingService.get_clinic_credit_balance(clinic_id)
-            
-            # Create deduction transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions (
-                    clinic_id, transaction_type, amount, description, lead_id, 
-                    status, created_at, processed_at
-                ) VALUES (
-                    :clinic_id, 'deduction', :amount, :description, :lead_id,
-                    'completed', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-                ) RETURNING id
-            """), {
-                "clinic_id": clinic_id,
-                "amount": -credit_cost,
-                "description": description or f"Lead generation cost for package worth ₹{package_price:,}",
-                "lead_id": lead_id
-            })
-            
-            transaction_id = db.session.execute(text("SELECT lastval()")).scalar()
+            posting = credit_ledger.post(
+                clinic_id, -credit_cost, 'deduction',
+                description=description or f"Lead generation cost for package worth ₹{package_price:,}",
+                idempotency_key=f'lead:{lead_id}',
+                lead_id=lead_id
+            )
+            if posting['duplicate']:
+                return {'success': False, 'error': 'Credits already deducted for this lead'}
             
             # Update lead with billing info
             db.session.execute(text("""
@@ -116,16 +75,14 @@ class EnhancedCreditBillingService:
             
             db.session.commit()
             
-            # Update clinic balance
-            new_balance = EnhancedCreditBillingService.get_clinic_credit_balance(clinic_id)
-            
+            new_balance = posting['new_balance']
             logger.info(f"Deducted {credit_cost} credits for lead {lead_id}. New balance: {new_balance}")
             
             return {
                 'success': True,
                 'credits_deducted': credit_cost,
                 'new_balance': new_balance,
-                'transaction_id': transaction_id
+                'transaction_id': posting['transaction_id']
             }
             
         except Exception as e:
@@ -134,39 +91,31 @@ class EnhancedCreditBillingService:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def add_credits(clinic_id, amount, transaction_type='credit', description=None, order_id=None, payment_id=None):
-        """Add credits to clinic account."""
+    def add_credits(clinic_id, amount, transaction_type='credit', description=None, order_id=None, payment_id=None,
+                    idempotency_key=None):
+        """Add credits to clinic account; a repeated idempotency_key is a no-op."""
         try:
-            result = db.session.execute(text("""
-                INSERT INTO credit_transactions (
-                    clinic_id, transaction_type, amount, description, order_id, 
-                    payment_id, status, created_at, processed_at
-                ) VALUES (
-                    :clinic_id, :transaction_type, :amount, :description, :order_id,
-                    :payment_id, 'completed', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-                ) RETURNING id
-            """), {
-                "clinic_id": clinic_id,
-                "transaction_type": transaction_type,
-                "amount": amount,
-                "description": description,
-                "order_id": order_id,
-                "payment_id": payment_id
-            })
-            
-            transaction_id = result.scalar()
+            posting = credit_ledger.post(
+                clinic_id, amount, transaction_type,
+                description=description,
+                idempotency_key=idempotency_key,
+                order_id=order_id,
+                payment_id=payment_id
+            )
             db.session.commit()
             
-            # Update clinic balance
-            new_balance = EnhancedCreditBillingService.get_clinic_credit_balance(clinic_id)
-            
-            logger.info(f"Added {amount} credits ({transaction_type}) for clinic {clinic_id}. New balance: {new_balance}")
+            new_balance = posting['new_balance']
+            if posting['duplicate']:
+                logger.info(f"Credits for {idempotency_key} already added to clinic {clinic_id}")
+            else:
+                logger.info(f"Added {amount} credits ({transaction_type}) for clinic {clinic_id}. New balance: {new_balance}")
             
             return {
                 'success': True,
-                'credits_added': amount,
+                'duplicate': posting['duplicate'],
+                'credits_added': 0 if posting['duplicate'] else amount,
                 'new_balance': new_balance,
-                'transaction_id': transaction_id
+                'transaction_id': posting['transaction_id']
             }
             
         except Exception as e:
@@ -254,7 +203,7 @@ def billing_dashboard():
                              transactions=transactions,
                              monthly_stats=monthly_stats_dict,
                              credit_packages=credit_packages,
-                             pricing_tiers=EnhancedCreditBillingService.PRICING_TIERS)
+                             pricing_tiers=lead_pricing.table().ranges())
         
     except Exception as e:
         logger.error(f"Error in billing dashboard: {e}")
@@ -383,10 +332,12 @@ def razorpay_webhook():
                 transaction_type='credit',
                 description=f'Credit purchase via Razorpay - {credits} credits',
                 order_id=order_id,
-                payment_id=payment_id
+                payment_id=payment_id,
+                idempotency_key=f'razorpay:{payment_id}'
             )
             
-            if result['success']:
+            # Razorpay retries webhooks and verify_payment may already have credited this payment
+            if result['success'] and not result['duplicate']:
                 # Calculate and add bonus credits
                 bonus_credits = EnhancedCreditBillingService.calculate_bonus_credits(amount)
                 if bonus_credits > 0:
@@ -395,7 +346,8 @@ def razorpay_webhook():
                         amount=bonus_credits,
                         transaction_type='bonus',
                         description=f'Promotional bonus for purchase of {credits} credits',
-                        order_id=order_id
+                        order_id=order_id,
+                        idempotency_key=f'razorpay:{payment_id}:bonus'
                     )
                 
                 logger.info(f"Payment processed: {credits} credits + {bonus_credits} bonus for clinic {clinic_id}")
@@ -515,10 +467,12 @@ def verify_payment():
             transaction_type='credit',
             description=f'Credit purchase via Razorpay - {credits} credits',
             order_id=razorpay_order_id,
-            payment_id=razorpay_payment_id
+            payment_id=razorpay_payment_id,
+            idempotency_key=f'razorpay:{razorpay_payment_id}'
         )
         
-        if result['success']:
+        # The webhook may have credited this payment already
+        if result['success'] and not result['duplicate']:
             # Calculate and add bonus credits
             bonus_credits = EnhancedCreditBillingService.calculate_bonus_credits(amount)
             if bonus_credits > 0:
@@ -527,7 +481,8 @@ def verify_payment():
                     amount=bonus_credits,
                     transaction_type='bonus',
                     description=f'Promotional bonus for purchase of {credits} credits',
-                    order_id=razorpay_order_id
+                    order_id=razorpay_order_id,
+                    idempotency_key=f'razorpay:{razorpay_payment_id}:bonus'
                 )
                 result['bonus_credits'] = bonus_credits
             
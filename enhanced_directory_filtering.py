@@ -6,6 +6,9 @@ from models import db, Clinic, Doctor, Procedure, Package, Category
 from sqlalchemy import text, or_, and_, func
 import json
 
+from facet_engine import (clinic_facets, doctor_facets, procedure_facets, cumulative,
+                          RATING_THRESHOLDS, EXPERIENCE_THRESHOLDS)
+
 directory_bp = Blueprint('directory', __name__)
 
 @directory_bp.route('/clinics')
@@ -85,7 +88,7 @@ def clinic_directory():
     total_clinics = db.session.execute(text(count_query), params).scalar()
     
     # Get filter options
-    filter_options = get_clinic_filter_options()
+    filter_options = get_clinic_filter_options(request.args)
     
     # Pagination info
     total_pages = (total_clinics + limit - 1) // limit
@@ -193,7 +196,7 @@ def doctor_directory():
     total_doctors = db.session.execute(text(count_query), params).scalar()
     
     # Get filter options
-    filter_options = get_doctor_filter_options()
+    filter_options = get_doctor_filter_options(request.args)
     
     # Pagination info
     total_pages = (total_doctors + limit - 1) // limit
@@ -306,7 +309,7 @@ def procedure_directory():
     total_procedures = db.session.execute(text(count_query), params).scalar()
     
     # Get filter options
-    filter_options = get_procedure_filter_options()
+    filter_options = get_procedure_filter_options(request.args)
     
     # Pagination info
     total_pages = (total_procedures + limit - 1) // limit
@@ -373,107 +376,70 @@ def search_suggestions():
     
     return jsonify(suggestions[:10])
 
-def get_clinic_filter_options():
-    """Get available filter options for clinics."""
-    # Get cities
-    cities = db.session.execute(text("""
-        SELECT DISTINCT city, COUNT(*) as count
-        FROM clinics 
-        WHERE is_approved = true AND city IS NOT NULL
-        GROUP BY city 
-        ORDER BY count DESC, city ASC
-    """)).fetchall()
-    
-    # Get specialties
-    specialties = db.session.execute(text("""
-        SELECT DISTINCT unnest(specialties) as specialty, COUNT(*) as count
-        FROM clinics 
-        WHERE is_approved = true AND specialties IS NOT NULL
-        GROUP BY specialty 
-        ORDER BY count DESC, specialty ASC
-    """)).fetchall()
+def _facet_options(entries):
+    return [{'name': entry['value'], 'count': entry['count']} for entry in entries]
+
+def _threshold_options(entries, thresholds, labels):
+    counts = {entry['value']: entry['count'] for entry in cumulative(entries, thresholds)}
+    return [{'value': value, 'label': labels[value], 'count': counts.get(value, 0)} for value in thresholds]
+
+RATING_LABELS = {'4.5': '4.5+ Stars', '4.0': '4.0+ Stars', '3.5': '3.5+ Stars', '3.0': '3.0+ Stars'}
+
+def get_clinic_filter_options(filters=None):
+    """Get available filter options for clinics, counted against the other active filters."""
+    facets = clinic_facets.counts(filters, db)['facets']
     
     return {
-        'cities': [{'name': row.city, 'count': row.count} for row in cities],
-        'specialties': [{'name': row.specialty, 'count': row.count} for row in specialties],
-        'rating_options': [
-            {'value': '4.5', 'label': '4.5+ Stars'},
-            {'value': '4.0', 'label': '4.0+ Stars'},
-            {'value': '3.5', 'label': '3.5+ Stars'},
-            {'value': '3.0', 'label': '3.0+ Stars'}
-        ]
+        'cities': _facet_options(facets['city']),
+        'specialties': _facet_options(facets['specialty']),
+        'rating_options': _threshold_options(facets['rating'], RATING_THRESHOLDS, RATING_LABELS)
     }
 
-def get_doctor_filter_options():
-    """Get available filter options for doctors."""
-    # Get cities
-    cities = db.session.execute(text("""
-        SELECT DISTINCT city, COUNT(*) as count
-        FROM doctors 
-        WHERE verification_status = 'approved' AND city IS NOT NULL
-        GROUP BY city 
-        ORDER BY count DESC, city ASC
-    """)).fetchall()
-    
-    # Get specialties
-    specialties = db.session.execute(text("""
-        SELECT DISTINCT specialty, COUNT(*) as count
-        FROM doctors 
-        WHERE verification_status = 'approved' AND specialty IS NOT NULL
-        GROUP BY specialty 
-        ORDER BY count DESC, specialty ASC
-    """)).fetchall()
+def get_doctor_filter_options(filters=None):
+    """Get available filter options for doctors, counted against the other active filters."""
+    facets = doctor_facets.counts(filters, db)['facets']
+    fee_counts = {entry['value']: entry['count'] for entry in facets['consultation_fee']}
+    fee_labels = [
+        ('free', 'Free Consultation'),
+        ('under_1000', 'Under ₹1,000'),
+        ('1000_2000', '₹1,000 - ₹2,000'),
+        ('over_2000', 'Over ₹2,000')
+    ]
     
     return {
-        'cities': [{'name': row.city, 'count': row.count} for row in cities],
-        'specialties': [{'name': row.specialty, 'count': row.count} for row in specialties],
-        'experience_options': [
-            {'value': '1', 'label': '1+ Years'},
-            {'value': '5', 'label': '5+ Years'},
-            {'value': '10', 'label': '10+ Years'},
-            {'value': '15', 'label': '15+ Years'}
-        ],
-        'fee_options': [
-            {'value': 'free', 'label': 'Free Consultation'},
-            {'value': 'under_1000', 'label': 'Under ₹1,000'},
-            {'value': '1000_2000', 'label': '₹1,000 - ₹2,000'},
-            {'value': 'over_2000', 'label': 'Over ₹2,000'}
-        ]
+        'cities': _facet_options(facets['city']),
+        'specialties': _facet_options(facets['specialty']),
+        'experience_options': _threshold_options(facets['experience'], EXPERIENCE_THRESHOLDS, {
+            '15': '15+ Years', '10': '10+ Years', '5': '5+ Years', '1': '1+ Years'
+        })[::-1],
+        'fee_options': [{'value': value, 'label': label, 'count': fee_counts.get(value, 0)}
+                        for value, label in fee_labels],
+        'rating_options': _threshold_options(facets['rating'], RATING_THRESHOLDS, RATING_LABELS)
     }
 
-def get_procedure_filter_options():
-    """Get available filter options for procedures."""
-    # Get body parts
-    body_parts = db.session.execute(text("""
-        SELECT DISTINCT body_part, COUNT(*) as count
-        FROM procedures 
-        WHERE body_part IS NOT NULL
-        GROUP BY body_part 
-        ORDER BY count DESC, body_part ASC
-    """)).fetchall()
-    
-    # Get categories
-    categories = db.session.execute(text("""
-        SELECT c.id, c.name, COUNT(p.id) as count
-        FROM categories c
-        LEFT JOIN procedures p ON c.id = p.category_id
-        GROUP BY c.id, c.name 
-        HAVING COUNT(p.id) > 0
-        ORDER BY count DESC, c.name ASC
-    """)).fetchall()
+def get_procedure_filter_options(filters=None):
+    """Get available filter options for procedures, counted against the other active filters."""
+    facets = procedure_facets.counts(filters, db)['facets']
+    price_counts = {entry['value']: entry['count'] for entry in facets['price']}
+    
+    categories = []
+    for entry in facets['category']:
+        category_id, _, name = entry['value'].partition(':')
+        if entry['count'] > 0:
+            categories.append({'id': int(category_id), 'name': name, 'count': entry['count']})
     
     return {
-        'body_parts': [{'name': row.body_part, 'count': row.count} for row in body_parts],
-        'categories': [{'id': row.id, 'name': row.name, 'count': row.count} for row in categories],
+        'body_parts': _facet_options(facets['body_part']),
+        'categories': categories,
         'price_ranges': [
-            {'value': 'under_50k', 'label': 'Under ₹50,000'},
-            {'value': '50k_100k', 'label': '₹50,000 - ₹1,00,000'},
-            {'value': '100k_200k', 'label': '₹1,00,000 - ₹2,00,000'},
-            {'value': 'over_200k', 'label': 'Over ₹2,00,000'}
+            {'value': 'under_50k', 'label': 'Under ₹50,000', 'count': price_counts.get('under_50k', 0)},
+            {'value': '50k_100k', 'label': '₹50,000 - ₹1,00,000', 'count': price_counts.get('50k_100k', 0)},
+            {'value': '100k_200k', 'label': '₹1,00,000 - ₹2,00,000', 'count': price_counts.get('100k_200k', 0)},
+            {'value': 'over_200k', 'label': 'Over ₹2,00,000', 'count': price_counts.get('over_200k', 0)}
         ],
         'duration_options': [
             {'value': 'under_1h', 'label': 'Under 1 Hour'},
             {'value': '1h_3h', 'label': '1-3 Hours'},
             {'value': 'over_3h', 'label': 'Over 3 Hours'}
         ]
-    }
\ No newline at end of file
+    }
@@ -7,6 +7,8 @@ from flask_login import login_required, current_user
 from datetime import datetime
 from sqlalchemy import text
 from models import db
+from credit_ledger import ledger as credit_ledger
+from lead_pricing_engine import lead_pricing
 import logging
 
 enhanced_lead_bp = Blueprint('enhanced_lead', __name__)
@@ -18,18 +20,13 @@ class LeadCreditService:
     @staticmethod
     def calculate_lead_cost(package_value):
         """Calculate credit cost based on package value using dynamic pricing."""
-        from dynamic_lead_pricing import DynamicPricingService
-        return DynamicPricingService.calculate_lead_cost(package_value)
+        return lead_pricing.lead_cost(package_value)
     
     @staticmethod
     def check_clinic_credit_balance(clinic_id):
         """Check if clinic has sufficient credits."""
         try:
-            result = db.session.execute(text("""
-                SELECT credit_balance FROM clinics WHERE id = :clinic_id
-            """), {"clinic_id": clinic_id}).fetchone()
-            
-            return result.credit_balance if result else 0
+            return credit_ledger.balance(clinic_id)
         except Exception as e:
             logger.error(f"Error checking credit balance: {e}")
             return 0
@@ -38,26 +35,12 @@ class LeadCreditService:
     def deduct_credits(clinic_id, credits, lead_id, description):
         """Deduct credits from clinic and record transaction."""
         try:
-            # Update clinic balance
-            db.session.execute(text("""
-                UPDATE clinics 
-                SET credit_balance = credit_balance - :credits,
-                    total_credits_used = total_credits_used + :credits
-                WHERE id = :clinic_id
-            """), {"credits": credits, "clinic_id": clinic_id})
-            
-            # Record transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions 
-                (clinic_id, transaction_type, amount, description, lead_id, status, created_at)
-                VALUES (:clinic_id, 'lead_deduction', :credits, :description, :lead_id, 'completed', :created_at)
-            """), {
-                "clinic_id": clinic_id,
-                "credits": -credits,
-                "description": description,
-                "lead_id": lead_id,
-                "created_at": datetime.utcnow()
-            })
+            credit_ledger.post(
+                clinic_id, -credits, 'lead_deduction',
+                description=description,
+                idempotency_key=f'lead:{lead_id}',
+                lead_id=lead_id
+            )
             
             return True
         except Exception as e:
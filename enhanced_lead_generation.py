@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, g, session
 from flask_login import current_user
 from app import db
+from credit_ledger import ledger as credit_ledger, InsufficientCredits
 from models import Lead, Clinic, Package, User
 from sqlalchemy import and_, or_, text
 
@@ -456,17 +457,6 @@ def create_lead_from_verified_data(data, skip_session_storage=False):
         # Calculate lead cost based on clinic tier and contact intent
         lead_cost = calculate_lead_cost(clinic, data['contact_intent'])
         
-        # Check clinic credit balance
-        if clinic.credit_balance < lead_cost:
-            # Create lead but mark as insufficient credits
-            payment_status = 'insufficient_credits'
-            logger.warning(f"Clinic {clinic.id} has insufficient credits for lead. Required: {lead_cost}, Available: {clinic.credit_balance}")
-        else:
-            # Deduct credits from clinic
-            clinic.credit_balance -= lead_cost
-            payment_status = 'paid'
-            logger.info(f"Deducted {lead_cost} credits from clinic {clinic.id}. New balance: {clinic.credit_balance}")
-        
         # Create the verified lead using only valid Lead model fields
         lead = Lead(
             patient_name=data['name'],
@@ -482,6 +472,25 @@ def create_lead_from_verified_data(data, skip_session_storage=False):
         
         # Save to database
         db.session.add(lead)
+        db.session.flush()
+        
+        # Charge the clinic; the check and the deduction are one statement, so
+        # concurrent leads cannot take the balance below zero
+        try:
+            posting = credit_ledger.post(
+                clinic.id, -lead_cost, 'lead_deduction',
+                description=f"Verified {data['contact_intent']} lead via {data['source_type']}",
+                idempotency_key=f'lead:{lead.id}',
+                allow_negative=False,
+                lead_id=lead.id
+            )
+            payment_status = 'paid'
+            logger.info(f"Deducted {lead_cost} credits from clinic {clinic.id}. New balance: {posting['new_balance']}")
+        except InsufficientCredits as e:
+            # Create lead but mark as insufficient credits
+            payment_status = 'insufficient_credits'
+            logger.warning(f"Clinic {clinic.id} has insufficient credits for lead. Required: {lead_cost}, Available: {e.balance}")
+        
         db.session.commit()
         
         logger.info(f"Created verified lead {lead.id} for clinic {clinic.id}")
@@ -15,6 +15,12 @@ from sqlalchemy import text
 from enhanced_highlights_handler import process_key_highlights
 from intelligent_procedure_generator import procedure_generator
 from auto_categorization import auto_categorize_package
+from cache_backend import cache as tiered_cache
+from cache_invalidation import (mark_dirty, PACKAGES, CLINICS, package_tag, clinic_tag,
+                                package_category_tag)
+from package_directory_query import PackageDirectoryQuery
+from buffered_counters import counters
+from facet_engine import package_facets, PACKAGE_PRICE_BUCKETS
 
 enhanced_package_bp = Blueprint('enhanced_package', __name__)
 logger = logging.getLogger(__name__)
@@ -354,6 +360,9 @@ def add_package_enhanced():
         result_row = create_result.fetchone()
         if result_row:
             package_id = result_row[0]
+            # Raw SQL bypasses ORM events, so queue cache tags explicitly
+            mark_dirty(PACKAGES, package_tag(package_id), clinic_tag(clinic['id']),
+                       package_category_tag(category) if category else None)
             db.session.commit()
             
             # Auto-categorize the package
@@ -633,6 +642,9 @@ def edit_package_enhanced(package_id):
             'clinic_id': clinic['id']
         })
         
+        # Raw SQL bypasses ORM events, so queue cache tags explicitly
+        mark_dirty(PACKAGES, package_tag(package_id), clinic_tag(clinic['id']),
+                   package_category_tag(category) if category else None)
         db.session.commit()
         
         logger.info(f"Package {package_id} updated successfully by clinic {clinic['id']}")
@@ -651,6 +663,23 @@ def edit_package_enhanced(package_id):
             'message': f'Error updating package: {str(e)}'
         }), 500
 
+def get_directory_filter_lists():
+    """Distinct package categories and clinic cities for the directory filters.
+    
+    Cached for hours and invalidated by package/clinic edits (cache tags).
+    """
+    def _load():
+        categories_sql = "SELECT DISTINCT category_name FROM package_categories ORDER BY category_name"
+        categories_result = db.session.execute(text(categories_sql)).fetchall()
+        
+        locations_sql = "SELECT DISTINCT city FROM clinics ORDER BY city"
+        locations_result = db.session.execute(text(locations_sql)).fetchall()
+        
+        return [row[0] for row in categories_result], [row[0] for row in locations_result]
+    
+    return tiered_cache.get_or_set('package_directory', 'filter_lists', _load,
+                                   ttl=21600, tags=(PACKAGES, CLINICS))
+
 @enhanced_package_bp.route('/packages/')
 def package_directory():
     """Enhanced package directory with filtering and search."""
@@ -663,167 +692,18 @@ def package_directory():
         min_price = request.args.get('min_price', '')
         max_price = request.args.get('max_price', '')
         search = request.args.get('search', '')
-        sort = request.args.get('sort', 'mixed')
         
-        # Base query
-        package_sql = """
-            SELECT p.*, c.name as clinic_name, c.city as clinic_city, c.contact_number as clinic_contact,
-                   c.overall_rating as clinic_rating, c.total_reviews as clinic_reviews
-            FROM packages p
-            JOIN clinics c ON p.clinic_id = c.id
-            WHERE p.is_active = true
-        """
-        
-        params = {}
-        
-        # Add filters
-        if category_id:
-            # Filter by new hierarchical categories (including child categories)
-            package_sql += """ AND p.id IN (
-                SELECT DISTINCT ec.entity_id 
-                FROM entity_categories ec 
-                JOIN category_hierarchy ch ON ec.category_id = ch.id
-                WHERE ec.entity_type = 'package' 
-                  AND (ch.id = :category_id OR ch.parent_id = :category_id 
-                       OR ch.parent_id IN (SELECT id FROM category_hierarchy WHERE parent_id = :category_id))
-            )"""
-            params['category_id'] = category_id
-        elif category:
-            # Fallback to old category filtering
-            package_sql += " AND p.category ILIKE :category"
-            params['category'] = f'%{category}%'
-            
-        if location:
-            package_sql += " AND (c.city ILIKE :location OR c.state ILIKE :location)"
-            params['location'] = f'%{location}%'
-            
-        if search:
-            package_sql += " AND (p.title ILIKE :search OR p.description ILIKE :search OR c.name ILIKE :search OR p.id IN (SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :search))"
-            params['search'] = f'%{search}%'
-            
-        # Handle custom price range
-        if min_price and max_price:
-            try:
-                min_price_val = float(min_price)
-                max_price_val = float(max_price)
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN :min_price AND :max_price"
-                params['min_price'] = min_price_val
-                params['max_price'] = max_price_val
-            except ValueError:
-                pass
-        elif min_price:
-            try:
-                min_price_val = float(min_price)
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) >= :min_price"
-                params['min_price'] = min_price_val
-            except ValueError:
-                pass
-        elif max_price:
-            try:
-                max_price_val = float(max_price)
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) <= :max_price"
-                params['max_price'] = max_price_val
-            except ValueError:
-                pass
-        elif price_range:
-            # Handle preset price ranges
-            if price_range == '0-50000':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) < 50000"
-            elif price_range == '50000-100000':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 50000 AND 100000"
-            elif price_range == '100000-200000':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 100000 AND 200000"
-            elif price_range == '200000+':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) > 200000"
-        
-        # Add sorting - mixed by default for variety
-        if sort == 'price_low':
-            package_sql += " ORDER BY COALESCE(p.price_discounted, p.price_actual) ASC"
-        elif sort == 'price_high':
-            package_sql += " ORDER BY COALESCE(p.price_discounted, p.price_actual) DESC"
-        elif sort == 'rating':
-            package_sql += " ORDER BY c.overall_rating DESC NULLS LAST"
-        elif sort == 'popularity':
-            package_sql += " ORDER BY c.total_reviews DESC NULLS LAST"
-        elif sort == 'newest':
-            package_sql += " ORDER BY p.created_at DESC"
-        else:  # mixed (default) - randomized to show variety of clinics
-            package_sql += " ORDER BY RANDOM()"
-        
-        # Get total count for pagination (before adding LIMIT)
-        # Create a cleaner count query by building it separately to avoid string replacement issues
-        count_sql = """
-            SELECT COUNT(DISTINCT p.id)
-            FROM packages p
-            JOIN clinics c ON p.clinic_id = c.id
-            WHERE p.is_active = true
-        """
-        
-        # Add the same filters to count query
-        if category_id:
-            # Filter by new hierarchical categories (including child categories)
-            count_sql += """ AND p.id IN (
-                SELECT DISTINCT ec.entity_id 
-                FROM entity_categories ec 
-                JOIN category_hierarchy ch ON ec.category_id = ch.id
-                WHERE ec.entity_type = 'package' 
-                  AND (ch.id = :category_id OR ch.parent_id = :category_id 
-                       OR ch.parent_id IN (SELECT id FROM category_hierarchy WHERE parent_id = :category_id))
-            )"""
-        elif category:
-            count_sql += " AND p.category ILIKE :category"
-            
-        if location:
-            count_sql += " AND (c.city ILIKE :location OR c.state ILIKE :location)"
-            
-        if search:
-            count_sql += " AND (p.title ILIKE :search OR p.description ILIKE :search OR c.name ILIKE :search OR p.id IN (SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :search))"
-            
-        # Handle custom price range for count query
-        if min_price and max_price:
-            try:
-                min_price_val = float(min_price)
-                max_price_val = float(max_price)
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN :min_price AND :max_price"
-            except ValueError:
-                pass
-        elif min_price:
-            try:
-                min_price_val = float(min_price)
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) >= :min_price"
-            except ValueError:
-                pass
-        elif max_price:
-            try:
-                max_price_val = float(max_price)
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) <= :max_price"
-            except ValueError:
-                pass
-        elif price_range:
-            # Handle preset price ranges for count query
-            if price_range == '0-50000':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) < 50000"
-            elif price_range == '50000-100000':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 50000 AND 100000"
-            elif price_range == '100000-200000':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 100000 AND 200000"
-            elif price_range == '200000+':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) > 200000"
-        
-        total_count = db.session.execute(text(count_sql), params).scalar()
+        # Shared filters, keyset pagination and cached count (see package_directory_query.py)
+        directory_query = PackageDirectoryQuery(request.args)
+        total_count = directory_query.total_count(db)
         logger.info(f"Package directory total_count: {total_count}")
         
-        # Add pagination limit for "Show More" functionality
+        # First page for "Show More" functionality; later pages continue from next_cursor
         limit = 20  # Show 20 packages initially
-        package_sql += " LIMIT :limit"
-        params['limit'] = limit
-        
-        packages_result = db.session.execute(text(package_sql), params).fetchall()
+        page_packages, next_cursor = directory_query.fetch_page(db, limit=limit)
         packages = []
         
-        for row in packages_result:
-            package = dict(row._mapping)
-            
+        for package in page_packages:
             # Parse JSON fields safely for directory display
             if package.get('results_gallery'):
                 try:
@@ -874,23 +754,18 @@ def package_directory():
             packages.append(package)
         
         # Get unique categories and locations for filters (using new many-to-many structure)
-        categories_sql = "SELECT DISTINCT category_name FROM package_categories ORDER BY category_name"
-        categories_result = db.session.execute(text(categories_sql)).fetchall()
-        categories = [row[0] for row in categories_result]
-        
-        locations_sql = "SELECT DISTINCT city FROM clinics ORDER BY city"
-        locations_result = db.session.execute(text(locations_sql)).fetchall()
-        locations = [row[0] for row in locations_result]
+        categories, locations = get_directory_filter_lists()
         
         # Create filter_params object for template
         filter_params = {
             'category': category,
+            'category_id': category_id,
             'location': location,
             'price_range': price_range,
             'min_price': min_price,
             'max_price': max_price,
             'search': search,
-            'sort': sort
+            'sort': directory_query.sort
         }
         
         # Add pagination variables that template expects
@@ -906,7 +781,9 @@ def package_directory():
                              # Pagination variables for "Show More" functionality
                              total_count=total_count,
                              showing_count=len(packages),
-                             has_more=total_count > limit,
+                             has_more=next_cursor is not None,
+                             next_cursor=next_cursor,
+                             shuffle_seed=directory_query.seed,
                              page=1,
                              total_pages=1,
                              has_prev=False,
@@ -922,157 +799,23 @@ def package_directory():
 def api_packages_load_more():
     """API endpoint for loading more packages (Show More functionality)."""
     try:
-        # Get pagination parameters
+        # Get pagination parameters; offset is only used by clients without a cursor
         offset = request.args.get('offset', 0, type=int)
         limit = request.args.get('limit', 20, type=int)
         
-        # Get filter parameters (same as main packages route)
-        category = request.args.get('category', '')
-        location = request.args.get('location', '')
-        price_range = request.args.get('price_range', '')
-        min_price = request.args.get('min_price', '')
-        max_price = request.args.get('max_price', '')
-        search = request.args.get('search', '')
-        sort = request.args.get('sort', 'mixed')
-        
-        # Base query (same as main route)
-        package_sql = """
-            SELECT p.*, c.name as clinic_name, c.city as clinic_city, c.contact_number as clinic_contact,
-                   c.overall_rating as clinic_rating, c.total_reviews as clinic_reviews
-            FROM packages p
-            JOIN clinics c ON p.clinic_id = c.id
-            WHERE p.is_active = true
-        """
-        
-        params = {}
-        
-        # Add filters (same logic as main route) - using new many-to-many category structure
-        if category:
-            package_sql += " AND p.id IN (SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :category)"
-            params['category'] = f'%{category}%'
-            
-        if location:
-            package_sql += " AND (c.city ILIKE :location OR c.state ILIKE :location)"
-            params['location'] = f'%{location}%'
-            
-        if search:
-            package_sql += " AND (p.title ILIKE :search OR p.description ILIKE :search OR c.name ILIKE :search OR p.id IN (SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :search))"
-            params['search'] = f'%{search}%'
-            
-        # Handle price filtering
-        if min_price and max_price:
-            try:
-                min_price_val = float(min_price)
-                max_price_val = float(max_price)
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN :min_price AND :max_price"
-                params['min_price'] = min_price_val
-                params['max_price'] = max_price_val
-            except ValueError:
-                pass
-        elif min_price:
-            try:
-                min_price_val = float(min_price)
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) >= :min_price"
-                params['min_price'] = min_price_val
-            except ValueError:
-                pass
-        elif max_price:
-            try:
-                max_price_val = float(max_price)
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) <= :max_price"
-                params['max_price'] = max_price_val
-            except ValueError:
-                pass
-        elif price_range:
-            # Handle preset price ranges
-            if price_range == '0-50000':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) < 50000"
-            elif price_range == '50000-100000':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 50000 AND 100000"
-            elif price_range == '100000-200000':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 100000 AND 200000"
-            elif price_range == '200000+':
-                package_sql += " AND COALESCE(p.price_discounted, p.price_actual) > 200000"
-        
-        # Add sorting - mixed by default for variety
-        if sort == 'price_low':
-            package_sql += " ORDER BY COALESCE(p.price_discounted, p.price_actual) ASC"
-        elif sort == 'price_high':
-            package_sql += " ORDER BY COALESCE(p.price_discounted, p.price_actual) DESC"
-        elif sort == 'rating':
-            package_sql += " ORDER BY c.overall_rating DESC NULLS LAST"
-        elif sort == 'popularity':
-            package_sql += " ORDER BY c.total_reviews DESC NULLS LAST"
-        elif sort == 'newest':
-            package_sql += " ORDER BY p.created_at DESC"
-        else:  # mixed (default) - randomized to show variety of clinics
-            package_sql += " ORDER BY RANDOM()"
-        
-        # Get total count - build separate count query to avoid string replacement issues
-        count_sql = """
-            SELECT COUNT(DISTINCT p.id)
-            FROM packages p
-            JOIN clinics c ON p.clinic_id = c.id
-            WHERE p.is_active = true
-        """
-        
-        # Add the same filters to count query as main query
-        if category:
-            count_sql += " AND p.id IN (SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :category)"
-            
-        if location:
-            count_sql += " AND (c.city ILIKE :location OR c.state ILIKE :location)"
-            
-        if search:
-            count_sql += " AND (p.title ILIKE :search OR p.description ILIKE :search OR c.name ILIKE :search OR p.id IN (SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :search))"
-            
-        # Handle price filtering for count query
-        if min_price and max_price:
-            try:
-                min_price_val = float(min_price)
-                max_price_val = float(max_price)
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN :min_price AND :max_price"
-            except ValueError:
-                pass
-        elif min_price:
-            try:
-                min_price_val = float(min_price)
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) >= :min_price"
-            except ValueError:
-                pass
-        elif max_price:
-            try:
-                max_price_val = float(max_price)
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) <= :max_price"
-            except ValueError:
-                pass
-        elif price_range:
-            # Handle preset price ranges for count query
-            if price_range == '0-50000':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) < 50000"
-            elif price_range == '50000-100000':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 50000 AND 100000"
-            elif price_range == '100000-200000':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) BETWEEN 100000 AND 200000"
-            elif price_range == '200000+':
-                count_sql += " AND COALESCE(p.price_discounted, p.price_actual) > 200000"
-        
-        total_count = db.session.execute(text(count_sql), params).scalar()
-        
-        # Add pagination
-        package_sql += " LIMIT :limit OFFSET :offset"
-        params['limit'] = limit
-        params['offset'] = offset
-        
-        packages_result = db.session.execute(text(package_sql), params).fetchall()
-        packages = [dict(row._mapping) for row in packages_result]
+        # Same filters, sort and shuffle seed as the directory page
+        directory_query = PackageDirectoryQuery(request.args)
+        total_count = directory_query.total_count(db)
+        packages, next_cursor = directory_query.fetch_page(db, limit=limit, offset=offset)
         
         return jsonify({
             'success': True,
             'packages': packages,
             'total_count': total_count,
             'showing_count': len(packages),
-            'has_more': (offset + len(packages)) < total_count
+            'has_more': next_cursor is not None,
+            'next_cursor': next_cursor,
+            'seed': directory_query.seed
         })
         
     except Exception as e:
@@ -1155,9 +898,8 @@ def package_detail(slug):
         else:
             package['results_gallery'] = []
         
-        # Update view count
-        db.session.execute(text("UPDATE packages SET view_count = COALESCE(view_count, 0) + 1 WHERE id = :id"), {'id': package['id']})
-        db.session.commit()
+        # Update view count (buffered, written by the periodic counter flush)
+        counters.increment('package_views', package['id'])
         
         # Get clinic data for ratings and reviews
         clinic_sql = """
@@ -1386,56 +1128,34 @@ def search_locations():
 def get_filter_data():
     """Get filter data with real-time updates."""
     try:
-        # Get price range statistics
-        price_stats_sql = """
-            SELECT 
-                MIN(COALESCE(price_discounted, price_actual)) as min_price,
-                MAX(COALESCE(price_discounted, price_actual)) as max_price,
-                AVG(COALESCE(price_discounted, price_actual)) as avg_price,
-                COUNT(*) as total_packages
-            FROM packages 
-            WHERE is_active = true
-        """
-        price_stats = db.session.execute(text(price_stats_sql)).fetchone()
-        
-        # Get price distribution for histogram
-        price_ranges = [
-            {'min': 0, 'max': 25000, 'label': 'Under ₹25K'},
-            {'min': 25000, 'max': 50000, 'label': '₹25K - ₹50K'},
-            {'min': 50000, 'max': 100000, 'label': '₹50K - ₹1L'},
-            {'min': 100000, 'max': 200000, 'label': '₹1L - ₹2L'},
-            {'min': 200000, 'max': 500000, 'label': '₹2L - ₹5L'},
-            {'min': 500000, 'max': 10000000, 'label': 'Above ₹5L'}
-        ]
+        # Stats and histogram come from one cached facet query, narrowed by any active filters
+        result = package_facets.counts(request.args, db)
+        stats = result['stats']
+        bucket_counts = {entry['value']: entry['count'] for entry in result['facets']['price']}
+        price_labels = {
+            '0-50000': 'Under ₹50K',
+            '50000-100000': '₹50K - ₹1L',
+            '100000-200000': '₹1L - ₹2L',
+            '200000+': 'Above ₹2L'
+        }
         
         distribution = []
-        for range_data in price_ranges:
-            count_sql = """
-                SELECT COUNT(*) 
-                FROM packages 
-                WHERE is_active = true 
-                AND COALESCE(price_discounted, price_actual) >= :min_price
-                AND COALESCE(price_discounted, price_actual) < :max_price
-            """
-            count_result = db.session.execute(text(count_sql), {
-                'min_price': range_data['min'],
-                'max_price': range_data['max']
-            }).fetchone()
-            
+        for bucket, min_price, max_price in PACKAGE_PRICE_BUCKETS:
             distribution.append({
-                'range': range_data['label'],
-                'count': count_result[0] if count_result else 0,
-                'min': range_data['min'],
-                'max': range_data['max']
+                'range': price_labels[bucket],
+                'value': bucket,  # Pass back as price_range
+                'count': bucket_counts.get(bucket, 0),
+                'min': min_price,
+                'max': max_price
             })
         
         return jsonify({
             'success': True,
             'price_stats': {
-                'min_price': float(price_stats[0]) if price_stats[0] else 0,
-                'max_price': float(price_stats[1]) if price_stats[1] else 1000000,
-                'avg_price': float(price_stats[2]) if price_stats[2] else 50000,
-                'total_packages': price_stats[3] if price_stats[3] else 0
+                'min_price': float(stats['min_price']) if stats.get('min_price') else 0,
+                'max_price': float(stats['max_price']) if stats.get('max_price') else 1000000,
+                'avg_price': float(stats['avg_price']) if stats.get('avg_price') else 50000,
+                'total_packages': result['total'] or 0
             },
             'price_distribution': distribution
         })
@@ -0,0 +1,364 @@
+"""
+Background job queue for face analysis.
+
+The upload request only saves the image and creates a ``FaceAnalysis`` row
+with status ``queued``; validation, optimisation and the Gemini + MediaPipe
+analysis run in a worker pool and the results page polls
+``/face-analysis/status/<id>`` until the job finishes.
+
+Pool modes (``FACE_ANALYSIS_EXECUTOR``):
+
+- ``process`` (default): a spawn-context process pool of
+  ``FACE_ANALYSIS_WORKERS`` processes. Workers never touch the database;
+  they report stage changes over a queue and return the analysis result.
+- ``local``: the same pipeline on in-process threads, for tests and local
+  development.
+
+A single persister thread per gunicorn worker applies stage changes and
+results to the database. At most ``FACE_ANALYSIS_MAX_PENDING`` jobs are
+accepted per gunicorn worker; beyond that uploads are refused instead of
+queueing for minutes. An analysis process that dies (a MediaPipe crash, the
+OOM killer) breaks a process pool for good, so a broken pool is replaced on
+the next upload; jobs that could not be queued are failed, never left
+``queued``.
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODE = os.environ.get('FACE_ANALYSIS_EXECUTOR', 'process')
+WORKERS = int(os.environ.get('FACE_ANALYSIS_WORKERS', 2))
+MAX_PENDING = int(os.environ.get('FACE_ANALYSIS_MAX_PENDING', 20))
+STALE_AFTER = timedelta(minutes=10)  # A job still pending after this was lost with its worker
+
+QUEUED = 'queued'
+VALIDATING = 'validating'
+OPTIMIZING = 'optimizing'
+ANALYZING = 'analyzing'
+SAVING = 'saving'
+COMPLETED = 'completed'
+FAILED = 'failed'
+REJECTED = 'rejected'
+
+PENDING_STATUSES = (QUEUED, VALIDATING, OPTIMIZING, ANALYZING, SAVING)
+
+STATUS_MESSAGES = {
+    QUEUED: 'Waiting for an analysis slot...',
+    VALIDATING: 'Checking image quality and face position...',
+    OPTIMIZING: 'Preparing your image...',
+    ANALYZING: 'Analyzing facial features...',
+    SAVING: 'Saving your results...',
+    COMPLETED: 'Analysis complete',
+    FAILED: 'Analysis failed',
+    REJECTED: 'Image quality is too poor for accurate analysis',
+}
+
+
+# ---- worker side (no Flask app, no database) ---------------------------------
+
+_progress = None
+
+
+def _init_worker(progress_queue):
+    global _progress
+    _progress = progress_queue
+    from utils.face_mesh_pool import warm_up
+    warm_up()  # Load FaceMesh now rather than on this worker's first upload
+
+
+def _report(analysis_id, status):
+    if _progress is not None:
+        try:
+            _progress.put((analysis_id, status))
+        except Exception:
+            pass  # Progress is cosmetic; never fail the job over it
+
+
+def _validation_summary(validation):
+    return {
+        'is_valid': bool(validation.get('is_valid')),
+        'validation_score': float(validation.get('validation_score', 0.0)),
+        'issues': list(validation.get('issues', [])),
+        'recommendations': list(validation.get('recommendations', [])),
+    }
+
+
+def run_face_analysis(analysis_id, file_path, user_info):
+    """Validate, optimise and analyse one image; returns an outcome dict."""
+    from utils.face_image_pipeline import FaceImage
+    from utils.image_validation import validate_face_image
+    from utils.gemini_analysis import analyze_face_image_enhanced
+
+    _report(analysis_id, VALIDATING)
+    try:
+        # Decoded once; validation, Gemini and the geometric analysis share the buffer and landmarks
+        face_image = FaceImage.open(file_path)
+    except Exception as e:
+        logger.error(f"Could not decode uploaded image {file_path}: {e}")
+        face_image = None
+    validation = _validation_summary(validate_face_image(face_image))
+    if not validation['is_valid'] and validation['validation_score'] < 0.5:
+        return {'status': REJECTED, 'file_path': file_path, 'validation': validation,
+                'face_mesh': _face_mesh_stats()}
+
+    _report(analysis_id, OPTIMIZING)
+    try:
+        file_path = face_image.save_optimized()
+    except Exception as e:
+        logger.warning(f"Image optimization failed, proceeding with original: {e}")
+
+    _report(analysis_id, ANALYZING)
+    result = analyze_face_image_enhanced(file_path, user_info, face_image=face_image)
+    return {
+        'status': FAILED if 'error' in result else COMPLETED,
+        'file_path': file_path,
+        'validation': validation,
+        'result': result,
+        'face_mesh': _face_mesh_stats(),
+    }
+
+
+def _face_mesh_stats():
+    from utils.face_mesh_pool import stats
+    return stats()
+
+
+# ---- web worker side ---------------------------------------------------------
+
+class FaceAnalysisJobQueue:
+    """Per-gunicorn-worker pool plus the thread that persists job progress."""
+
+    def __init__(self, mode=EXECUTOR_MODE, workers=WORKERS, max_pending=MAX_PENDING, job=run_face_analysis):
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self.job = job
+        self._pid = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress = None
+        self._events = queue.Queue()
+        self._pending = 0
+        self._app = None
+        self._face_mesh_stats = {}  # Analysis worker pid -> FaceMesh pool stats from its latest job
+
+    def _ensure_started(self):
+        # Pools and threads do not survive gunicorn's fork with preload_app, so start lazily per process
+        if self._pid == os.getpid():
+            return
+        from flask import current_app
+        self._app = current_app._get_current_object()
+        self._events = queue.Queue()
+        self._pending = 0
+        if self.mode == 'local':
+            self._progress = queue.Queue()
+        else:
+            self._progress = multiprocessing.get_context('spawn').Queue()
+        self._executor = self._new_executor()
+        self._pid = os.getpid()
+        threading.Thread(target=self._relay_progress, args=(self._progress,), daemon=True,
+                         name='face-analysis-progress').start()
+        threading.Thread(target=self._persist, daemon=True, name='face-analysis-persist').start()
+        logger.info(f"Face analysis job queue started ({self.mode}, {self.workers} workers)")
+
+    def _new_executor(self):
+        if self.mode == 'local':
+            return ThreadPoolExecutor(self.workers, thread_name_prefix='face-analysis',
+                                      initializer=_init_worker, initargs=(self._progress,))
+        context = multiprocessing.get_context('spawn')  # MediaPipe and gRPC are not fork-safe
+        return ProcessPoolExecutor(self.workers, mp_context=context,
+                                   initializer=_init_worker, initargs=(self._progress,))
+
+    def _replace_executor(self, broken):
+        with self._lock:
+            if self._executor is not broken:
+                return  # Another upload already replaced it
+            logger.warning(f"Face analysis pool is broken; starting a new one ({self.workers} workers)")
+            self._executor = self._new_executor()
+        broken.shutdown(wait=False)
+
+    def submit(self, analysis_id, file_path, user_info):
+        """
+        Queue a job; False when this worker already has ``max_pending`` jobs in
+        flight. A job that cannot be queued is reported as failed.
+        """
+        with self._lock:
+            self._ensure_started()
+            if self._pending >= self.max_pending:
+                return False
+            self._pending += 1
+        try:
+            future = self._submit(analysis_id, file_path, user_info)
+        except Exception as e:
+            logger.error(f"Could not queue face analysis {analysis_id}: {e}")
+            future = Future()
+            future.set_exception(e)
+        # The persister releases the pending slot and saves the outcome, failed or not
+        future.add_done_callback(lambda done: self._events.put(('done', analysis_id, done)))
+        return True
+
+    def _submit(self, analysis_id, file_path, user_info):
+        executor = self._executor
+        try:
+            return executor.submit(self.job, analysis_id, file_path, user_info)
+        except BrokenExecutor:
+            self._replace_executor(executor)
+            return self._executor.submit(self.job, analysis_id, file_path, user_info)
+
+    def pending(self):
+        return self._pending
+
+    def stats(self):
+        """Queue depth plus the FaceMesh pool stats each analysis worker last reported."""
+        return {
+            'mode': self.mode,
+            'workers': self.workers,
+            'pending': self._pending,
+            'max_pending': self.max_pending,
+            'face_mesh': list(self._face_mesh_stats.values()),
+        }
+
+    def _relay_progress(self, progress):
+        while True:
+            try:
+                analysis_id, status = progress.get()
+            except Exception:
+                time.sleep(1)
+                continue
+            self._events.put(('progress', analysis_id, status))
+
+    def _persist(self):
+        from app import db
+        while True:
+            kind, analysis_id, payload = self._events.get()
+            with self._app.app_context():
+                try:
+                    if kind == 'progress':
+                        set_status(db, analysis_id, payload)
+                    else:
+                        with self._lock:
+                            self._pending -= 1
+                        try:
+                            outcome = payload.result()
+                        except Exception as e:
+                            logger.error(f"Face analysis job {analysis_id} crashed: {e}")
+                            outcome = {'status': FAILED, 'result': {'error': str(e)}}
+                        if outcome.get('face_mesh'):
+                            self._face_mesh_stats[outcome['face_mesh']['pid']] = outcome['face_mesh']
+                        save_outcome(db, analysis_id, outcome)
+                except Exception as e:
+                    logger.error(f"Could not persist face analysis job {analysis_id} ({kind}): {e}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+
+def set_status(db, analysis_id, status, message=None):
+    """Move a still-pending analysis to ``status`` (finished jobs are never moved back)."""
+    from sqlalchemy import text, bindparam
+    db.session.execute(text("""
+        UPDATE face_analyses SET status = :status, status_message = :message
+        WHERE id = :id AND status IN :pending
+    """).bindparams(bindparam('pending', expanding=True)),
+        {'id': analysis_id, 'status': status, 'message': message or STATUS_MESSAGES.get(status),
+         'pending': list(PENDING_STATUSES)})
+    db.session.commit()
+
+
+def save_outcome(db, analysis_id, outcome):
+    """Store a finished job's analysis, recommendations and final status."""
+    from models import FaceAnalysis, FaceAnalysisRecommendation
+
+    analysis = FaceAnalysis.query.get(analysis_id)
+    if analysis is None:
+        return
+    status = outcome['status']
+    validation = outcome.get('validation')
+    result = outcome.get('result') or {}
+    if outcome.get('file_path'):
+        analysis.image_path = outcome['file_path']
+
+    if status == REJECTED:
+        analysis.analysis_data = {'error': STATUS_MESSAGES[REJECTED], 'image_validation': validation,
+                                  'timestamp': datetime.now().isoformat()}
+        analysis.status, analysis.status_message = REJECTED, STATUS_MESSAGES[REJECTED]
+        db.session.commit()
+        return
+
+    if status == FAILED:
+        error_message = result.get('error', STATUS_MESSAGES[FAILED])
+        logger.error(f"Analysis {analysis_id} returned error: {error_message}")
+        analysis.analysis_data = {'error': error_message, 'timestamp': datetime.now().isoformat()}
+        analysis.status, analysis.status_message = FAILED, error_message
+        db.session.commit()
+        return
+
+    set_status(db, analysis_id, SAVING)
+    if validation and not validation['is_valid']:
+        result['image_validation'] = validation
+    analysis.analysis_data = result
+
+    # Store geometric analysis data if available
+    if result.get('has_geometric_analysis'):
+        analysis.geometric_analysis_data = result.get('geometric_analysis')
+        analysis.mathematical_scores = result.get('mathematical_scores')
+        analysis.has_geometric_analysis = True
+    else:
+        analysis.has_geometric_analysis = False
+        logger.warning("Geometric analysis was not available")
+
+    for skin_item in result.get('skin_analysis', []):
+        db.session.add(FaceAnalysisRecommendation(
+            analysis_id=analysis.id,
+            recommendation_type='skin',
+            feature_name=skin_item.get('name', ''),
+            severity_score=skin_item.get('severity', 0.0),
+            recommendation_details=skin_item.get('details', ''),
+            treatment_options=skin_item.get('treatments', '')
+        ))
+    for structure_item in result.get('facial_structure', []):
+        db.session.add(FaceAnalysisRecommendation(
+            analysis_id=analysis.id,
+            recommendation_type='structure',
+            feature_name=structure_item.get('name', ''),
+            severity_score=structure_item.get('prominence', 0.0),
+            recommendation_details=structure_item.get('details', ''),
+            treatment_options=structure_item.get('treatments', ''),
+            needs_surgery=structure_item.get('needs_surgery', False)
+        ))
+    for surgery_item in result.get('surgical_recommendations', []):
+        db.session.add(FaceAnalysisRecommendation(
+            analysis_id=analysis.id,
+            recommendation_type='surgical',
+            feature_name=surgery_item.get('procedure_name', ''),
+            severity_score=surgery_item.get('urgency', 0.8),  # Default high urgency for surgical procedures
+            recommendation_details=f"For: {surgery_item.get('target_condition', '')}\n\n{surgery_item.get('description', '')}",
+            treatment_options=surgery_item.get('expected_outcomes', ''),
+            needs_surgery=True
+        ))
+
+    analysis.status, analysis.status_message = COMPLETED, STATUS_MESSAGES[COMPLETED]
+    db.session.commit()
+    logger.info(f"Face analysis completed for ID {analysis.id}")
+
+
+def expire_if_stale(db, analysis):
+    """Fail a job that has been pending too long (its worker was restarted mid-job)."""
+    if analysis.status in PENDING_STATUSES and analysis.created_at \
+            and datetime.utcnow() - analysis.created_at > STALE_AFTER:
+        analysis.status = FAILED
+        analysis.status_message = 'Analysis timed out. Please try again.'
+        analysis.analysis_data = {'error': analysis.status_message, 'timestamp': datetime.now().isoformat()}
+        db.session.commit()
+    return analysis
+
+
+face_analysis_jobs = FaceAnalysisJobQueue()
@@ -24,9 +24,9 @@ from werkzeug.utils import secure_filename
 
 from app import db
 from models import FaceAnalysis, FaceAnalysisRecommendation
-from utils.gemini_analysis import analyze_face_image, analyze_face_image_enhanced
-from utils.image_validation import validate_face_image
-from utils.image_compression import optimize_face_analysis_image
+from face_analysis_jobs import (face_analysis_jobs, expire_if_stale, QUEUED, FAILED, REJECTED,
+                                PENDING_STATUSES, STATUS_MESSAGES)
+from utils.face_mesh_pool import warm_up_in_background
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -34,6 +34,12 @@ logger = logging.getLogger(__name__)
 # Create the blueprint
 face_analysis = Blueprint('face_analysis', __name__, url_prefix='/face-analysis')
 
+
+@face_analysis.before_request
+def warm_face_meshes():
+    """Load this web worker's FaceMesh graphs while the user is still on the upload page."""
+    warm_up_in_background()
+
 # Configure upload settings
 UPLOAD_FOLDER = 'static/uploads/face_analysis'
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png'}
@@ -162,56 +168,17 @@ def upload():
             flash('Please upload an image or take a photo with the camera.', 'error')
             return redirect(url_for('face_analysis.index'))
         
-        # Validate image positioning and quality
-        logger.info(f"Validating image positioning for {file_path}")
-        validation_result = validate_face_image(file_path)
-        
-        # Check if image passes validation
-        if not validation_result['is_valid']:
-            logger.warning(f"Image failed validation: {validation_result['issues']}")
-            
-            # Create detailed error message with recommendations
-            error_message = "Image quality issues detected:\n"
-            for issue in validation_result['issues']:
-                error_message += f"• {issue}\n"
-            
-            error_message += "\nRecommendations for better results:\n"
-            for recommendation in validation_result['recommendations']:
-                error_message += f"• {recommendation}\n"
-            
-            flash(error_message, 'warning')
-            
-            # If validation score is very low, reject the image
-            if validation_result['validation_score'] < 0.5:
-                flash('Image quality is too poor for accurate analysis. Please retake the photo following the guidelines.', 'error')
-                return redirect(url_for('face_analysis.index'))
-            
-            # For moderate scores, warn but proceed
-            flash('Proceeding with analysis, but results may be less accurate due to image quality issues.', 'info')
-        
-        # Optimize image for face analysis (compress if needed)
-        try:
-            logger.info(f"Optimizing image for face analysis: {file_path}")
-            optimized_file_path = optimize_face_analysis_image(file_path)
-            
-            # Update file path if image was optimized
-            if optimized_file_path != file_path:
-                file_path = optimized_file_path
-                logger.info(f"Image optimized and saved to: {file_path}")
-        except Exception as e:
-            logger.warning(f"Image optimization failed, proceeding with original: {e}")
-            # Continue with original image if optimization fails
-        
-        # Create anonymous analysis record first
+        # Create the analysis record; validation and analysis run as a background job
         user_id = current_user.id if current_user.is_authenticated else None
         is_anonymous = not current_user.is_authenticated
         
-        # Create an empty analysis record
         analysis = FaceAnalysis()
         analysis.user_id = user_id
         analysis.image_path = file_path
         analysis.analysis_data = {}
         analysis.is_anonymous = is_anonymous
+        analysis.status = QUEUED
+        analysis.status_message = STATUS_MESSAGES[QUEUED]
         db.session.add(analysis)
         db.session.commit()
         
@@ -223,103 +190,15 @@ def upload():
             'history': treatment_history
         }
         
-        # Analyze the face using enhanced analysis (Gemini + Geometric)
-        logger.info(f"Calling analyze_face_image_enhanced with file_path={file_path}")
-        analysis_result = analyze_face_image_enhanced(file_path, user_info)
-        
-        # Check for errors in the analysis result
-        if 'error' in analysis_result:
-            error_message = analysis_result['error']
-            logger.error(f"Analysis returned error: {error_message}")
-            # Update error info in the analysis data
-            analysis.analysis_data = {
-                'error': error_message,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            try:
-                db.session.commit()
-            except Exception as db_error:
-                logger.error(f"Error commit failed: {db_error}")
-                db.session.rollback()
-            
-            if "API key" in error_message:
-                flash('API configuration error. Please contact the administrator.', 'error')
-            else:
-                flash(f'Analysis error: {error_message}', 'error')
-            return redirect(url_for('face_analysis.index'))
-        
-        # Update the analysis record with the results
-        logger.info("Updating database with analysis results")
-        analysis.analysis_data = analysis_result
-        
-        # Store geometric analysis data if available
-        if analysis_result.get('has_geometric_analysis'):
-            analysis.geometric_analysis_data = analysis_result.get('geometric_analysis')
-            analysis.mathematical_scores = analysis_result.get('mathematical_scores')
-            analysis.has_geometric_analysis = True
-            logger.info("Geometric analysis data stored successfully")
-        else:
-            analysis.has_geometric_analysis = False
-            logger.warning("Geometric analysis was not available")
-        
-        # Store skin analysis recommendations
-        logger.info(f"Processing {len(analysis_result.get('skin_analysis', []))} skin analysis recommendations")
-        for skin_item in analysis_result.get('skin_analysis', []):
-            try:
-                recommendation = FaceAnalysisRecommendation()
-                recommendation.analysis_id = analysis.id
-                recommendation.recommendation_type = 'skin'
-                recommendation.feature_name = skin_item.get('name', '')
-                recommendation.severity_score = skin_item.get('severity', 0.0)
-                recommendation.recommendation_details = skin_item.get('details', '')
-                recommendation.treatment_options = skin_item.get('treatments', '')
-                db.session.add(recommendation)
-            except Exception as e:
-                logger.error(f"Error adding skin recommendation: {e}")
-        
-        # Store facial structure recommendations
-        logger.info(f"Processing {len(analysis_result.get('facial_structure', []))} facial structure recommendations")
-        for structure_item in analysis_result.get('facial_structure', []):
-            try:
-                recommendation = FaceAnalysisRecommendation()
-                recommendation.analysis_id = analysis.id
-                recommendation.recommendation_type = 'structure'
-                recommendation.feature_name = structure_item.get('name', '')
-                recommendation.severity_score = structure_item.get('prominence', 0.0)
-                recommendation.recommendation_details = structure_item.get('details', '')
-                recommendation.treatment_options = structure_item.get('treatments', '')
-                recommendation.needs_surgery = structure_item.get('needs_surgery', False)
-                db.session.add(recommendation)
-            except Exception as e:
-                logger.error(f"Error adding structure recommendation: {e}")
-        
-        # Store surgical recommendations
-        logger.info(f"Processing {len(analysis_result.get('surgical_recommendations', []))} surgical recommendations")
-        for surgery_item in analysis_result.get('surgical_recommendations', []):
-            try:
-                recommendation = FaceAnalysisRecommendation()
-                recommendation.analysis_id = analysis.id
-                recommendation.recommendation_type = 'surgical'
-                recommendation.feature_name = surgery_item.get('procedure_name', '')
-                recommendation.severity_score = surgery_item.get('urgency', 0.8)  # Default high urgency for surgical procedures
-                recommendation.recommendation_details = f"For: {surgery_item.get('target_condition', '')}\n\n{surgery_item.get('description', '')}"
-                recommendation.treatment_options = surgery_item.get('expected_outcomes', '')
-                recommendation.needs_surgery = True
-                db.session.add(recommendation)
-            except Exception as e:
-                logger.error(f"Error adding surgical recommendation: {e}")
-        
-        try:
+        if not face_analysis_jobs.submit(analysis.id, file_path, user_info):
+            analysis.status = FAILED
+            analysis.status_message = 'Too many analyses in progress'
+            analysis.analysis_data = {'error': analysis.status_message, 'timestamp': datetime.now().isoformat()}
             db.session.commit()
-            logger.info(f"Face analysis completed for ID {analysis.id}")
-        except Exception as db_error:
-            logger.error(f"Database commit error: {db_error}")
-            db.session.rollback()
-            flash('Analysis completed but could not save to database. Please try again.', 'warning')
+            flash('Our analysis service is busy right now. Please try again in a minute.', 'warning')
             return redirect(url_for('face_analysis.index'))
         
-        # Redirect to results page
+        logger.info(f"Queued face analysis {analysis.id} for {file_path}")
         return redirect(url_for('face_analysis.results', analysis_id=analysis.id))
     except Exception as e:
         logger.error(f"Error processing face analysis: {e}")
@@ -366,10 +245,24 @@ def results(analysis_id):
     analysis = FaceAnalysis.query.get_or_404(analysis_id)
     
     # Check if the user can access this analysis
-    if analysis.user_id and current_user.is_authenticated and (analysis.user_id != current_user.id) and not (hasattr(current_user, 'is_admin') and current_user.is_admin):
+    if not can_view_analysis(analysis):
         flash('You do not have permission to view this analysis.', 'error')
         return redirect(url_for('face_analysis.index'))
     
+    # Still running: show the progress page, which polls the status endpoint
+    expire_if_stale(db, analysis)
+    if analysis.status in PENDING_STATUSES:
+        return render_template('face_analysis/processing.html', analysis=analysis)
+    
+    if analysis.status in (FAILED, REJECTED):
+        flash_failed_analysis(analysis)
+        return redirect(url_for('face_analysis.index'))
+    
+    validation = (analysis.analysis_data or {}).get('image_validation') if isinstance(analysis.analysis_data, dict) else None
+    if validation and request.args.get('fresh'):
+        flash_validation_issues(validation)
+        flash('Results may be less accurate due to image quality issues.', 'info')
+    
     # Ensure analysis_data is properly formatted
     if not analysis.analysis_data or analysis.analysis_data is None:
         analysis.analysis_data = {
@@ -462,6 +355,53 @@ def results(analysis_id):
         surgical_recommendations=surgical_recommendations
     )
 
+@face_analysis.route('/status/<int:analysis_id>')
+def status(analysis_id):
+    """Progress of a face analysis job, polled by the processing page."""
+    analysis = FaceAnalysis.query.get_or_404(analysis_id)
+    if not can_view_analysis(analysis):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    expire_if_stale(db, analysis)
+    done = analysis.status not in PENDING_STATUSES
+    return jsonify({
+        'id': analysis.id,
+        'status': analysis.status,
+        'message': analysis.status_message or STATUS_MESSAGES.get(analysis.status, ''),
+        'done': done,
+        'redirect_url': url_for('face_analysis.results', analysis_id=analysis.id, fresh=1) if done else None
+    })
+
+def can_view_analysis(analysis):
+    """Owners and admins only, once an analysis belongs to a user."""
+    return not (analysis.user_id and current_user.is_authenticated and (analysis.user_id != current_user.id)
+                and not (hasattr(current_user, 'is_admin') and current_user.is_admin))
+
+def flash_validation_issues(validation):
+    error_message = "Image quality issues detected:\n"
+    for issue in validation.get('issues', []):
+        error_message += f"• {issue}\n"
+    
+    error_message += "\nRecommendations for better results:\n"
+    for recommendation in validation.get('recommendations', []):
+        error_message += f"• {recommendation}\n"
+    
+    flash(error_message, 'warning')
+
+def flash_failed_analysis(analysis):
+    if analysis.status == REJECTED:
+        validation = (analysis.analysis_data or {}).get('image_validation')
+        if validation:
+            flash_validation_issues(validation)
+        flash('Image quality is too poor for accurate analysis. Please retake the photo following the guidelines.', 'error')
+        return
+    
+    error_message = analysis.status_message or 'Analysis failed'
+    if "API key" in error_message:
+        flash('API configuration error. Please contact the administrator.', 'error')
+    else:
+        flash(f'Analysis error: {error_message}', 'error')
+
 @face_analysis.route('/history')
 @login_required
 def history():
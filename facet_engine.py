@@ -0,0 +1,355 @@
+"""
+Faceted filter counts for the directory pages.
+
+Every facet count honours all active filters except the facet's own (the
+usual "disjunctive" behaviour: picking Mumbai still shows how many results
+Delhi would have). All facets for one filter state come from a single
+``GROUP BY GROUPING SETS`` query: each row of the filtered base set carries
+one match flag per facet filter, and facet *i* counts the rows whose other
+flags are all true. Results are cached per (entity, filter signature) in the
+tiered cache and dropped by the entity's cache tags.
+
+Each directory defines a ``FacetEngine`` with its base table, always-on
+filters (search text, approval) and ``Facet`` specs. The package directory
+instead hands over its own filter builder
+(``package_directory_query.filter_predicates``), so the facet counts always
+use exactly the filters the listing does.
+"""
+
+import logging
+from sqlalchemy import text
+
+from cache_backend import cache, make_key
+from cache_invalidation import PACKAGES, CLINICS, DOCTORS, PROCEDURES, CATEGORIES
+from package_directory_query import FILTER_FIELDS, PRESET_PRICE_RANGES, filter_predicates
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAMESPACE = 'facets'
+CACHE_TTL = 900
+
+
+class Facet:
+    """One facet: a grouping expression plus the predicate for its own filter.
+
+    ``predicate(value, params)`` returns SQL for the active filter value (adding
+    bind parameters to ``params``) or None when the filter is not usable.
+    ``buckets`` optionally maps raw group values to display order.
+    """
+
+    def __init__(self, name, expr, predicate=None, param=None, join=None, buckets=None):
+        self.name = name
+        self.expr = expr
+        self.predicate = predicate
+        self.param = param or name
+        self.join = join
+        self.buckets = buckets
+
+
+class FacetEngine:
+    """Computes all facet counts of one directory in one query."""
+
+    def __init__(self, entity, from_sql, base_where, tags, facets, search=None, stats=None, row_id='t.id',
+                 shared_filters=None):
+        self.entity = entity
+        self.row_id = row_id
+        self.from_sql = from_sql
+        self.base_where = base_where
+        self.tags = tags
+        self.facets = facets
+        self.search = search    # (param name, predicate builder) applied to every facet
+        self.stats = stats or {}  # name -> aggregate over rows matching every filter
+        # (filter fields, builder) when the directory owns its filter SQL: builder(filters) returns
+        # ({group: predicate}, params); a group named like a facet's param is that facet's own
+        # filter, any other group applies to every facet
+        self.shared_filters = shared_filters
+
+    def signature(self, filters):
+        if self.shared_filters:
+            relevant = list(self.shared_filters[0])
+        else:
+            relevant = [facet.param for facet in self.facets]
+            if self.search:
+                relevant.append(self.search[0])
+        return make_key(self.entity, *sorted((k, str(filters.get(k) or '').strip()) for k in relevant))
+
+    def counts(self, filters, db):
+        """{'facets': {name: [{'value', 'count'}, ...]}, 'total': n, 'stats': {...}}, cached per filter state."""
+        filters = filters or {}
+        return cache.get_or_set(CACHE_NAMESPACE, self.signature(filters),
+                                lambda: self._compute(filters, db), ttl=CACHE_TTL, tags=self.tags)
+
+    def _compute(self, filters, db):
+        sql, params = self.query(filters)
+        return self.collect(db.session.execute(text(sql), params).fetchall())
+
+    def _predicates(self, filters):
+        """(shared WHERE predicates, per-facet predicate or None, params) for a filter state."""
+        if self.shared_filters:
+            groups, params = self.shared_filters[1](filters)
+            own = [groups.pop(facet.param, None) for facet in self.facets]
+            return list(groups.values()), own, params
+
+        params = {}
+        where = []
+        if self.search:
+            search_param, search_predicate = self.search
+            value = (filters.get(search_param) or '').strip()
+            if value:
+                where.append(search_predicate(value, params))
+        own = []
+        for facet in self.facets:
+            value = (str(filters.get(facet.param) or '')).strip()
+            own.append(facet.predicate(value, params) if value and facet.predicate else None)
+        return where, own, params
+
+    def query(self, filters):
+        """The GROUPING SETS query for a filter state, as (sql, params)."""
+        shared, own, params = self._predicates(filters)
+        where = [self.base_where] + shared
+
+        joins = [facet.join for facet in self.facets if facet.join]
+        columns = [f"{self.row_id} AS row_id"]
+        flags = []
+        for i, (facet, predicate) in enumerate(zip(self.facets, own)):
+            columns.append(f"{facet.expr} AS f{i}")
+            flags.append(f"m{i}" if predicate else None)
+            columns.append(f"({predicate or 'TRUE'}) AS m{i}")
+        for name, (row_expr, _aggregate) in self.stats.items():
+            columns.append(f"{row_expr} AS s_{name}")
+
+        def others(i):
+            active = [flag for j, flag in enumerate(flags) if flag and j != i]
+            return ' AND '.join(active) or 'TRUE'
+
+        all_flags = ' AND '.join(flag for flag in flags if flag) or 'TRUE'
+        select = [f"f{i}" for i in range(len(self.facets))]
+        select += [f"GROUPING(f{i}) AS g{i}" for i in range(len(self.facets))]
+        select += [f"COUNT(DISTINCT row_id) FILTER (WHERE {others(i)}) AS c{i}" for i in range(len(self.facets))]
+        select.append(f"COUNT(DISTINCT row_id) FILTER (WHERE {all_flags}) AS total")
+        select += [f"{aggregate.format(col=f's_{name}')} FILTER (WHERE {all_flags}) AS stat_{name}"
+                   for name, (_row_expr, aggregate) in self.stats.items()]
+        grouping_sets = ', '.join(f"(f{i})" for i in range(len(self.facets))) + ', ()'
+
+        sql = f"""
+            WITH base AS (
+                SELECT {', '.join(columns)}
+                FROM {self.from_sql} {' '.join(joins)}
+                WHERE {' AND '.join(where)}
+            )
+            SELECT {', '.join(select)}
+            FROM base
+            GROUP BY GROUPING SETS ({grouping_sets})
+        """
+        return sql, params
+
+    def collect(self, rows):
+        """Turn the query's rows into the ``counts()`` result; values no row matches are left out."""
+        facets = {facet.name: [] for facet in self.facets}
+        total = 0
+        stats = {}
+        for row in rows:
+            mapping = row._mapping
+            groups = [mapping[f"g{i}"] for i in range(len(self.facets))]
+            if all(groups):
+                total = mapping['total']
+                stats = {name: mapping[f"stat_{name}"] for name in self.stats}
+                continue
+            i = groups.index(0)
+            value = mapping[f"f{i}"]
+            count = mapping[f"c{i}"]
+            if value is None or not count:
+                continue
+            facets[self.facets[i].name].append({'value': value, 'count': count})
+
+        for facet in self.facets:
+            entries = facets[facet.name]
+            if facet.buckets:
+                order = {bucket: position for position, bucket in enumerate(facet.buckets)}
+                entries.sort(key=lambda e: order.get(e['value'], len(order)))
+            else:
+                entries.sort(key=lambda e: (-e['count'], str(e['value'])))
+        return {'facets': facets, 'total': total, 'stats': stats}
+
+
+def cumulative(entries, thresholds):
+    """Turn bucketed counts ('4.5', '4.0', ...) into "at least" counts per threshold."""
+    by_value = {entry['value']: entry['count'] for entry in entries}
+    running = 0
+    result = []
+    for threshold in thresholds:
+        running += by_value.get(threshold, 0)
+        result.append({'value': threshold, 'count': running})
+    return result
+
+
+# ---- shared predicate builders ----------------------------------------------
+
+def _ilike(column):
+    def predicate(value, params):
+        key = f"p_{len(params)}"
+        params[key] = f"%{value}%"
+        return f"{column} ILIKE :{key}"
+    return predicate
+
+
+def _any_ilike(*columns):
+    def predicate(value, params):
+        key = f"p_{len(params)}"
+        params[key] = f"%{value}%"
+        return '(' + ' OR '.join(f"{column} ILIKE :{key}" for column in columns) + ')'
+    return predicate
+
+
+def _array_any_ilike(column):
+    def predicate(value, params):
+        key = f"p_{len(params)}"
+        params[key] = f"%{value}%"
+        return f"EXISTS (SELECT 1 FROM unnest({column}) AS element WHERE element ILIKE :{key})"
+    return predicate
+
+
+def _at_least(column, cast=float):
+    def predicate(value, params):
+        try:
+            number = cast(value)
+        except ValueError:
+            return None
+        key = f"p_{len(params)}"
+        params[key] = number
+        return f"{column} >= :{key}"
+    return predicate
+
+
+def _bucket_is(expr):
+    def predicate(value, params):
+        key = f"p_{len(params)}"
+        params[key] = value
+        return f"{expr} = :{key}"
+    return predicate
+
+
+def _equals_int(column):
+    def predicate(value, params):
+        try:
+            number = int(value)
+        except ValueError:
+            return None
+        key = f"p_{len(params)}"
+        params[key] = number
+        return f"{column} = :{key}"
+    return predicate
+
+
+RATING_THRESHOLDS = ['4.5', '4.0', '3.5', '3.0']
+
+
+def rating_bucket(column):
+    return f"""CASE WHEN {column} >= 4.5 THEN '4.5' WHEN {column} >= 4.0 THEN '4.0'
+                    WHEN {column} >= 3.5 THEN '3.5' WHEN {column} >= 3.0 THEN '3.0' END"""
+
+
+def _preset_case(presets):
+    branches = ' '.join(f"WHEN {predicate} THEN '{label}'" for label, predicate in presets.items())
+    return f"CASE {branches} END"
+
+
+def _preset_bounds(label):
+    """'50000-100000' -> (50000, 100000); '200000+' -> (200000, None)."""
+    low, _, high = label.rstrip('+').partition('-')
+    return int(low), int(high) if high else None
+
+
+# ---- packages -----------------------------------------------------------------
+
+PACKAGE_PRICE_EXPR = "COALESCE(p.price_discounted, p.price_actual)"
+# The directory's price_range presets, so a bucket value filters the listing to exactly its count
+PACKAGE_PRICE_BUCKETS = [(label, *_preset_bounds(label)) for label in PRESET_PRICE_RANGES]
+PACKAGE_PRICE_BUCKET_EXPR = _preset_case(PRESET_PRICE_RANGES)
+CLINIC_RATING_EXPR = "COALESCE(c.google_rating, c.rating)"
+
+package_facets = FacetEngine(
+    entity='packages',
+    from_sql="packages p JOIN clinics c ON p.clinic_id = c.id",
+    base_where="p.is_active = true",
+    row_id='p.id',
+    tags=(PACKAGES, CLINICS),
+    # Same filters as the directory page itself (category_id, package_categories, price presets, ...)
+    shared_filters=(FILTER_FIELDS, filter_predicates),
+    facets=[
+        Facet('city', 'c.city', param='location'),
+        Facet('category', 'p.category'),
+        Facet('price', PACKAGE_PRICE_BUCKET_EXPR, buckets=[label for label, _low, _high in PACKAGE_PRICE_BUCKETS]),
+        Facet('rating', rating_bucket(CLINIC_RATING_EXPR), buckets=RATING_THRESHOLDS),
+    ],
+    stats={
+        'min_price': (PACKAGE_PRICE_EXPR, "MIN({col})"),
+        'max_price': (PACKAGE_PRICE_EXPR, "MAX({col})"),
+        'avg_price': (PACKAGE_PRICE_EXPR, "AVG({col})"),
+    },
+)
+
+# ---- clinics --------------------------------------------------------------------
+
+clinic_facets = FacetEngine(
+    entity='clinics',
+    from_sql="clinics t",
+    base_where="t.is_approved = true",
+    tags=(CLINICS,),
+    search=('search', _any_ilike('t.name', 't.description')),
+    facets=[
+        Facet('city', 't.city', _ilike('t.city')),
+        # One row per specialty; counts use DISTINCT ids so other facets are not inflated
+        Facet('specialty', 'spec.name', _array_any_ilike('t.specialties'),
+              join="LEFT JOIN LATERAL unnest(t.specialties) AS spec(name) ON true"),
+        Facet('rating', rating_bucket('t.rating'), _at_least('t.rating'), buckets=RATING_THRESHOLDS),
+    ],
+)
+
+# ---- doctors --------------------------------------------------------------------
+
+DOCTOR_FEE_EXPR = """CASE WHEN COALESCE(t.consultation_fee, 0) = 0 THEN 'free'
+                          WHEN t.consultation_fee < 1000 THEN 'under_1000'
+                          WHEN t.consultation_fee <= 2000 THEN '1000_2000'
+                          ELSE 'over_2000' END"""
+DOCTOR_EXPERIENCE_EXPR = """CASE WHEN t.experience >= 15 THEN '15' WHEN t.experience >= 10 THEN '10'
+                                 WHEN t.experience >= 5 THEN '5' WHEN t.experience >= 1 THEN '1' END"""
+EXPERIENCE_THRESHOLDS = ['15', '10', '5', '1']
+
+doctor_facets = FacetEngine(
+    entity='doctors',
+    from_sql="doctors t",
+    base_where="t.verification_status = 'approved'",
+    tags=(DOCTORS,),
+    search=('search', _any_ilike('t.name', 't.specialty', 't.bio')),
+    facets=[
+        Facet('city', 't.city', _ilike('t.city')),
+        Facet('specialty', 't.specialty', _ilike('t.specialty')),
+        Facet('experience', DOCTOR_EXPERIENCE_EXPR, _at_least('t.experience', int), buckets=EXPERIENCE_THRESHOLDS),
+        Facet('consultation_fee', DOCTOR_FEE_EXPR, _bucket_is(DOCTOR_FEE_EXPR),
+              buckets=['free', 'under_1000', '1000_2000', 'over_2000']),
+        Facet('rating', rating_bucket('t.rating'), _at_least('t.rating'), buckets=RATING_THRESHOLDS),
+    ],
+)
+
+# ---- procedures -----------------------------------------------------------------
+
+PROCEDURE_PRICE_EXPR = """CASE WHEN t.max_cost < 50000 THEN 'under_50k'
+                               WHEN t.min_cost >= 50000 AND t.max_cost <= 100000 THEN '50k_100k'
+                               WHEN t.min_cost >= 100000 AND t.max_cost <= 200000 THEN '100k_200k'
+                               WHEN t.min_cost > 200000 THEN 'over_200k' END"""
+
+procedure_facets = FacetEngine(
+    entity='procedures',
+    from_sql="procedures t LEFT JOIN categories cat ON t.category_id = cat.id",
+    base_where="TRUE",
+    tags=(PROCEDURES, CATEGORIES),
+    search=('search', _any_ilike('t.procedure_name', 't.short_description', 't.body_part', 'cat.name')),
+    facets=[
+        Facet('body_part', 't.body_part', _ilike('t.body_part')),
+        # Grouped by id so the value can be used directly as the category filter
+        Facet('category', "cat.id::text || ':' || cat.name", _equals_int('t.category_id'), param='category'),
+        Facet('price', PROCEDURE_PRICE_EXPR, _bucket_is(PROCEDURE_PRICE_EXPR), param='price_range',
+              buckets=['under_50k', '50k_100k', '100k_200k', 'over_200k']),
+    ],
+)
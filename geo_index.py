@@ -0,0 +1,245 @@
+"""
+In-memory spatial index over clinic coordinates.
+
+Clinics are bucketed into a fixed lat/lng grid (``CELL_DEGREES`` per cell).
+Radius queries only visit the cells overlapping the search circle's bounding
+box and refine those candidates with a vectorised NumPy haversine; k-nearest
+queries grow a ring of cells until the k-th hit is provably closer than
+anything outside the ring. Lookup cost depends on local clinic density, not
+on the total number of clinics.
+
+``latitude``/``longitude`` exist on the ``clinics`` table (written by the
+import scripts) but are not mapped on ``models.Clinic``, so the index loads
+with raw SQL. Each worker keeps an immutable snapshot and swaps in a rebuilt
+one in the background when the ``clinics`` cache tag is bumped (see
+cache_invalidation.py) or the snapshot gets older than
+``GEO_INDEX_REBUILD_SECONDS``.
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+import numpy as np
+from sqlalchemy import text
+
+from cache_backend import cache
+from cache_invalidation import CLINICS
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.0
+CELL_DEGREES = 0.1  # ~11km of latitude per cell
+VERSION_CHECK_INTERVAL = 1.0
+REBUILD_INTERVAL = int(os.environ.get('GEO_INDEX_REBUILD_SECONDS', 600))
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distances in km from one point to arrays of points (degrees in, NumPy vectorised)."""
+    lat1 = np.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlng = np.radians(lngs) - np.radians(lng)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bounding_box(lat, lng, radius_km):
+    """
+    (min_lat, max_lat, min_lng, max_lng) enclosing a circle, longitude scaled by
+    cos(latitude). Longitudes are not wrapped; a circle reaching a pole spans
+    every longitude.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    if abs(lat) + lat_delta >= 90.0:
+        lng_delta = 180.0
+    else:
+        cos_lat = math.cos(math.radians(abs(lat) + lat_delta))
+        lng_delta = min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return lat - lat_delta, lat + lat_delta, lng - lng_delta, lng + lng_delta
+
+
+def _lng_ranges(min_lng, max_lng):
+    """Split an unwrapped longitude range into ranges within [-180, 180] at the antimeridian."""
+    if max_lng - min_lng >= 360.0:
+        return [(-180.0, 180.0)]
+    start = (min_lng + 180.0) % 360.0 - 180.0
+    end = start + (max_lng - min_lng)
+    if end <= 180.0:
+        return [(start, end)]
+    return [(start, 180.0), (-180.0, end - 360.0)]
+
+
+def _cell(lat, lng):
+    return int(math.floor(lat / CELL_DEGREES)), int(math.floor(lng / CELL_DEGREES))
+
+
+class GeoIndex:
+    """Immutable grid index; build a new one instead of mutating."""
+
+    def __init__(self, ids, lats, lngs, payloads=None):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.payloads = payloads or {}
+        self.built_at = time.time()
+
+        cells = {}
+        for position, (lat, lng) in enumerate(zip(self.lats, self.lngs)):
+            cells.setdefault(_cell(lat, lng), []).append(position)
+        self.cells = {cell: np.asarray(positions, dtype=np.int64) for cell, positions in cells.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _candidates(self, min_lat, max_lat, min_lng, max_lng):
+        chunks = []
+        for lng_from, lng_to in _lng_ranges(min_lng, max_lng):
+            min_row, min_col = _cell(min_lat, lng_from)
+            max_row, max_col = _cell(max_lat, lng_to)
+            if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+                # Huge radius: scanning the occupied cells is cheaper than the empty grid
+                chunks.extend(positions for (row, col), positions in self.cells.items()
+                              if min_row <= row <= max_row and min_col <= col <= max_col)
+            else:
+                chunks.extend(self.cells[(row, col)]
+                              for row in range(min_row, max_row + 1)
+                              for col in range(min_col, max_col + 1)
+                              if (row, col) in self.cells)
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def within_radius(self, lat, lng, radius_km, offset=0, limit=None):
+        """Clinics within ``radius_km``, nearest first: (total, [(clinic_id, distance_km), ...])."""
+        positions = self._candidates(*bounding_box(lat, lng, radius_km))
+        if not len(positions):
+            return 0, []
+        distances = haversine_km(lat, lng, self.lats[positions], self.lngs[positions])
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        end = None if limit is None else offset + limit
+        page = order[offset:end]
+        return len(order), [(int(self.ids[positions[i]]), float(distances[i])) for i in page]
+
+    def nearest(self, lat, lng, k=10, max_radius_km=None):
+        """The ``k`` nearest clinics as [(clinic_id, distance_km), ...]."""
+        if not len(self) or k <= 0:
+            return []
+        radius_km = CELL_DEGREES * KM_PER_DEGREE_LAT
+        # Past this radius the bounding box spans the whole grid
+        limit_km = max_radius_km or math.pi * EARTH_RADIUS_KM
+        while True:
+            radius_km = min(radius_km, limit_km)
+            total, hits = self.within_radius(lat, lng, radius_km, limit=k)
+            # Everything outside the circle is farther than radius_km, so k hits inside are final
+            if total >= k or radius_km >= limit_km:
+                return hits
+            radius_km *= 2
+
+    def payload(self, clinic_id):
+        return self.payloads.get(clinic_id)
+
+
+EMPTY_INDEX = GeoIndex([], [], [])
+
+
+def load_clinic_index(db):
+    """Build a GeoIndex of approved clinics with coordinates (one query)."""
+    start_time = time.time()
+    rows = db.session.execute(text("""
+        SELECT id, name, slug, area, city, latitude, longitude,
+               COALESCE(google_rating, rating) as rating,
+               COALESCE(google_review_count, review_count) as review_count,
+               specialties
+        FROM clinics
+        WHERE is_approved = true
+          AND latitude IS NOT NULL AND longitude IS NOT NULL
+          AND NOT (latitude = 0 AND longitude = 0)
+    """)).fetchall()
+
+    ids, lats, lngs, payloads = [], [], [], {}
+    for row in rows:
+        ids.append(row.id)
+        lats.append(float(row.latitude))
+        lngs.append(float(row.longitude))
+        payloads[row.id] = {
+            'id': row.id,
+            'name': row.name,
+            'slug': row.slug,
+            'area': row.area,
+            'city': row.city,
+            'latitude': float(row.latitude),
+            'longitude': float(row.longitude),
+            'rating': row.rating,
+            'review_count': row.review_count,
+            'specialties': list(row.specialties or []),
+        }
+    index = GeoIndex(ids, lats, lngs, payloads)
+    logger.info(f"Clinic geo index built: {len(index)} clinics in {len(index.cells)} cells "
+                f"({(time.time() - start_time) * 1000:.1f}ms)")
+    return index
+
+
+class GeoIndexHolder:
+    """Per-worker current index plus lazy background rebuilds."""
+
+    def __init__(self):
+        self._index = None
+        self._versions = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def get(self, app, db):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._versions = cache.tag_versions.current((CLINICS,))
+                    self._index = load_clinic_index(db)
+            return self._index
+
+        now = time.time()
+        if now - self._last_check >= VERSION_CHECK_INTERVAL:
+            self._last_check = now
+            versions = cache.tag_versions.current((CLINICS,))
+            if versions != self._versions or now - self._index.built_at > REBUILD_INTERVAL:
+                self._start_rebuild(app, db, versions)
+        return self._index
+
+    def _start_rebuild(self, app, db, versions):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def rebuild():
+            try:
+                with app.app_context():
+                    index = load_clinic_index(db)
+                self._index, self._versions = index, versions
+            except Exception as e:
+                logger.warning(f"Clinic geo index rebuild failed: {e}")
+            finally:
+                self._rebuilding = False
+
+        # Keep serving the current snapshot while the new one loads
+        threading.Thread(target=rebuild, daemon=True, name='clinic-geo-index').start()
+
+
+holder = GeoIndexHolder()
+
+
+def get_clinic_geo_index():
+    """The worker's clinic geo index; built on first use, refreshed after clinic edits."""
+    from flask import current_app
+    from app import db
+    try:
+        return holder.get(current_app._get_current_object(), db)
+    except Exception as e:
+        logger.error(f"Clinic geo index unavailable: {e}")
+        db.session.rollback()
+        return EMPTY_INDEX
@@ -124,6 +124,7 @@ antidote_memory_percent {metrics_data['memory_percent']}
 # TYPE antidote_disk_percent gauge
 antidote_disk_percent {metrics_data['disk_percent']}
 """
+        metrics_text += cache_metrics_text()
         
         return Response(metrics_text, mimetype='text/plain')
         
@@ -131,6 +132,53 @@ antidote_disk_percent {metrics_data['disk_percent']}
         logger.error(f"Metrics endpoint failed: {e}")
         return f"# Error: {str(e)}", 503
 
+@health_bp.route('/health/cache')
+def cache_health():
+    """Hit/miss/eviction counters for the unified tiered cache."""
+    from cache_backend import cache
+    return jsonify(cache.get_stats()), 200
+
+@health_bp.route('/health/ai-query-cache')
+def ai_query_cache_health():
+    """Hit rate, fallbacks and latency of the AI query analysis cache."""
+    from query_analysis_cache import query_analysis_cache
+    return jsonify(query_analysis_cache.stats()), 200
+
+@health_bp.route('/health/interaction-ingest')
+def interaction_ingest_health():
+    """Buffer depth, dropped events and flush results of this worker's interaction ingestor."""
+    from interaction_ingest import ingestor
+    return jsonify(ingestor.stats()), 200
+
+@health_bp.route('/health/face-mesh')
+def face_mesh_health():
+    """FaceMesh pool sizes and checkout wait times, here and in the face analysis workers."""
+    from utils.face_mesh_pool import stats
+    from face_analysis_jobs import face_analysis_jobs
+    return jsonify({'web': stats(), 'analysis': face_analysis_jobs.stats()}), 200
+
+def cache_metrics_text():
+    """Prometheus-style counters for the unified tiered cache."""
+    try:
+        from cache_backend import cache
+        stats = cache.get_stats()
+    except Exception as e:
+        logger.debug(f"Cache stats unavailable: {e}")
+        return ""
+    
+    lines = ["", "# HELP antidote_cache_events_total Tiered cache events by namespace",
+             "# TYPE antidote_cache_events_total counter"]
+    for namespace, counters in sorted(stats['namespaces'].items()):
+        for event, value in sorted(counters.items()):
+            lines.append(f'antidote_cache_events_total{{namespace="{namespace}",event="{event}"}} {value}')
+    lines += ["", "# HELP antidote_cache_local_bytes Bytes held by the in-process cache tier",
+              "# TYPE antidote_cache_local_bytes gauge",
+              f"antidote_cache_local_bytes {stats['local']['bytes']}",
+              "# HELP antidote_cache_local_entries Entries held by the in-process cache tier",
+              "# TYPE antidote_cache_local_entries gauge",
+              f"antidote_cache_local_entries {stats['local']['entries']}", ""]
+    return "\n".join(lines)
+
 def register_health_monitoring(app):
     """Register health monitoring blueprint with the app."""
     app.register_blueprint(health_bp)
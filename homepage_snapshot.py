@@ -0,0 +1,172 @@
+"""
+Background-refreshed homepage snapshot.
+
+The homepage category carousels used to run one ``ORDER BY RANDOM() LIMIT 7``
+join per category (ten per request) plus a correlated package COUNT for the
+verified clinics strip. This module materialises, in two queries, the pool
+of eligible packages for every homepage category and the verified clinic
+list with package counts. The snapshot lives in the unified tiered cache
+(tagged so package/clinic edits rebuild it) and a per-worker daemon thread
+refreshes it periodically; random sampling happens in-process, so the
+homepage issues no SQL for these sections.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from flask import current_app
+from sqlalchemy import text, bindparam
+
+from app import db
+from cache_backend import cache
+from cache_invalidation import PACKAGES, CLINICS
+
+logger = logging.getLogger(__name__)
+
+HOMEPAGE_CATEGORIES = [
+    'Injectables & Anti-Aging', 'Facials & Skin Glow', 'Laser & Advanced Technology',
+    'Hair Treatments', 'Scar, Spots & Skin Correction', 'Surgical Procedures',
+    'Body Treatments', 'Medical Consultations', 'Brows & Eyes', 'Lips & Smile'
+]
+PACKAGES_PER_CATEGORY = 7
+VERIFIED_CLINIC_MIN_REVIEWS = 1000
+VERIFIED_CLINIC_LIMIT = 20
+
+REFRESH_INTERVAL = int(os.environ.get('HOMEPAGE_SNAPSHOT_REFRESH_SECONDS', 600))  # 10 minutes
+CACHE_NAMESPACE = 'homepage'
+CACHE_KEY = 'snapshot'
+SNAPSHOT_TAGS = (CLINICS, PACKAGES)
+
+
+class HomepageSnapshot:
+    """Immutable materialised homepage data for one refresh cycle."""
+
+    def __init__(self, category_pools, packages, verified_clinics, built_at=None):
+        self.category_pools = category_pools      # category -> [package_id, ...]
+        self.packages = packages                  # package_id -> row dict
+        self.verified_clinics = verified_clinics  # list of clinic row dicts
+        self.built_at = built_at or time.time()
+
+    def sample_category_packages(self, per_category=PACKAGES_PER_CATEGORY, rng=random):
+        """Random packages per category, drawn from the materialised pools."""
+        category_packages = {}
+        for category in HOMEPAGE_CATEGORIES:
+            pool = self.category_pools.get(category, [])
+            chosen = rng.sample(pool, min(per_category, len(pool)))
+            # Copy so templates cannot mutate the shared snapshot
+            category_packages[category] = [dict(self.packages[pid]) for pid in chosen]
+        return category_packages
+
+    def verified_clinic_list(self):
+        return [dict(clinic) for clinic in self.verified_clinics]
+
+
+EMPTY_SNAPSHOT = HomepageSnapshot({}, {}, [])
+
+
+def build_homepage_snapshot():
+    """Materialise category pools and verified clinics (two queries)."""
+    start_time = time.time()
+
+    package_rows = db.session.execute(text("""
+        SELECT pc.category_name, p.id, p.title, p.slug, p.category, p.description,
+               p.price_actual, p.price_discounted, p.duration, p.downtime,
+               p.actual_treatment_name, c.name as clinic_name, c.slug as clinic_slug
+        FROM packages p
+        JOIN clinics c ON p.clinic_id = c.id
+        JOIN package_categories pc ON p.id = pc.package_id
+        WHERE p.is_active = true AND pc.category_name IN :categories
+    """).bindparams(bindparam('categories', expanding=True)),
+        {'categories': HOMEPAGE_CATEGORIES}).fetchall()
+
+    pool_sets = {category: set() for category in HOMEPAGE_CATEGORIES}
+    packages = {}
+    for row in package_rows:
+        data = dict(row._mapping)
+        category_name = data.pop('category_name')
+        packages.setdefault(data['id'], data)
+        pool_sets[category_name].add(data['id'])
+    category_pools = {category: sorted(ids) for category, ids in pool_sets.items()}
+
+    # Package counts come from one grouped join instead of a correlated subquery per clinic
+    clinic_rows = db.session.execute(text("""
+        SELECT c.id, c.name, c.city, c.state, c.google_rating, c.google_review_count, c.description, c.slug,
+               COALESCE(pk.package_count, 0) as package_count
+        FROM clinics c
+        LEFT JOIN (
+            SELECT clinic_id, COUNT(*) as package_count
+            FROM packages
+            WHERE is_active = true
+            GROUP BY clinic_id
+        ) pk ON pk.clinic_id = c.id
+        WHERE c.is_approved = true AND c.google_review_count >= :min_reviews
+        ORDER BY c.google_review_count DESC, c.google_rating DESC
+        LIMIT :limit
+    """), {'min_reviews': VERIFIED_CLINIC_MIN_REVIEWS, 'limit': VERIFIED_CLINIC_LIMIT}).fetchall()
+    verified_clinics = [dict(row._mapping) for row in clinic_rows]
+
+    elapsed = (time.time() - start_time) * 1000
+    logger.info(f"Homepage snapshot built: {len(packages)} packages, "
+                f"{len(verified_clinics)} clinics ({elapsed:.1f}ms)")
+    return HomepageSnapshot(category_pools, packages, verified_clinics)
+
+
+class SnapshotRefresher:
+    """Per-worker daemon thread that rebuilds the snapshot periodically."""
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self, app):
+        # Threads do not survive gunicorn's fork with preload_app, so start lazily per process
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(target=self._run, args=(app,), daemon=True,
+                                      name='homepage-snapshot-refresher')
+            thread.start()
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with app.app_context():
+                    refresh_homepage_snapshot()
+            except Exception as e:
+                logger.warning(f"Homepage snapshot refresh failed: {e}")
+
+
+refresher = SnapshotRefresher()
+
+
+def refresh_homepage_snapshot():
+    """Rebuild the snapshot and replace the cached copy."""
+    # Snapshot tag versions first so an edit during the rebuild still invalidates it
+    versions = cache.tag_versions.current(SNAPSHOT_TAGS)
+    snapshot = build_homepage_snapshot()
+    cache.set(CACHE_NAMESPACE, CACHE_KEY, snapshot, ttl=REFRESH_INTERVAL * 2,
+              tags=SNAPSHOT_TAGS, versions=versions)
+    return snapshot
+
+
+def get_homepage_snapshot():
+    """Current homepage snapshot; builds once on a cold cache or after an edit."""
+    try:
+        refresher.ensure_started(current_app._get_current_object())
+    except RuntimeError:
+        pass  # No app context (scripts); serve without background refresh
+
+    try:
+        return cache.get_or_set(CACHE_NAMESPACE, CACHE_KEY, build_homepage_snapshot,
+                                ttl=REFRESH_INTERVAL * 2, tags=SNAPSHOT_TAGS)
+    except Exception as e:
+        logger.error(f"Error building homepage snapshot: {e}")
+        db.session.rollback()
+        return EMPTY_SNAPSHOT
@@ -2,20 +2,26 @@
 """
 Hybrid clinic import system combining CSV data with Google Places API.
 This system uses the comprehensive CSV data and enhances it with Google Places API data.
+
+Rows are imported in committed chunks through csv_import_engine.run_import;
+an interrupted import resumes after its last committed chunk when run again.
 """
 
 import os
-import csv
 import psycopg2
+from psycopg2.extras import execute_values
 import requests
 import logging
-import json
 from datetime import datetime
 
+from csv_import_engine import run_import, ChunkResult
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 25  # Small: every new clinic waits on a Google Places call inside the chunk's transaction
+
 def get_db_connection():
     """Get database connection."""
     return psycopg2.connect(os.environ.get('DATABASE_URL'))
@@ -54,309 +60,283 @@ def fetch_google_places_data(place_id, api_key):
         return None
 
 def create_clinic_owner_user(conn, clinic_name, email=None, phone=None):
-    """Create a user account for the clinic owner."""
-    try:
-        cursor = conn.cursor()
-        
-        # Generate email if not provided
-        if not email:
-            clean_name = clinic_name.lower().replace(' ', '').replace(',', '').replace('|', '')[:20]
-            email = f"{clean_name}@antidote-clinics.com"
-        
-        # Check if user already exists
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        if cursor.fetchone():
-            cursor.close()
-            return email
-        
-        # Create user with phone number
-        cursor.execute("""
-            INSERT INTO users (name, email, phone_number, password_hash, is_clinic_owner, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (clinic_name, email, phone, 'temp_hash', True, datetime.now()))
-        
-        conn.commit()
-        cursor.close()
-        
+    """Create a user account for the clinic owner (in the caller's transaction); returns its email."""
+    cursor = conn.cursor()
+    
+    # Generate email if not provided
+    if not email:
+        clean_name = clinic_name.lower().replace(' ', '').replace(',', '').replace('|', '')[:20]
+        email = f"{clean_name}@antidote-clinics.com"
+    
+    # Create user with phone number unless one already exists
+    cursor.execute("""
+        INSERT INTO users (name, email, phone_number, password_hash, is_clinic_owner, created_at)
+        SELECT %s, %s, %s, %s, %s, %s
+        WHERE NOT EXISTS (SELECT 1 FROM users WHERE email = %s)
+    """, (clinic_name, email, phone, 'temp_hash', True, datetime.now(), email))
+    if cursor.rowcount:
         logger.info(f"Created clinic owner user: {email}")
-        return email
-        
-    except Exception as e:
-        logger.error(f"Error creating clinic owner user: {e}")
-        return None
+    cursor.close()
+    return email
 
 def import_reviews_for_clinic(conn, clinic_id, reviews_data):
-    """Import reviews from Google Places API data."""
-    try:
-        if not reviews_data:
-            return 0
-        
-        cursor = conn.cursor()
-        imported_count = 0
-        
-        for review in reviews_data:
-            try:
-                # Extract review data
-                author_name = review.get('author_name', 'Anonymous')
-                author_photo_url = review.get('profile_photo_url', '')
-                rating = review.get('rating', 0)
-                text = review.get('text', '')
-                time_created = review.get('time', 0)
-                
-                # Convert timestamp to datetime
-                review_date = datetime.fromtimestamp(time_created) if time_created else datetime.now()
-                
-                # Check if review already exists
-                cursor.execute("""
-                    SELECT id FROM google_reviews 
-                    WHERE clinic_id = %s AND author_name = %s AND text = %s
-                """, (clinic_id, author_name, text))
-                
-                if cursor.fetchone():
-                    continue  # Skip duplicate
-                
-                # Insert review with is_active = true
-                cursor.execute("""
-                    INSERT INTO google_reviews (
-                        clinic_id, author_name, profile_photo_url, rating, 
-                        text, time, created_at, is_active
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    clinic_id, author_name, author_photo_url, rating,
-                    text, review_date, datetime.now(), True
-                ))
-                
-                imported_count += 1
-                
-            except Exception as e:
-                logger.error(f"Error importing review: {e}")
-                continue
-        
-        conn.commit()
-        cursor.close()
-        
-        logger.info(f"Successfully imported {imported_count} reviews for clinic {clinic_id}")
-        return imported_count
-        
-    except Exception as e:
-        logger.error(f"Error importing reviews for clinic {clinic_id}: {e}")
+    """Import reviews from Google Places API data with one multi-row INSERT; returns how many were new."""
+    if not reviews_data:
         return 0
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT author_name, text FROM google_reviews WHERE clinic_id = %s", (clinic_id,))
+    seen = set(cursor.fetchall())
+    
+    now = datetime.now()
+    reviews = []
+    for review in reviews_data:
+        # Extract review data
+        author_name = review.get('author_name', 'Anonymous')
+        text = review.get('text', '')
+        if (author_name, text) in seen:
+            continue  # Skip duplicate
+        seen.add((author_name, text))
+        time_created = review.get('time', 0)
+        
+        # Convert timestamp to datetime
+        review_date = datetime.fromtimestamp(time_created) if time_created else now
+        reviews.append((clinic_id, author_name, review.get('profile_photo_url', ''), review.get('rating', 0),
+                        text, review_date, now, True))
+    
+    if reviews:
+        # Insert reviews with is_active = true
+        execute_values(cursor, """
+            INSERT INTO google_reviews (
+                clinic_id, author_name, profile_photo_url, rating,
+                text, time, created_at, is_active
+            ) VALUES %s
+        """, reviews, page_size=len(reviews))
+    cursor.close()
+    
+    logger.info(f"Successfully imported {len(reviews)} reviews for clinic {clinic_id}")
+    return len(reviews)
 
-def clinic_exists(conn, google_place_id=None, name=None):
-    """Check if clinic already exists."""
-    try:
-        cursor = conn.cursor()
-        
-        if google_place_id:
-            cursor.execute("SELECT id FROM clinics WHERE google_place_id = %s", (google_place_id,))
-        elif name:
-            cursor.execute("SELECT id FROM clinics WHERE name = %s", (name,))
-        else:
-            return False
-        
-        result = cursor.fetchone()
-        cursor.close()
-        
-        return result[0] if result else False
-        
-    except Exception as e:
-        logger.error(f"Error checking clinic existence: {e}")
-        return False
+def existing_clinics(cursor, place_ids, names):
+    """Google place ids and names of the clinics that already exist (one query)."""
+    if not place_ids and not names:
+        return set(), set()
+    cursor.execute("""
+        SELECT google_place_id, name FROM clinics
+        WHERE google_place_id = ANY(%s) OR name = ANY(%s)
+    """, (list(place_ids), list(names)))
+    rows = cursor.fetchall()
+    return {place_id for place_id, _ in rows if place_id}, {name for _, name in rows}
 
-def import_hybrid_clinic(csv_row, google_data=None):
-    """Import clinic combining CSV data with Google Places data."""
-    try:
-        conn = get_db_connection()
-        
-        # Extract CSV data
-        name = csv_row['name']
-        slug = csv_row['slug']
-        description = csv_row['description']
-        address = csv_row['address']
-        city = csv_row['city']
-        state = csv_row['state']
-        country = csv_row['country']
-        pincode = csv_row['pincode']
-        latitude = float(csv_row['latitude']) if csv_row['latitude'] else None
-        longitude = float(csv_row['longitude']) if csv_row['longitude'] else None
-        contact_number = csv_row['contact_number']
-        email = csv_row['email']
-        website_url = csv_row['website_url']
-        specialties = csv_row['specialties']
-        operating_hours = csv_row['operating_hours']
-        google_place_id = csv_row['google_place_id']
-        amenities = csv_row['amenities']
-        owner_email = csv_row['owner_email']
-        
-        # Check if clinic already exists
-        existing_id = clinic_exists(conn, google_place_id, name)
-        if existing_id:
-            logger.info(f"Clinic already exists: {name} (ID: {existing_id})")
-            conn.close()
-            return existing_id
-        
-        # Use Google data if available, otherwise use CSV data
-        if google_data:
-            # Override with Google-verified data
-            google_rating = google_data.get('rating')
-            google_review_count = google_data.get('user_ratings_total')
-            google_phone = google_data.get('formatted_phone_number')
-            google_website = google_data.get('website')
-            google_address = google_data.get('formatted_address')
-            
-            # Parse Google opening hours
-            google_hours = None
-            if google_data.get('opening_hours'):
-                opening_hours_data = google_data['opening_hours']
-                if opening_hours_data.get('weekday_text'):
-                    # Convert Google's weekday_text to our format
-                    weekday_hours = {}
-                    for day_text in opening_hours_data['weekday_text']:
-                        # Format: "Monday: 8:00 AM – 9:00 PM"
-                        if ':' in day_text:
-                            day_name, hours = day_text.split(':', 1)
-                            weekday_hours[day_name.strip()] = hours.strip()
-                    
-                    if weekday_hours:
-                        google_hours = '; '.join([f"{day}: {hours}" for day, hours in weekday_hours.items()])
-            
-            # Get Google description/summary
-            google_description = None
-            if google_data.get('editorial_summary'):
-                google_description = google_data['editorial_summary'].get('overview', '')
-            
-            # If no editorial summary, create description from Google types and name
-            if not google_description and google_data.get('types'):
-                types = google_data.get('types', [])
-                medical_types = [t for t in types if any(keyword in t.lower() for keyword in ['hospital', 'clinic', 'doctor', 'health', 'medical', 'beauty', 'spa'])]
-                if medical_types:
-                    primary_type = medical_types[0].replace('_', ' ').title()
-                    google_description = f"Professional {primary_type.lower()} providing quality healthcare and aesthetic services."
-            
-            # Use Google coordinates if available
-            if google_data.get('geometry'):
-                google_location = google_data['geometry'].get('location', {})
-                if google_location:
-                    latitude = google_location.get('lat', latitude)
-                    longitude = google_location.get('lng', longitude)
-            
-            # Use Google-verified contact info if available
-            phone_number = google_phone or contact_number
-            website = google_website or website_url
-            verified_address = google_address or address
-            working_hours = google_hours or operating_hours  # Prefer Google hours
-            description = google_description or clinic_description  # Prefer Google description
-            
-        else:
-            # Use CSV data only
-            google_rating = None
-            google_review_count = None
-            phone_number = contact_number
-            website = website_url
-            verified_address = address
-            working_hours = operating_hours
-            description = description
-        
-        # Create clinic owner user
-        owner_email_final = create_clinic_owner_user(conn, name, owner_email or email, contact_number)
-        
-        # Get owner user ID
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE email = %s", (owner_email_final,))
-        result = cursor.fetchone()
-        owner_user_id = result[0] if result else None
-        
-        # Insert clinic with hybrid data using correct schema
-        cursor.execute("""
-            INSERT INTO clinics (
-                name, slug, description, address, city, state, pincode,
-                latitude, longitude, phone_number, email, website, 
-                services_offered, working_hours, google_place_id, google_rating, 
-                google_review_count, owner_user_id, created_at, 
-                is_active, is_approved, verification_status
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            ) RETURNING id
-        """, (
-            name, slug, description, verified_address, city, state, pincode,
-            latitude, longitude, phone_number, email, website,
-            specialties, working_hours, google_place_id, google_rating,
-            google_review_count, owner_user_id, datetime.now(),
-            True, True, 'verified'  # Auto-approve clinics from CSV
-        ))
-        
-        clinic_id = cursor.fetchone()[0]
-        
-        # Import reviews if available from Google data
-        if google_data and google_data.get('reviews'):
-            reviews_imported = import_reviews_for_clinic(conn, clinic_id, google_data['reviews'])
-            logger.info(f"Imported {reviews_imported} reviews for {name}")
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        logger.info(f"Successfully imported hybrid clinic: {name} (ID: {clinic_id})")
-        return clinic_id
-        
-    except Exception as e:
-        logger.error(f"Error importing hybrid clinic {name}: {e}")
-        return None
+def import_hybrid_clinic(conn, csv_row, google_data=None):
+    """Insert one clinic combining CSV data with Google Places data; returns its id (the caller commits)."""
+    # Extract CSV data
+    name = csv_row['name']
+    slug = csv_row['slug']
+    description = csv_row['description']
+    address = csv_row['address']
+    city = csv_row['city']
+    state = csv_row['state']
+    pincode = csv_row['pincode']
+    latitude = float(csv_row['latitude']) if csv_row['latitude'] else None
+    longitude = float(csv_row['longitude']) if csv_row['longitude'] else None
+    contact_number = csv_row['contact_number']
+    email = csv_row['email']
+    website_url = csv_row['website_url']
+    specialties = csv_row['specialties']
+    operating_hours = csv_row['operating_hours']
+    google_place_id = csv_row['google_place_id']
+    owner_email = csv_row['owner_email']
+    
+    # Use Google data if available, otherwise use CSV data
+    if google_data:
+        # Override with Google-verified data
+        google_rating = google_data.get('rating')
+        google_review_count = google_data.get('user_ratings_total')
+        google_phone = google_data.get('formatted_phone_number')
+        google_website = google_data.get('website')
+        google_address = google_data.get('formatted_address')
+        
+        # Parse Google opening hours
+        google_hours = None
+        if google_data.get('opening_hours'):
+            opening_hours_data = google_data['opening_hours']
+            if opening_hours_data.get('weekday_text'):
+                # Convert Google's weekday_text to our format
+                weekday_hours = {}
+                for day_text in opening_hours_data['weekday_text']:
+                    # Format: "Monday: 8:00 AM – 9:00 PM"
+                    if ':' in day_text:
+                        day_name, hours = day_text.split(':', 1)
+                        weekday_hours[day_name.strip()] = hours.strip()
+                
+                if weekday_hours:
+                    google_hours = '; '.join([f"{day}: {hours}" for day, hours in weekday_hours.items()])
+        
+        # Get Google description/summary
+        google_description = None
+        if google_data.get('editorial_summary'):
+            google_description = google_data['editorial_summary'].get('overview', '')
+        
+        # If no editorial summary, create description from Google types and name
+        if not google_description and google_data.get('types'):
+            types = google_data.get('types', [])
+            medical_types = [t for t in types if any(keyword in t.lower() for keyword in ['hospital', 'clinic', 'doctor', 'health', 'medical', 'beauty', 'spa'])]
+            if medical_types:
+                primary_type = medical_types[0].replace('_', ' ').title()
+                google_description = f"Professional {primary_type.lower()} providing quality healthcare and aesthetic services."
+        
+        # Use Google coordinates if available
+        if google_data.get('geometry'):
+            google_location = google_data['geometry'].get('location', {})
+            if google_location:
+                latitude = google_location.get('lat', latitude)
+                longitude = google_location.get('lng', longitude)
+        
+        # Use Google-verified contact info if available
+        phone_number = google_phone or contact_number
+        website = google_website or website_url
+        verified_address = google_address or address
+        working_hours = google_hours or operating_hours  # Prefer Google hours
+        description = google_description or description  # Prefer Google description
+        
+    else:
+        # Use CSV data only
+        google_rating = None
+        google_review_count = None
+        phone_number = contact_number
+        website = website_url
+        verified_address = address
+        working_hours = operating_hours
+    
+    # Create clinic owner user
+    owner_email_final = create_clinic_owner_user(conn, name, owner_email or email, contact_number)
+    
+    # Get owner user ID
+    cursor = conn.cursor()
+    cursor.execute("SELECT id FROM users WHERE email = %s", (owner_email_final,))
+    result = cursor.fetchone()
+    owner_user_id = result[0] if result else None
+    
+    # Insert clinic with hybrid data using correct schema
+    cursor.execute("""
+        INSERT INTO clinics (
+            name, slug, description, address, city, state, pincode,
+            latitude, longitude, phone_number, email, website, 
+            services_offered, working_hours, google_place_id, google_rating, 
+            google_review_count, owner_user_id, created_at, 
+            is_active, is_approved, verification_status
+        ) VALUES (
+            %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+        ) RETURNING id
+    """, (
+        name, slug, description, verified_address, city, state, pincode,
+        latitude, longitude, phone_number, email, website,
+        specialties, working_hours, google_place_id, google_rating,
+        google_review_count, owner_user_id, datetime.now(),
+        True, True, 'verified'  # Auto-approve clinics from CSV
+    ))
+    
+    clinic_id = cursor.fetchone()[0]
+    
+    # Import reviews if available from Google data
+    if google_data and google_data.get('reviews'):
+        reviews_imported = import_reviews_for_clinic(conn, clinic_id, google_data['reviews'])
+        logger.info(f"Imported {reviews_imported} reviews for {name}")
+    
+    cursor.close()
+    
+    logger.info(f"Successfully imported hybrid clinic: {name} (ID: {clinic_id})")
+    return clinic_id
+
+def import_hybrid_chunk(conn, chunk, api_key, google_cache=None):
+    """
+    Import one chunk of CSV rows with Google Places enhancement. Existing
+    clinics (by google_place_id, or by name when the row has none) are looked
+    up in one query and skipped, so a replayed chunk imports nothing twice;
+    Google is only asked about new clinics, once per place id.
+    """
+    result = ChunkResult()
+    google_cache = {} if google_cache is None else google_cache
+    
+    cursor = conn.cursor()
+    existing_place_ids, existing_names = existing_clinics(
+        cursor,
+        {row['google_place_id'] for _, row in chunk if row.get('google_place_id')},
+        {row['name'] for _, row in chunk if row.get('name')})
+    cursor.close()
+    
+    for row_num, row in chunk:
+        name = row.get('name')
+        place_id = row.get('google_place_id')
+        if not name:
+            result.fail(row_num, "Missing clinic name")
+            continue
+        exists = place_id in existing_place_ids if place_id else name in existing_names
+        if exists:
+            logger.info(f"Clinic already exists: {name}")
+            result.skipped += 1
+            continue
+        
+        logger.info(f"Processing clinic {row_num}: {name}")
+        
+        # Fetch Google Places data if place_id exists (kept for row-by-row retries of a failed chunk)
+        google_data = None
+        if place_id:
+            if place_id not in google_cache:
+                google_cache[place_id] = fetch_google_places_data(place_id, api_key)
+            google_data = google_cache[place_id]
+            if google_data:
+                logger.info(f"Enhanced with Google data: rating {google_data.get('rating')}, reviews {google_data.get('user_ratings_total')}")
+        
+        # Import clinic
+        clinic_id = import_hybrid_clinic(conn, row, google_data)
+        logger.info(f"✅ Imported: {name} (ID: {clinic_id})")
+        result.inserted += 1
+        existing_names.add(name)
+        if place_id:
+            existing_place_ids.add(place_id)
+    
+    return result
 
-def process_csv_file(csv_file_path, limit=None):
-    """Process CSV file and import clinics with Google Places enhancement."""
+def process_csv_file(csv_file_path, limit=None, resume=True):
+    """
+    Import clinics from a CSV file with Google Places enhancement, one
+    committed chunk at a time. ``limit`` caps the rows this run imports; the
+    next run carries on after them. Returns (imported, errors).
+    """
     try:
         api_key = get_google_api_key()
-        imported_count = 0
-        error_count = 0
-        
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            
-            for i, row in enumerate(reader):
-                if limit and i >= limit:
-                    break
-                
-                try:
-                    name = row['name']
-                    place_id = row['google_place_id']
-                    
-                    logger.info(f"Processing clinic {i+1}: {name}")
-                    
-                    # Fetch Google Places data if place_id exists
-                    google_data = None
-                    if place_id:
-                        google_data = fetch_google_places_data(place_id, api_key)
-                        if google_data:
-                            logger.info(f"Enhanced with Google data: rating {google_data.get('rating')}, reviews {google_data.get('user_ratings_total')}")
-                    
-                    # Import clinic
-                    clinic_id = import_hybrid_clinic(row, google_data)
-                    
-                    if clinic_id:
-                        imported_count += 1
-                        logger.info(f"✅ Imported: {name} (ID: {clinic_id})")
-                    else:
-                        error_count += 1
-                        logger.error(f"❌ Failed: {name}")
-                    
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"Error processing row {i+1}: {e}")
-                    continue
-        
-        logger.info(f"Import complete: {imported_count} successful, {error_count} errors")
-        return imported_count, error_count
-        
+        conn = get_db_connection()
     except Exception as e:
         logger.error(f"Error processing CSV file: {e}")
         return 0, 0
+    
+    google_cache = {}
+    try:
+        stats = run_import(
+            csv_file_path, conn,
+            lambda conn, chunk: import_hybrid_chunk(conn, chunk, api_key, google_cache),
+            chunk_size=CHUNK_SIZE, required_columns=['name', 'google_place_id'], resume=resume, max_rows=limit
+        )
+    except Exception as e:
+        logger.error(f"Error processing CSV file (committed chunks are kept; rerun to resume): {e}")
+        conn.rollback()
+        return 0, 0
+    finally:
+        conn.close()
+    
+    for error in stats.errors:
+        logger.error(f"❌ Failed: {error}")
+    logger.info(f"Import complete: {stats.inserted} successful, {stats.skipped} already existed, "
+                f"{stats.failed} errors ({stats.rows_per_second:.1f} rows/sec)")
+    return stats.inserted, stats.failed
 
 def main():
     """Test with a few clinics from the CSV."""
     csv_file = "attached_assets/hyderabad_filtered_clinics.csv - Sheet1_1750429116184.csv"
     
-    # Test with first 5 clinics
+    # Test with 5 clinics (a rerun carries on with the next 5)
     imported, errors = process_csv_file(csv_file, limit=5)
     
     print(f"\n🎯 Hybrid Import Test Results:")
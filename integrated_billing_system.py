@@ -7,6 +7,8 @@ from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 from sqlalchemy import text
 from models import db
+from credit_ledger import ledger as credit_ledger
+from lead_pricing_engine import lead_pricing
 import logging
 import os
 
@@ -16,16 +18,6 @@ logger = logging.getLogger(__name__)
 class BillingService:
     """Complete billing service for credit management."""
     
-    # Lead pricing tiers based on package price ranges
-    PRICING_TIERS = {
-        (0, 5000): 100,           # < ₹5,000 → 100 credits
-        (5000, 10000): 180,       # ₹5,000-₹10,000 → 180 credits  
-        (10000, 20000): 250,      # ₹10,000-₹20,000 → 250 credits
-        (20000, 50000): 320,      # ₹20,000-₹50,000 → 320 credits
-        (50000, 100000): 400,     # ₹50,000-₹100,000 → 400 credits
-        (100000, float('inf')): 500  # ₹100,000+ → 500 credits
-    }
-    
     BONUS_TIERS = {
         1000: 0,      # ₹1,000 → 0 bonus
         5000: 1000,   # ₹5,000 → 1000 bonus credits
@@ -37,42 +29,15 @@ class BillingService:
     @staticmethod
     def calculate_lead_cost(package_price):
         """Calculate lead cost based on package price range."""
-        try:
-            package_price = float(package_price)
-            for (min_price, max_price), cost in BillingService.PRICING_TIERS.items():
-                if min_price <= package_price < max_price:
-                    return cost
-            return 500
-        except (ValueError, TypeError):
-            return 100  # Default minimum cost
+        return lead_pricing.lead_cost(package_price)
     
     @staticmethod
     def get_clinic_credit_balance(clinic_id):
         """Get current credit balance for a clinic."""
         try:
-            result = db.session.execute(text("""
-                SELECT COALESCE(
-                    (SELECT SUM(amount) FROM credit_transactions 
-                     WHERE clinic_id = :clinic_id AND transaction_type IN ('credit', 'bonus', 'refund', 'admin_adjustment')) -
-                    (SELECT SUM(ABS(amount)) FROM credit_transactions 
-                     WHERE clinic_id = :clinic_id AND transaction_type = 'deduction'), 
-                    0
-                ) as balance
-            """), {"clinic_id": clinic_id}).scalar()
-            
-            balance = result or 0
-            
-            # Update clinic table with current balance
-            db.session.execute(text("""
-                UPDATE clinics SET credit_balance = :balance WHERE id = :clinic_id
-            """), {"balance": balance, "clinic_id": clinic_id})
-            db.session.commit()
-            
-            return balance
-            
+            return credit_ledger.balance(clinic_id)
         except Exception as e:
             logger.error(f"Error getting credit balance for clinic {clinic_id}: {e}")
-            db.session.rollback()
             return 0
     
     @staticmethod
@@ -82,24 +47,15 @@ class BillingService:
             # Calculate cost
             credit_cost = BillingService.calculate_lead_cost(package_price)
             
-            # Check current balance (allow negative as per requirements)
-            current_balance = BillingService.get_clinic_credit_balance(clinic_id)
-            
-            # Create deduction transaction
-            db.session.execute(text("""
-                INSERT INTO credit_transactions (
-                    clinic_id, transaction_type, amount, description, lead_id, 
-                    status, created_at, processed_at
-                ) VALUES (
-                    :clinic_id, 'deduction', :amount, :description, :lead_id,
-                    'completed', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-                )
-            """), {
-                "clinic_id": clinic_id,
-                "amount": -credit_cost,
-                "description": description or f"Lead generation cost for package worth ₹{package_price:,}",
-                "lead_id": lead_id
-            })
+            # Allow negative balance as per requirements; a lead is charged once
+            posting = credit_ledger.post(
+                clinic_id, -credit_cost, 'deduction',
+                description=description or f"Lead generation cost for package worth ₹{package_price:,}",
+                idempotency_key=f'lead:{lead_id}',
+                lead_id=lead_id
+            )
+            if posting['duplicate']:
+                return {'success': False, 'error': 'Credits already deducted for this lead'}
             
             # Update lead with billing info
             db.session.execute(text("""
@@ -112,9 +68,7 @@ class BillingService:
             
             db.session.commit()
             
-            # Get new balance
-            new_balance = BillingService.get_clinic_credit_balance(clinic_id)
-            
+            new_balance = posting['new_balance']
             logger.info(f"Deducted {credit_cost} credits for lead {lead_id}. New balance: {new_balance}")
             
             return {
@@ -133,27 +87,14 @@ class BillingService:
     def add_credits(clinic_id, amount, transaction_type='credit', description=None, order_id=None):
         """Add credits to clinic account."""
         try:
-            db.session.execute(text("""
-                INSERT INTO credit_transactions (
-                    clinic_id, transaction_type, amount, description, order_id,
-                    status, created_at, processed_at
-                ) VALUES (
-                    :clinic_id, :transaction_type, :amount, :description, :order_id,
-                    'completed', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-                )
-            """), {
-                "clinic_id": clinic_id,
-                "transaction_type": transaction_type,
-                "amount": amount,
-                "description": description,
-                "order_id": order_id
-            })
-            
+            posting = credit_ledger.post(
+                clinic_id, amount, transaction_type,
+                description=description,
+                order_id=order_id
+            )
             db.session.commit()
             
-            # Update clinic balance
-            new_balance = BillingService.get_clinic_credit_balance(clinic_id)
-            
+            new_balance = posting['new_balance']
             logger.info(f"Added {amount} credits ({transaction_type}) for clinic {clinic_id}. New balance: {new_balance}")
             
             return {
@@ -309,7 +250,7 @@ def billing_dashboard():
                              transactions=transactions,
                              monthly_stats=monthly_stats_dict,
                              credit_packages=credit_packages,
-                             pricing_tiers=BillingService.PRICING_TIERS)
+                             pricing_tiers=lead_pricing.table().ranges())
         
     except Exception as e:
         logger.error(f"Error in billing dashboard: {e}")
@@ -0,0 +1,248 @@
+"""
+Buffered, asynchronous ingestion for tracking events.
+
+Request handlers enqueue plain dicts into a bounded in-process buffer and
+return immediately; a background worker drains the buffer every
+``INTERACTION_FLUSH_SECONDS`` (or as soon as a batch fills) and hands each
+kind of event to its registered sink, which writes the whole batch with
+multi-row statements. When the buffer is full new events are dropped and
+counted rather than slowing the request down. Each kind is written in its
+own transaction; a kind whose sink fails is retried on the next flushes
+(``WRITE_ATTEMPTS`` in all) without holding back the others.
+
+Sinks are registered by the modules that own the tables (see
+interaction_tracker.py and personalization_service.py). Code that must read
+its own writes back (lead scoring) calls ``flush()`` first. Accumulators
+(buffered_counters.py) aggregate in memory instead of queueing one event per
+call and are written by the same worker on every flush.
+"""
+
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+BUFFER_SIZE = int(os.environ.get('INTERACTION_BUFFER_SIZE', 10000))
+BATCH_SIZE = int(os.environ.get('INTERACTION_BATCH_SIZE', 500))
+FLUSH_INTERVAL = float(os.environ.get('INTERACTION_FLUSH_SECONDS', 1.0))
+ID_BLOCK_SIZE = 100
+ROWS_PER_STATEMENT = 500  # Keeps bind parameter counts well under driver limits
+WRITE_ATTEMPTS = 3  # Flushes a failing sink's events are tried in before they are dropped
+
+
+def values_clause(columns, rows, prefix='v'):
+    """``(:v0_a, :v0_b), (:v1_a, ...)`` plus its params, for multi-row INSERT/UPDATE ... FROM (VALUES ...)."""
+    groups, params = [], {}
+    for i, row in enumerate(rows):
+        names = []
+        for column in columns:
+            name = f"{prefix}{i}_{column}"
+            params[name] = row.get(column)
+            names.append(f":{name}")
+        groups.append(f"({', '.join(names)})")
+    return ', '.join(groups), params
+
+
+def insert_rows(conn, table, columns, rows, suffix=''):
+    """Multi-row INSERT of dict rows, chunked to ``ROWS_PER_STATEMENT`` rows per statement."""
+    for start in range(0, len(rows), ROWS_PER_STATEMENT):
+        values_sql, params = values_clause(columns, rows[start:start + ROWS_PER_STATEMENT])
+        conn.execute(text(f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values_sql} {suffix}"), params)
+
+
+class SequenceBlock:
+    """Hands out ids reserved from a table's serial sequence, one round trip per block."""
+
+    def __init__(self, table, column='id', size=ID_BLOCK_SIZE):
+        self.table = table
+        self.column = column
+        self.size = size
+        self._ids = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def next_id(self, engine):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._ids, self._pid = [], os.getpid()  # Never share a reserved block across a fork
+            if not self._ids:
+                with engine.connect() as conn:
+                    rows = conn.execute(text(
+                        "SELECT nextval(pg_get_serial_sequence(:table, :column)) FROM generate_series(1, :n)"
+                    ), {'table': self.table, 'column': self.column, 'n': self.size}).fetchall()
+                self._ids = [row[0] for row in reversed(rows)]
+            return self._ids.pop()
+
+
+class EventIngestor:
+    """Bounded event buffer plus the per-process worker that writes it out."""
+
+    def __init__(self, buffer_size=BUFFER_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._sinks = {}
+        self._accumulators = {}
+        self._retries = []  # (kind, events, attempt) of sink writes that failed
+        self._buffer = queue.Queue(maxsize=buffer_size)
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._worker_pid = None
+        self._app = None
+        self._engine = None
+        self._counters_lock = threading.Lock()
+        self.counters = {'enqueued': 0, 'dropped': 0, 'written': 0, 'failed': 0, 'flushes': 0}
+        self.last_flush_ms = 0.0
+
+    def register_sink(self, kind, writer):
+        """``writer(conn, events)`` persists a batch of one kind inside the flush transaction."""
+        self._sinks[kind] = writer
+
+    def register_accumulator(self, name, accumulator):
+        """
+        ``accumulator.drain()`` hands over what it aggregated, ``write(conn, data)``
+        persists it in its own flush transaction and ``restore(data)`` takes it
+        back when that transaction fails.
+        """
+        self._accumulators[name] = accumulator
+
+    def _count(self, name, amount=1):
+        with self._counters_lock:
+            self.counters[name] += amount
+
+    # -- producer side --
+
+    def enqueue(self, kind, event):
+        """Buffer one event; returns False (and counts a drop) when the buffer is full."""
+        self._ensure_worker()
+        try:
+            self._buffer.put_nowait((kind, event))
+        except queue.Full:
+            self._count('dropped')
+            if self.counters['dropped'] % 1000 == 1:
+                logger.warning(f"Interaction buffer full ({self.buffer_size}); "
+                               f"{self.counters['dropped']} events dropped so far")
+            return False
+        self._count('enqueued')
+        if self._buffer.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def stats(self):
+        with self._counters_lock:
+            stats = dict(self.counters)
+        stats.update(pid=os.getpid(), capacity=self.buffer_size, pending=self._buffer.qsize(),
+                     retrying=sum(len(events) for _, events, _ in self._retries),
+                     last_flush_ms=round(self.last_flush_ms, 2))
+        # How full the buffer is; drops start at 1.0
+        stats['backpressure'] = round(stats['pending'] / self.buffer_size, 3) if self.buffer_size else 0.0
+        return stats
+
+    # -- consumer side --
+
+    def start(self):
+        """Make sure this process has a flush worker (for producers that do not enqueue)."""
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._worker_pid == os.getpid():
+            return
+        from flask import current_app
+        from app import db
+        self._app = current_app._get_current_object()
+        self._engine = db.engine
+        # Threads do not survive gunicorn's fork with preload_app, so start lazily per process
+        if self._worker_pid is not None:
+            self._buffer = queue.Queue(maxsize=self.buffer_size)  # The parent's events are its own
+            self._retries = []
+        self._worker_pid = os.getpid()
+        threading.Thread(target=self._run, daemon=True, name='interaction-ingest').start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Interaction flush failed: {e}")
+
+    def flush(self):
+        """Write everything buffered so far; safe to call from request threads."""
+        if self._engine is None:
+            return 0
+        with self._flush_lock:
+            written = self._write_retries()
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._buffer.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    break
+                written += self._write(batch)
+            self._write_accumulators()
+            return written
+
+    def _write(self, batch):
+        start_time = time.time()
+        by_kind = {}
+        for kind, event in batch:
+            by_kind.setdefault(kind, []).append(event)
+        written = sum(self._write_kind(kind, events) for kind, events in by_kind.items())
+        self._count('flushes')
+        self.last_flush_ms = (time.time() - start_time) * 1000
+        return written
+
+    def _write_kind(self, kind, events, attempt=1):
+        """One transaction per kind, so a sink that fails cannot roll back the others' rows."""
+        try:
+            with self._app.app_context(), self._engine.begin() as conn:
+                self._sinks[kind](conn, events)
+        except Exception as e:
+            if attempt < WRITE_ATTEMPTS:
+                self._retries.append((kind, events, attempt + 1))
+                logger.warning(f"Failed to write {len(events)} buffered {kind} events "
+                               f"(attempt {attempt}/{WRITE_ATTEMPTS}, retried on the next flush): {e}")
+            else:
+                self._count('failed', len(events))
+                logger.error(f"Dropping {len(events)} buffered {kind} events after {attempt} attempts: {e}")
+            return 0
+        self._count('written', len(events))
+        return len(events)
+
+    def _write_retries(self):
+        retries, self._retries = self._retries, []
+        return sum(self._write_kind(kind, events, attempt) for kind, events, attempt in retries)
+
+    def _write_accumulators(self):
+        for name, accumulator in self._accumulators.items():
+            data = accumulator.drain()
+            if not data:
+                continue
+            try:
+                with self._app.app_context(), self._engine.begin() as conn:
+                    accumulator.write(conn, data)
+            except Exception as e:
+                accumulator.restore(data)  # Retried on the next flush
+                logger.error(f"Failed to write buffered {name}: {e}")
+
+
+ingestor = EventIngestor()
+
+
+@atexit.register
+def _flush_on_exit():
+    # Best effort: events still buffered when a worker shuts down cleanly
+    if ingestor._worker_pid == os.getpid():
+        try:
+            ingestor.flush()
+        except Exception as e:
+            logger.warning(f"Could not flush buffered interactions at exit: {e}")
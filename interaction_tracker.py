@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 from flask import session, request, g
 from sqlalchemy import text
 from app import db
+from interaction_ingest import ingestor, insert_rows, SequenceBlock
 import logging
 
 # Configure logging
@@ -31,20 +32,24 @@ class InteractionTracker:
         """
         Track any user interaction in the system.
         
+        The interaction and its session update are buffered and written in
+        batches by the background ingestor; only the id is reserved up front.
+        
         Args:
             interaction_type: Type of interaction (ai_recommendation, face_analysis, etc.)
             data: Dictionary of interaction data
             source_page: Source page URL
         
         Returns:
-            interaction_id: ID of created interaction record
+            interaction_id: ID of the interaction record (written asynchronously)
         """
         try:
             session_id = InteractionTracker.get_or_create_session_id()
             user_id = getattr(g, 'current_user', {}).get('id') if hasattr(g, 'current_user') else None
             
-            # Prepare interaction data
+            interaction_id = interaction_ids.next_id(db.engine)
             interaction_data = {
+                'id': interaction_id,
                 'session_id': session_id,
                 'user_id': user_id,
                 'interaction_type': interaction_type,
@@ -52,83 +57,65 @@ class InteractionTracker:
                 'data': json.dumps(data) if data else None,
                 'ip_address': request.remote_addr if request else None,
                 'user_agent': request.headers.get('User-Agent') if request else None,
-                'referrer_url': request.referrer if request else None
+                'referrer_url': request.referrer if request else None,
+                'created_at': datetime.now()
             }
             
-            # Insert interaction record
-            result = db.session.execute(text("""
-                INSERT INTO user_interactions 
-                (session_id, user_id, interaction_type, source_page, data, ip_address, user_agent, referrer_url)
-                VALUES (:session_id, :user_id, :interaction_type, :source_page, :data, :ip_address, :user_agent, :referrer_url)
-                RETURNING id
-            """), interaction_data)
-            
-            interaction_id = result.fetchone()[0]
-            db.session.commit()
-            
-            # Update session tracking
-            InteractionTracker.update_session_tracking(session_id, source_page)
+            if not ingestor.enqueue('lead_interaction', interaction_data):
+                return None
             
-            logger.info(f"Tracked interaction: {interaction_type} for session {session_id[:8]}...")
+            logger.debug(f"Queued interaction: {interaction_type} for session {session_id[:8]}...")
             return interaction_id
             
         except Exception as e:
-            db.session.rollback()
             logger.error(f"Error tracking interaction: {e}")
             return None
+
+
+INTERACTION_COLUMNS = ('id', 'session_id', 'user_id', 'interaction_type', 'source_page', 'data',
+                       'ip_address', 'user_agent', 'referrer_url', 'created_at')
+SESSION_COLUMNS = ('session_id', 'user_id', 'ip_address', 'user_agent', 'referrer_url',
+                   'first_page', 'last_page', 'page_count', 'created_at', 'updated_at')
+
+interaction_ids = SequenceBlock('user_interactions')
+
+
+def write_lead_interactions(conn, events):
+    """Batch sink: one multi-row INSERT for the interactions, one upsert for their sessions."""
+    insert_rows(conn, 'user_interactions', INTERACTION_COLUMNS, events)
     
-    @staticmethod
-    def update_session_tracking(session_id, current_page=None):
-        """Update session tracking with page visit."""
-        try:
-            # Get or create session record
-            session_result = db.session.execute(text("""
-                SELECT id, page_count, first_page, created_at 
-                FROM user_sessions 
-                WHERE session_id = :session_id
-            """), {'session_id': session_id}).fetchone()
-            
-            if session_result:
-                # Update existing session
-                session_data = dict(session_result._mapping)
-                time_diff = datetime.now() - session_data['created_at']
-                total_seconds = int(time_diff.total_seconds())
-                
-                db.session.execute(text("""
-                    UPDATE user_sessions 
-                    SET page_count = page_count + 1,
-                        last_page = :current_page,
-                        total_time_seconds = :total_seconds,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE session_id = :session_id
-                """), {
-                    'session_id': session_id,
-                    'current_page': current_page,
-                    'total_seconds': total_seconds
-                })
-            else:
-                # Create new session
-                user_id = getattr(g, 'current_user', {}).get('id') if hasattr(g, 'current_user') else None
-                
-                db.session.execute(text("""
-                    INSERT INTO user_sessions 
-                    (session_id, user_id, ip_address, user_agent, referrer_url, first_page, last_page)
-                    VALUES (:session_id, :user_id, :ip_address, :user_agent, :referrer_url, :first_page, :last_page)
-                """), {
-                    'session_id': session_id,
-                    'user_id': user_id,
-                    'ip_address': request.remote_addr if request else None,
-                    'user_agent': request.headers.get('User-Agent') if request else None,
-                    'referrer_url': request.referrer if request else None,
-                    'first_page': current_page,
-                    'last_page': current_page
-                })
-            
-            db.session.commit()
-            
-        except Exception as e:
-            db.session.rollback()
-            logger.error(f"Error updating session tracking: {e}")
+    # Coalesce to one row per session: first page/time from the first event, last from the latest
+    sessions = {}
+    for event in events:
+        current = sessions.get(event['session_id'])
+        if current is None:
+            sessions[event['session_id']] = {
+                'session_id': event['session_id'],
+                'user_id': event['user_id'],
+                'ip_address': event['ip_address'],
+                'user_agent': event['user_agent'],
+                'referrer_url': event['referrer_url'],
+                'first_page': event['source_page'],
+                'last_page': event['source_page'],
+                'page_count': 1,
+                'created_at': event['created_at'],
+                'updated_at': event['created_at']
+            }
+        else:
+            current['page_count'] += 1
+            current['last_page'] = event['source_page']
+            current['updated_at'] = event['created_at']
+    
+    insert_rows(conn, 'user_sessions', SESSION_COLUMNS, list(sessions.values()), suffix="""
+        ON CONFLICT (session_id) DO UPDATE SET
+            page_count = user_sessions.page_count + EXCLUDED.page_count,
+            last_page = EXCLUDED.last_page,
+            total_time_seconds = GREATEST(0, EXTRACT(EPOCH FROM EXCLUDED.updated_at - user_sessions.created_at))::int,
+            updated_at = EXCLUDED.updated_at
+    """)
+
+
+ingestor.register_sink('lead_interaction', write_lead_interactions)
 
 class LeadScorer:
     """Lead scoring system based on interactions and behavior."""
@@ -201,6 +188,9 @@ class LeadScorer:
     def calculate_lead_score(session_id, additional_data=None):
         """Calculate comprehensive lead score for a session."""
         try:
+            # Scoring reads this session's interactions back, so write out anything still buffered
+            ingestor.flush()
+            
             # Get all interactions for session
             interactions_result = db.session.execute(text("""
                 SELECT interaction_type, data, created_at
@@ -293,6 +283,8 @@ class LeadConverter:
     def create_lead_from_interaction(interaction_id, contact_data):
         """Create a lead record from an interaction."""
         try:
+            ingestor.flush()
+            
             # Get interaction details
             interaction_result = db.session.execute(text("""
                 SELECT ui.*, us.utm_source, us.utm_medium, us.utm_campaign
@@ -0,0 +1,364 @@
+"""
+Offline item-to-item similarity for procedures and packages.
+
+``python item_similarity.py build`` computes, for every procedure and every
+active package, its ``TOP_K`` most similar items of the same kind:
+
+- text similarity: cosine of sublinear TF-IDF vectors over names,
+  descriptions and category/body-part text (terms in fewer than two items
+  cannot make two items similar and are dropped);
+- co-interaction: visitors in ``user_interactions`` who looked at both
+  items within ``CO_INTERACTION_DAYS``, as ``both / sqrt(a * b)``.
+
+The blend is written to ``<SIMILARITY_MODEL_DIR>/<kind>_neighbors.npy``, one
+fixed-width record per item (id, neighbour ids, scores) sorted by id. Each
+worker maps the files read-only with ``np.load(mmap_mode='r')`` at boot
+(``init_app``), so the pages are shared between workers and a lookup is a
+binary search over the id column with no SQL. A rebuilt file replaces the
+old one atomically and is picked up within ``RELOAD_CHECK_INTERVAL``
+seconds.
+
+Where the models get built: Elastic Beanstalk runs the build on every
+instance at deploy (.ebextensions/06_similarity_model.config). Everywhere
+else (Docker, Procfile) the serving workers build missing models, and
+rebuild them once they are ``REBUILD_INTERVAL`` seconds old, in a
+background thread; a lock file in the model directory lets one process per
+host do the work. ``SIMILARITY_REBUILD_SECONDS=0`` turns that off.
+
+This replaces the joblib pickles (``similarity_matrix.pkl``,
+``procedure_ids.pkl``). They still loaded, but no code in the tree read
+them.
+"""
+
+import os
+import re
+import math
+import time
+import fcntl
+import logging
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.environ.get('SIMILARITY_MODEL_DIR',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), 'similarity_model'))
+KINDS = ('procedure', 'package')
+TOP_K = 20
+MIN_DOCUMENT_FREQUENCY = 2
+MAX_FEATURES = 4096
+TEXT_WEIGHT = 0.7
+CO_INTERACTION_WEIGHT = 0.3
+CO_INTERACTION_DAYS = 180
+MIN_CO_VISITORS = 2
+MAX_ITEMS_PER_VISITOR = 50  # A crawler-like visitor would otherwise add quadratic noise
+BLOCK_ROWS = 256
+RELOAD_CHECK_INTERVAL = 30.0
+REBUILD_INTERVAL = int(os.environ.get('SIMILARITY_REBUILD_SECONDS', 24 * 3600))
+FAILED_BUILD_RETRY = 600
+
+STOPWORDS = frozenset({
+    'and', 'the', 'for', 'with', 'from', 'that', 'this', 'are', 'your', 'you', 'our', 'can', 'will',
+    'has', 'have', 'its', 'into', 'also', 'more', 'which', 'what', 'when', 'who', 'how', 'all',
+})
+_TAG = re.compile(r"<[^>]+>")
+_WORD = re.compile(r"[a-z][a-z0-9]+")
+
+
+def tokens(document):
+    return [word for word in _WORD.findall(_TAG.sub(' ', document or '').lower())
+            if len(word) > 2 and word not in STOPWORDS]
+
+
+def tfidf_matrix(documents):
+    """Rows are L2-normalised sublinear TF-IDF vectors (float32, items x terms)."""
+    counts = [Counter(tokens(document)) for document in documents]
+    frequency = Counter(term for document_counts in counts for term in document_counts)
+    vocabulary = {term: column for column, (term, n) in enumerate(
+        (term, n) for term, n in frequency.most_common(MAX_FEATURES) if n >= MIN_DOCUMENT_FREQUENCY
+    )}
+
+    matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    idf = np.zeros(len(vocabulary), dtype=np.float32)
+    for term, column in vocabulary.items():
+        idf[column] = math.log((1 + len(documents)) / (1 + frequency[term])) + 1
+    for row, document_counts in enumerate(counts):
+        for term, n in document_counts.items():
+            column = vocabulary.get(term)
+            if column is not None:
+                matrix[row, column] = 1 + math.log(n)
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def co_interaction(visitor_items, positions):
+    """{position: {position: score}} from {visitor: [item ids]}, scored both / sqrt(a * b)."""
+    item_visitors = Counter()
+    pairs = Counter()
+    for items in visitor_items.values():
+        seen = sorted({positions[item_id] for item_id in items if item_id in positions})[:MAX_ITEMS_PER_VISITOR]
+        item_visitors.update(seen)
+        for i, a in enumerate(seen):
+            for b in seen[i + 1:]:
+                pairs[(a, b)] += 1
+
+    scores = {}
+    for (a, b), both in pairs.items():
+        if both < MIN_CO_VISITORS:
+            continue
+        score = both / math.sqrt(item_visitors[a] * item_visitors[b])
+        scores.setdefault(a, {})[b] = score
+        scores.setdefault(b, {})[a] = score
+    return scores
+
+
+def model_dtype(k):
+    return np.dtype([('id', '<i8'), ('neighbors', '<i8', (k,)), ('scores', '<f4', (k,))])
+
+
+def build_neighbors(ids, documents, co_scores=None, k=TOP_K):
+    """Records of the ``k`` best-scoring other items per item, by id; unused slots hold id -1."""
+    order = np.argsort(np.asarray(ids, dtype=np.int64), kind='stable')
+    ids = np.asarray(ids, dtype=np.int64)[order]
+    documents = [documents[i] for i in order]
+    inverse = {int(old): new for new, old in enumerate(order)}
+    co_scores = {inverse[a]: {inverse[b]: s for b, s in row.items()} for a, row in (co_scores or {}).items()}
+
+    n = len(ids)
+    records = np.zeros(n, dtype=model_dtype(k))
+    records['id'] = ids
+    records['neighbors'] = -1
+    width = min(k, n - 1)
+    if width <= 0:
+        return records
+
+    features = tfidf_matrix(documents)
+    for start in range(0, n, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, n)
+        # One block of the similarity matrix at a time keeps memory at BLOCK_ROWS x n
+        block = TEXT_WEIGHT * (features[start:stop] @ features.T)
+        for row in range(start, stop):
+            for column, score in co_scores.get(row, {}).items():
+                block[row - start, column] += CO_INTERACTION_WEIGHT * score
+        block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        top = np.argpartition(-block, width - 1, axis=1)[:, :width]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        best_first = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, best_first, axis=1)
+        top_scores = np.take_along_axis(top_scores, best_first, axis=1)
+
+        neighbors = np.where(top_scores > 0, ids[top], -1)
+        records['neighbors'][start:stop, :width] = neighbors
+        records['scores'][start:stop, :width] = np.where(top_scores > 0, top_scores, 0)
+    return records
+
+
+def model_path(kind, folder=None):
+    return os.path.join(folder or MODEL_DIR, f"{kind}_neighbors.npy")
+
+
+def save_model(kind, records, folder=None):
+    """Write atomically, so mapped readers see the old file or the new one, never half of one."""
+    folder = folder or MODEL_DIR
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=f'.{kind}-', suffix='.npy')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, model_path(kind, folder))
+
+
+# -- offline build --
+
+def load_documents(session, kind):
+    """(ids, documents) for every procedure or active package (one query)."""
+    if kind == 'procedure':
+        rows = session.execute(text("""
+            SELECT p.id, p.procedure_name, p.alternative_names, p.short_description, p.body_part,
+                   p.procedure_types, c.name AS category_name
+            FROM procedures p
+            LEFT JOIN categories c ON c.id = p.category_id
+        """)).fetchall()
+        # Names count twice: they are short and the most specific text there is
+        return ([row.id for row in rows],
+                [' '.join(filter(None, (row.procedure_name, row.procedure_name, row.alternative_names,
+                                        row.category_name, row.body_part, row.procedure_types,
+                                        row.short_description)))
+                 for row in rows])
+    rows = session.execute(text("""
+        SELECT p.id, p.title, p.actual_treatment_name, p.category, p.description, pr.procedure_name
+        FROM packages p
+        LEFT JOIN procedures pr ON pr.id = p.procedure_id
+        WHERE p.is_active = true
+    """)).fetchall()
+    return ([row.id for row in rows],
+            [' '.join(filter(None, (row.title, row.title, row.actual_treatment_name, row.category,
+                                    row.procedure_name, row.description)))
+             for row in rows])
+
+
+def load_visitor_items(session, kind, days=CO_INTERACTION_DAYS):
+    """{visitor: [item ids]} of the visitors who interacted with items of ``kind`` recently."""
+    visitor_items = {}
+    try:
+        rows = session.execute(text("""
+            SELECT DISTINCT user_id, target_id
+            FROM user_interactions
+            WHERE target_type = :kind AND target_id IS NOT NULL AND timestamp >= :since
+        """), {'kind': kind, 'since': datetime.utcnow() - timedelta(days=days)}).fetchall()
+    except Exception as e:
+        logger.warning(f"No co-interaction data for {kind}s, using text similarity only: {e}")
+        session.rollback()
+        return visitor_items
+    for user_id, target_id in rows:
+        visitor_items.setdefault(user_id, []).append(target_id)
+    return visitor_items
+
+
+def build(session, kinds=KINDS, folder=None):
+    """Rebuild and save the neighbour files; returns {kind: items}."""
+    built = {}
+    for kind in kinds:
+        start_time = time.time()
+        ids, documents = load_documents(session, kind)
+        positions = {item_id: position for position, item_id in enumerate(ids)}
+        co_scores = co_interaction(load_visitor_items(session, kind), positions)
+        save_model(kind, build_neighbors(ids, documents, co_scores), folder)
+        built[kind] = len(ids)
+        logger.info(f"{kind} similarity built: {len(ids)} items, {len(co_scores)} with co-interactions "
+                    f"({time.time() - start_time:.1f}s)")
+    return built
+
+
+# -- serving --
+
+class SimilarityModel:
+    """Read-only memory-mapped neighbour records of one kind."""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        self.records = np.load(path, mmap_mode='r')
+        self.ids = self.records['id']
+
+    def __len__(self):
+        return len(self.ids)
+
+    def related(self, item_id, limit=None):
+        """[(item_id, score), ...] best first; [] for items the model does not know."""
+        position = int(np.searchsorted(self.ids, item_id))
+        if position >= len(self.ids) or self.ids[position] != item_id:
+            return []
+        record = self.records[position]
+        return [(int(neighbor), float(score))
+                for neighbor, score in zip(record['neighbors'][:limit], record['scores'][:limit])
+                if neighbor >= 0]
+
+
+class ModelHolder:
+    """Per-process mapped models, swapped when a rebuild replaces a file."""
+
+    def __init__(self, folder=None):
+        self.folder = folder
+        self._models = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._app = None
+        self._build_pid = None     # Process running a background build, if any
+        self._next_build_at = 0.0
+
+    def load(self, folder=None):
+        self.folder = folder or self.folder or MODEL_DIR
+        with self._lock:
+            for kind in KINDS:
+                path = model_path(kind, self.folder)
+                current = self._models.get(kind)
+                try:
+                    if current is None or os.stat(path).st_mtime != current.mtime:
+                        self._models[kind] = SimilarityModel(path)
+                        logger.info(f"Mapped {kind} similarity model ({len(self._models[kind])} items)")
+                except FileNotFoundError:
+                    self._models.pop(kind, None)
+                except Exception as e:
+                    logger.error(f"Could not map {kind} similarity model: {e}")
+            self._last_check = time.time()
+
+    def get(self, kind):
+        if self.folder is None or time.time() - self._last_check >= RELOAD_CHECK_INTERVAL:
+            self.load()
+            self.maybe_rebuild()
+        return self._models.get(kind)
+
+    def needs_build(self):
+        if len(self._models) < len(KINDS):
+            return True
+        return time.time() - min(model.mtime for model in self._models.values()) > REBUILD_INTERVAL
+
+    def maybe_rebuild(self):
+        """Build missing or old models in a background thread of this worker."""
+        if (self._app is None or REBUILD_INTERVAL <= 0 or self._build_pid == os.getpid()
+                or time.time() < self._next_build_at or not self.needs_build()):
+            return
+        # Threads do not survive gunicorn's fork with preload_app, so start lazily per process
+        self._build_pid = os.getpid()
+        threading.Thread(target=self._rebuild, daemon=True, name='item-similarity-build').start()
+
+    def _rebuild(self):
+        from app import db
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(os.path.join(self.folder, '.build.lock'), 'w') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # Another worker on this host is building
+                self.load()
+                if not self.needs_build():
+                    return  # Finished by another worker meanwhile
+                with self._app.app_context():
+                    build(db.session, folder=self.folder)
+            self.load()
+        except Exception as e:
+            logger.error(f"Background similarity build failed: {e}")
+            self._next_build_at = time.time() + FAILED_BUILD_RETRY
+        finally:
+            self._build_pid = None
+
+
+holder = ModelHolder()
+
+
+def init_app(app):
+    """Map the neighbour files at boot (before gunicorn forks with preload_app)."""
+    app.config.setdefault('SIMILARITY_MODEL_DIR', MODEL_DIR)
+    holder._app = app
+    holder.load(app.config['SIMILARITY_MODEL_DIR'])
+    if not holder._models:
+        logger.warning(f"No similarity model in {holder.folder}; a worker will build it in the background "
+                       f"(or run `python item_similarity.py build`)")
+
+
+def related_ids(kind, item_id, limit=10):
+    """Ids and scores of the items most similar to ``item_id``, without touching the database."""
+    model = holder.get(kind)
+    if model is None:
+        return []
+    return model.related(item_id, limit)
+
+
+if __name__ == "__main__":
+    import sys
+    from app import app, db
+
+    with app.app_context():
+        if sys.argv[1:2] == ['build']:
+            built = build(db.session, sys.argv[2:] or KINDS)
+            print(f"✅ Built similarity models in {MODEL_DIR}: {built}")
+        else:
+            print("Usage: python item_similarity.py build [procedure|package ...]")
@@ -6,6 +6,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from datetime import datetime
 from models import db
+from credit_ledger import ledger as credit_ledger
 from sqlalchemy import text
 import logging
 
@@ -172,25 +173,13 @@ class LeadDisputeService:
             if action == 'approve' and dispute_dict['billed_amount']:
                 refund_amount = abs(dispute_dict['billed_amount'])
                 
-                # Add refund transaction
-                db.session.execute(text("""
-                    INSERT INTO credit_transactions (
-                        clinic_id, transaction_type, amount, description, 
-                        lead_id, status, created_at, processed_at
-                    ) VALUES (
-                        :clinic_id, 'refund', :amount, :description,
-                        :lead_id, 'completed', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP
-                    )
-                """), {
-                    "clinic_id": dispute_dict['clinic_id'],
-                    "amount": refund_amount,
-                    "description": f"Refund for disputed lead - {dispute_dict['reason']}",
-                    "lead_id": dispute_dict['lead_id']
-                })
-                
-                # Update clinic balance
-                from enhanced_credit_billing import EnhancedCreditBillingService
-                EnhancedCreditBillingService.get_clinic_credit_balance(dispute_dict['clinic_id'])
+                # Add refund transaction; a dispute is refunded at most once
+                credit_ledger.post(
+                    dispute_dict['clinic_id'], refund_amount, 'refund',
+                    description=f"Refund for disputed lead - {dispute_dict['reason']}",
+                    idempotency_key=f'dispute:{dispute_id}:refund',
+                    lead_id=dispute_dict['lead_id']
+                )
             
             # Update lead status
             new_lead_status = 'refunded' if action == 'approve' else 'active'
@@ -0,0 +1,150 @@
+"""
+Lead pricing engine shared by every billing module.
+
+Active ``lead_pricing_tiers`` rows are compiled once into a ``PricingTable``:
+a sorted array of tier lower bounds plus matching upper bounds and costs.
+A lead's cost is one ``bisect`` over the lower bounds and one bounds check;
+``PricingTable.costs`` prices a whole array of package values with
+``np.searchsorted`` (used by the admin pricing preview).
+
+The compiled table lives in the shared cache under the ``lead-pricing`` tag.
+Admin tier edits call ``invalidate()`` inside their transaction, so every
+gunicorn worker recompiles on its next lookup after the commit. When no tier
+is configured, or the tiers cannot be read, ``FALLBACK_TIERS`` apply.
+"""
+
+import bisect
+import logging
+import numpy as np
+from sqlalchemy import text
+
+from cache_backend import cache
+from cache_invalidation import LEAD_PRICING, mark_dirty
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'lead_pricing'
+TABLE_TTL = 3600
+
+# Used when no tier is configured; bounds are inclusive like the admin tiers
+FALLBACK_TIERS = [
+    {'tier_name': 'Up to ₹5,000', 'min_package_value': 0, 'max_package_value': 5000, 'credit_cost': 100},
+    {'tier_name': '₹5,001 - ₹10,000', 'min_package_value': 5001, 'max_package_value': 10000, 'credit_cost': 150},
+    {'tier_name': '₹10,001 - ₹20,000', 'min_package_value': 10001, 'max_package_value': 20000, 'credit_cost': 200},
+    {'tier_name': '₹20,001 - ₹50,000', 'min_package_value': 20001, 'max_package_value': 50000, 'credit_cost': 300},
+    {'tier_name': 'Above ₹50,000', 'min_package_value': 50001, 'max_package_value': None, 'credit_cost': 400},
+]
+
+
+def parse_package_value(package_value):
+    """Package value as an int; accepts '12,500', floats and None."""
+    if isinstance(package_value, str):
+        package_value = float(package_value.replace(',', '')) if package_value.strip() else 0
+    return int(package_value) if package_value else 0
+
+
+class PricingTable:
+    """
+    Tiers compiled for lookup.
+
+    A value is priced by the tier with the greatest lower bound not above it,
+    provided the value is within that tier's upper bound (None = open-ended).
+    Values in a gap between tiers, or outside all of them, pay the highest
+    tier's cost. Tiers are validated not to overlap when they are saved.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = sorted((dict(tier) for tier in tiers), key=lambda tier: tier['min_package_value'])
+        if not self.tiers:
+            raise ValueError("A pricing table needs at least one tier")
+        self.lower = [int(tier['min_package_value']) for tier in self.tiers]
+        self._lower = np.array(self.lower, dtype=np.float64)
+        self._upper = np.array([np.inf if tier['max_package_value'] is None else int(tier['max_package_value'])
+                                for tier in self.tiers], dtype=np.float64)
+        self._costs = np.array([int(tier['credit_cost']) for tier in self.tiers], dtype=np.int64)
+        self.top_cost = int(self._costs[-1])
+
+    def tier_index(self, package_value):
+        """Index of the tier containing ``package_value``, or None."""
+        index = bisect.bisect_right(self.lower, package_value) - 1
+        if index >= 0 and package_value <= self._upper[index]:
+            return index
+        return None
+
+    def cost(self, package_value):
+        index = self.tier_index(package_value)
+        return int(self._costs[index]) if index is not None else self.top_cost
+
+    def costs(self, package_values, default=None):
+        """
+        Vectorised ``cost`` for an array of package values.
+
+        Values that match no tier get ``default`` (a scalar or an array
+        aligned with ``package_values``) or, without one, the highest tier's cost.
+        """
+        values = np.asarray(package_values, dtype=np.float64)
+        index = np.searchsorted(self._lower, values, side='right') - 1
+        clipped = np.clip(index, 0, None)
+        matched = (index >= 0) & (values <= self._upper[clipped])
+        fallback = self.top_cost if default is None else default
+        return np.where(matched, self._costs[clipped], fallback).astype(np.int64)
+
+    def ranges(self):
+        """{(min, max): cost} with an open upper bound as inf, for the billing templates."""
+        return {(tier['min_package_value'], float('inf') if tier['max_package_value'] is None
+                 else tier['max_package_value']): tier['credit_cost'] for tier in self.tiers}
+
+
+FALLBACK_TABLE = PricingTable(FALLBACK_TIERS)
+
+
+class LeadPricingEngine:
+    """Compiled, cross-worker cached lead pricing."""
+
+    def load_tiers(self):
+        from app import db
+        result = db.session.execute(text("""
+            SELECT id, tier_name, min_package_value, max_package_value,
+                   credit_cost, is_active, created_at, updated_at
+            FROM lead_pricing_tiers
+            WHERE is_active = TRUE
+            ORDER BY min_package_value ASC
+        """))
+        return [dict(row._mapping) for row in result.fetchall()]
+
+    def _compile(self):
+        tiers = self.load_tiers()
+        if not tiers:
+            logger.warning("No pricing tiers found, using fallback pricing")
+            return FALLBACK_TABLE
+        logger.info(f"Compiled {len(tiers)} lead pricing tiers")
+        return PricingTable(tiers)
+
+    def table(self):
+        try:
+            return cache.get_or_set(NAMESPACE, 'tiers', self._compile, ttl=TABLE_TTL, tags=[LEAD_PRICING])
+        except Exception as e:
+            # Not cached, so the real tiers are picked up as soon as they can be read
+            logger.error(f"Error fetching pricing tiers: {e}")
+            return FALLBACK_TABLE
+
+    def lead_cost(self, package_value):
+        """Credit cost of a lead for a package worth ``package_value`` (INR)."""
+        try:
+            package_value = parse_package_value(package_value)
+        except (ValueError, TypeError) as e:
+            logger.error(f"Invalid package value {package_value!r}: {e}")
+            package_value = 0
+        return self.table().cost(package_value)
+
+    def lead_costs(self, package_values):
+        """Costs for many package values at once (NumPy array)."""
+        values = [parse_package_value(value) for value in package_values]
+        return self.table().costs(values)
+
+    def invalidate(self, session=None):
+        """Recompile in every worker once the current transaction commits."""
+        mark_dirty(LEAD_PRICING, session=session)
+
+
+lead_pricing = LeadPricingEngine()
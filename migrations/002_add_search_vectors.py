@@ -0,0 +1,57 @@
+"""
+Migration 002: Full-text search vectors
+Adds generated, weighted tsvector columns with GIN indexes for /search
+"""
+
+import os
+import sys
+import psycopg2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from search_engine import search_vector_ddl
+
+def get_db_connection():
+    """Get database connection using environment variable."""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return psycopg2.connect(database_url)
+
+def add_search_vectors():
+    """Create the generated search_vector columns and their GIN indexes."""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        for statement in search_vector_ddl():
+            cursor.execute(statement)
+            print(f"✓ {statement.strip().splitlines()[0][:90]}")
+
+        # Refresh planner statistics so the GIN indexes are picked up immediately
+        cursor.execute("ANALYZE procedures, doctors, threads, community, packages, clinics;")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error adding search vectors: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    """Run all migration steps."""
+    print("Adding full-text search vectors")
+    print("=" * 50)
+
+    try:
+        add_search_vectors()
+        print("\n✅ Search vector migration completed successfully!")
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Migration 003: AI query analysis cache
+Stores Gemini analyses per normalized query so they survive restarts
+"""
+
+import os
+import psycopg2
+
+def get_db_connection():
+    """Get database connection using environment variable."""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return psycopg2.connect(database_url)
+
+def create_ai_query_analyses_table():
+    """Create the ai_query_analyses table used by query_analysis_cache.py."""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ai_query_analyses (
+                query_key TEXT PRIMARY KEY,
+                analysis TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_ai_query_analyses_created_at ON ai_query_analyses(created_at);
+        """)
+
+        print("✓ Created ai_query_analyses table")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error creating ai_query_analyses table: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    """Run all migration steps."""
+    print("Creating AI query analysis cache table")
+    print("=" * 50)
+
+    try:
+        create_ai_query_analyses_table()
+        print("\n✅ AI query analysis migration completed successfully!")
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
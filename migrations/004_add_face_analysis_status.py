@@ -0,0 +1,56 @@
+"""
+Migration 004: Face analysis job status
+Adds status columns so face analyses can run as background jobs
+"""
+
+import os
+import psycopg2
+
+def get_db_connection():
+    """Get database connection using environment variable."""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return psycopg2.connect(database_url)
+
+def add_face_analysis_status():
+    """Add status/status_message to face_analyses; existing rows count as completed."""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            ALTER TABLE face_analyses
+            ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'completed';
+        """)
+        cursor.execute("""
+            ALTER TABLE face_analyses ADD COLUMN IF NOT EXISTS status_message TEXT;
+        """)
+
+        print("✓ Added status columns to face_analyses")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error adding face analysis status: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    """Run all migration steps."""
+    print("Adding face analysis job status")
+    print("=" * 50)
+
+    try:
+        add_face_analysis_status()
+        print("\n✅ Face analysis status migration completed successfully!")
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
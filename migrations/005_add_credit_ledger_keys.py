@@ -0,0 +1,91 @@
+"""
+Migration 005: Credit ledger idempotency keys
+Adds credit_transactions.idempotency_key (unique) so replayed payment
+webhooks and retried lead charges post at most once, plus the index the
+ledger balance sums and reconciliation use, and records an opening_balance
+transaction for every clinic whose balance predates the ledger.
+"""
+
+import os
+import psycopg2
+
+def get_db_connection():
+    """Get database connection using environment variable."""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return psycopg2.connect(database_url)
+
+def add_credit_ledger_keys():
+    """Add the idempotency key column and ledger indexes to credit_transactions."""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            ALTER TABLE credit_transactions ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(100);
+        """)
+        # NULLs are distinct, so only keyed postings are deduplicated
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_credit_transactions_idempotency_key
+            ON credit_transactions (idempotency_key);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_credit_transactions_clinic_status
+            ON credit_transactions (clinic_id, status) INCLUDE (amount);
+        """)
+
+        print("✓ Added idempotency key and ledger indexes to credit_transactions")
+
+        # Balances written before the ledger (bulk-import starting credits, direct
+        # UPDATEs) have no transactions behind them; record the difference as an
+        # opening balance so reconciliation does not treat real credits as drift.
+        # Postings are blocked meanwhile, and the key makes re-running a no-op.
+        cursor.execute("LOCK TABLE clinics, credit_transactions IN SHARE MODE;")
+        cursor.execute("""
+            INSERT INTO credit_transactions (
+                clinic_id, transaction_type, amount, description, idempotency_key,
+                status, created_at, processed_at
+            )
+            SELECT c.id, 'opening_balance',
+                   COALESCE(c.credit_balance, 0) - COALESCE(l.total, 0),
+                   'Balance carried over from before the credit ledger',
+                   'opening_balance:' || c.id,
+                   'completed', NOW(), NOW()
+            FROM clinics c
+            LEFT JOIN (
+                SELECT clinic_id, SUM(amount) AS total
+                FROM credit_transactions
+                WHERE COALESCE(status, 'completed') = 'completed'
+                GROUP BY clinic_id
+            ) l ON l.clinic_id = c.id
+            WHERE COALESCE(c.credit_balance, 0) <> COALESCE(l.total, 0)
+            ON CONFLICT (idempotency_key) DO NOTHING;
+        """)
+        print(f"✓ Recorded opening balances for {cursor.rowcount} clinics")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error adding credit ledger keys: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    """Run all migration steps."""
+    print("Adding credit ledger idempotency keys")
+    print("=" * 50)
+
+    try:
+        add_credit_ledger_keys()
+        print("\n✅ Credit ledger migration completed successfully!")
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
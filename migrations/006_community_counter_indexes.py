@@ -0,0 +1,82 @@
+"""
+Migration 006: Community counter backfill
+Recounts community.reply_count from the reply rows (maintained incrementally
+from here on, together with the vote columns; see community_counters.py) and
+adds the indexes the recount, the thread detail reply query and
+reconciliation use.
+"""
+
+import os
+import psycopg2
+
+def get_db_connection():
+    """Get database connection using environment variable."""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return psycopg2.connect(database_url)
+
+def backfill_community_counters():
+    """Add counter indexes and recount every thread once."""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_community_parent_created
+            ON community (parent_id, created_at);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_community_replies_thread
+            ON community_replies (thread_id);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_thread_votes_thread
+            ON thread_votes (thread_id);
+        """)
+        print("✓ Added community counter indexes")
+
+        # Votes are not recounted: imported threads carry Reddit scores with no thread_votes rows
+        cursor.execute("""
+            WITH counted AS (
+                SELECT c.id, COALESCE(children.n, 0) + COALESCE(replies.n, 0) AS reply_count
+                FROM community c
+                LEFT JOIN (SELECT parent_id, COUNT(*) AS n FROM community
+                           WHERE parent_id IS NOT NULL GROUP BY parent_id) children
+                       ON children.parent_id = c.id
+                LEFT JOIN (SELECT thread_id, COUNT(*) AS n FROM community_replies
+                           GROUP BY thread_id) replies
+                       ON replies.thread_id = c.id
+            )
+            UPDATE community SET reply_count = counted.reply_count
+            FROM counted
+            WHERE community.id = counted.id
+              AND community.reply_count IS DISTINCT FROM counted.reply_count;
+        """)
+        print(f"✓ Recounted replies on {cursor.rowcount} community threads")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error backfilling community counters: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    """Run all migration steps."""
+    print("Backfilling community counters")
+    print("=" * 50)
+
+    try:
+        backfill_community_counters()
+        print("\n✅ Community counter migration completed successfully!")
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
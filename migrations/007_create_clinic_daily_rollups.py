@@ -0,0 +1,206 @@
+"""
+Migration 007: Clinic daily rollups
+Creates clinic_daily_rollups, one row per clinic per day holding lead,
+credit and package view totals, kept current by triggers on leads,
+credit_transactions and packages so every writer (ORM or raw SQL) is
+counted. Leads are attributed to the day they were created; later status
+changes (contacted, converted) update that day's row, matching how the
+admin analytics filter leads by created_at. Lead status may be NULL (not
+pending); a credit transaction without a status counts as completed, as in
+credit_ledger. History is backfilled from the raw tables; package views
+start counting from this migration.
+"""
+
+import os
+import psycopg2
+
+def get_db_connection():
+    """Get database connection using environment variable."""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return psycopg2.connect(database_url)
+
+def create_clinic_daily_rollups():
+    """Create the rollup table, its maintenance triggers and backfill history."""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        # clinic_id 0 collects leads without a clinic (doctor leads), so totals stay complete
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS clinic_daily_rollups (
+                clinic_id INTEGER NOT NULL,
+                day DATE NOT NULL,
+                leads INTEGER NOT NULL DEFAULT 0,
+                pending_leads INTEGER NOT NULL DEFAULT 0,
+                contacted_leads INTEGER NOT NULL DEFAULT 0,
+                converted_leads INTEGER NOT NULL DEFAULT 0,
+                lead_credits BIGINT NOT NULL DEFAULT 0,
+                conversion_value NUMERIC(14, 2) NOT NULL DEFAULT 0,
+                credits_added BIGINT NOT NULL DEFAULT 0,
+                credits_used BIGINT NOT NULL DEFAULT 0,
+                package_views BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (clinic_id, day)
+            );
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_clinic_daily_rollups_day
+            ON clinic_daily_rollups (day);
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_leads_created_at
+            ON leads (created_at);
+        """)
+        print("✓ Created clinic_daily_rollups")
+
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION rollup_lead_change() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    INSERT INTO clinic_daily_rollups AS r
+                        (clinic_id, day, leads, pending_leads, contacted_leads, converted_leads,
+                         lead_credits, conversion_value)
+                    VALUES (COALESCE(OLD.clinic_id, 0), COALESCE(OLD.created_at, now())::date, -1,
+                            -COALESCE(OLD.status = 'new', false)::int, -(OLD.contacted_at IS NOT NULL)::int,
+                            -(OLD.converted_at IS NOT NULL)::int, -COALESCE(OLD.credit_cost, 0),
+                            -COALESCE(OLD.conversion_value, 0))
+                    ON CONFLICT (clinic_id, day) DO UPDATE SET
+                        leads = r.leads + EXCLUDED.leads,
+                        pending_leads = r.pending_leads + EXCLUDED.pending_leads,
+                        contacted_leads = r.contacted_leads + EXCLUDED.contacted_leads,
+                        converted_leads = r.converted_leads + EXCLUDED.converted_leads,
+                        lead_credits = r.lead_credits + EXCLUDED.lead_credits,
+                        conversion_value = r.conversion_value + EXCLUDED.conversion_value;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO clinic_daily_rollups AS r
+                        (clinic_id, day, leads, pending_leads, contacted_leads, converted_leads,
+                         lead_credits, conversion_value)
+                    VALUES (COALESCE(NEW.clinic_id, 0), COALESCE(NEW.created_at, now())::date, 1,
+                            COALESCE(NEW.status = 'new', false)::int, (NEW.contacted_at IS NOT NULL)::int,
+                            (NEW.converted_at IS NOT NULL)::int, COALESCE(NEW.credit_cost, 0),
+                            COALESCE(NEW.conversion_value, 0))
+                    ON CONFLICT (clinic_id, day) DO UPDATE SET
+                        leads = r.leads + EXCLUDED.leads,
+                        pending_leads = r.pending_leads + EXCLUDED.pending_leads,
+                        contacted_leads = r.contacted_leads + EXCLUDED.contacted_leads,
+                        converted_leads = r.converted_leads + EXCLUDED.converted_leads,
+                        lead_credits = r.lead_credits + EXCLUDED.lead_credits,
+                        conversion_value = r.conversion_value + EXCLUDED.conversion_value;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS leads_daily_rollup ON leads;")
+        cursor.execute("""
+            CREATE TRIGGER leads_daily_rollup
+            AFTER INSERT OR DELETE OR UPDATE OF clinic_id, created_at, status, contacted_at,
+                converted_at, credit_cost, conversion_value
+            ON leads FOR EACH ROW EXECUTE FUNCTION rollup_lead_change();
+        """)
+
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION rollup_credit_change() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') AND COALESCE(OLD.status, 'completed') = 'completed' THEN
+                    INSERT INTO clinic_daily_rollups AS r (clinic_id, day, credits_added, credits_used)
+                    VALUES (OLD.clinic_id, COALESCE(OLD.created_at, now())::date,
+                            -GREATEST(OLD.amount, 0), -GREATEST(-OLD.amount, 0))
+                    ON CONFLICT (clinic_id, day) DO UPDATE SET
+                        credits_added = r.credits_added + EXCLUDED.credits_added,
+                        credits_used = r.credits_used + EXCLUDED.credits_used;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') AND COALESCE(NEW.status, 'completed') = 'completed' THEN
+                    INSERT INTO clinic_daily_rollups AS r (clinic_id, day, credits_added, credits_used)
+                    VALUES (NEW.clinic_id, COALESCE(NEW.created_at, now())::date,
+                            GREATEST(NEW.amount, 0), GREATEST(-NEW.amount, 0))
+                    ON CONFLICT (clinic_id, day) DO UPDATE SET
+                        credits_added = r.credits_added + EXCLUDED.credits_added,
+                        credits_used = r.credits_used + EXCLUDED.credits_used;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS credit_transactions_daily_rollup ON credit_transactions;")
+        cursor.execute("""
+            CREATE TRIGGER credit_transactions_daily_rollup
+            AFTER INSERT OR DELETE OR UPDATE OF clinic_id, created_at, status, amount
+            ON credit_transactions FOR EACH ROW EXECUTE FUNCTION rollup_credit_change();
+        """)
+
+        cursor.execute("""
+            CREATE OR REPLACE FUNCTION rollup_package_views() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO clinic_daily_rollups AS r (clinic_id, day, package_views)
+                VALUES (NEW.clinic_id, CURRENT_DATE, COALESCE(NEW.view_count, 0) - COALESCE(OLD.view_count, 0))
+                ON CONFLICT (clinic_id, day) DO UPDATE SET
+                    package_views = r.package_views + EXCLUDED.package_views;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+        cursor.execute("DROP TRIGGER IF EXISTS packages_daily_views ON packages;")
+        cursor.execute("""
+            CREATE TRIGGER packages_daily_views
+            AFTER UPDATE OF view_count ON packages
+            FOR EACH ROW WHEN (NEW.view_count IS DISTINCT FROM OLD.view_count)
+            EXECUTE FUNCTION rollup_package_views();
+        """)
+        print("✓ Created rollup triggers on leads, credit_transactions and packages")
+
+        # Backfill inside the same transaction as the triggers, so no write is counted twice or missed
+        cursor.execute("LOCK TABLE leads, credit_transactions IN SHARE MODE;")
+        cursor.execute("DELETE FROM clinic_daily_rollups;")
+        cursor.execute("""
+            INSERT INTO clinic_daily_rollups
+                (clinic_id, day, leads, pending_leads, contacted_leads, converted_leads,
+                 lead_credits, conversion_value)
+            SELECT COALESCE(clinic_id, 0), created_at::date, COUNT(*),
+                   COUNT(*) FILTER (WHERE status = 'new'), COUNT(contacted_at), COUNT(converted_at),
+                   COALESCE(SUM(credit_cost), 0), COALESCE(SUM(conversion_value), 0)
+            FROM leads
+            WHERE created_at IS NOT NULL
+            GROUP BY 1, 2;
+        """)
+        cursor.execute("""
+            INSERT INTO clinic_daily_rollups AS r (clinic_id, day, credits_added, credits_used)
+            SELECT clinic_id, created_at::date,
+                   COALESCE(SUM(amount) FILTER (WHERE amount > 0), 0),
+                   COALESCE(-SUM(amount) FILTER (WHERE amount < 0), 0)
+            FROM credit_transactions
+            WHERE COALESCE(status, 'completed') = 'completed' AND created_at IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (clinic_id, day) DO UPDATE SET
+                credits_added = EXCLUDED.credits_added,
+                credits_used = EXCLUDED.credits_used;
+        """)
+        print("✓ Backfilled clinic_daily_rollups")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error creating clinic daily rollups: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    """Run all migration steps."""
+    print("Creating clinic daily rollups")
+    print("=" * 50)
+
+    try:
+        create_clinic_daily_rollups()
+        print("\n✅ Clinic daily rollup migration completed successfully!")
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Migration 008: Visitor interest profiles
+Creates visitor_profiles, the decayed sparse category/keyword vectors the
+personalization sink maintains per visitor (see personalization_engine.py),
+and seeds the category part from user_category_affinity.
+"""
+
+import os
+import psycopg2
+
+def get_db_connection():
+    """Get database connection using environment variable."""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable not set")
+    return psycopg2.connect(database_url)
+
+def create_visitor_profiles():
+    """Create the profile table and seed it from existing category affinities."""
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS visitor_profiles (
+                user_id VARCHAR(32) PRIMARY KEY,
+                categories TEXT NOT NULL DEFAULT '{}',
+                keywords TEXT NOT NULL DEFAULT '{}',
+                as_of DOUBLE PRECISION NOT NULL,
+                interactions INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+            );
+        """)
+        print("✓ Created visitor_profiles table")
+
+        # Affinities become weights as of their latest update; decay takes over from there
+        cursor.execute("""
+            INSERT INTO visitor_profiles (user_id, categories, as_of, interactions)
+            SELECT user_id,
+                   json_object_agg(category_id, ROUND(affinity_score::numeric, 4))::text,
+                   EXTRACT(EPOCH FROM MAX(last_updated)),
+                   COUNT(*)
+            FROM user_category_affinity
+            WHERE affinity_score > 0
+            GROUP BY user_id
+            ON CONFLICT (user_id) DO NOTHING;
+        """)
+        print(f"✓ Seeded {cursor.rowcount} visitor profiles from category affinities")
+
+        conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error creating visitor profiles: {e}")
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    """Run all migration steps."""
+    print("Creating visitor profiles")
+    print("=" * 50)
+
+    try:
+        create_visitor_profiles()
+        print("\n✅ Visitor profile migration completed successfully!")
+    except Exception as e:
+        print(f"\n❌ Migration failed: {e}")
+        raise
+
+if __name__ == "__main__":
+    main()
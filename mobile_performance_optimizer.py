@@ -4,13 +4,10 @@ Comprehensive optimizations for Replit deployments
 """
 
 import gzip
-import time
-import json
-from io import BytesIO
-from flask import Flask, request, make_response, g
-from werkzeug.middleware.proxy_fix import ProxyFix
+from flask import request
 import re
-import hashlib
+
+from response_pipeline import register_stage, ORDER_MOBILE
 
 class MobilePerformanceOptimizer:
     """Comprehensive mobile performance optimization system"""
@@ -24,31 +21,9 @@ class MobilePerformanceOptimizer:
         """Initialize mobile performance optimizations"""
         self.app = app
         
-        # Mobile-specific optimizations
-        @app.before_request
-        def optimize_mobile_request():
-            g.start_time = time.time()
-            g.is_mobile = self.is_mobile_request()
-            
-        @app.after_request
-        def optimize_mobile_response(response):
-            # Apply mobile-specific optimizations
-            if hasattr(g, 'is_mobile') and g.is_mobile:
-                response = self.optimize_mobile_response(response)
-            
-            # Add performance headers
-            response = self.add_performance_headers(response)
-            
-            # Track response time
-            if hasattr(g, 'start_time'):
-                response_time = (time.time() - g.start_time) * 1000
-                response.headers['X-Response-Time'] = f"{response_time:.1f}ms"
-                
-                # Log slow requests for mobile
-                if g.is_mobile and response_time > 100:
-                    app.logger.warning(f"Slow mobile request: {request.path} took {response_time:.1f}ms")
-            
-            return response
+        # Timing, cache policy and compression are other response pipeline stages;
+        # this stage only adds the mobile hints
+        register_stage(app, 'mobile_hints', self.add_performance_headers, ORDER_MOBILE)
     
     def is_mobile_request(self):
         """Detect mobile requests"""
@@ -204,21 +179,12 @@ class MobilePerformanceOptimizer:
         return response
     
     def add_performance_headers(self, response):
-        """Add performance optimization headers"""
-        # Cache control for mobile
-        if request.path.startswith('/static/'):
-            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
-        else:
-            response.headers['Cache-Control'] = 'public, max-age=300'
-        
-        # Performance hints
-        response.headers['X-Content-Type-Options'] = 'nosniff'
-        response.headers['X-Frame-Options'] = 'DENY'
-        
-        # Mobile-specific headers
-        if hasattr(g, 'is_mobile') and g.is_mobile:
-            response.headers['Vary'] = 'User-Agent'
-            response.headers['X-Mobile-Optimized'] = 'true'
+        """Add mobile hints to HTML responses for mobile browsers"""
+        if response.mimetype != 'text/html' or not self.is_mobile_request():
+            return response
+        
+        # The body is the same for every device, so no Vary: User-Agent (it would only split caches)
+        response.headers['X-Mobile-Optimized'] = 'true'
         
         return response
 
@@ -305,6 +305,9 @@ class FaceAnalysis(db.Model):
     has_geometric_analysis = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     is_anonymous = Column(Boolean, default=False)
+    # Background job state: queued/validating/optimizing/analyzing/saving, then completed/failed/rejected
+    status = Column(String(20), nullable=False, default='completed', server_default='completed')
+    status_message = Column(Text, nullable=True)
     
     # Relationships
     user = relationship('User', backref=backref('face_analyses', cascade='all, delete-orphan'))
@@ -1376,6 +1379,7 @@ class CreditTransaction(db.Model):
     
     # Status
     status = Column(String(20), default='completed')  # 'pending', 'completed', 'failed', 'refunded'
+    idempotency_key = Column(String(100), unique=True)  # Set by credit_ledger for webhook/lead postings
     
     # Admin fields for enhanced tracking
     created_by = Column(Integer, ForeignKey('users.id'), nullable=True)  # Admin who created the transaction
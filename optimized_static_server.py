@@ -2,38 +2,44 @@
 Optimized static file server with WebP support and compression
 Serves WebP images when available and supported by browser
 """
-from flask import Blueprint, request, send_from_directory, abort
-import os
+from flask import Blueprint, request, send_from_directory
 from pathlib import Path
 
+from compression_middleware import static_variants
+from asset_manifest import asset_manifest, IMMUTABLE_MAX_AGE
+
 optimized_static = Blueprint('optimized_static', __name__)
 
 @optimized_static.route('/static/<path:filename>')
 def optimized_static_files(filename):
     """Serve optimized static files with WebP support"""
     static_dir = Path('static')
-    requested_file = static_dir / filename
-    
-    # Check for WebP version if client supports it
-    if _supports_webp() and _is_image(filename):
-        webp_file = _get_webp_version(requested_file)
-        if webp_file and webp_file.exists():
-            return send_from_directory(
-                webp_file.parent, 
-                webp_file.name,
-                cache_timeout=31536000  # 1 year cache
-            )
-    
-    # Serve original file if it exists
-    if requested_file.exists():
-        cache_timeout = 31536000 if 'optimized/' in filename else 86400
-        return send_from_directory(
-            static_dir, 
+    original = asset_manifest.resolve(filename)
+    fingerprinted = original is not None
+    filename = original or filename
+
+    # WebP siblings are indexed at boot, so no per-request stat
+    has_webp = _is_image(filename) and static_variants.has_webp(filename)
+    if has_webp and _supports_webp():
+        response = send_from_directory(
+            static_dir,
+            str(Path(filename).with_suffix('.webp')),
+            max_age=31536000  # 1 year cache
+        )
+    else:
+        # send_from_directory answers 404 for missing files
+        max_age = 31536000 if 'optimized/' in filename else 86400
+        response = send_from_directory(
+            static_dir,
             filename,
-            cache_timeout=cache_timeout
+            max_age=max_age
         )
-    
-    abort(404)
+    if has_webp:
+        response.vary.add('Accept')
+    if fingerprinted:
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
 
 def _supports_webp():
     """Check if client supports WebP format"""
@@ -45,12 +51,6 @@ def _is_image(filename):
     image_extensions = {'.jpg', '.jpeg', '.png', '.gif'}
     return Path(filename).suffix.lower() in image_extensions
 
-def _get_webp_version(file_path):
-    """Get WebP version of image file"""
-    if file_path.suffix.lower() in {'.jpg', '.jpeg', '.png'}:
-        return file_path.with_suffix('.webp')
-    return None
-
 @optimized_static.route('/health-check')
 def health_check():
     """Ultra-fast health check endpoint"""
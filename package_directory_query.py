@@ -0,0 +1,219 @@
+"""
+Query builder for the package directory and its "Show More" API.
+
+Both endpoints share one filter builder, paginate with an opaque keyset
+cursor (``(sort_key, id)`` of the last row shown) instead of OFFSET, and read
+the total from a count cached per filter set. The default "mixed" sort is a
+seeded shuffle (``md5(id || seed)``), so every load-more call continues the
+same order instead of re-randomising.
+"""
+
+import json
+import base64
+import random
+import logging
+from sqlalchemy import text
+
+from cache_backend import cache, make_key
+from cache_invalidation import PACKAGES, CLINICS
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+COUNT_NAMESPACE = 'package_counts'
+COUNT_TTL = 900  # Tag-invalidated on edits; TTL only bounds drift from raw-SQL writers
+
+PRICE_EXPR = "COALESCE(p.price_discounted, p.price_actual, 0)"
+
+# sort -> (key expression, descending)
+SORTS = {
+    'price_low': (PRICE_EXPR, False),
+    'price_high': (PRICE_EXPR, True),
+    'rating': ("COALESCE(c.overall_rating, -1)", True),
+    'popularity': ("COALESCE(c.total_reviews, -1)", True),
+    'newest': ("COALESCE(p.created_at, TIMESTAMP '1970-01-01')", True),
+    'mixed': ("md5(p.id::text || :shuffle_seed)", False),
+}
+DEFAULT_SORT = 'mixed'
+
+# Half-open, so every price falls in exactly one range (they double as the price facet's buckets)
+PRESET_PRICE_RANGES = {
+    '0-50000': f"{PRICE_EXPR} < 50000",
+    '50000-100000': f"{PRICE_EXPR} >= 50000 AND {PRICE_EXPR} < 100000",
+    '100000-200000': f"{PRICE_EXPR} >= 100000 AND {PRICE_EXPR} < 200000",
+    '200000+': f"{PRICE_EXPR} >= 200000",
+}
+
+FILTER_FIELDS = ('category', 'category_id', 'location', 'price_range', 'min_price', 'max_price', 'search')
+
+
+def _float_or_none(value):
+    try:
+        return float(value) if value not in (None, '') else None
+    except ValueError:
+        return None
+
+
+def filter_predicates(filters):
+    """
+    SQL for each active directory filter, keyed by filter group ('category',
+    'location', 'search', 'price'), plus their bind parameters. The directory
+    ANDs them all; the facet counts (facet_engine.package_facets) leave out
+    the facet's own group.
+    """
+    f = {field: (filters.get(field) or '').strip() for field in FILTER_FIELDS}
+    predicates = {}
+    params = {}
+
+    if f['category_id']:
+        # Hierarchical categories, including children and grandchildren
+        predicates['category'] = """p.id IN (
+            SELECT ec.entity_id
+            FROM entity_categories ec
+            JOIN category_hierarchy ch ON ec.category_id = ch.id
+            WHERE ec.entity_type = 'package'
+              AND (ch.id = :category_id OR ch.parent_id = :category_id
+                   OR ch.parent_id IN (SELECT id FROM category_hierarchy WHERE parent_id = :category_id))
+        )"""
+        params['category_id'] = f['category_id']
+    elif f['category']:
+        predicates['category'] = ("(p.category ILIKE :category OR p.id IN "
+                                  "(SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :category))")
+        params['category'] = f"%{f['category']}%"
+
+    if f['location']:
+        predicates['location'] = "(c.city ILIKE :location OR c.state ILIKE :location)"
+        params['location'] = f"%{f['location']}%"
+
+    if f['search']:
+        predicates['search'] = ("(p.title ILIKE :search OR p.description ILIKE :search OR c.name ILIKE :search"
+                                " OR p.id IN (SELECT pc.package_id FROM package_categories pc WHERE pc.category_name ILIKE :search))")
+        params['search'] = f"%{f['search']}%"
+
+    price = []
+    min_price = _float_or_none(f['min_price'])
+    max_price = _float_or_none(f['max_price'])
+    if min_price is not None:
+        price.append(f"{PRICE_EXPR} >= :min_price")
+        params['min_price'] = min_price
+    if max_price is not None:
+        price.append(f"{PRICE_EXPR} <= :max_price")
+        params['max_price'] = max_price
+    if min_price is None and max_price is None and f['price_range'] in PRESET_PRICE_RANGES:
+        price.append(PRESET_PRICE_RANGES[f['price_range']])
+    if price:
+        predicates['price'] = ' AND '.join(price)
+
+    return predicates, params
+
+
+class PackageDirectoryQuery:
+    """Filters, sort and cursor for one directory page request."""
+
+    def __init__(self, args):
+        self.filters = {field: (args.get(field) or '').strip() for field in FILTER_FIELDS}
+        self.sort = args.get('sort') or DEFAULT_SORT
+        if self.sort not in SORTS:
+            self.sort = DEFAULT_SORT
+        self.cursor = decode_cursor(args.get('cursor'))
+        if self.cursor and self.cursor.get('s') != self.sort:
+            self.cursor = None  # Sort changed; start over
+        self.seed = self._shuffle_seed(args.get('seed'))
+
+    def _shuffle_seed(self, requested):
+        if self.cursor and self.cursor.get('seed'):
+            return self.cursor['seed']
+        if requested and requested.isalnum() and len(requested) <= 16:
+            return requested
+        return f"{random.getrandbits(32):08x}"
+
+    # ---- SQL ----
+
+    def where_clause(self):
+        """Filter SQL shared by the page query and the count query."""
+        predicates, params = filter_predicates(self.filters)
+        sql = " WHERE p.is_active = true" + ''.join(f" AND {predicate}" for predicate in predicates.values())
+        return sql, params
+
+    def fetch_page(self, db, limit=PAGE_SIZE, offset=0):
+        """One page of packages plus the cursor for the next one (None when exhausted)."""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        key_expr, descending = SORTS[self.sort]
+        direction = 'DESC' if descending else 'ASC'
+        where_sql, params = self.where_clause()
+        params.update(shuffle_seed=self.seed, limit=limit + 1)
+
+        if self.cursor:
+            # Row comparison continues exactly after the last row shown
+            where_sql += f" AND ({key_expr}, p.id) {'<' if descending else '>'} (:cursor_key, :cursor_id)"
+            params.update(cursor_key=self.cursor['k'], cursor_id=self.cursor['i'])
+            offset = 0
+
+        rows = db.session.execute(text(f"""
+            SELECT p.*, c.name as clinic_name, c.city as clinic_city, c.contact_number as clinic_contact,
+                   c.overall_rating as clinic_rating, c.total_reviews as clinic_reviews,
+                   {key_expr} as directory_sort_key
+            FROM packages p
+            JOIN clinics c ON p.clinic_id = c.id
+            {where_sql}
+            ORDER BY {key_expr} {direction}, p.id {direction}
+            LIMIT :limit OFFSET :offset
+        """), dict(params, offset=max(offset, 0))).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        packages = []
+        for row in rows:
+            package = dict(row._mapping)
+            package.pop('directory_sort_key', None)
+            packages.append(package)
+
+        next_cursor = None
+        if has_more and rows:
+            last = rows[-1]._mapping
+            next_cursor = encode_cursor(self.sort, last['directory_sort_key'], last['id'], self.seed)
+        return packages, next_cursor
+
+    # ---- counts ----
+
+    def count_key(self):
+        # Sort, cursor and seed do not change the total
+        return make_key(*sorted(self.filters.items()))
+
+    def total_count(self, db):
+        """Package count for this filter set, cached until packages or clinics change."""
+        def _count():
+            where_sql, params = self.where_clause()
+            return db.session.execute(text(f"""
+                SELECT COUNT(*)
+                FROM packages p
+                JOIN clinics c ON p.clinic_id = c.id
+                {where_sql}
+            """), params).scalar() or 0
+
+        return cache.get_or_set(COUNT_NAMESPACE, self.count_key(), _count,
+                                ttl=COUNT_TTL, tags=(PACKAGES, CLINICS))
+
+
+def encode_cursor(sort, key, package_id, seed):
+    if hasattr(key, 'isoformat'):
+        key = key.isoformat()
+    elif key is not None and not isinstance(key, (int, float, str)):
+        key = str(key)  # Decimal prices; exact, and PostgreSQL infers numeric
+    payload = json.dumps({'s': sort, 'k': key, 'i': package_id, 'seed': seed}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Cursor dict, or None for a missing or malformed cursor (values are only ever bound parameters)."""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+        if not isinstance(data, dict) or not isinstance(data.get('i'), int) or 'k' not in data:
+            return None
+        return data
+    except Exception:
+        logger.debug(f"Ignoring invalid package directory cursor: {cursor!r}")
+        return None
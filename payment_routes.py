@@ -10,6 +10,7 @@ import os
 import logging
 from datetime import datetime
 from credit_billing_system import CreditBillingService
+from credit_ledger import ledger as credit_ledger
 from models import db, Clinic
 from sqlalchemy import text
 
@@ -267,12 +268,8 @@ def payment_webhook():
             
             logger.warning(f"Payment failed: {payment_id} for order: {order_id}")
             
-            # Update transaction status to failed
-            db.session.execute(text("""
-                UPDATE credit_transactions 
-                SET status = 'failed' 
-                WHERE order_id = :order_id
-            """), {'order_id': order_id})
+            # Through the ledger: pending rows are marked failed, credited ones reversed
+            credit_ledger.fail_payment(payment_id)
             
             db.session.commit()
         
@@ -3,54 +3,46 @@ Performance caching system to reduce expensive database queries.
 Addresses the timezone and schema introspection queries consuming 25.7% and 5.6% of database time.
 """
 
-import os
-import json
-import time
 from functools import wraps
-from flask import current_app
 import logging
 
+from cache_backend import cache as tiered_cache
+
 logger = logging.getLogger(__name__)
 
 class PerformanceCache:
-    """In-memory cache for expensive database operations."""
+    """Facade over the unified tiered cache for expensive database operations."""
+    
+    namespace = 'performance'
     
-    def __init__(self):
-        self._cache = {}
-        self._timestamps = {}
+    def __init__(self, backend=None):
+        self.backend = backend or tiered_cache
         self.default_ttl = 3600  # 1 hour default TTL
         
     def get(self, key):
         """Get cached value if not expired."""
-        if key not in self._cache:
-            return None
-            
-        timestamp = self._timestamps.get(key, 0)
-        if time.time() - timestamp > self.default_ttl:
-            self.invalidate(key)
-            return None
-            
-        return self._cache[key]
+        return self.backend.get(self.namespace, key)
     
     def set(self, key, value, ttl=None):
         """Set cached value with TTL."""
         if ttl is None:
             ttl = self.default_ttl
             
-        self._cache[key] = value
-        self._timestamps[key] = time.time()
+        self.backend.set(self.namespace, key, value, ttl=ttl)
         
         logger.debug(f"Cached key '{key}' with TTL {ttl}s")
     
+    def get_or_set(self, key, compute, ttl=None):
+        """Get cached value, computing it once (single-flight) on a miss."""
+        return self.backend.get_or_set(self.namespace, key, compute, ttl=ttl or self.default_ttl)
+    
     def invalidate(self, key):
         """Remove cached value."""
-        self._cache.pop(key, None)
-        self._timestamps.pop(key, None)
+        self.backend.delete(self.namespace, key)
     
     def clear(self):
         """Clear all cached values."""
-        self._cache.clear()
-        self._timestamps.clear()
+        self.backend.clear(self.namespace)
 
 # Global cache instance
 performance_cache = PerformanceCache()
@@ -62,18 +54,8 @@ def cached_query(key, ttl=3600):
         def wrapper(*args, **kwargs):
             cache_key = f"{key}:{str(args)}:{str(sorted(kwargs.items()))}"
             
-            # Try to get from cache first
-            cached_result = performance_cache.get(cache_key)
-            if cached_result is not None:
-                logger.debug(f"Cache hit for {cache_key}")
-                return cached_result
-            
-            # Execute function and cache result
-            result = func(*args, **kwargs)
-            performance_cache.set(cache_key, result, ttl)
-            logger.debug(f"Cache miss for {cache_key}, result cached")
-            
-            return result
+            # Concurrent misses wait for a single execution
+            return performance_cache.get_or_set(cache_key, lambda: func(*args, **kwargs), ttl)
         return wrapper
     return decorator
 
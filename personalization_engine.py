@@ -0,0 +1,408 @@
+"""
+Per-visitor interest profiles and in-process recommendation scoring.
+
+A visitor's interests are two small sparse vectors, category id -> weight
+and keyword -> weight, stored in ``visitor_profiles`` as of one timestamp.
+Weights decay exponentially with ``PERSONALIZATION_HALF_LIFE_DAYS``: an
+update first decays the whole vector to the interaction time and then adds
+the interaction, so recent interests outweigh old ones without keeping any
+history. Entries below ``MIN_WEIGHT`` are pruned and each vector keeps only
+its ``MAX_CATEGORIES``/``MAX_KEYWORDS`` strongest entries.
+
+Profiles are written only by the ``personalization`` ingest sink
+(personalization_service.py) with one read and one upsert per batch, so
+tracking an interaction never touches them on the request path.
+
+Recommendations score every candidate against a per-worker item-feature
+matrix (category one-hot plus name keywords, rows L2-normalised): one
+primary-key lookup for the profile, then ``features[:, profile columns] @
+weights`` in NumPy blended with a popularity prior, cut to the top k with
+``argpartition``. Matrices are rebuilt in the background when the
+procedures/doctors/categories cache tags are bumped (see
+cache_invalidation.py) or the snapshot gets older than
+``PERSONALIZATION_MATRIX_REBUILD_SECONDS``.
+"""
+
+import os
+import re
+import json
+import math
+import time
+import logging
+import threading
+import numpy as np
+from sqlalchemy import text, bindparam
+
+from cache_backend import cache
+from cache_invalidation import PROCEDURES, DOCTORS, CATEGORIES
+from interaction_ingest import insert_rows
+
+logger = logging.getLogger(__name__)
+
+HALF_LIFE_SECONDS = float(os.environ.get('PERSONALIZATION_HALF_LIFE_DAYS', 14)) * 86400
+MAX_CATEGORIES = 32
+MAX_KEYWORDS = 64
+MIN_WEIGHT = 0.01
+KEYWORD_WEIGHT = 0.5  # Per keyword, relative to the interaction's increment
+POPULARITY_WEIGHT = 0.15  # Prior blended into the cosine score (and the whole score for unknown visitors)
+VERSION_CHECK_INTERVAL = 1.0
+REBUILD_INTERVAL = int(os.environ.get('PERSONALIZATION_MATRIX_REBUILD_SECONDS', 600))
+
+PROFILE_COLUMNS = ('user_id', 'categories', 'keywords', 'as_of', 'interactions', 'updated_at')
+
+STOPWORDS = frozenset({
+    'with', 'from', 'that', 'this', 'your', 'what', 'when', 'where', 'which', 'about', 'have', 'more',
+})
+_WORD = re.compile(r"[a-z][a-z0-9]+")
+
+
+def keywords(*texts):
+    """Distinct lower-cased words longer than three characters, in order of appearance."""
+    words = []
+    for value in texts:
+        for word in _WORD.findall((value or '').lower()):
+            if len(word) > 3 and word not in STOPWORDS and word not in words:
+                words.append(word)
+    return words
+
+
+def _strongest(vector, limit):
+    kept = {key: weight for key, weight in vector.items() if weight >= MIN_WEIGHT}
+    if len(kept) > limit:
+        kept = dict(sorted(kept.items(), key=lambda item: item[1], reverse=True)[:limit])
+    return kept
+
+
+class Profile:
+    """One visitor's decayed sparse interest vectors; all weights are as of ``as_of`` (epoch seconds)."""
+
+    __slots__ = ('categories', 'keywords', 'as_of', 'interactions')
+
+    def __init__(self, categories=None, keywords=None, as_of=None, interactions=0):
+        self.categories = categories or {}
+        self.keywords = keywords or {}
+        self.as_of = as_of
+        self.interactions = interactions
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            {int(category_id): weight for category_id, weight in json.loads(row.categories or '{}').items()},
+            json.loads(row.keywords or '{}'),
+            row.as_of,
+            row.interactions or 0
+        )
+
+    def decay_to(self, at):
+        """Scale every weight down to time ``at``; never moves backwards."""
+        if self.as_of is None:
+            self.as_of = at
+            return
+        if at <= self.as_of:
+            return
+        factor = 0.5 ** ((at - self.as_of) / HALF_LIFE_SECONDS)
+        for vector in (self.categories, self.keywords):
+            for key in vector:
+                vector[key] *= factor
+        self.as_of = at
+
+    def add(self, at, increment, category_id=None, words=()):
+        self.decay_to(at)
+        if category_id:
+            self.categories[category_id] = self.categories.get(category_id, 0.0) + increment
+        for word in words:
+            self.keywords[word] = self.keywords.get(word, 0.0) + increment * KEYWORD_WEIGHT
+        self.interactions += 1
+
+    def compact(self):
+        self.categories = _strongest(self.categories, MAX_CATEGORIES)
+        self.keywords = _strongest(self.keywords, MAX_KEYWORDS)
+        return self
+
+    def __bool__(self):
+        return bool(self.categories or self.keywords)
+
+    def to_row(self, user_id, updated_at):
+        return {
+            'user_id': user_id,
+            'categories': json.dumps({str(key): round(weight, 4) for key, weight in self.categories.items()}),
+            'keywords': json.dumps({key: round(weight, 4) for key, weight in self.keywords.items()}),
+            'as_of': self.as_of,
+            'interactions': self.interactions,
+            'updated_at': updated_at
+        }
+
+
+def update_profiles(conn, interactions, updated_at):
+    """
+    Fold ``(user_id, at, increment, category_id, words)`` interactions into
+    ``visitor_profiles``: one locking SELECT and one multi-row upsert per batch.
+    """
+    by_user = {}
+    for interaction in interactions:
+        by_user.setdefault(interaction[0], []).append(interaction)
+    if not by_user:
+        return 0
+
+    # Rows are locked in key order so concurrent worker flushes cannot deadlock
+    lock = ' FOR UPDATE' if conn.dialect.name == 'postgresql' else ''
+    rows = conn.execute(text(f"""
+        SELECT user_id, categories, keywords, as_of, interactions
+        FROM visitor_profiles
+        WHERE user_id IN :user_ids
+        ORDER BY user_id{lock}
+    """).bindparams(bindparam('user_ids', expanding=True)), {'user_ids': sorted(by_user)}).fetchall()
+    profiles = {row.user_id: Profile.from_row(row) for row in rows}
+
+    upserts = []
+    for user_id, user_interactions in by_user.items():
+        profile = profiles.get(user_id) or Profile()
+        for _, at, increment, category_id, words in sorted(user_interactions, key=lambda item: item[1]):
+            profile.add(at, increment, category_id, words)
+        upserts.append(profile.compact().to_row(user_id, updated_at))
+
+    insert_rows(conn, 'visitor_profiles', PROFILE_COLUMNS, upserts, suffix="""
+        ON CONFLICT (user_id) DO UPDATE SET
+            categories = EXCLUDED.categories,
+            keywords = EXCLUDED.keywords,
+            as_of = EXCLUDED.as_of,
+            interactions = EXCLUDED.interactions,
+            updated_at = EXCLUDED.updated_at
+    """)
+    return len(upserts)
+
+
+def load_profile(session, user_id, now=None):
+    """The visitor's profile decayed to ``now``, or None when there is nothing (left) to go on."""
+    row = session.execute(text("""
+        SELECT categories, keywords, as_of, interactions
+        FROM visitor_profiles
+        WHERE user_id = :user_id
+    """), {'user_id': str(user_id)}).fetchone()
+    if row is None:
+        return None
+    profile = Profile.from_row(row)
+    profile.decay_to(now or time.time())
+    return profile.compact() or None
+
+
+class ItemMatrix:
+    """Immutable item-feature matrix for one kind of item; build a new one instead of mutating."""
+
+    def __init__(self, kind, ids, item_features, popularity, payloads=None):
+        self.kind = kind
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.payloads = payloads or {}
+        self.built_at = time.time()
+
+        self.category_columns, self.keyword_columns = {}, {}
+        cells = []
+        for row, (category_ids, words) in enumerate(item_features):
+            for category_id in category_ids:
+                column = self.category_columns.setdefault(category_id, len(self.category_columns) + len(self.keyword_columns))
+                cells.append((row, column, 1.0))
+            for word in words:
+                column = self.keyword_columns.setdefault(word, len(self.category_columns) + len(self.keyword_columns))
+                cells.append((row, column, KEYWORD_WEIGHT))
+
+        self.features = np.zeros((len(self.ids), len(self.category_columns) + len(self.keyword_columns)), dtype=np.float32)
+        if cells:
+            rows, columns, values = zip(*cells)
+            self.features[rows, columns] = values
+        norms = np.linalg.norm(self.features, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.features /= norms
+
+        popularity = np.asarray(popularity, dtype=np.float32)
+        peak = popularity.max() if len(popularity) else 0.0
+        self.prior = popularity / peak if peak > 0 else np.zeros(len(self.ids), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def encode(self, profile):
+        """The profile as (feature columns, unit-length weights), restricted to features items have."""
+        columns, weights = [], []
+        for category_id, weight in profile.categories.items():
+            column = self.category_columns.get(category_id)
+            if column is not None:
+                columns.append(column)
+                weights.append(weight)
+        for word, weight in profile.keywords.items():
+            column = self.keyword_columns.get(word)
+            if column is not None:
+                columns.append(column)
+                weights.append(weight)
+        weights = np.asarray(weights, dtype=np.float32)
+        if len(weights):
+            weights /= np.linalg.norm(weights)
+        return np.asarray(columns, dtype=np.int64), weights
+
+    def scores(self, profile=None):
+        columns, weights = self.encode(profile) if profile else ((), ())
+        if not len(columns):
+            return POPULARITY_WEIGHT * self.prior
+        return self.features[:, columns] @ weights + POPULARITY_WEIGHT * self.prior
+
+    def top_k(self, profile=None, k=10):
+        """[(item_id, score), ...] best first; popularity order when the profile matches no feature."""
+        if not len(self) or k <= 0:
+            return []
+        scores = self.scores(profile)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(self.ids[i]), float(scores[i])) for i in top]
+
+    def payload(self, item_id):
+        return self.payloads.get(item_id)
+
+
+def load_procedure_matrix(db):
+    """Procedures by category and name/category/body-part keywords, prior = popularity_score (one query)."""
+    rows = db.session.execute(text("""
+        SELECT p.id, p.procedure_name, p.category_id, p.body_part, p.popularity_score,
+               p.avg_rating, p.min_cost, p.max_cost, p.image_url, c.name AS category_name
+        FROM procedures p
+        LEFT JOIN categories c ON c.id = p.category_id
+    """)).fetchall()
+
+    ids, features, popularity, payloads = [], [], [], {}
+    for row in rows:
+        ids.append(row.id)
+        features.append(([row.category_id] if row.category_id else [],
+                         keywords(row.procedure_name, row.category_name, row.body_part)))
+        popularity.append(row.popularity_score or 0)
+        payloads[row.id] = {
+            'id': row.id,
+            'procedure_name': row.procedure_name,
+            'category_id': row.category_id,
+            'category_name': row.category_name,
+            'body_part': row.body_part,
+            'avg_rating': row.avg_rating,
+            'min_cost': row.min_cost,
+            'max_cost': row.max_cost,
+            'image_url': row.image_url,
+        }
+    return ItemMatrix('procedure', ids, features, popularity, payloads)
+
+
+def load_doctor_matrix(db):
+    """Doctors by their categories and specialty keywords, prior = rating weighted by log review count."""
+    rows = db.session.execute(text("""
+        SELECT id, name, specialty, city, rating, review_count, experience, profile_image, is_verified
+        FROM doctors
+    """)).fetchall()
+    doctor_categories = {}
+    for doctor_id, category_id in db.session.execute(text(
+        "SELECT doctor_id, category_id FROM doctor_categories"
+    )).fetchall():
+        doctor_categories.setdefault(doctor_id, []).append(category_id)
+
+    ids, features, popularity, payloads = [], [], [], {}
+    for row in rows:
+        ids.append(row.id)
+        features.append((doctor_categories.get(row.id, []), keywords(row.specialty)))
+        popularity.append((row.rating or 0) * math.log1p(row.review_count or 0))
+        payloads[row.id] = {
+            'id': row.id,
+            'name': row.name,
+            'specialty': row.specialty,
+            'city': row.city,
+            'rating': row.rating,
+            'review_count': row.review_count,
+            'experience': row.experience,
+            'profile_image': row.profile_image,
+            'is_verified': row.is_verified,
+        }
+    return ItemMatrix('doctor', ids, features, popularity, payloads)
+
+
+class MatrixHolder:
+    """Per-worker current matrix of one kind plus lazy background rebuilds."""
+
+    def __init__(self, kind, loader, tags):
+        self.kind = kind
+        self.loader = loader
+        self.tags = tags
+        self._matrix = None
+        self._versions = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def _load(self, db):
+        start_time = time.time()
+        matrix = self.loader(db)
+        logger.info(f"{self.kind} feature matrix built: {matrix.features.shape[0]} items x "
+                    f"{matrix.features.shape[1]} features ({(time.time() - start_time) * 1000:.1f}ms)")
+        return matrix
+
+    def get(self, app, db):
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    self._versions = cache.tag_versions.current(self.tags)
+                    self._matrix = self._load(db)
+            return self._matrix
+
+        now = time.time()
+        if now - self._last_check >= VERSION_CHECK_INTERVAL:
+            self._last_check = now
+            versions = cache.tag_versions.current(self.tags)
+            if versions != self._versions or now - self._matrix.built_at > REBUILD_INTERVAL:
+                self._start_rebuild(app, db, versions)
+        return self._matrix
+
+    def _start_rebuild(self, app, db, versions):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        def rebuild():
+            try:
+                with app.app_context():
+                    matrix = self._load(db)
+                self._matrix, self._versions = matrix, versions
+            except Exception as e:
+                logger.warning(f"{self.kind} feature matrix rebuild failed: {e}")
+            finally:
+                self._rebuilding = False
+
+        # Keep scoring against the current snapshot while the new one loads
+        threading.Thread(target=rebuild, daemon=True, name=f'{self.kind}-feature-matrix').start()
+
+
+holders = {
+    'procedure': MatrixHolder('procedure', load_procedure_matrix, (PROCEDURES, CATEGORIES)),
+    'doctor': MatrixHolder('doctor', load_doctor_matrix, (DOCTORS, CATEGORIES)),
+}
+
+
+def warm_up():
+    """Build every feature matrix now instead of on the first recommendation request."""
+    from flask import current_app
+    from app import db
+    for holder in holders.values():
+        holder.get(current_app._get_current_object(), db)
+
+
+def recommend(user_id, kind='procedure', k=10):
+    """
+    Top-k items of ``kind`` for a visitor as payload dicts with a ``score``;
+    visitors without a usable profile get the popularity order.
+    """
+    from flask import current_app
+    from app import db
+    holder = holders.get(kind)
+    if holder is None:
+        raise ValueError(f"No recommendations for {kind}")
+    try:
+        matrix = holder.get(current_app._get_current_object(), db)
+        profile = load_profile(db.session, user_id) if user_id is not None else None
+    except Exception as e:
+        logger.error(f"Personalized {kind} recommendations unavailable: {e}")
+        db.session.rollback()
+        return []
+    return [dict(matrix.payload(item_id), score=round(score, 4)) for item_id, score in matrix.top_k(profile, k)]
@@ -4,16 +4,27 @@ This service handles user behavior tracking without requiring login.
 """
 
 from flask import Blueprint, request, jsonify, session
-from sqlalchemy import text, func
+from sqlalchemy import text, bindparam
 from app import db
-from models import Category, Procedure, Doctor, UserInteraction, UserCategoryAffinity, CategoryRelationship
+from models import Category, UserCategoryAffinity, CategoryRelationship
+from interaction_ingest import ingestor, insert_rows, values_clause
+from personalization_engine import recommend, update_profiles, keywords, warm_up
 import json
 import hashlib
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 
+# Affinity score increments by interaction type
+AFFINITY_INCREMENTS = {
+    'view': 0.1,
+    'click': 0.2,
+    'search': 0.15,
+    'form_submit': 0.3,
+    'bookmark': 0.25
+}
+
 personalization_bp = Blueprint('personalization', __name__, url_prefix='/api/personalization')
 
 class PersonalizationService:
@@ -48,50 +59,39 @@ class PersonalizationService:
         hash_obj = hashlib.sha256(fingerprint.encode())
         return abs(int(hash_obj.hexdigest()[:8], 16)) % (2**31 - 1)
     
+    @staticmethod
+    def parse_target_id(value):
+        """Integer id of an interaction's target, None when absent; ValueError for anything else."""
+        if value is None or value == '':
+            return None
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"Invalid target id: {value!r}")
+        return value or None
+
     @staticmethod
     def track_interaction(user_id, session_id, interaction_type, target_type=None, target_id=None, metadata=None):
-        """Track a user interaction for personalization."""
+        """Track a user interaction for personalization (buffered; written in batches with its affinity update)."""
         try:
-            interaction = UserInteraction(
-                user_id=user_id,
-                session_id=session_id,
-                interaction_type=interaction_type,
-                target_type=target_type,
-                target_id=target_id,
-                extra_data=json.dumps(metadata) if metadata else None
-            )
-            db.session.add(interaction)
-            db.session.commit()
-            
-            # Update category affinity if applicable
-            if target_type == 'category' and target_id:
-                PersonalizationService.update_category_affinity(user_id, target_id, interaction_type)
-            elif target_type == 'procedure' and target_id:
-                # Get procedure's category and update affinity
-                procedure = Procedure.query.get(target_id)
-                if procedure and procedure.category_id:
-                    PersonalizationService.update_category_affinity(user_id, procedure.category_id, interaction_type)
-                    
-            return True
+            return ingestor.enqueue('personalization', {
+                'user_id': user_id,
+                'session_id': session_id,
+                'interaction_type': interaction_type,
+                'target_type': target_type,
+                'target_id': target_id,
+                'extra_data': json.dumps(metadata) if metadata else None,
+                'timestamp': datetime.utcnow()
+            })
         except Exception as e:
             logger.error(f"Error tracking interaction: {e}")
-            db.session.rollback()
             return False
     
     @staticmethod
     def update_category_affinity(user_id, category_id, interaction_type):
         """Update user's affinity score for a category."""
         try:
-            # Define score increments based on interaction type
-            score_increments = {
-                'view': 0.1,
-                'click': 0.2,
-                'search': 0.15,
-                'form_submit': 0.3,
-                'bookmark': 0.25
-            }
-            
-            increment = score_increments.get(interaction_type, 0.1)
+            increment = AFFINITY_INCREMENTS.get(interaction_type, 0.1)
             
             # Get or create affinity record
             affinity = UserCategoryAffinity.query.filter_by(
@@ -165,30 +165,128 @@ class PersonalizationService:
     
     @staticmethod
     def get_personalized_procedures(user_id, limit=10):
-        """Get personalized procedures based on user's interests."""
-        try:
-            # Get user's top categories
-            user_categories = db.session.query(
-                UserCategoryAffinity.category_id
-            ).filter_by(user_id=user_id)\
-             .order_by(UserCategoryAffinity.affinity_score.desc())\
-             .limit(5).all()
-            
-            category_ids = [cat.category_id for cat in user_categories]
-            
-            if category_ids:
-                # Get procedures from user's preferred categories
-                procedures = Procedure.query.filter(
-                    Procedure.category_id.in_(category_ids)
-                ).order_by(func.random()).limit(limit).all()
-            else:
-                # Fallback to popular procedures
-                procedures = Procedure.query.order_by(func.random()).limit(limit).all()
-            
-            return procedures
-        except Exception as e:
-            logger.error(f"Error getting personalized procedures: {e}")
-            return []
+        """Top procedures for the visitor's interest profile (popular ones when there is none)."""
+        return recommend(user_id, 'procedure', limit)
+
+    @staticmethod
+    def get_personalized_doctors(user_id, limit=10):
+        """Top doctors for the visitor's interest profile (best rated when there is none)."""
+        return recommend(user_id, 'doctor', limit)
+
+    @staticmethod
+    def get_personalized_content(fingerprint, content_type="procedure", limit=10):
+        """Personalized content of one type for a browser fingerprint, as plain dicts."""
+        user_id = str(PersonalizationService.fingerprint_to_user_id(fingerprint))
+        if content_type == "category":
+            return [{'id': c.id, 'name': c.name, 'image_url': c.image_url}
+                    for c in PersonalizationService.get_personalized_categories(user_id, limit)]
+        if content_type in ("procedure", "doctor"):
+            return recommend(user_id, content_type, limit)
+        return []
+
+    @staticmethod
+    def initialize_cache():
+        """Build the procedure/doctor feature matrices at startup."""
+        warm_up()
+
+INTERACTION_COLUMNS = ('user_id', 'session_id', 'interaction_type', 'target_type', 'target_id',
+                       'extra_data', 'timestamp')
+
+
+def profile_interactions(events, procedures):
+    """``(user_id, at, increment, category_id, words)`` per event that says something about the visitor's interests."""
+    interactions = []
+    for event in events:
+        metadata = json.loads(event['extra_data']) if event['extra_data'] else {}
+        category_id, name = None, metadata.get('content_name') or metadata.get('query')
+        if event['target_type'] == 'category' and event['target_id']:
+            category_id = int(event['target_id'])
+        elif event['target_type'] == 'procedure' and event['target_id'] in procedures:
+            category_id, procedure_name = procedures[event['target_id']]
+            name = name or procedure_name
+        words = keywords(name)
+        if category_id or words:
+            interactions.append((
+                str(event['user_id']),
+                event['timestamp'].replace(tzinfo=timezone.utc).timestamp(),
+                AFFINITY_INCREMENTS.get(event['interaction_type'], 0.1),
+                category_id,
+                words
+            ))
+    return interactions
+
+
+def write_personalization_interactions(conn, events):
+    """
+    Batch sink: multi-row INSERT of the interactions, the visitors' interest
+    profiles (personalization_engine), then the coalesced category affinity updates.
+    """
+    insert_rows(conn, 'user_interactions', INTERACTION_COLUMNS, events)
+
+    procedure_ids = {e['target_id'] for e in events if e['target_type'] == 'procedure' and e['target_id']}
+    procedures = {}
+    if procedure_ids:
+        procedures = {row.id: (row.category_id, row.procedure_name) for row in conn.execute(
+            text("SELECT id, category_id, procedure_name FROM procedures WHERE id IN :ids").bindparams(bindparam('ids', expanding=True)),
+            {'ids': list(procedure_ids)}
+        ).fetchall()}
+    procedure_categories = {procedure_id: category_id for procedure_id, (category_id, _) in procedures.items()}
+
+    update_profiles(conn, profile_interactions(events, procedures), datetime.utcnow())
+
+    # Increments per (user, category) in arrival order, so the decay applies exactly as one-by-one updates would
+    increments = {}
+    for event in events:
+        if not event['target_id']:
+            continue
+        if event['target_type'] == 'category':
+            category_id = event['target_id']
+        elif event['target_type'] == 'procedure':
+            category_id = procedure_categories.get(event['target_id'])
+        else:
+            continue
+        if category_id:
+            increments.setdefault((event['user_id'], int(category_id)), []).append(
+                AFFINITY_INCREMENTS.get(event['interaction_type'], 0.1))
+    if not increments:
+        return
+    
+    pairs = [{'user_id': user_id, 'category_id': category_id} for user_id, category_id in increments]
+    values_sql, params = values_clause(('user_id', 'category_id'), pairs)
+    existing = {(row.user_id, row.category_id): row.affinity_score for row in conn.execute(text(f"""
+        SELECT a.user_id, a.category_id, a.affinity_score
+        FROM user_category_affinity a
+        JOIN (VALUES {values_sql}) AS v(user_id, category_id)
+          ON a.user_id = v.user_id AND a.category_id = v.category_id
+    """), params)}
+    
+    now = datetime.utcnow()
+    updates, inserts = [], []
+    for key, steps in increments.items():
+        if key in existing:
+            score = existing[key] or 0.0
+            for increment in steps:
+                score = min(1.0, score * 0.95 + increment)
+            updates.append({'user_id': key[0], 'category_id': key[1], 'affinity_score': score, 'last_updated': now})
+        else:
+            score = steps[0]
+            for increment in steps[1:]:
+                score = min(1.0, score * 0.95 + increment)
+            inserts.append({'user_id': key[0], 'category_id': key[1], 'affinity_score': score, 'last_updated': now})
+    
+    if updates:
+        values_sql, params = values_clause(('user_id', 'category_id', 'affinity_score', 'last_updated'), updates)
+        conn.execute(text(f"""
+            UPDATE user_category_affinity a
+            SET affinity_score = v.affinity_score, last_updated = v.last_updated
+            FROM (VALUES {values_sql}) AS v(user_id, category_id, affinity_score, last_updated)
+            WHERE a.user_id = v.user_id AND a.category_id = v.category_id
+        """), params)
+    if inserts:
+        insert_rows(conn, 'user_category_affinity', ('user_id', 'category_id', 'affinity_score', 'last_updated'), inserts)
+
+
+ingestor.register_sink('personalization', write_personalization_interactions)
 
 # API Routes
 @personalization_bp.route('/track', methods=['POST'])
@@ -196,6 +294,10 @@ def track_interaction():
     """API endpoint to track user interactions."""
     try:
         data = request.get_json()
+        try:
+            target_id = PersonalizationService.parse_target_id(data.get('targetId'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         # Get user fingerprint from headers or data
         user_agent = request.headers.get('User-Agent', '')
@@ -209,7 +311,7 @@ def track_interaction():
             session_id=data.get('sessionId', ''),
             interaction_type=data.get('type', 'view'),
             target_type=data.get('targetType'),
-            target_id=data.get('targetId'),
+            target_id=target_id,
             metadata=data.get('metadata')
         )
         
@@ -235,316 +337,8 @@ def get_recommendations():
         return jsonify({
             'success': True,
             'categories': [{'id': c.id, 'name': c.name, 'image_url': c.image_url} for c in categories],
-            'procedures': [{'id': p.id, 'name': p.procedure_name, 'category_id': p.category_id} for p in procedures]
+            'procedures': [{'id': p['id'], 'name': p['procedure_name'], 'category_id': p['category_id']} for p in procedures]
         })
     except Exception as e:
         logger.error(f"Error in get_recommendations endpoint: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
-    
-    @staticmethod
-    def track_interaction(fingerprint, interaction_type, content_type, content_id, 
-                         content_name="", page_url="", session_id=""):
-        """Track user interaction for personalization."""
-        try:
-            # First ensure the anonymous user exists
-            PersonalizationService.get_or_create_anonymous_user(fingerprint)
-            
-            # Convert fingerprint to consistent user ID
-            user_id = PersonalizationService.fingerprint_to_user_id(fingerprint)
-            
-            # Insert interaction with the user ID
-            db.session.execute(
-                text("""INSERT INTO user_interactions 
-                       (anonymous_user_id, interaction_type, content_type, content_id, 
-                        content_name, page_url, session_id, created_at)
-                       VALUES (:user_id, :type, :ctype, :cid, :cname, :page, :session, :now)"""),
-                {
-                    "user_id": user_id,
-                    "type": interaction_type,
-                    "ctype": content_type,
-                    "cid": content_id,
-                    "cname": content_name,
-                    "page": page_url,
-                    "session": session_id,
-                    "now": datetime.utcnow()
-                }
-            )
-            
-            # Update user preferences based on interaction
-            if content_type == "category" or content_type == "procedure":
-                PersonalizationService.update_user_interests(fingerprint, content_type, content_id, content_name)
-            
-            db.session.commit()
-            
-        except Exception as e:
-            logger.error(f"Error tracking interaction: {e}")
-            db.session.rollback()
-    
-    @staticmethod
-    def update_user_interests(fingerprint, content_type, content_id, content_name):
-        """Update user interest scores based on interactions."""
-        try:
-            # Get current user data
-            result = db.session.execute(
-                text("SELECT preferred_categories, interest_keywords FROM anonymous_users WHERE browser_fingerprint = :fp"),
-                {"fp": fingerprint}
-            ).fetchone()
-            
-            if result:
-                categories = json.loads(result.preferred_categories or '{}')
-                keywords = json.loads(result.interest_keywords or '{}')
-                
-                # Update category interest
-                if content_type == "category":
-                    category_id = str(content_id)
-                    categories[category_id] = min(10.0, categories.get(category_id, 0) + 1.0)
-                
-                # Update keyword interests
-                if content_name:
-                    words = content_name.lower().split()
-                    for word in words:
-                        if len(word) > 3:
-                            keywords[word] = min(10.0, keywords.get(word, 0) + 0.5)
-                
-                # If it's a procedure, also update its category
-                if content_type == "procedure":
-                    proc_result = db.session.execute(
-                        text("SELECT category_id FROM procedures WHERE id = :pid"),
-                        {"pid": content_id}
-                    ).fetchone()
-                    
-                    if proc_result:
-                        category_id = str(proc_result.category_id)
-                        categories[category_id] = min(10.0, categories.get(category_id, 0) + 0.8)
-                
-                # Update database
-                db.session.execute(
-                    text("""UPDATE anonymous_users 
-                           SET preferred_categories = :cats, interest_keywords = :keywords, updated_at = :now
-                           WHERE browser_fingerprint = :fp"""),
-                    {
-                        "fp": fingerprint,
-                        "cats": json.dumps(categories),
-                        "keywords": json.dumps(keywords),
-                        "now": datetime.utcnow()
-                    }
-                )
-                
-        except Exception as e:
-            logger.error(f"Error updating user interests: {e}")
-    
-    @staticmethod
-    def get_personalized_content(fingerprint, content_type="procedure", limit=10):
-        """Get personalized content recommendations for user."""
-        try:
-            # Get user preferences
-            result = db.session.execute(
-                text("SELECT preferred_categories, interest_keywords, visit_count FROM anonymous_users WHERE browser_fingerprint = :fp"),
-                {"fp": fingerprint}
-            ).fetchone()
-            
-            if not result:
-                return PersonalizationService.get_default_content(content_type, limit)
-            
-            categories = json.loads(result.preferred_categories or '{}')
-            keywords = json.loads(result.interest_keywords or '{}')
-            visit_count = result.visit_count
-            
-            if content_type == "procedure":
-                return PersonalizationService.get_personalized_procedures(categories, keywords, visit_count, limit)
-            elif content_type == "category":
-                return PersonalizationService.get_personalized_categories(categories, limit)
-            elif content_type == "doctor":
-                return PersonalizationService.get_personalized_doctors(categories, keywords, limit)
-            
-            return PersonalizationService.get_default_content(content_type, limit)
-            
-        except Exception as e:
-            logger.error(f"Error getting personalized content: {e}")
-            return PersonalizationService.get_default_content(content_type, limit)
-    
-    @staticmethod
-    def get_personalized_procedures(categories, keywords, visit_count, limit):
-        """Get personalized procedure recommendations."""
-        try:
-            if not categories and not keywords:
-                return PersonalizationService.get_default_content("procedure", limit)
-            
-            # Build category filter
-            category_ids = list(categories.keys()) if categories else []
-            
-            if category_ids:
-                # Get procedures from interested categories
-                category_filter = ','.join(category_ids)
-                procedures = db.session.execute(
-                    text(f"""SELECT p.*, c.name as category_name 
-                           FROM procedures p 
-                           JOIN categories c ON p.category_id = c.id 
-                           WHERE p.category_id IN ({category_filter})
-                           ORDER BY p.popularity_score DESC 
-                           LIMIT :limit"""),
-                    {"limit": limit}
-                ).fetchall()
-            else:
-                # Fallback to keyword-based search
-                keyword_list = list(keywords.keys())[:5]  # Top 5 keywords
-                if keyword_list:
-                    keyword_pattern = '|'.join(keyword_list)
-                    procedures = db.session.execute(
-                        text("""SELECT p.*, c.name as category_name 
-                               FROM procedures p 
-                               JOIN categories c ON p.category_id = c.id 
-                               WHERE p.procedure_name ~* :pattern
-                               ORDER BY p.popularity_score DESC 
-                               LIMIT :limit"""),
-                        {"pattern": keyword_pattern, "limit": limit}
-                    ).fetchall()
-                else:
-                    return PersonalizationService.get_default_content("procedure", limit)
-            
-            return [dict(proc._mapping) for proc in procedures]
-            
-        except Exception as e:
-            logger.error(f"Error getting personalized procedures: {e}")
-            return PersonalizationService.get_default_content("procedure", limit)
-    
-    @staticmethod
-    def get_personalized_categories(categories, limit):
-        """Get personalized category recommendations."""
-        try:
-            if not categories:
-                return PersonalizationService.get_default_content("category", limit)
-            
-            # Sort categories by user interest
-            sorted_categories = sorted(categories.items(), key=lambda x: x[1], reverse=True)
-            top_category_ids = [cat_id for cat_id, score in sorted_categories[:limit]]
-            
-            if top_category_ids:
-                category_filter = ','.join(top_category_ids)
-                result = db.session.execute(
-                    text(f"""SELECT c.*, bp.name as body_part_name 
-                           FROM categories c 
-                           JOIN body_parts bp ON c.body_part_id = bp.id 
-                           WHERE c.id IN ({category_filter})
-                           ORDER BY CASE c.id {' '.join([f'WHEN {cat_id} THEN {i}' for i, cat_id in enumerate(top_category_ids)])} END""")
-                ).fetchall()
-                
-                return [dict(cat._mapping) for cat in result]
-            
-            return PersonalizationService.get_default_content("category", limit)
-            
-        except Exception as e:
-            logger.error(f"Error getting personalized categories: {e}")
-            return PersonalizationService.get_default_content("category", limit)
-    
-    @staticmethod
-    def get_personalized_doctors(categories, keywords, limit):
-        """Get personalized doctor recommendations."""
-        try:
-            if not categories:
-                return PersonalizationService.get_default_content("doctor", limit)
-            
-            category_ids = list(categories.keys())[:5]  # Top 5 categories
-            if category_ids:
-                category_filter = ','.join(category_ids)
-                doctors = db.session.execute(
-                    text(f"""SELECT DISTINCT d.*, COUNT(dc.category_id) as relevance_score 
-                           FROM doctors d 
-                           JOIN doctor_categories dc ON d.id = dc.doctor_id 
-                           WHERE dc.category_id IN ({category_filter})
-                           GROUP BY d.id 
-                           ORDER BY relevance_score DESC, d.rating DESC 
-                           LIMIT :limit"""),
-                    {"limit": limit}
-                ).fetchall()
-                
-                return [dict(doc._mapping) for doc in doctors]
-            
-            return PersonalizationService.get_default_content("doctor", limit)
-            
-        except Exception as e:
-            logger.error(f"Error getting personalized doctors: {e}")
-            return PersonalizationService.get_default_content("doctor", limit)
-    
-    @staticmethod
-    def get_default_content(content_type, limit):
-        """Get default content when no personalization data is available."""
-        try:
-            if content_type == "procedure":
-                procedures = Procedure.query.order_by(Procedure.popularity_score.desc()).limit(limit).all()
-                return [{"id": p.id, "procedure_name": p.procedure_name, "category_id": p.category_id} for p in procedures]
-            
-            elif content_type == "category":
-                categories = Category.query.order_by(Category.popularity_score.desc()).limit(limit).all()
-                return [{"id": c.id, "name": c.name, "body_part_id": c.body_part_id} for c in categories]
-            
-            elif content_type == "doctor":
-                doctors = Doctor.query.order_by(Doctor.rating.desc()).limit(limit).all()
-                return [{"id": d.id, "name": d.name, "specialty": d.specialty} for d in doctors]
-            
-            return []
-            
-        except Exception as e:
-            logger.error(f"Error getting default content: {e}")
-            return []
-
-# API Routes
-@personalization_bp.route('/api/track-interactions', methods=['POST'])
-def track_interactions():
-    """API endpoint to receive user interaction data."""
-    try:
-        data = request.get_json()
-        fingerprint = data.get('fingerprint')
-        interactions = data.get('interactions', [])
-        
-        if not fingerprint:
-            return jsonify({"error": "Fingerprint required"}), 400
-        
-        # Ensure anonymous user exists
-        user = PersonalizationService.get_or_create_anonymous_user(fingerprint)
-        if not user:
-            return jsonify({"error": "Failed to create user"}), 500
-        
-        # Process each interaction
-        for interaction in interactions:
-            PersonalizationService.track_interaction(
-                fingerprint=fingerprint,
-                interaction_type=interaction.get('type', 'unknown'),
-                content_type=interaction.get('content_type', 'unknown'),
-                content_id=interaction.get('data', {}).get('procedure_id') or 
-                          interaction.get('data', {}).get('category_id') or 
-                          interaction.get('data', {}).get('doctor_id', 0),
-                content_name=interaction.get('data', {}).get('procedure_name', '') or
-                           interaction.get('data', {}).get('category_name', '') or
-                           interaction.get('data', {}).get('doctor_name', ''),
-                page_url=interaction.get('page_url', ''),
-                session_id=data.get('session_id', '')
-            )
-        
-        return jsonify({"status": "success", "processed": len(interactions)})
-        
-    except Exception as e:
-        logger.error(f"Error in track_interactions: {e}")
-        return jsonify({"error": "Internal server error"}), 500
-
-@personalization_bp.route('/api/personalized-content/<content_type>')
-def get_personalized_content_api(content_type):
-    """API endpoint to get personalized content recommendations."""
-    try:
-        fingerprint = request.args.get('fingerprint')
-        limit = min(int(request.args.get('limit', 10)), 50)  # Max 50 items
-        
-        if fingerprint:
-            content = PersonalizationService.get_personalized_content(fingerprint, content_type, limit)
-        else:
-            content = PersonalizationService.get_default_content(content_type, limit)
-        
-        return jsonify({
-            "status": "success",
-            "content": content,
-            "personalized": bool(fingerprint)
-        })
-        
-    except Exception as e:
-        logger.error(f"Error in get_personalized_content_api: {e}")
-        return jsonify({"error": "Internal server error"}), 500
\ No newline at end of file
@@ -10,51 +10,44 @@ from functools import wraps
 from flask import current_app
 from app import db
 from models import Category, Procedure, Doctor, Clinic, Package, Community, User
+from cache_backend import cache as tiered_cache
 
 logger = logging.getLogger(__name__)
 
 class Phase1PerformanceCache:
-    """Advanced caching system for Phase 1 performance optimization"""
+    """Phase 1 cache facade over the unified tiered cache"""
     
-    def __init__(self):
-        self._cache = {}
-        self._timestamps = {}
+    namespace = 'phase1'
+    
+    def __init__(self, backend=None):
+        self.backend = backend or tiered_cache
         self.default_ttl = 1800  # 30 minutes
         self.short_ttl = 300     # 5 minutes for frequently changing data
         self.long_ttl = 3600     # 1 hour for stable data
         
     def get(self, key):
         """Get cached value if not expired"""
-        if key not in self._cache:
-            return None
-            
-        timestamp = self._timestamps.get(key, 0)
-        if time.time() - timestamp > self.default_ttl:
-            self.invalidate(key)
-            return None
-            
-        logger.debug(f"Cache HIT for key: {key}")
-        return self._cache[key]
+        value = self.backend.get(self.namespace, key)
+        if value is not None:
+            logger.debug(f"Cache HIT for key: {key}")
+        return value
     
     def set(self, key, value, ttl=None):
         """Set cached value with TTL"""
         if ttl is None:
             ttl = self.default_ttl
             
-        self._cache[key] = value
-        self._timestamps[key] = time.time()
+        self.backend.set(self.namespace, key, value, ttl=ttl)
         logger.debug(f"Cache SET for key: {key} (TTL: {ttl}s)")
     
     def invalidate(self, key):
         """Remove cached value"""
-        self._cache.pop(key, None)
-        self._timestamps.pop(key, None)
+        self.backend.delete(self.namespace, key)
         logger.debug(f"Cache INVALIDATED for key: {key}")
     
     def clear_all(self):
         """Clear all cached values"""
-        self._cache.clear()
-        self._timestamps.clear()
+        self.backend.clear(self.namespace)
         logger.info("All cache cleared")
 
 # Global cache instance
@@ -65,21 +58,17 @@ def cached_query(cache_key, ttl=None):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Try to get from cache first
-            cached_result = phase1_cache.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # Execute function and cache result
-            start_time = time.time()
-            result = func(*args, **kwargs)
-            execution_time = (time.time() - start_time) * 1000
-            
-            # Cache the result
-            phase1_cache.set(cache_key, result, ttl)
-            logger.info(f"Query executed and cached: {cache_key} ({execution_time:.2f}ms)")
+            def _execute():
+                start_time = time.time()
+                result = func(*args, **kwargs)
+                execution_time = (time.time() - start_time) * 1000
+                logger.info(f"Query executed and cached: {cache_key} ({execution_time:.2f}ms)")
+                return result
             
-            return result
+            # Concurrent misses share a single execution
+            return phase1_cache.backend.get_or_set(
+                phase1_cache.namespace, cache_key, _execute, ttl=ttl or phase1_cache.default_ttl
+            )
         return wrapper
     return decorator
 
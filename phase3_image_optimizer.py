@@ -197,6 +197,11 @@ if __name__ == "__main__":
     # Create responsive image helper
     optimizer.create_responsive_image_helper()
     
+    # Fingerprint the new WebP variants so they get immutable URLs
+    from asset_manifest import asset_manifest
+    asset_manifest.load(str(optimizer.static_dir))
+    asset_manifest.save()
+    
     total_savings = banner_savings + hero_savings + svg_savings
     total_count = banner_count + hero_count + svg_count
     
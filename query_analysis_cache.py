@@ -0,0 +1,295 @@
+"""
+Cache, coalescing and time budget for AI query analysis.
+
+User concerns are normalised (lowercased, punctuation and stop words
+removed, remaining words de-duplicated and sorted) so "Hair loss treatment"
+and "treatment for hair loss" share one entry. A lookup tries, in order:
+
+1. the tiered cache (namespace ``ai_query_analysis``), which also coalesces
+   concurrent identical misses into one model call;
+2. the ``ai_query_analyses`` table, which keeps analyses across restarts
+   (migrations/003_create_ai_query_analyses.py). When it cannot be reached,
+   analyses are kept in memory only and the table is tried again after
+   ``AI_QUERY_DB_RETRY_SECONDS``;
+3. the closest previously analysed query whose word set overlaps by at
+   least ``AI_QUERY_SIMILARITY`` (Jaccard);
+4. the model itself, bounded by ``AI_QUERY_TIMEOUT_SECONDS``. On timeout or
+   error the caller's keyword analyser answers instead. A late model result
+   is still stored for the next request. Identical queries in other workers
+   wait out the whole budget for the leader's result rather than calling
+   the model themselves.
+"""
+
+import os
+import re
+import json
+import time
+import logging
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from sqlalchemy import text
+
+from cache_backend import cache
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = 'ai_query_analysis'
+CACHE_TTL = 7 * 24 * 3600
+MODEL_TIMEOUT = float(os.environ.get('AI_QUERY_TIMEOUT_SECONDS', 8))
+LEADER_OVERHEAD = 2.0  # Store and similarity lookups a leader may do before calling the model
+SIMILARITY_THRESHOLD = float(os.environ.get('AI_QUERY_SIMILARITY', 0.75))
+MAX_KNOWN_QUERIES = 5000
+LATENCY_SAMPLES = 1000
+DB_RETRY_SECONDS = float(os.environ.get('AI_QUERY_DB_RETRY_SECONDS', 60))
+
+STOP_WORDS = frozenset("""
+a about am an and any are as at be been but by can could do does for from get getting have having
+help how i i'm im in is it its looking me my need of on or please should so some that the their
+them there these this to treatment treatments want wanting what when which who why will with
+would you your
+""".split())
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize_query(query_text):
+    """Sorted, de-duplicated content words of a query (all words if every word is a stop word)."""
+    words = [w.strip("'") for w in WORD_RE.findall((query_text or '').lower())]
+    words = [w for w in words if w]
+    content = [w for w in words if w not in STOP_WORDS] or words
+    return tuple(sorted(set(content)))
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class QueryAnalysisCache:
+    """Normalised-query cache in front of a slow analysis function."""
+
+    def __init__(self, timeout=MODEL_TIMEOUT, threshold=SIMILARITY_THRESHOLD, max_known=MAX_KNOWN_QUERIES):
+        self.timeout = timeout
+        self.threshold = threshold
+        self.max_known = max_known
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='ai-query')
+        self._lock = threading.Lock()
+        self._known = OrderedDict()   # key -> frozenset of words, most recent last
+        self._by_word = {}            # word -> set of keys, candidates for similarity matches
+        self._loaded = False
+        self._db_retry_at = 0.0      # The store is skipped until then after a failure
+        self._app = None
+        self.counters = {'requests': 0, 'cache_hits': 0, 'db_hits': 0, 'similar_hits': 0,
+                         'model_calls': 0, 'model_errors': 0, 'timeouts': 0, 'fallbacks': 0}
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._model_latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    # ---- public API ------------------------------------------------------
+
+    def analyze(self, query_text, model_call, fallback):
+        """
+        Analysis for ``query_text``: cached, similar, or from ``model_call``
+        within the time budget; ``fallback(query_text)`` otherwise.
+        """
+        start_time = time.perf_counter()
+        self._count('requests')
+        words = normalize_query(query_text)
+        analysis = None
+        if words:
+            self._ensure_loaded()
+            key = ' '.join(words)
+            computed = []
+
+            def compute():
+                computed.append(True)
+                return self._resolve(key, words, query_text, model_call)
+
+            try:
+                analysis = cache.get_or_set(NAMESPACE, key, compute, ttl=CACHE_TTL,
+                                            wait=self.timeout + LEADER_OVERHEAD)
+            except Exception as e:
+                logger.error(f"AI query analysis failed: {e}")
+            if analysis is not None and not computed:
+                self._count('cache_hits')
+
+        if analysis is None:
+            self._count('fallbacks')
+            analysis = fallback(query_text)
+        self._latencies.append((time.perf_counter() - start_time) * 1000)
+        return analysis
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        served = stats['cache_hits'] + stats['db_hits'] + stats['similar_hits']
+        stats['hit_rate'] = round(served / stats['requests'], 4) if stats['requests'] else 0.0
+        stats['known_queries'] = len(self._known)
+        stats['latency_ms'] = _percentiles(self._latencies)
+        stats['model_latency_ms'] = _percentiles(self._model_latencies)
+        return stats
+
+    # ---- resolution (runs once per key at a time) ------------------------
+
+    def _resolve(self, key, words, query_text, model_call):
+        analysis = self._load(key)
+        if analysis is not None:
+            self._count('db_hits')
+            return analysis
+
+        similar_key = self._most_similar(frozenset(words))
+        if similar_key is not None:
+            analysis = cache.get(NAMESPACE, similar_key) or self._load(similar_key)
+            if analysis is not None:
+                self._count('similar_hits')
+                return analysis
+
+        return self._call_model(key, words, query_text, model_call)
+
+    def _call_model(self, key, words, query_text, model_call):
+        self._count('model_calls')
+        start_time = time.perf_counter()
+        future = self._executor.submit(model_call, query_text)
+
+        def store_late_result(done):
+            # A result arriving after the budget still serves the next identical query
+            try:
+                analysis = done.result()
+            except Exception:
+                return
+            if analysis is not None:
+                cache.set(NAMESPACE, key, analysis, ttl=CACHE_TTL)
+                self._store(key, words, analysis)
+
+        try:
+            analysis = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._count('timeouts')
+            logger.warning(f"AI query analysis exceeded {self.timeout:.1f}s; using keyword analysis")
+            future.add_done_callback(store_late_result)
+            return None
+        except Exception as e:
+            self._count('model_errors')
+            logger.error(f"AI query analysis model call failed: {e}")
+            return None
+        finally:
+            self._model_latencies.append((time.perf_counter() - start_time) * 1000)
+
+        if analysis is not None:
+            self._store(key, words, analysis)
+        return analysis
+
+    # ---- similarity index ------------------------------------------------
+
+    def _remember(self, key, words):
+        with self._lock:
+            if key in self._known:
+                self._known.move_to_end(key)
+                return
+            self._known[key] = words
+            for word in words:
+                self._by_word.setdefault(word, set()).add(key)
+            while len(self._known) > self.max_known:
+                old_key, old_words = self._known.popitem(last=False)
+                for word in old_words:
+                    keys = self._by_word.get(word)
+                    if keys is not None:
+                        keys.discard(old_key)
+                        if not keys:
+                            del self._by_word[word]
+
+    def _most_similar(self, words):
+        with self._lock:
+            candidates = set()
+            for word in words:
+                candidates |= self._by_word.get(word, set())
+            best_key, best_score = None, self.threshold
+            for key in candidates:
+                score = jaccard(words, self._known[key])
+                if score >= best_score:
+                    best_key, best_score = key, score
+        return best_key
+
+    # ---- durable store ---------------------------------------------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        from flask import current_app
+        self._app = current_app._get_current_object()
+        with self._lock:
+            if self._loaded or not self._db_ready():
+                return
+            self._loaded = True
+        rows = self._query("""
+            SELECT query_key FROM ai_query_analyses
+            ORDER BY created_at DESC LIMIT :limit
+        """, {'limit': self.max_known})
+        if rows is None:
+            self._loaded = False  # Load the known queries once the store is back
+            return
+        for row in reversed(rows):
+            self._remember(row.query_key, frozenset(row.query_key.split()))
+
+    def _db_ready(self):
+        return time.time() >= self._db_retry_at
+
+    def _db_failed(self, e):
+        # Usually the migration has not run or the database is restarting; keep serving from cache
+        self._db_retry_at = time.time() + DB_RETRY_SECONDS
+        logger.warning(f"AI query analysis store unavailable, caching in memory only "
+                       f"for {DB_RETRY_SECONDS:.0f}s: {e}")
+
+    def _query(self, sql, params):
+        if not self._db_ready():
+            return None
+        from app import db
+        try:
+            with self._app.app_context(), db.engine.connect() as conn:
+                return conn.execute(text(sql), params).fetchall()
+        except Exception as e:
+            self._db_failed(e)
+            return None
+
+    def _load(self, key):
+        rows = self._query("SELECT analysis FROM ai_query_analyses WHERE query_key = :key", {'key': key})
+        if not rows:
+            return None
+        try:
+            return json.loads(rows[0].analysis)
+        except (TypeError, ValueError):
+            return None
+
+    def _store(self, key, words, analysis):
+        self._remember(key, frozenset(words))
+        if not self._db_ready():
+            return
+        from app import db
+        try:
+            with self._app.app_context(), db.engine.begin() as conn:
+                conn.execute(text("""
+                    INSERT INTO ai_query_analyses (query_key, analysis, created_at)
+                    VALUES (:key, :analysis, CURRENT_TIMESTAMP)
+                    ON CONFLICT (query_key) DO UPDATE SET analysis = EXCLUDED.analysis
+                """), {'key': key, 'analysis': json.dumps(analysis)})
+        except Exception as e:
+            logger.warning(f"Could not persist AI query analysis: {e}")
+
+
+def _percentiles(samples):
+    values = sorted(samples)
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'samples': 0}
+    return {
+        'p50': round(values[len(values) // 2], 2),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+        'samples': len(values),
+    }
+
+
+query_analysis_cache = QueryAnalysisCache()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Verify clinics.credit_balance against the credit_transactions ledger.
+
+Every completed transaction is summed per clinic and compared with the
+materialised balance. Drift means a write bypassed credit_ledger (balances
+that predate it are carried as opening_balance rows by migration 005, so
+run that first); --fix resets the balance to the ledger sum under the clinic
+row lock, so postings running at the same time are not lost.
+
+    python reconcile_credit_balances.py          # report drift, exit 1 if any
+    python reconcile_credit_balances.py --fix    # repair drifted balances
+"""
+
+import sys
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def reconcile_credit_balances(fix=False):
+    from app import app
+    from credit_ledger import ledger
+
+    start_time = time.time()
+    with app.app_context():
+        drifted = ledger.reconcile(fix=fix)
+
+    total_drift = sum(entry['drift'] for entry in drifted)
+    fixed = sum(1 for entry in drifted if 'fixed_to' in entry)
+    logger.info(f"{len(drifted)} clinics drifted from the ledger (net {total_drift:+d} credits)"
+                + (f", {fixed} repaired" if fix else "") + f", {time.time() - start_time:.1f}s")
+    return drifted
+
+
+if __name__ == "__main__":
+    fix = '--fix' in sys.argv
+    drifted = reconcile_credit_balances(fix=fix)
+    unresolved = [entry for entry in drifted if 'fixed_to' not in entry]
+    sys.exit(1 if unresolved else 0)
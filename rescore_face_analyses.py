@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Re-score stored face analyses with the current geometric metrics.
+
+Landmarks saved with each analysis (geometric_analysis_data.landmarks_data)
+are stacked into one (B, 478, 3) array per batch and scored with
+FacialGeometricAnalyzer.score_batch, so no image is decoded and MediaPipe is
+not needed. Only mathematical_scores is rewritten.
+
+    python rescore_face_analyses.py            # report changes only
+    python rescore_face_analyses.py --apply    # write the new scores
+"""
+
+import sys
+import time
+import logging
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+# mathematical_scores key -> score_batch component
+SCORE_KEYS = {
+    'golden_ratio_score': 'golden_ratio',
+    'symmetry_score': 'symmetry',
+    'facial_thirds_score': 'facial_thirds',
+    'facial_fifths_score': 'facial_fifths',
+    'neoclassical_score': 'neoclassical_canons',
+    'ogee_curve_score': 'ogee_curve',
+    'facial_harmony_score': 'facial_harmony',
+}
+
+
+def rescore_face_analyses(apply=False, batch_size=BATCH_SIZE):
+    from app import app, db
+    from models import FaceAnalysis
+    from utils.geometric_analysis import FacialGeometricAnalyzer, stack_landmarks
+
+    analyzer = FacialGeometricAnalyzer()
+    scored = changed = skipped = 0
+    last_id = 0
+    start_time = time.time()
+
+    with app.app_context():
+        while True:
+            analyses = (FaceAnalysis.query
+                        .filter(FaceAnalysis.has_geometric_analysis.is_(True), FaceAnalysis.id > last_id)
+                        .order_by(FaceAnalysis.id)
+                        .limit(batch_size)
+                        .all())
+            if not analyses:
+                break
+            last_id = analyses[-1].id
+
+            rows, landmark_sets = [], []
+            for analysis in analyses:
+                landmarks = ((analysis.geometric_analysis_data or {}).get('landmarks_data') or {}).get('landmarks')
+                if not landmarks:
+                    skipped += 1
+                    continue
+                rows.append(analysis)
+                landmark_sets.append(landmarks)
+            if not rows:
+                continue
+
+            scores = analyzer.score_batch(stack_landmarks(landmark_sets))
+            for i, analysis in enumerate(rows):
+                if np.isnan(scores['facial_harmony'][i]):
+                    skipped += 1
+                    continue
+                new_scores = {key: float(scores[component][i]) for key, component in SCORE_KEYS.items()}
+                scored += 1
+                if new_scores != (analysis.mathematical_scores or {}):
+                    changed += 1
+                    if apply:
+                        analysis.mathematical_scores = new_scores
+
+            if apply:
+                db.session.commit()
+            logger.info(f"Scored {scored} analyses so far (up to id {last_id})")
+
+    logger.info(f"{scored} scored, {changed} {'updated' if apply else 'would change'}, "
+                f"{skipped} skipped without usable landmarks, {time.time() - start_time:.1f}s")
+    return scored, changed, skipped
+
+
+if __name__ == "__main__":
+    rescore_face_analyses(apply='--apply' in sys.argv)
@@ -0,0 +1,130 @@
+"""
+Single-pass response pipeline.
+
+Every response goes through one ordered list of stages registered by the
+modules that own each concern, instead of a stack of ``after_request`` hooks
+that each timed the request, set security headers or rewrote
+``Cache-Control`` again:
+
+    security_headers   security_headers.add_security_headers
+    cache_policy       server_performance_optimization (the one Cache-Control policy)
+    mobile_hints       mobile_performance_optimizer
+    compression        compression_middleware (last, so it sees the final body and policy)
+
+A stage is ``func(response) -> response`` and is registered once per app by
+name; registering the same name again is ignored, so importing a module
+twice cannot run its work twice. The pipeline itself does the request
+timing: one ``X-Response-Time`` header, a ``Server-Timing`` breakdown, one
+slow-request log line, and per-stage call counts and durations in
+``stats()`` so the fixed cost of the stack is visible.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from flask import Flask, g, request
+
+logger = logging.getLogger(__name__)
+
+ORDER_SECURITY = 10
+ORDER_CACHE = 20
+ORDER_MOBILE = 30
+ORDER_COMPRESSION = 90
+
+EXTENSION_KEY = 'response_pipeline'
+
+
+Stage = namedtuple('Stage', 'name func order')
+
+
+class ResponsePipeline:
+    """Runs the registered stages in order from a single after_request hook."""
+
+    def __init__(self, app=None):
+        self.stages = []
+        self.timings = {}  # name -> [calls, total seconds, max seconds]
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.config.setdefault('RESPONSE_SLOW_MS', 500)
+        app.config.setdefault('RESPONSE_SERVER_TIMING', True)
+        self.slow_ms = app.config['RESPONSE_SLOW_MS']
+        self.server_timing = app.config['RESPONSE_SERVER_TIMING']
+        app.extensions[EXTENSION_KEY] = self
+        app.before_request(self._start)
+        app.after_request(self._run)
+
+    def add_stage(self, name, func, order):
+        """Register a stage; a name that is already registered keeps its first function."""
+        if any(stage.name == name for stage in self.stages):
+            logger.debug(f"Response stage {name} already registered")
+            return False
+        self.stages.append(Stage(name, func, order))
+        self.stages.sort(key=lambda stage: stage.order)
+        return True
+
+    def _start(self):
+        g.response_started = time.perf_counter()
+
+    def _run(self, response):
+        elapsed = []
+        for stage in self.stages:
+            started = time.perf_counter()
+            try:
+                response = stage.func(response)
+            except Exception as e:
+                logger.error(f"Response stage {stage.name} failed for {request.path}: {e}")
+            elapsed.append((stage.name, time.perf_counter() - started))
+
+        request_started = g.get('response_started')
+        if request_started is not None:
+            total = time.perf_counter() - request_started
+            elapsed.append(('total', total))
+            total_ms = total * 1000
+            response.headers['X-Response-Time'] = f"{total_ms:.2f}ms"
+            if self.server_timing:
+                response.headers['Server-Timing'] = ', '.join(
+                    f"{name};dur={seconds * 1000:.2f}" for name, seconds in elapsed
+                )
+            if total_ms > self.slow_ms:
+                logger.warning(f"SLOW REQUEST: {request.method} {request.path} took {total_ms:.2f}ms")
+
+        self._record(elapsed)
+        return response
+
+    def _record(self, elapsed):
+        with self._lock:
+            for name, seconds in elapsed:
+                timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+
+    def stats(self):
+        """Per-stage call counts and durations (total = whole request including the view)."""
+        with self._lock:
+            return {
+                name: {
+                    'calls': calls,
+                    'total_ms': round(total * 1000, 2),
+                    'avg_us': round(total * 1e6 / calls, 1) if calls else 0,
+                    'max_ms': round(peak * 1000, 2)
+                }
+                for name, (calls, total, peak) in self.timings.items()
+            }
+
+
+def get_pipeline(app: Flask):
+    """The app's pipeline, installed on first use."""
+    pipeline = app.extensions.get(EXTENSION_KEY)
+    if pipeline is None:
+        pipeline = ResponsePipeline(app)
+    return pipeline
+
+
+def register_stage(app: Flask, name, func, order):
+    """Add a response stage to the app's pipeline (once per name)."""
+    return get_pipeline(app).add_stage(name, func, order)
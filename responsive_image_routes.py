@@ -8,6 +8,8 @@ from pathlib import Path
 from flask import Blueprint, request, send_file, abort
 from werkzeug.utils import secure_filename
 
+from asset_manifest import asset_manifest
+
 # Create blueprint for responsive images
 responsive_images = Blueprint('responsive_images', __name__)
 
@@ -17,33 +19,21 @@ def get_optimized_image_path(image_name, is_mobile=False):
     # Check if WebP is supported
     accepts_webp = 'image/webp' in request.headers.get('Accept', '')
     
-    # Base paths
-    optimized_dir = Path("static/optimized")
-    original_dir = Path("static/uploads/banners")
-    
     # Get base name without extension
     base_name = Path(image_name).stem
     
-    # Priority order: WebP mobile > WebP desktop > original
+    # Priority order: WebP mobile > WebP desktop > original > images directory
+    candidates = []
     if is_mobile and accepts_webp:
-        mobile_webp = optimized_dir / f"{base_name}_mobile.webp"
-        if mobile_webp.exists():
-            return mobile_webp
-    
+        candidates.append(f"optimized/{base_name}_mobile.webp")
     if accepts_webp:
-        webp_path = optimized_dir / f"{base_name}.webp"
-        if webp_path.exists():
-            return webp_path
-    
-    # Fallback to original
-    original_path = original_dir / image_name
-    if original_path.exists():
-        return original_path
+        candidates.append(f"optimized/{base_name}.webp")
+    candidates += [f"uploads/banners/{image_name}", f"images/{image_name}"]
     
-    # Check in images directory
-    images_path = Path("static/images") / image_name
-    if images_path.exists():
-        return images_path
+    # Looked up in the boot-time asset manifest rather than stat()ed per request
+    for candidate in candidates:
+        if asset_manifest.has(candidate):
+            return Path("static") / candidate
     
     return None
 
@@ -72,7 +62,8 @@ def serve_optimized_image(image_name):
         # Add format info
         if image_path.suffix.lower() == '.webp':
             response.headers['Content-Type'] = 'image/webp'
-            response.headers['Vary'] = 'Accept'
+        # The same URL answers differently per browser and device
+        response.headers['Vary'] = 'Accept, User-Agent'
         
         return response
     
@@ -101,11 +92,11 @@ def optimized_image_url(image_path, is_mobile=False):
     # Extract filename from path
     filename = Path(image_path).name
     
-    # Check if optimized version exists
+    # Link the chosen variant by its fingerprinted static URL (immutable caching)
     optimized_path = get_optimized_image_path(filename, is_mobile)
     
-    if optimized_path and optimized_path.exists():
-        return url_for('responsive_images.serve_optimized_image', image_name=filename)
+    if optimized_path:
+        return url_for('static', filename=optimized_path.relative_to('static').as_posix())
     
     # Fallback to original
     return f"/{image_path}"
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, send_from_directory, session
 from sqlalchemy import func, text
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash
@@ -23,6 +24,8 @@ from models import (
     Banner, BannerSlide
 )
 from app import db
+from community_counters import record_view
+from buffered_counters import counters
 import logging
 
 # Import new admin systems
@@ -1099,20 +1102,10 @@ def index():
         
         # Removed affordable_packages - section removed from homepage
         
-        # Get clinics with 1000+ reviews (using a quick additional query)
-        try:
-            verified_clinics = db.session.execute(text("""
-                SELECT c.id, c.name, c.city, c.state, c.google_rating, c.google_review_count, c.description, c.slug,
-                       (SELECT COUNT(*) FROM packages WHERE clinic_id = c.id AND is_active = true) as package_count
-                FROM clinics c 
-                WHERE c.is_approved = true AND c.google_review_count >= 1000
-                ORDER BY c.google_review_count DESC, c.google_rating DESC
-                LIMIT 20
-            """)).fetchall()
-            verified_clinics = [dict(row._mapping) for row in verified_clinics] if verified_clinics else []
-        except Exception as e:
-            logger.error(f"Error loading clinics data: {str(e)}")
-            verified_clinics = []
+        # Verified clinics and category carousels come from the background-refreshed snapshot
+        from homepage_snapshot import get_homepage_snapshot
+        homepage_snapshot = get_homepage_snapshot()
+        verified_clinics = homepage_snapshot.verified_clinic_list()
         
         # Set safe defaults for other data
         popular_body_parts = []
@@ -1137,29 +1130,8 @@ def index():
             logger.error(f"Error preloading hero banner: {str(e)}")
             hero_banner_data = None
         
-        # Get category data for homepage sections
-        category_packages = {}
-        try:
-            categories = ['Injectables & Anti-Aging', 'Facials & Skin Glow', 'Laser & Advanced Technology', 
-                         'Hair Treatments', 'Scar, Spots & Skin Correction', 'Surgical Procedures', 
-                         'Body Treatments', 'Medical Consultations', 'Brows & Eyes', 'Lips & Smile']
-            
-            for category in categories:
-                packages = db.session.execute(text("""
-                    SELECT p.id, p.title, p.slug, p.category, p.description, p.price_actual, p.price_discounted,
-                           p.duration, p.downtime, p.actual_treatment_name, c.name as clinic_name, c.slug as clinic_slug
-                    FROM packages p
-                    JOIN clinics c ON p.clinic_id = c.id
-                    JOIN package_categories pc ON p.id = pc.package_id
-                    WHERE p.is_active = true AND pc.category_name = :category
-                    ORDER BY RANDOM()
-                    LIMIT 7
-                """), {'category': category}).fetchall()
-                
-                category_packages[category] = [dict(row._mapping) for row in packages] if packages else []
-        except Exception as e:
-            logger.error(f"Error loading category packages: {str(e)}")
-            category_packages = {}
+        # Get category data for homepage sections (sampled in-process from materialised pools)
+        category_packages = homepage_snapshot.sample_category_packages()
         
         # Render with optimized data including packages, clinics, and preloaded banner
         return render_template(
@@ -1323,61 +1295,42 @@ def autocomplete():
             return jsonify([])
         
         suggestions = []
+        # Served from the in-process index; no database round trip per keystroke
+        from autocomplete_index import get_autocomplete_index
+        index = get_autocomplete_index()
         
         # Search for procedures
         if not search_type or search_type in ['doctors', 'procedures']:
             procedure_limit = 8 if search_type == 'procedures' else 3
             
-            procedures = Procedure.query.filter(
-                Procedure.procedure_name.ilike(f"%{query}%")
-            ).order_by(
-                # Prioritize exact matches, then alphabetical
-                db.case((Procedure.procedure_name.ilike(f"{query}"), 0), else_=1),
-                Procedure.procedure_name
-            ).limit(procedure_limit).all()
-            
-            # Add procedures to suggestions
-            for procedure in procedures:
-                category_name = procedure.category.name if procedure.category else "Procedure"
-                procedure_type = "Surgical" if procedure.procedure_types and "surgical" in procedure.procedure_types.lower() else "Non-Surgical"
-                
+            for entry in index.suggest(query, 'procedure', procedure_limit):
                 suggestions.append({
-                    'id': procedure.id,
-                    'text': procedure.procedure_name,
-                    'display': f"{procedure.procedure_name} [Procedure]",
+                    'id': entry.id,
+                    'text': entry.text,
+                    'display': f"{entry.text} [Procedure]",
                     'category': 'Procedure',
-                    'url': url_for('web.procedure_detail', procedure_id=procedure.id),
-                    'type': procedure_type,
-                    'body_part': procedure.body_part
+                    'url': url_for('web.procedure_detail', procedure_id=entry.id),
+                    'type': entry.data['type'],
+                    'body_part': entry.data['body_part']
                 })
         
         # Search for doctors (only if in doctors tab or no specific tab)
         if not search_type or search_type == 'doctors':
             doctor_limit = 5 if search_type == 'doctors' else 2
             
-            doctors = Doctor.query.filter(
-                (Doctor.name.ilike(f"%{query}%")) |
-                (Doctor.specialty.ilike(f"%{query}%"))
-            ).order_by(
-                # Prioritize exact matches in name, then specialty
-                db.case((Doctor.name.ilike(f"{query}"), 0), else_=1),
-                Doctor.name
-            ).limit(doctor_limit).all()
-            
-            # Add doctors to suggestions
-            for doctor in doctors:
-                location = f"{doctor.city}{', ' + doctor.state if doctor.state else ''}"
-                display_text = f"Dr. {doctor.name} – {doctor.specialty}"
+            for entry in index.suggest(query, 'doctor', doctor_limit):
+                location = entry.data['location']
+                display_text = f"Dr. {entry.text} – {entry.data['specialty']}"
                 if location:
                     display_text += f", {location}"
                     
                 suggestions.append({
-                    'id': doctor.id,
-                    'text': f"Dr. {doctor.name}",
+                    'id': entry.id,
+                    'text': f"Dr. {entry.text}",
                     'display': f"{display_text} [Doctor]",
                     'category': 'Doctor',
-                    'url': url_for('web.doctor_detail', doctor_id=doctor.id),
-                    'specialty': doctor.specialty,
+                    'url': url_for('web.doctor_detail', doctor_id=entry.id),
+                    'specialty': entry.data['specialty'],
                     'location': location
                 })
         
@@ -1385,129 +1338,42 @@ def autocomplete():
         if not search_type or search_type == 'discussions':
             thread_limit = 8 if search_type == 'discussions' else 2
             
-            # Search in both Thread and Community models for comprehensive results
-            threads = Thread.query.filter(
-                Thread.title.ilike(f"%{query}%") | 
-                Thread.content.ilike(f"%{query}%")
-            ).order_by(
-                # Prioritize exact matches, then newest
-                db.case((Thread.title.ilike(f"{query}"), 0), else_=1),
-                Thread.created_at.desc()
-            ).limit(thread_limit).all()
+            # Thread results first, then Community threads fill the remaining slots
+            thread_entries = index.suggest(query, 'thread', thread_limit)
+            if thread_limit > len(thread_entries):
+                seen_ids = {entry.id for entry in thread_entries}
+                thread_entries += [entry for entry in index.suggest(query, 'community', thread_limit - len(thread_entries))
+                                   if entry.id not in seen_ids]
             
-            # Add threads to suggestions with enhanced information
-            for thread in threads:
-                # Get a brief content preview (first 100 characters)
-                content_preview = thread.content[:100] + "..." if thread.content and len(thread.content) > 100 else thread.content
-                
-                # Count replies for this thread
-                try:
-                    # Use direct SQL count for thread replies
-                    reply_count = db.session.execute(text(f"SELECT COUNT(*) FROM replies WHERE thread_id = {thread.id}")).scalar() or 0
-                except Exception as e:
-                    logger.error(f"Error counting replies: {str(e)}")
-                    reply_count = 0
-                
+            for entry in thread_entries:
                 suggestions.append({
-                    'id': thread.id,
-                    'text': thread.title,
-                    'display': f"{thread.title} [Community Thread]",
+                    'id': entry.id,
+                    'text': entry.text,
+                    'display': f"{entry.text} [Community Thread]",
                     'category': 'Thread',
-                    'url': url_for('web.community_thread_detail', thread_id=thread.id),
-                    'date': thread.created_at.strftime('%b %d, %Y') if thread.created_at else '',
-                    'content_preview': content_preview,
-                    'reply_count': reply_count,
+                    'url': url_for('web.community_thread_detail', thread_id=entry.id),
+                    'date': entry.data['date'],
+                    'content_preview': entry.data['content_preview'],
+                    'reply_count': entry.data['reply_count'],
                     'is_enhanced': True
                 })
-            
-            # Also search in Community model if needed
-            if thread_limit > len(threads):
-                remaining_limit = thread_limit - len(threads)
-                
-                community_threads = Community.query.filter(
-                    Community.title.ilike(f"%{query}%") | 
-                    Community.content.ilike(f"%{query}%")
-                ).order_by(
-                    db.case((Community.title.ilike(f"{query}"), 0), else_=1),
-                    Community.created_at.desc()
-                ).limit(remaining_limit).all()
-                
-                for thread in community_threads:
-                    # Check if we already have this thread (avoid duplicates)
-                    if not any(s.get('id') == thread.id and s.get('category') == 'Thread' for s in suggestions):
-                        # Get a brief content preview (first 100 characters)
-                        content_preview = thread.content[:100] + "..." if thread.content and len(thread.content) > 100 else thread.content
-                        
-                        # Count replies for this thread
-                        try:
-                            # Use direct SQL count for community replies
-                            reply_count = db.session.execute(text(f"SELECT COUNT(*) FROM community WHERE parent_id = {thread.id}")).scalar() or 0
-                        except Exception as e:
-                            logger.error(f"Error counting community replies: {str(e)}")
-                            reply_count = 0
-                        
-                        suggestions.append({
-                            'id': thread.id,
-                            'text': thread.title,
-                            'display': f"{thread.title} [Community Thread]",
-                            'category': 'Thread',
-                            'url': url_for('web.community_thread_detail', thread_id=thread.id),
-                            'date': thread.created_at.strftime('%b %d, %Y') if thread.created_at else '',
-                            'content_preview': content_preview,
-                            'reply_count': reply_count,
-                            'is_enhanced': True
-                        })
         
         # Search for packages (only if in packages tab or no specific tab)
         if not search_type or search_type == 'packages':
-            try:
-                from models import Package, Clinic
-                package_limit = 8 if search_type == 'packages' else 3
-                
-                # Search for packages
-                packages = db.session.query(Package).join(Clinic).filter(
-                    Package.is_active == True,
-                    Clinic.is_approved == True,
-                    db.or_(
-                        Package.title.ilike(f"%{query}%"),
-                        Package.description.ilike(f"%{query}%"),
-                        Package.category.ilike(f"%{query}%")
-                    )
-                ).order_by(
-                    # Prioritize exact matches in title, then alphabetical
-                    db.case((Package.title.ilike(f"{query}"), 0), else_=1),
-                    Package.title
-                ).limit(package_limit).all()
-                
-                # Add packages to suggestions
-                for package in packages:
-                    clinic_name = package.clinic.name if package.clinic else "Unknown Clinic"
-                    clinic_city = package.clinic.city if package.clinic else ""
-                    
-                    # Format price display
-                    price_actual = getattr(package, 'price_actual', None)
-                    price_discounted = getattr(package, 'price_discounted', None)
-                    
-                    if price_discounted and price_actual and price_discounted < price_actual:
-                        price_display = f"₹{price_discounted:,.0f}"
-                    elif price_actual:
-                        price_display = f"₹{price_actual:,.0f}"
-                    else:
-                        price_display = "Contact for price"
-                    
-                    suggestions.append({
-                        'id': package.id,
-                        'text': package.title,
-                        'display': f"{package.title} - {clinic_name} [Package]",
-                        'category': 'Package',
-                        'url': url_for('enhanced_package.package_detail', slug=package.slug),
-                        'clinic_name': clinic_name,
-                        'clinic_city': clinic_city,
-                        'price': price_display,
-                        'package_category': getattr(package, 'category', None) or 'General'
-                    })
-            except Exception as e:
-                logger.error(f"Error searching packages in autocomplete: {str(e)}")
+            package_limit = 8 if search_type == 'packages' else 3
+            
+            for entry in index.suggest(query, 'package', package_limit):
+                suggestions.append({
+                    'id': entry.id,
+                    'text': entry.text,
+                    'display': f"{entry.text} - {entry.data['clinic_name']} [Package]",
+                    'category': 'Package',
+                    'url': url_for('enhanced_package.package_detail', slug=entry.data['slug']),
+                    'clinic_name': entry.data['clinic_name'],
+                    'clinic_city': entry.data['clinic_city'],
+                    'price': entry.data['price'],
+                    'package_category': entry.data['package_category']
+                })
         
         # Sort suggestions by relevance within their category
         if search_type == 'doctors':
@@ -1569,110 +1435,7 @@ def search():
         if search_type not in ['doctors', 'procedures', 'threads', 'packages']:
             search_type = None
             
-        # Initialize results containers
-        procedures = []
-        doctors = []
-        threads = []
-        packages = []
-        
-        # Search for procedures if requested or searching all
-        if not search_type or search_type == 'procedures':
-            procedures = Procedure.query.filter(
-                Procedure.procedure_name.ilike(f"%{query}%") | 
-                Procedure.short_description.ilike(f"%{query}%") |
-                Procedure.overview.ilike(f"%{query}%") |
-                Procedure.procedure_details.ilike(f"%{query}%") |
-                Procedure.body_part.ilike(f"%{query}%")
-            ).limit(20).all()
-        
-        # Search for doctors if requested or searching all
-        if not search_type or search_type == 'doctors':
-            # For doctor searches with procedure names like "Rhinoplasty", we need to handle it differently
-            # We'll first check if the query matches any procedure name
-            procedure = Procedure.query.filter(
-                Procedure.procedure_name.ilike(f"%{query}%")
-            ).first()
-            
-            if procedure and search_type == 'doctors':
-                # If it's a procedure, get all doctors (since they are all plastic surgeons)
-                # and only filter by location if provided
-                if location and location.strip():
-                    doctors = Doctor.query.filter(
-                        Doctor.city.ilike(f"%{location.strip()}%")
-                    ).limit(20).all()
-                else:
-                    doctors = Doctor.query.limit(20).all()
-            else:
-                # If not a procedure name or searching all types, use regular search
-                # Start with the base query
-                doctor_query = Doctor.query.filter(
-                    Doctor.name.ilike(f"%{query}%") | 
-                    Doctor.specialty.ilike(f"%{query}%") |
-                    Doctor.bio.ilike(f"%{query}%")
-                )
-                
-                # Add location filter if provided
-                if location and location.strip():
-                    doctor_query = doctor_query.filter(Doctor.city.ilike(f"%{location.strip()}%"))
-                
-                # Get the results
-                doctors = doctor_query.limit(20).all()
-                
-                # If no results, try to find all doctors who perform that procedure
-                if search_type == 'doctors' and not doctors:
-                    # Try to find procedure by name again (for safety)
-                    if not procedure:
-                        procedure = Procedure.query.filter(
-                            Procedure.procedure_name.ilike(f"%{query}%")
-                        ).first()
-                    
-                    if procedure:
-                        # Find doctors filtered by location if provided
-                        if location and location.strip():
-                            doctors = Doctor.query.filter(
-                                Doctor.city.ilike(f"%{location.strip()}%")
-                            ).limit(20).all()
-                        else:
-                            doctors = Doctor.query.limit(20).all()
-        
-        # Search for community threads if requested or searching all
-        if not search_type or search_type == 'threads':
-            # First search the Thread model
-            threads = Thread.query.filter(
-                Thread.title.ilike(f"%{query}%") | 
-                Thread.content.ilike(f"%{query}%") |
-                Thread.keywords.cast(db.String).ilike(f"%{query}%")
-            ).limit(10).all()
-            
-            # If we don't have enough threads or specifically searching for threads, also search Community model
-            if len(threads) < 10 or search_type == 'threads':
-                # Also search in Community model for more discussion threads
-                community_threads = Community.query.filter(
-                    Community.title.ilike(f"%{query}%") | 
-                    Community.content.ilike(f"%{query}%") |
-                    Community.tags.cast(db.String).ilike(f"%{query}%")
-                ).filter(
-                    Community.parent_id.is_(None)  # Only get top-level threads, not replies
-                ).limit(20 - len(threads)).all()
-                
-                # Add community threads to the results
-                # Add reply count for each thread for proper display
-                for thread in community_threads:
-                    try:
-                        # Calculate reply count for each community thread
-                        reply_count = db.session.query(Community).filter(
-                            Community.parent_id == thread.id
-                        ).count()
-                        
-                        # Set the reply_count attribute dynamically
-                        thread.reply_count = reply_count
-                    except Exception as e:
-                        logger.error(f"Error counting replies for thread {thread.id}: {str(e)}")
-                        thread.reply_count = 0
-                
-                threads.extend(community_threads)
-        
-        # Handle specific search types - redirect to their respective main pages with search parameters
+        # Specific search types are served by their own listing pages
         if search_type == 'packages':
             # Redirect to the enhanced packages page with search parameters
             from urllib.parse import urlencode
@@ -1719,68 +1482,17 @@ def search():
             }
             return redirect(url_for('web.community') + '?' + urlencode(params))
         
-        # Search for packages if searching all types (not specific packages search)
-        if not search_type:
-            try:
-                from models import Package, Clinic
-                # Build the package search query
-                package_query = db.session.query(Package).join(Clinic).filter(
-                    Package.is_active == True,
-                    Clinic.is_approved == True,
-                    db.or_(
-                        Package.title.ilike(f"%{query}%"),
-                        Package.description.ilike(f"%{query}%"),
-                        Package.category.ilike(f"%{query}%")
-                    )
-                )
-                
-                # Add location filter if provided
-                if location and location.strip():
-                    package_query = package_query.filter(
-                        Clinic.city.ilike(f"%{location.strip()}%")
-                    )
-                
-                packages = package_query.limit(20).all()
-                
-                # Add clinic information to each package
-                for package in packages:
-                    if not hasattr(package, 'clinic'):
-                        package.clinic = Clinic.query.get(package.clinic_id)
-                
-            except Exception as e:
-                logger.error(f"Error searching packages: {str(e)}")
-                packages = []
-        else:
-            packages = []
+        # Ranked full-text search across every entity (see search_engine.py)
+        from search_engine import get_search_engine
+        results = get_search_engine().search(query, location=location)
         
-        # Search for clinics if searching all types (not specific clinic search)
-        if not search_type:
-            try:
-                from models import Clinic
-                # Build the clinic search query
-                clinic_query = Clinic.query.filter(
-                    Clinic.is_approved == True,
-                    db.or_(
-                        Clinic.name.ilike(f"%{query}%"),
-                        Clinic.description.ilike(f"%{query}%"),
-                        Clinic.area.ilike(f"%{query}%"),
-                        Clinic.city.ilike(f"%{query}%")
-                    )
-                )
-                
-                # Add location filter if provided
-                if location and location.strip():
-                    clinic_query = clinic_query.filter(
-                        Clinic.city.ilike(f"%{location.strip()}%")
-                    )
-                
-                clinics = clinic_query.limit(20).all()
-                
-            except Exception as e:
-                logger.error(f"Error searching clinics: {str(e)}")
-                clinics = []
-        else:
-            clinics = []
+        procedures = [r.entity for r in results['procedure']]
+        doctors = [r.entity for r in results['doctor']]
+        threads = [r.entity for r in results['thread']]
+        # Community threads fill the discussion list after Thread results
+        threads += [r.entity for r in results['community'][:20 - len(threads)]]
+        packages = [r.entity for r in results['package']]
+        clinics = [r.entity for r in results['clinic']]
         
         # Log search results
         logger.info(f"Search for '{query}' found: {len(procedures)} procedures, {len(doctors)} doctors, {len(threads)} threads, {len(packages)} packages, {len(clinics)} clinics")
@@ -1915,8 +1627,10 @@ def community():
         category_filter = request.args.get('category', '').strip()
         sort_by = request.args.get('sort', 'latest')
         
-        # Base query for threads
-        base_query = Community.query.filter(Community.parent_id.is_(None))  # Only top-level threads
+        # Base query for threads, authors and categories loaded in the same query
+        base_query = Community.query.options(
+            joinedload(Community.user), joinedload(Community.category)
+        ).filter(Community.parent_id.is_(None))  # Only top-level threads
         
         # Apply search filters
         if search_query:
@@ -1948,16 +1662,7 @@ def community():
         else:
             threads = base_query.order_by(Community.created_at.desc()).limit(50).all()
         
-        # Add reply count for each thread
-        for thread in threads:
-            try:
-                reply_count = db.session.query(Community).filter(
-                    Community.parent_id == thread.id
-                ).count()
-                thread.reply_count = reply_count
-            except Exception as e:
-                logger.error(f"Error counting replies for thread {thread.id}: {str(e)}")
-                thread.reply_count = 0
+        # reply_count is maintained on insert/delete (community_counters)
         
         # Get categories for filter dropdown
         categories = Category.query.all()
@@ -2037,20 +1742,10 @@ def community_post_redirect(thread_id):
 def community_thread_detail(thread_id):
     """Render the detailed community thread page with nested replies."""
     try:
-        # Get the thread
-        thread = Community.query.get_or_404(thread_id)
-        
-        # Safely handle user data
-        if thread.user_id:
-            thread.user = User.query.get(thread.user_id)
-        else:
-            thread.user = None
-        
-        # Get category and procedure if they exist
-        if thread.category_id:
-            thread.category = Category.query.get(thread.category_id)
-        if thread.procedure_id:
-            thread.procedure = Procedure.query.get(thread.procedure_id)
+        # Get the thread with its author, category and procedure in one query
+        thread = Community.query.options(
+            joinedload(Community.user), joinedload(Community.category), joinedload(Community.procedure)
+        ).filter(Community.id == thread_id).first_or_404()
         
         # Create media directory if it doesn't exist
         media_dir = os.path.join(os.getcwd(), 'static', 'media')
@@ -2058,12 +1753,8 @@ def community_thread_detail(thread_id):
             os.makedirs(media_dir, exist_ok=True)
             logger.info(f"Created media directory at {media_dir}")
         
-        # Increment view count
-        thread.view_count += 1
-        
-        # Update reply count with an accurate value
-        thread.reply_count = count_all_replies(thread.id)
-        db.session.commit()
+        # Buffered and written in batches; reply_count is kept current on insert/delete
+        record_view(thread.id)
         
         # Get sort parameter (default: oldest first for thread details)
         sort = request.args.get('sort', 'oldest')
@@ -2071,57 +1762,33 @@ def community_thread_detail(thread_id):
         # Log for debugging
         logger.debug(f"Displaying thread {thread_id} with sort order: {sort}")
         
-        # Get all replies for this thread from the community table
-        replies = Community.query.filter_by(parent_id=thread_id).all()
+        # Get all replies for this thread from the community table, sorted and with authors
+        reply_order = {
+            'latest': [Community.created_at.desc()],
+            'popular': [func.coalesce(Community.upvotes, 0).desc(), Community.created_at],
+        }.get(sort, [Community.created_at])
+        replies = Community.query.options(joinedload(Community.user)).filter(
+            Community.parent_id == thread_id
+        ).order_by(*reply_order).all()
         logger.debug(f"Found {len(replies)} total replies for thread {thread_id}")
         
-        # Process replies and attach user data
-        top_level_replies = []
-        
-        # For each reply, safely attach its user data
-        for reply in replies:
-            # Attach user data safely
-            if reply.user_id:
-                reply.user = User.query.get(reply.user_id)
-            else:
-                reply.user = None
-            
-            # Since we're using parent_id=thread_id, all these are top-level replies
-            top_level_replies.append(reply)
-        
-        logger.debug(f"Found {len(top_level_replies)} top-level replies for thread {thread_id}")
-        
-        # Sort replies based on sort parameter
-        if sort == 'latest':
-            top_level_replies.sort(key=lambda x: x.created_at, reverse=True)
-        elif sort == 'oldest':
-            top_level_replies.sort(key=lambda x: x.created_at)
-        elif sort == 'popular':
-            # Sort by upvotes if available, otherwise by creation date
-            top_level_replies.sort(key=lambda x: (x.upvotes or 0), reverse=True)
+        # Since we're using parent_id=thread_id, all these are top-level replies
+        top_level_replies = list(replies)
         
         # Get related threads (same category or procedure)
         related_threads = []
+        related_filter = None
         if thread.category_id:
-            related_threads = Community.query.filter(
-                Community.category_id == thread.category_id,
-                Community.id != thread.id,
-                Community.parent_id.is_(None)  # Only top-level threads
-            ).order_by(Community.created_at.desc()).limit(5).all()
+            related_filter = Community.category_id == thread.category_id
         elif thread.procedure_id:
-            related_threads = Community.query.filter(
-                Community.procedure_id == thread.procedure_id,
+            related_filter = Community.procedure_id == thread.procedure_id
+        if related_filter is not None:
+            related_threads = Community.query.options(joinedload(Community.user)).filter(
+                related_filter,
                 Community.id != thread.id,
                 Community.parent_id.is_(None)  # Only top-level threads
             ).order_by(Community.created_at.desc()).limit(5).all()
         
-        # Add user data to related threads
-        for related in related_threads:
-            if related.user_id:
-                related.user = User.query.get(related.user_id)
-            else:
-                related.user = None
-        
         # Get all categories for the dropdown
         categories = Category.query.all()
         
@@ -4379,9 +4046,8 @@ def clinic_profile_direct(clinic_id):
             flash('Clinic not found or not approved.', 'error')
             return redirect(url_for('web.index'))
         
-        # Update view count
-        clinic.view_count = (clinic.view_count or 0) + 1
-        db.session.commit()
+        # Update view count (buffered, written by the periodic counter flush)
+        counters.increment('clinic_views', clinic.id)
         
         return render_template('clinic_profile.html', clinic=clinic)
                              
@@ -5094,28 +4760,12 @@ def allocate_credits():
             flash('Invalid clinic or credit amount', 'danger')
             return redirect(url_for('admin_credit.credit_dashboard'))
         
-        # Update clinic balance
-        db.session.execute(text("""
-            UPDATE clinics 
-            SET credit_balance = credit_balance + :credits,
-                total_credits_purchased = total_credits_purchased + :credits
-            WHERE id = :clinic_id
-        """), {
-            'credits': credits,
-            'clinic_id': clinic_id
-        })
-        
-        # Record transaction
-        db.session.execute(text("""
-            INSERT INTO credit_transactions 
-            (clinic_id, amount, transaction_type, description, created_by, created_at)
-            VALUES (:clinic_id, :amount, 'manual_allocation', :description, :admin_id, NOW())
-        """), {
-            'clinic_id': clinic_id,
-            'amount': credits,
-            'description': description or f'Manual credit allocation by admin',
-            'admin_id': current_user.id
-        })
+        from credit_ledger import ledger as credit_ledger
+        credit_ledger.post(
+            clinic_id, credits, 'manual_allocation',
+            description=description or f'Manual credit allocation by admin',
+            created_by=current_user.id
+        )
         
         db.session.commit()
         
@@ -5252,100 +4902,24 @@ def admin_lead_analytics():
             leads.append(lead_dict)
         
         # Get all clinics for filter dropdown
-        cursor.execute("SELECT id, name FROM clinics WHERE is_approved = true ORDER BY name")
+        cursor.execute("""
+            SELECT id, name, COALESCE(credit_balance, 0) FROM clinics
+            WHERE is_approved = true ORDER BY name
+        """)
         clinic_rows = cursor.fetchall()
-        clinics = [{'id': row[0], 'name': row[1]} for row in clinic_rows]
+        clinics = [{'id': row[0], 'name': row[1], 'credit_balance': row[2]} for row in clinic_rows]
         
         cursor.close()
         conn.close()
         
-        # Calculate analytics safely
-        total_leads = len(leads)
-        contacted_leads = 0
-        converted_leads = 0
-        total_revenue = 0
-        total_credits_spent = 0
-        
-        for lead in leads:
-            # Safe None checks
-            if lead.get('contacted_at') is not None:
-                contacted_leads += 1
-            if lead.get('converted_at') is not None:
-                converted_leads += 1
-            if lead.get('conversion_value') is not None:
-                total_revenue += float(lead['conversion_value'] or 0)
-            if lead.get('credit_cost') is not None:
-                total_credits_spent += int(lead['credit_cost'] or 0)
-        
-        # Calculate metrics with safe division
-        contact_rate = (contacted_leads * 100.0 / total_leads) if total_leads > 0 else 0.0
-        conversion_rate = (converted_leads * 100.0 / total_leads) if total_leads > 0 else 0.0
-        roi = ((total_revenue - total_credits_spent) * 100.0 / total_credits_spent) if total_credits_spent > 0 else 0.0
-        avg_lead_value = (total_revenue / converted_leads) if converted_leads > 0 else 0.0
-        
-        analytics = {
-            'total_leads': total_leads,
-            'contacted_leads': contacted_leads,
-            'converted_leads': converted_leads,
-            'total_revenue': round(total_revenue, 2),
-            'total_credits_spent': total_credits_spent,
-            'contact_rate': round(contact_rate, 2),
-            'conversion_rate': round(conversion_rate, 2),
-            'roi': round(roi, 2),
-            'avg_lead_value': round(avg_lead_value, 2)
-        }
-        
-        # Get clinic performance metrics
-        cursor2 = conn.cursor() if not conn.closed else psycopg2.connect(os.environ.get('DATABASE_URL')).cursor()
-        
-        clinic_metrics_query = """
-            SELECT 
-                c.id,
-                c.name,
-                COALESCE(c.credit_balance, 0) as credit_balance,
-                COUNT(l.id) as total_leads,
-                COUNT(CASE WHEN l.contacted_at IS NOT NULL THEN 1 END) as contacted_leads,
-                COUNT(CASE WHEN l.converted_at IS NOT NULL THEN 1 END) as converted_leads,
-                CASE WHEN COUNT(l.id) > 0 
-                    THEN ROUND((COUNT(CASE WHEN l.contacted_at IS NOT NULL THEN 1 END)::numeric / COUNT(l.id)) * 100, 2)
-                    ELSE 0 END as contact_rate,
-                CASE WHEN COUNT(l.id) > 0 
-                    THEN ROUND((COUNT(CASE WHEN l.converted_at IS NOT NULL THEN 1 END)::numeric / COUNT(l.id)) * 100, 2)
-                    ELSE 0 END as conversion_rate,
-                COALESCE(SUM(l.credit_cost), 0) as total_credits_spent,
-                COALESCE(SUM(l.conversion_value), 0) as total_revenue
-            FROM clinics c
-            LEFT JOIN leads l ON c.id = l.clinic_id 
-                AND l.created_at >= %s AND l.created_at <= %s
-            WHERE c.is_approved = true
-        """
-        
-        clinic_params = [parsed_start_date, parsed_end_date]
-        if clinic_id:
-            clinic_metrics_query += " AND c.id = %s"
-            clinic_params.append(clinic_id)
-        
-        clinic_metrics_query += " GROUP BY c.id, c.name, c.credit_balance ORDER BY total_leads DESC"
-        
-        cursor2.execute(clinic_metrics_query, clinic_params)
-        clinic_rows = cursor2.fetchall()
-        
-        clinic_column_names = [desc[0] for desc in cursor2.description]
-        clinic_metrics = []
-        for row in clinic_rows:
-            clinic_dict = dict(zip(clinic_column_names, row))
-            # Calculate ROI percentage
-            revenue = clinic_dict.get('total_revenue', 0) or 0
-            credits_spent = clinic_dict.get('total_credits_spent', 0) or 0
-            if credits_spent > 0:
-                clinic_dict['roi_percentage'] = round(((revenue - credits_spent) / credits_spent) * 100, 2)
-            else:
-                clinic_dict['roi_percentage'] = 0
-            clinic_metrics.append(clinic_dict)
-            
-        cursor2.close()
-        if not conn.closed:
-            conn.close()
+        # Totals and per-clinic funnels come from the daily rollups, not the 500-row list above
+        from clinic_rollups import lead_analytics
+        analytics, clinic_metrics = lead_analytics(
+            start_day=parsed_start_date.date() if parsed_start_date else None,
+            end_day=parsed_end_date.date() if parsed_end_date else None,
+            clinic_id=clinic_id,
+            clinics=clinics
+        )
         
         return render_template('admin/lead_analytics.html',
                               leads=leads,
@@ -6909,25 +6483,14 @@ def lead_confirmation(lead_id):
 # Helper function to count replies recursively
 def count_all_replies(thread_id):
     """
-    Count all replies for a thread, including nested replies.
-    This provides a more accurate count than just counting top-level replies.
+    Count all replies for a thread.
     
-    Uses the unified community table structure where replies have parent_id = thread_id.
+    Reads the denormalised community.reply_count, which community_counters
+    keeps current as replies are added and removed; nothing is written here.
     """
     try:
-        # Count all replies to this thread (entries with parent_id = thread_id)
-        total = Community.query.filter_by(parent_id=thread_id).count()
-        
-        # Log for debugging
-        logger.debug(f"Found {total} total replies for thread {thread_id} using recursive count")
-        
-        # Update the thread's reply_count if different
-        thread = Community.query.get(thread_id)
-        if thread and thread.reply_count != total:
-            thread.reply_count = total
-            db.session.commit()
-            
-        return total
+        total = db.session.query(Community.reply_count).filter(Community.id == thread_id).scalar()
+        return total or 0
     except Exception as e:
         logger.error(f"Error counting replies: {str(e)}")
         return 0
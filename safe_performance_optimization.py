@@ -7,7 +7,6 @@ import time
 import gzip
 import io
 from functools import wraps
-from flask import request, make_response, current_app
 
 class SafePerformanceCache:
     """Simple in-memory cache for database queries"""
@@ -165,17 +164,6 @@ def optimize_database_queries():
         print(f"Database optimization skipped: {e}")
         return {}
 
-def add_cache_headers(response):
-    """Add appropriate cache headers for static content"""
-    if request.endpoint and 'static' in request.endpoint:
-        # Cache static files for 1 hour
-        response.headers['Cache-Control'] = 'public, max-age=3600'
-        response.headers['Expires'] = time.strftime(
-            '%a, %d %b %Y %H:%M:%S GMT', 
-            time.gmtime(time.time() + 3600)
-        )
-    return response
-
 def register_safe_performance_optimizations(app):
     """Register safe performance optimizations with Flask app"""
     
@@ -184,14 +172,8 @@ def register_safe_performance_optimizations(app):
     # 1. Skip compression middleware due to encoding issues
     print("⚠️ Compression middleware disabled to prevent encoding issues")
     
-    # 2. Add cache headers for static files
-    try:
-        @app.after_request
-        def add_cache_headers_to_response(response):
-            return add_cache_headers(response)
-        print("✅ Cache headers enabled for static files")
-    except Exception as e:
-        print(f"❌ Cache headers failed: {e}")
+    # 2. Cache headers and request timing are stages of response_pipeline
+    #    (server_performance_optimization owns the cache policy)
     
     # 3. Initialize database query caching
     try:
@@ -201,24 +183,6 @@ def register_safe_performance_optimizations(app):
     except Exception as e:
         print(f"❌ Database query caching failed: {e}")
     
-    # 4. Add performance monitoring
-    try:
-        @app.before_request
-        def before_request():
-            request.start_time = time.time()
-        
-        @app.after_request
-        def after_request(response):
-            if hasattr(request, 'start_time'):
-                duration = time.time() - request.start_time
-                if duration > 1.0:  # Log slow requests
-                    print(f"⚠️ Slow request: {request.path} took {duration:.2f}s")
-            return response
-        
-        print("✅ Performance monitoring enabled")
-    except Exception as e:
-        print(f"❌ Performance monitoring failed: {e}")
-    
     print("🎯 Safe performance optimizations registered successfully")
     return app
 
@@ -0,0 +1,287 @@
+"""
+PostgreSQL full-text search for the global ``/search`` page.
+
+Each searchable table carries a generated ``search_vector`` column (created by
+migrations/002_add_search_vectors.py) weighted title (A) > summary (B) >
+body (C), backed by a GIN index. Searches run one ranked ``@@`` query per
+entity kind, load the matching rows by id and return them as ``SearchResult``
+objects in ``ts_rank`` order. Community reply counts come from the
+denormalised ``community.reply_count`` column (see community_counters.py).
+
+``search_vector`` is deliberately not mapped on the models, so the ORM keeps
+working on databases where the migration has not run yet; there the engine
+falls back to the previous ILIKE matching.
+"""
+
+import re
+import time
+import logging
+from sqlalchemy import text, bindparam, or_
+from sqlalchemy.orm import joinedload
+
+logger = logging.getLogger(__name__)
+
+PROCEDURE = 'procedure'
+DOCTOR = 'doctor'
+THREAD = 'thread'
+COMMUNITY_THREAD = 'community'
+PACKAGE = 'package'
+CLINIC = 'clinic'
+KINDS = (PROCEDURE, DOCTOR, THREAD, COMMUNITY_THREAD, PACKAGE, CLINIC)
+
+DEFAULT_LIMITS = {
+    PROCEDURE: 20,
+    DOCTOR: 20,
+    THREAD: 10,
+    COMMUNITY_THREAD: 20,
+    PACKAGE: 20,
+    CLINIC: 20,
+}
+
+TEXT_SEARCH_CONFIG = 'english'
+
+# Arrays cannot be fed to a generated column directly: array_to_string is only STABLE
+ARRAY_TO_TEXT_FUNCTION = """
+    CREATE OR REPLACE FUNCTION antidote_array_to_text(text[]) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ SELECT array_to_string($1, ' ') $$
+"""
+
+# table -> weighted document (A: title, B: summary, C: body)
+SEARCH_DOCUMENTS = {
+    'procedures': {
+        'A': "coalesce(procedure_name, '') || ' ' || coalesce(alternative_names, '')",
+        'B': "coalesce(short_description, '') || ' ' || coalesce(body_part, '')",
+        'C': "coalesce(overview, '') || ' ' || coalesce(procedure_details, '')",
+    },
+    'doctors': {
+        'A': "coalesce(name, '')",
+        'B': "coalesce(specialty, '')",
+        'C': "coalesce(bio, '')",
+    },
+    'threads': {
+        'A': "coalesce(title, '')",
+        'B': "coalesce(antidote_array_to_text(keywords), '')",
+        'C': "coalesce(content, '')",
+    },
+    'community': {
+        'A': "coalesce(title, '')",
+        'B': "coalesce(antidote_array_to_text(tags), '')",
+        'C': "coalesce(content, '')",
+    },
+    'packages': {
+        'A': "coalesce(title, '')",
+        'B': "coalesce(category, '') || ' ' || coalesce(actual_treatment_name, '')",
+        'C': "coalesce(description, '')",
+    },
+    'clinics': {
+        'A': "coalesce(name, '')",
+        'B': "coalesce(area, '') || ' ' || coalesce(city, '')",
+        'C': "coalesce(description, '')",
+    },
+}
+
+
+def search_vector_expression(table):
+    parts = [f"setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', {expr}), '{weight}')"
+             for weight, expr in SEARCH_DOCUMENTS[table].items()]
+    return ' || '.join(parts)
+
+
+def search_vector_ddl():
+    """Statements that add the generated search columns and their GIN indexes."""
+    statements = [ARRAY_TO_TEXT_FUNCTION]
+    for table in SEARCH_DOCUMENTS:
+        statements.append(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({search_vector_expression(table)}) STORED")
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_search_vector ON {table} USING gin(search_vector)")
+    return statements
+
+
+_WORD_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def build_tsquery(query):
+    """AND of the query words with prefix matching on the last one ('botox lip' -> 'botox & lip:*')."""
+    words = _WORD_RE.findall((query or '').lower())
+    if not words:
+        return None
+    words[-1] += ':*'  # The user may still be typing the last word
+    return ' & '.join(words)
+
+
+class SearchResult:
+    """One ranked hit, whatever the entity type."""
+
+    __slots__ = ('kind', 'id', 'rank', 'entity')
+
+    def __init__(self, kind, entity_id, rank, entity=None):
+        self.kind = kind
+        self.id = entity_id
+        self.rank = rank
+        self.entity = entity
+
+    def __repr__(self):
+        return f"<SearchResult {self.kind}:{self.id} rank={self.rank:.4f}>"
+
+
+class SearchEngine:
+    """Ranked full-text search over procedures, doctors, threads, packages and clinics."""
+
+    def __init__(self, db):
+        self.db = db
+        self._fts_available = None
+
+    def fts_available(self):
+        """True once the search_vector migration has been applied (checked once per process)."""
+        if self._fts_available is None:
+            try:
+                if self.db.engine.dialect.name != 'postgresql':
+                    self._fts_available = False
+                else:
+                    found = self.db.session.execute(text("""
+                        SELECT COUNT(*) FROM information_schema.columns
+                        WHERE column_name = 'search_vector' AND table_name IN :tables
+                    """).bindparams(bindparam('tables', expanding=True)),
+                        {'tables': list(SEARCH_DOCUMENTS)}).scalar()
+                    self._fts_available = found == len(SEARCH_DOCUMENTS)
+                    if not self._fts_available:
+                        logger.warning("search_vector columns missing; run migrations/002_add_search_vectors.py")
+            except Exception as e:
+                logger.warning(f"Could not check full-text search columns: {e}")
+                self.db.session.rollback()
+                return False
+        return self._fts_available
+
+    def search(self, query, kinds=KINDS, location=None, limits=None):
+        """Ranked results per kind: {'procedure': [SearchResult, ...], ...}."""
+        limits = dict(DEFAULT_LIMITS, **(limits or {}))
+        location = (location or '').strip() or None
+        use_fts = self.fts_available()
+        tsquery = build_tsquery(query)
+
+        start_time = time.time()
+        results = {}
+        for kind in kinds:
+            if use_fts:
+                hits = self._ranked_ids(kind, tsquery, location, limits[kind]) if tsquery else []
+                results[kind] = self._load_entities(kind, hits)
+            else:
+                results[kind] = self._ilike_search(kind, query, location, limits[kind])
+
+        logger.debug(f"Search for '{query}' ({'fts' if use_fts else 'ilike'}) "
+                     f"took {(time.time() - start_time) * 1000:.1f}ms")
+        return results
+
+    # ---- full-text path ----
+
+    def _ranked_ids(self, kind, tsquery, location, limit):
+        table, joins, filters, params = self._fts_source(kind, location)
+        rows = self.db.session.execute(text(f"""
+            SELECT t.id, ts_rank(t.search_vector, q.query) AS rank
+            FROM {table} t {joins}, to_tsquery('{TEXT_SEARCH_CONFIG}', :tsquery) AS q(query)
+            WHERE t.search_vector @@ q.query {filters}
+            ORDER BY rank DESC, t.id
+            LIMIT :limit
+        """), dict(params, tsquery=tsquery, limit=limit)).fetchall()
+        return [(row.id, float(row.rank)) for row in rows]
+
+    @staticmethod
+    def _fts_source(kind, location):
+        params = {}
+        joins = ''
+        filters = ''
+        if kind == PROCEDURE:
+            table = 'procedures'
+        elif kind == DOCTOR:
+            table = 'doctors'
+            if location:
+                filters = ' AND t.city ILIKE :location'
+        elif kind == THREAD:
+            table = 'threads'
+        elif kind == COMMUNITY_THREAD:
+            table = 'community'
+            filters = ' AND t.parent_id IS NULL'  # Top-level threads only, not replies
+        elif kind == PACKAGE:
+            table = 'packages'
+            joins = 'JOIN clinics c ON t.clinic_id = c.id'
+            filters = ' AND t.is_active = true AND c.is_approved = true'
+            if location:
+                filters += ' AND c.city ILIKE :location'
+        elif kind == CLINIC:
+            table = 'clinics'
+            filters = ' AND t.is_approved = true'
+            if location:
+                filters += ' AND t.city ILIKE :location'
+        else:
+            raise ValueError(f"Unknown search kind: {kind}")
+        if location:
+            params['location'] = f"%{location}%"
+        return table, joins, filters, params
+
+    def _load_entities(self, kind, hits):
+        if not hits:
+            return []
+        model = _models()[kind]
+        query = model.query
+        if kind == PACKAGE:
+            query = query.options(joinedload(model.clinic))
+        by_id = {entity.id: entity for entity in query.filter(model.id.in_([i for i, _ in hits])).all()}
+        return [SearchResult(kind, entity_id, rank, by_id[entity_id])
+                for entity_id, rank in hits if entity_id in by_id]
+
+    # ---- fallback path (migration not applied) ----
+
+    def _ilike_search(self, kind, query, location, limit):
+        models = _models()
+        model = models[kind]
+        pattern = f"%{query}%"
+        location_pattern = f"%{location}%" if location else None
+        q = model.query
+
+        if kind == PROCEDURE:
+            q = q.filter(or_(model.procedure_name.ilike(pattern), model.short_description.ilike(pattern),
+                             model.overview.ilike(pattern), model.procedure_details.ilike(pattern),
+                             model.body_part.ilike(pattern)))
+        elif kind == DOCTOR:
+            q = q.filter(or_(model.name.ilike(pattern), model.specialty.ilike(pattern), model.bio.ilike(pattern)))
+            if location_pattern:
+                q = q.filter(model.city.ilike(location_pattern))
+        elif kind == THREAD:
+            q = q.filter(or_(model.title.ilike(pattern), model.content.ilike(pattern)))
+        elif kind == COMMUNITY_THREAD:
+            q = q.filter(or_(model.title.ilike(pattern), model.content.ilike(pattern)),
+                         model.parent_id.is_(None))
+        elif kind == PACKAGE:
+            clinic = models[CLINIC]
+            q = q.join(clinic).options(joinedload(model.clinic)).filter(
+                model.is_active == True, clinic.is_approved == True,
+                or_(model.title.ilike(pattern), model.description.ilike(pattern), model.category.ilike(pattern)))
+            if location_pattern:
+                q = q.filter(clinic.city.ilike(location_pattern))
+        elif kind == CLINIC:
+            q = q.filter(model.is_approved == True,
+                         or_(model.name.ilike(pattern), model.description.ilike(pattern),
+                             model.area.ilike(pattern), model.city.ilike(pattern)))
+            if location_pattern:
+                q = q.filter(model.city.ilike(location_pattern))
+
+        return [SearchResult(kind, entity.id, 0.0, entity) for entity in q.limit(limit).all()]
+
+
+def _models():
+    from models import Procedure, Doctor, Thread, Community, Package, Clinic
+    return {PROCEDURE: Procedure, DOCTOR: Doctor, THREAD: Thread,
+            COMMUNITY_THREAD: Community, PACKAGE: Package, CLINIC: Clinic}
+
+
+_engine = None
+
+
+def get_search_engine():
+    global _engine
+    if _engine is None:
+        from app import db
+        _engine = SearchEngine(db)
+    return _engine
@@ -6,18 +6,17 @@ Implements comprehensive security headers to ensure browser security
 from flask import g
 import secrets
 
+from response_pipeline import register_stage, ORDER_SECURITY
+
 def add_security_headers(response):
     """Add comprehensive security headers to all responses."""
     
-    # Generate nonce for inline scripts if not already set
-    if not hasattr(g, 'nonce'):
-        g.nonce = secrets.token_urlsafe(16)
-    
     # Security headers
     response.headers['X-Content-Type-Options'] = 'nosniff'
     response.headers['X-Frame-Options'] = 'DENY'
     response.headers['X-XSS-Protection'] = '1; mode=block'
     response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
+    response.headers['X-DNS-Prefetch-Control'] = 'on'
     # Allow camera access for face analysis, restrict others
     response.headers['Permissions-Policy'] = 'camera=*, microphone=(), geolocation=()'
     
@@ -33,11 +32,10 @@ def add_security_headers(response):
 def register_security_middleware(app):
     """Register security middleware with Flask app."""
     
-    @app.after_request
-    def apply_security_headers(response):
-        return add_security_headers(response)
+    # The only place security headers are set (response pipeline stage)
+    register_stage(app, 'security_headers', add_security_headers, ORDER_SECURITY)
     
-    # Add template context for nonce
+    # Add template context for nonce (generated only when a template renders)
     @app.context_processor
     def inject_security_context():
         if not hasattr(g, 'nonce'):
@@ -2,26 +2,23 @@
 Server Performance Optimization System
 
 This module provides comprehensive server-side optimizations including:
-- Response compression
-- Caching headers
+- Caching headers (the cache_policy stage of response_pipeline)
 - Database query optimization
-- Static file serving optimization
 - Performance monitoring
 """
 
 import time
-import gzip
-import io
 import os
 from functools import wraps
-from flask import request, Response, current_app, g
-from werkzeug.middleware.proxy_fix import ProxyFix
+from flask import request, session
 import logging
 
+from response_pipeline import get_pipeline, register_stage, ORDER_CACHE
+
 logger = logging.getLogger(__name__)
 
 class PerformanceOptimizationMiddleware:
-    """Middleware for server performance optimization"""
+    """Owns the response cache policy; timing lives in response_pipeline"""
     
     def __init__(self, app=None):
         self.app = app
@@ -29,114 +26,50 @@ class PerformanceOptimizationMiddleware:
             self.init_app(app)
     
     def init_app(self, app):
-        """Initialize performance optimization middleware"""
-        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
-        app.config.setdefault('COMPRESS_LEVEL', 6)
-        app.config.setdefault('CACHE_STATIC_MAX_AGE', 3600)  # 1 hour
+        """Register the cache policy as a response pipeline stage"""
+        app.config.setdefault('CACHE_STATIC_MAX_AGE', 86400)  # 1 day for plain (unhashed) static URLs
         app.config.setdefault('CACHE_DYNAMIC_MAX_AGE', 300)  # 5 minutes
+        app.config.setdefault('CACHE_HTML_MAX_AGE', 60)  # 1 minute
+        self.app = app
         
-        # Add performance monitoring
-        app.before_request(self.before_request)
-        app.after_request(self.after_request)
-        
-        # Add compression
-        app.after_request(self.compress_response)
-        
-        # Add caching headers
-        app.after_request(self.add_cache_headers)
-        
-        # Add security headers
-        app.after_request(self.add_security_headers)
-    
-    def before_request(self):
-        """Track request start time"""
-        g.start_time = time.time()
+        # Compression and security headers are their own stages (compression_middleware, security_headers)
+        register_stage(app, 'cache_policy', self.add_cache_headers, ORDER_CACHE)
     
-    def after_request(self, response):
-        """Monitor response time and log slow requests"""
-        if hasattr(g, 'start_time'):
-            duration = (time.time() - g.start_time) * 1000  # Convert to milliseconds
-            
-            # Log slow requests
-            if duration > 500:  # Log requests slower than 500ms
-                logger.warning(f"SLOW REQUEST: {request.method} {request.path} took {duration:.2f}ms")
-            
-            # Add response time header for monitoring
-            response.headers['X-Response-Time'] = f"{duration:.2f}ms"
+    def add_cache_headers(self, response):
+        """The single Cache-Control policy; headers a view set itself are kept"""
+        config = self.app.config
+        cache_control = response.cache_control
         
-        return response
-    
-    def compress_response(self, response):
-        """Compress response if applicable"""
-        # Skip compression for certain content types
-        if (response.content_type.startswith('image/') or 
-            response.content_type.startswith('video/') or
-            response.content_type.startswith('audio/') or
-            'gzip' in response.headers.get('Content-Encoding', '')):
+        if request.endpoint == 'static':
+            # Fingerprinted URLs already carry a 1-year immutable policy (asset_manifest)
+            if cache_control.immutable:
+                return response
+            cache_control.public = True
+            if 'optimized/' in request.path:
+                cache_control.max_age = 31536000
+                cache_control.immutable = True
+            else:
+                # Plain paths can change in place, so revalidate
+                cache_control.max_age = config['CACHE_STATIC_MAX_AGE']
             return response
         
-        # Check if client accepts gzip
-        if 'gzip' not in request.headers.get('Accept-Encoding', ''):
+        if request.method != 'GET' or response.status_code != 200 or 'Cache-Control' in response.headers:
             return response
         
-        # Skip small responses - handle direct passthrough mode safely
-        try:
-            if len(response.data) < current_app.config['COMPRESS_MIN_SIZE']:
-                return response
-        except RuntimeError:
-            # Response is in direct passthrough mode, skip compression
+        # API responses get shorter cache times, HTML pages minimal caching
+        if request.path.startswith('/api/'):
+            max_age = config['CACHE_DYNAMIC_MAX_AGE']
+        elif response.mimetype == 'text/html':
+            max_age = config['CACHE_HTML_MAX_AGE']
+        else:
             return response
         
-        try:
-            # Compress the response
-            gzip_buffer = io.BytesIO()
-            with gzip.GzipFile(fileobj=gzip_buffer, mode='wb', 
-                              compresslevel=current_app.config['COMPRESS_LEVEL']) as gzip_file:
-                gzip_file.write(response.data)
-            
-            # Update response
-            response.data = gzip_buffer.getvalue()
-            response.headers['Content-Encoding'] = 'gzip'
-            response.headers['Content-Length'] = len(response.data)
-            response.headers['Vary'] = 'Accept-Encoding'
-            
-        except (RuntimeError, Exception) as e:
-            # Handle both direct passthrough mode and other compression errors
-            logger.debug(f"Compression skipped: {e}")
-            # Return original response on error
-            
-        return response
-    
-    def add_cache_headers(self, response):
-        """Add appropriate cache headers"""
-        # Static files get longer cache times
-        if request.path.startswith('/static/'):
-            if any(request.path.endswith(ext) for ext in ['.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp']):
-                response.headers['Cache-Control'] = f'public, max-age={current_app.config["CACHE_STATIC_MAX_AGE"]}'
-                try:
-                    response.headers['ETag'] = f'"{hash(response.data)}"'
-                except (RuntimeError, AttributeError):
-                    # Skip ETag for direct passthrough responses
-                    pass
-        
-        # API responses get shorter cache times
-        elif request.path.startswith('/api/'):
-            if request.method == 'GET':
-                response.headers['Cache-Control'] = f'public, max-age={current_app.config["CACHE_DYNAMIC_MAX_AGE"]}'
-        
-        # HTML pages get minimal caching
-        elif response.content_type.startswith('text/html'):
-            response.headers['Cache-Control'] = 'public, max-age=60'
-        
-        return response
-    
-    def add_security_headers(self, response):
-        """Add security headers"""
-        # Don't override existing CSP
-        if 'Content-Security-Policy' not in response.headers:
-            response.headers['X-Content-Type-Options'] = 'nosniff'
-            response.headers['X-Frame-Options'] = 'DENY'
-            response.headers['X-XSS-Protection'] = '1; mode=block'
+        # Pages that read the session are per user and must not sit in shared caches
+        if session.accessed:
+            cache_control.private = True
+        else:
+            cache_control.public = True
+        cache_control.max_age = max_age
         
         return response
 
@@ -181,7 +114,8 @@ def setup_performance_monitoring(app):
         return {
             'server_time': time.time(),
             'uptime': time.time() - app.config.get('START_TIME', time.time()),
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'response_stages': get_pipeline(app).stats()
         }
 
 
@@ -10,6 +10,7 @@ from datetime import datetime
 from flask import Blueprint, request, jsonify, render_template, redirect, url_for, session, flash
 from flask_login import login_required, current_user
 from models import db, Clinic, CreditTransaction, PromoCode, PromoUsage
+from credit_ledger import ledger as credit_ledger
 from werkzeug.security import generate_password_hash
 import hashlib
 import hmac
@@ -348,22 +349,14 @@ def demo_payment_complete():
         
         # Add credits to clinic
         credits_to_add = pending_order['credits']
-        clinic.credit_balance += credits_to_add
-        
-        # Create transaction record
-        from models import CreditTransaction
-        transaction = CreditTransaction(
-            clinic_id=clinic.id,
-            transaction_type='purchase',
-            amount=credits_to_add,
+        posting = credit_ledger.post(
+            clinic.id, credits_to_add, 'purchase',
+            description=f"Demo credit top-up: ₹{pending_order['amount']:,.0f}",
+            idempotency_key=f'payment:demo_{order_id}',
             order_id=order_id,
             payment_id=f'demo_{order_id}',
-            monetary_value=pending_order['amount'],
-            description=f"Demo credit top-up: ₹{pending_order['amount']:,.0f}",
-            status='completed'
+            monetary_value=pending_order['amount']
         )
-        
-        db.session.add(transaction)
         db.session.commit()
         
         # Clear pending order from session
@@ -375,7 +368,7 @@ def demo_payment_complete():
             'success': True,
             'message': 'Demo payment successful',
             'credits_added': credits_to_add,
-            'new_balance': clinic.credit_balance
+            'new_balance': posting['new_balance']
         })
         
     except Exception as e:
@@ -431,41 +424,30 @@ def verify_payment():
             flash('Clinic not found', 'error')
             return redirect(url_for('simple_billing.simple_credit_topup'))
         
-        # Add credits to clinic
+        # Add credits to clinic; the Razorpay payment id makes a repeated callback a no-op
         credits_to_add = pending_order['credits']
-        clinic.credit_balance += credits_to_add
-        
-        # Create transaction record
-        transaction = CreditTransaction(
-            clinic_id=clinic.id,
-            transaction_type='credit',
-            amount=pending_order['amount'],
-            credits=credits_to_add,
-            razorpay_payment_id=payment_id,
-            razorpay_order_id=order_id,
+        posting = credit_ledger.post(
+            clinic.id, credits_to_add, 'credit',
             description=f"Credit top-up: ₹{pending_order['amount']:,.0f}",
-            status='completed'
+            idempotency_key=f'razorpay:{payment_id}',
+            order_id=order_id,
+            payment_id=payment_id,
+            monetary_value=pending_order['amount']
         )
         
         # Record promo usage if applicable
-        if pending_order['promo_code_id']:
+        if pending_order['promo_code_id'] and not posting['duplicate']:
             promo_usage = PromoUsage(
                 clinic_id=clinic.id,
                 promo_code_id=pending_order['promo_code_id'],
-                transaction_id=None,  # Will be updated after transaction is saved
+                transaction_id=posting['transaction_id'],
                 discount_amount=pending_order['discount'],
                 bonus_amount=pending_order['bonus']
             )
             db.session.add(promo_usage)
         
-        db.session.add(transaction)
         db.session.commit()
         
-        # Update promo usage transaction reference
-        if pending_order['promo_code_id']:
-            promo_usage.transaction_id = transaction.id
-            db.session.commit()
-        
         # Clear pending order from session
         session.pop('pending_order', None)
         
@@ -477,7 +459,7 @@ def verify_payment():
                 'success': True,
                 'message': 'Payment successful',
                 'credits_added': credits_to_add,
-                'new_balance': clinic.credit_balance
+                'new_balance': posting['new_balance']
             })
         
         # For hosted checkout callback, redirect with success message
@@ -1,18 +1,41 @@
 """Smart recommendation system for cross-entity connections."""
 
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from app import db
+from item_similarity import related_ids
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _in_model_order(query, neighbors):
+    """Rows for the model's neighbour ids (one primary-key query), best first, with their relevance_score."""
+    scores = dict(neighbors)
+    rows = db.session.execute(
+        query.bindparams(bindparam('ids', expanding=True)), {'ids': list(scores)}
+    ).fetchall()
+    items = [dict(row._mapping, relevance_score=round(scores[row.id], 4)) for row in rows]
+    return sorted(items, key=lambda item: item['relevance_score'], reverse=True)
+
+
 class SmartRecommendationEngine:
     """Intelligent recommendation engine that connects all entities."""
     
     @staticmethod
     def get_related_packages(package_id, limit=6):
-        """Get packages related to the given package."""
+        """Get packages related to the given package (similarity model, then curated links)."""
         try:
+            neighbors = related_ids('package', package_id, limit * 2)
+            if neighbors:
+                # Twice the limit: some neighbours may have been deactivated since the build
+                return _in_model_order(text("""
+                    SELECT p.id, p.title, p.slug, p.price_discounted, p.price_actual,
+                           p.description, c.name as clinic_name
+                    FROM packages p
+                    JOIN clinics c ON p.clinic_id = c.id
+                    WHERE p.id IN :ids AND p.is_active = true
+                """), neighbors)[:limit]
+            
             query = text("""
                 SELECT DISTINCT p.id, p.title, p.slug, p.price_discounted, p.price_actual,
                        p.description, c.name as clinic_name, er.relevance_score
@@ -24,7 +47,7 @@ class SmartRecommendationEngine:
                   AND er.target_entity_type = 'package'
                   AND er.recommendation_type = 'related'
                   AND p.is_active = true
-                ORDER BY er.relevance_score DESC, RANDOM()
+                ORDER BY er.relevance_score DESC, p.id
                 LIMIT :limit
             """)
             result = db.session.execute(query, {'package_id': package_id, 'limit': limit}).fetchall()
@@ -60,8 +83,18 @@ class SmartRecommendationEngine:
     
     @staticmethod
     def get_complementary_procedures(procedure_id, limit=5):
-        """Get procedures commonly done together with the given procedure."""
+        """Get procedures similar to or commonly viewed with the given procedure (similarity model, then curated links)."""
         try:
+            neighbors = related_ids('procedure', procedure_id, limit)
+            if neighbors:
+                return _in_model_order(text("""
+                    SELECT p.id, p.procedure_name, p.short_description, p.min_cost, p.max_cost,
+                           c.name as category_name
+                    FROM procedures p
+                    JOIN categories c ON p.category_id = c.id
+                    WHERE p.id IN :ids
+                """), neighbors)
+            
             query = text("""
                 SELECT DISTINCT p.id, p.procedure_name, p.short_description, p.min_cost, p.max_cost,
                        c.name as category_name, er.relevance_score
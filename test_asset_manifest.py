@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests for the content-hashed static asset manifest.
+
+    python test_asset_manifest.py
+
+Uses a throwaway Flask app over a temporary static folder.
+"""
+
+import os
+import gzip
+import json
+import tempfile
+
+from flask import Flask, url_for, render_template_string
+
+from asset_manifest import init_asset_manifest, asset_manifest, MANIFEST_NAME
+from compression_middleware import enable_compression
+from server_performance_optimization import PerformanceOptimizationMiddleware
+
+CSS = b'.card { padding: 16px; border-radius: 8px; }\n' * 100
+
+
+def write(folder, relative, data):
+    path = os.path.join(folder, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def make_app():
+    folder = tempfile.mkdtemp()
+    write(folder, 'css/site.css', CSS)
+    write(folder, 'optimized/hero.webp', b'RIFF....WEBP')
+    write(folder, 'uploads/avatar.png', b'\x89PNG')
+    write(folder, 'sw.js', b'self.addEventListener("fetch", () => {});')
+
+    app = Flask(__name__, static_folder=folder, static_url_path='/static')
+    app.config['COMPRESS_PRECOMPRESS_STATIC'] = True  # Boot-time build step, as the Docker image runs it
+    enable_compression(app)
+    PerformanceOptimizationMiddleware(app)
+    init_asset_manifest(app)
+    return app
+
+
+def test_url_for_emits_hashed_names():
+    app = make_app()
+    with app.test_request_context():
+        css_url = url_for('static', filename='css/site.css')
+        assert css_url.startswith('/static/css/site.') and css_url.endswith('.css') and css_url != '/static/css/site.css'
+        assert url_for('static', filename='optimized/hero.webp') != '/static/optimized/hero.webp'
+        # Runtime uploads and the service worker keep their plain URLs
+        assert url_for('static', filename='uploads/avatar.png') == '/static/uploads/avatar.png'
+        assert url_for('static', filename='sw.js') == '/static/sw.js'
+        assert render_template_string("{{ asset_url('css/site.css') }}") == css_url
+
+
+def test_hashed_url_is_immutable():
+    app = make_app()
+    client = app.test_client()
+    with app.test_request_context():
+        css_url = url_for('static', filename='css/site.css')
+
+    response = client.get(css_url, headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.cache_control.immutable and response.cache_control.max_age == 31536000
+    assert not response.cache_control.no_cache
+    assert response.headers['Content-Encoding'] == 'gzip'  # Precompressed sibling still used
+    assert gzip.decompress(response.data) == CSS
+
+    plain = client.get('/static/css/site.css')
+    assert plain.status_code == 200 and not plain.cache_control.immutable
+    assert plain.cache_control.max_age == 86400
+
+
+def test_hash_follows_content():
+    app = make_app()
+    folder = app.static_folder
+    before = asset_manifest.url_name('css/site.css')
+    asset_manifest.save(folder)
+
+    path = write(folder, 'css/site.css', CSS + b'.new { color: red; }\n')
+    os.utime(path, (0, os.stat(path).st_mtime + 5))
+    assert asset_manifest.load(folder) == 1  # Only the changed file is rehashed
+    after = asset_manifest.url_name('css/site.css')
+    assert after != before
+    assert asset_manifest.resolve(before) is None and asset_manifest.resolve(after) == 'css/site.css'
+
+    with open(os.path.join(folder, MANIFEST_NAME)) as f:
+        assert 'css/site.css' in json.load(f)['assets']
+
+
+def main():
+    tests = [test_url_for_emits_hashed_names, test_hashed_url_is_immutable, test_hash_follows_content]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
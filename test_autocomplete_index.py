@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-memory autocomplete index.
+
+    python test_autocomplete_index.py
+
+Covers prefix and trigram search on a KindIndex built from hand-written
+entries, and the cross-worker refresh: a second index catching up through
+the change journal (in an in-process Redis stand-in, or a scratch tag
+directory) with id-level reloads.
+"""
+
+import tempfile
+
+from flask import Flask
+from sqlalchemy.orm import sessionmaker, make_transient_to_detached
+
+import autocomplete_index as ac
+from autocomplete_index import AutocompleteEntry, AutocompleteIndex, KindIndex, PROCEDURE, THREAD, SYNC, normalize
+from cache_backend import TieredCache, RedisTier, LocalRedis, FileTagVersions
+
+NAMES = {1: "Rhinoplasty", 2: "Revision Rhinoplasty", 3: "Breast Augmentation", 4: "Lip Filler",
+         5: "Liposuction"}
+
+
+def entry(entity_id, name):
+    return AutocompleteEntry(PROCEDURE, entity_id, name, [normalize(name)], normalize(name), {})
+
+
+def kind_index():
+    index = KindIndex()
+    index.load([entry(i, name) for i, name in NAMES.items()])
+    return index
+
+
+def ids(entries):
+    return [e.id for e in entries]
+
+
+def test_prefix_search_ranks_whole_matches_first():
+    index = kind_index()
+    assert ids(index.search('rhino', 10)) == [1, 2], "Entries starting with the query come first"
+    assert ids(index.search('rev rhin', 10)) == [2], "Every word must match a token prefix"
+    assert ids(index.search('lip', 10))[:2] == [4, 5]
+    assert ids(index.search('lip', 1)) == [4]
+    assert index.search('', 10) == []
+
+
+def test_trigram_fallback_for_typos():
+    index = kind_index()
+    assert ids(index.search(normalize('rhinoplasy'), 10))[0] == 1
+    assert ids(index.search(normalize('augmentaton'), 10)) == [3]
+    assert index.search('zzzz', 10) == []
+
+
+def test_upsert_and_remove():
+    index = kind_index()
+    index.upsert(entry(4, "Lip Lift"))
+    assert ids(index.search('filler', 10)) == [], "The old name's tokens are gone"
+    assert ids(index.search('lift', 10)) == [4]
+    index.remove(4)
+    assert 4 not in ids(index.search('lip', 10))
+    assert len(index) == 4
+
+
+def test_body_matches_rank_after_titles():
+    index = KindIndex()
+    index.load([
+        AutocompleteEntry(THREAD, 1, "Swelling after surgery", [normalize("Swelling after surgery")], 1, {},
+                          ac.body_tokens("Three weeks post rhinoplasty and still puffy")),
+        AutocompleteEntry(THREAD, 2, "Rhinoplasty recovery", [normalize("Rhinoplasty recovery")], 2, {},
+                          ac.body_tokens("Day ten")),
+    ])
+    assert ids(index.search('rhinoplasty', 10)) == [2, 1], "Body-only matches come after title matches"
+    assert ids(index.search('puffy', 10)) == [1]
+    assert ids(index.search('rhinoplasty puffy', 1)) == [1], "Words may match title or body"
+    index.upsert(AutocompleteEntry(THREAD, 1, "Swelling after surgery", [normalize("Swelling after surgery")], 1, {},
+                                   ac.body_tokens("Edited")))
+    assert index.search('puffy', 10) == [], "The old body's tokens are gone"
+    index.remove(1)
+    assert index.search('edited', 10) == []
+
+
+class FakeLoader:
+    def __init__(self):
+        self.rows = dict(NAMES)
+        self.calls = []
+        self.fail = False
+
+    def __call__(self, db, ids=None):
+        self.calls.append(None if ids is None else set(ids))
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        return [entry(i, name) for i, name in self.rows.items() if ids is None or i in ids]
+
+
+def with_cache(make_cache):
+    def decorate(test):
+        def run():
+            original_cache, original_loader = ac.cache, ac.LOADERS[PROCEDURE]
+            ac.cache = make_cache()
+            ac.LOADERS[PROCEDURE] = loader = FakeLoader()
+            try:
+                test(loader)
+            finally:
+                ac.cache, ac.LOADERS[PROCEDURE] = original_cache, original_loader
+        run.__name__ = test.__name__
+        return run
+    return decorate
+
+
+with_shared_cache = with_cache(lambda: TieredCache(remote=RedisTier(LocalRedis())))
+
+
+def other_worker():
+    index = AutocompleteIndex()
+    index._app = Flask(__name__)
+    index.build(None, (PROCEDURE,))
+    return index
+
+
+def check(index):
+    index._last_version_check = 0
+    index._check_freshness()
+    jobs = []
+    while not index._queue.empty():
+        jobs.append(index._queue.get_nowait())
+    return [job for job in jobs if job[0] == PROCEDURE]  # Only procedures were built
+
+
+@with_shared_cache
+def test_journaled_changes_reload_only_their_ids(loader):
+    index = other_worker()
+    loader.rows[2] = "Closed Rhinoplasty"
+    del loader.rows[5]
+    ac.publish_changes(PROCEDURE, {2, 5})
+
+    assert check(index) == [(PROCEDURE, SYNC)]
+    assert check(index) == [], "A queued refresh is not queued again"
+    index._refresh(None, PROCEDURE, SYNC)
+    assert loader.calls[-1] == {2, 5}, "Only the journaled ids are reloaded"
+    assert ids(index.kinds[PROCEDURE].search('closed', 10)) == [2]
+    assert ids(index.kinds[PROCEDURE].search('liposuction', 10)) == []
+    assert check(index) == []
+
+
+@with_shared_cache
+def test_unjournaled_tag_bump_rebuilds(loader):
+    index = other_worker()
+    ac.cache.invalidate_tags(*ac.KIND_TAGS[PROCEDURE])  # A raw-SQL write with mark_dirty
+    assert check(index) == [(PROCEDURE, SYNC)]
+    index._refresh(None, PROCEDURE, SYNC)
+    assert loader.calls[-1] is None, "Changes the journal cannot account for need a full build"
+
+    for entity_id in range(ac.CHANGE_JOURNAL_LENGTH + 1):
+        ac.publish_changes(PROCEDURE, {entity_id})
+    ac.publish_changes(PROCEDURE, {1})  # Evicts this worker's first unseen entry
+    assert check(index) == [(PROCEDURE, SYNC)]
+    index._refresh(None, PROCEDURE, SYNC)
+    assert loader.calls[-1] is None, "Trimmed entries need a full build"
+
+
+@with_shared_cache
+def test_failed_refresh_is_retried(loader):
+    index = other_worker()
+    ac.publish_changes(PROCEDURE, {1})
+    loader.fail = True
+    assert check(index) == [(PROCEDURE, SYNC)]
+    index._refresh(None, PROCEDURE, SYNC)
+    assert check(index) == [], "Retries back off"
+
+    loader.fail = False
+    index._retry_at.clear()
+    assert check(index) == [(PROCEDURE, SYNC)], "The change is still unseen after the failure"
+    index._refresh(None, PROCEDURE, SYNC)
+    assert check(index) == []
+
+
+@with_shared_cache
+def test_commit_changes_published_in_background(loader):
+    committing, other = other_worker(), other_worker()
+    committing._ready = True
+    committing._worker_pid = ac.os.getpid()  # Jobs are run by hand below
+    loader.rows[4] = "Lip Lift"
+    committing.schedule_changes(PROCEDURE, {4})
+    assert ac.read_journal(PROCEDURE) is None, "The committing request does not touch the journal"
+
+    kind, job_ids = committing._queue.get_nowait()
+    committing._refresh(None, kind, job_ids)
+    assert ids(committing.kinds[PROCEDURE].search('lift', 10)) == [4]
+    assert check(other) == [(PROCEDURE, SYNC)]
+    other._refresh(None, PROCEDURE, SYNC)
+    assert loader.calls[-1] == {4}
+    assert ids(other.kinds[PROCEDURE].search('lift', 10)) == [4]
+
+
+@with_cache(lambda: TieredCache(tag_versions=FileTagVersions(tempfile.mkdtemp())))
+def test_journal_shared_through_tag_directory_without_redis(loader):
+    index = other_worker()
+    loader.rows[2] = "Closed Rhinoplasty"
+    ac.publish_changes(PROCEDURE, {2})
+    ac.publish_changes(PROCEDURE, {3})
+    assert [seq for seq, _ids in ac.read_journal(PROCEDURE)['entries']] == [1, 2]
+
+    assert check(index) == [(PROCEDURE, SYNC)]
+    index._refresh(None, PROCEDURE, SYNC)
+    assert loader.calls[-1] == {2, 3}, "No full build without Redis either"
+    assert ids(index.kinds[PROCEDURE].search('closed', 10)) == [2]
+
+
+def test_counter_only_commits_ignored():
+    from models import Thread
+    Session = sessionmaker()
+    ac.register_autocomplete_updates(Session)
+    session = Session()
+    thread = Thread(id=7, title="Rhinoplasty recovery", view_count=3, reply_count=0)
+    make_transient_to_detached(thread)
+    session.add(thread)
+
+    thread.view_count, thread.reply_count = 4, 1
+    session.dispatch.after_flush(session, None)
+    assert not session.info.get(ac.PENDING_KEY), "View and reply counters never reload the index"
+
+    thread.title = "Rhinoplasty recovery diary"
+    session.dispatch.after_flush(session, None)
+    assert session.info[ac.PENDING_KEY] == {(THREAD, 7)}
+
+
+def main():
+    tests = [test_prefix_search_ranks_whole_matches_first, test_trigram_fallback_for_typos,
+             test_upsert_and_remove, test_body_matches_rank_after_titles, test_journaled_changes_reload_only_their_ids,
+             test_unjournaled_tag_bump_rebuilds, test_failed_refresh_is_retried,
+             test_commit_changes_published_in_background,
+             test_journal_shared_through_tag_directory_without_redis, test_counter_only_commits_ignored]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the buffered view/impression/click counters.
+
+    python test_buffered_counters.py
+
+Points the interaction ingest worker state at a scratch SQLite database
+(UPDATE ... FROM needs SQLite 3.33+) and checks that increments are
+aggregated per row, written as deltas, and kept when a flush fails.
+"""
+
+import os
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+from interaction_ingest import ingestor
+from buffered_counters import counters
+
+
+def setup_ingestor():
+    engine = create_engine('sqlite://')
+    ingestor._app = Flask(__name__)
+    ingestor._engine = engine
+    ingestor._worker_pid = os.getpid()  # Flushed by hand below, no background worker
+    counters.drain()
+    return engine
+
+
+def create_tables(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE packages (id INTEGER PRIMARY KEY, view_count INTEGER)"))
+        conn.execute(text(
+            "CREATE TABLE banner_slides (id INTEGER PRIMARY KEY, impression_count INTEGER, click_count INTEGER)"
+        ))
+        conn.execute(text("INSERT INTO packages (id, view_count) VALUES (1, 10), (2, NULL)"))
+        conn.execute(text("INSERT INTO banner_slides (id, impression_count, click_count) VALUES (7, 100, 3)"))
+
+
+def fetch(engine, sql):
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text(sql)).fetchall()]
+
+
+def test_increments_flush_as_deltas():
+    engine = setup_ingestor()
+    create_tables(engine)
+    for package_id in (1, 1, 2, 1):
+        counters.increment('package_views', package_id)
+    counters.increment('banner_impressions', 7, delta=5)
+    counters.increment('banner_clicks', 7)
+    assert counters.pending('package_views', 1) == 3
+
+    ingestor.flush()
+    assert fetch(engine, "SELECT id, view_count FROM packages ORDER BY id") == [(1, 13), (2, 1)]
+    assert fetch(engine, "SELECT impression_count, click_count FROM banner_slides") == [(105, 4)]
+    assert counters.pending('package_views', 1) == 0
+
+
+def test_failed_flush_keeps_deltas():
+    engine = setup_ingestor()
+    counters.increment('package_views', 1)
+    counters.increment('package_views', 1)
+    ingestor.flush()  # No tables yet: the write fails and the deltas go back
+    assert counters.pending('package_views', 1) == 2
+
+    create_tables(engine)
+    counters.increment('package_views', 1)
+    ingestor.flush()
+    assert fetch(engine, "SELECT view_count FROM packages WHERE id = 1") == [(13,)]
+
+
+def test_unknown_counter_rejected():
+    try:
+        counters.increment('packages; DROP TABLE packages', 1)
+    except KeyError:
+        return
+    assert False, "Unregistered counter names must not reach SQL"
+
+
+def main():
+    tests = [test_increments_flush_as_deltas, test_failed_flush_keeps_deltas, test_unknown_counter_rejected]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the unified tiered cache backend.
+Uses the in-process Redis stand-in, so no Redis server or database is needed.
+"""
+
+import time
+import tempfile
+import threading
+
+from cache_backend import (TieredCache, LRUTier, RedisTier, LocalRedis, CacheStats,
+                           FileTagVersions)
+
+
+def make_cache(max_entries=100, max_bytes=1024 * 1024, shared=False):
+    stats = CacheStats()
+    remote = RedisTier(LocalRedis()) if shared else None
+    return TieredCache(local=LRUTier(max_entries=max_entries, max_bytes=max_bytes),
+                       remote=remote, stats=stats)
+
+
+def test_lru_eviction_by_entries():
+    cache = make_cache(max_entries=3)
+    for i in range(5):
+        cache.set('ns', i, f'value-{i}')
+    assert cache.get('ns', 0) is None
+    assert cache.get('ns', 4) == 'value-4'
+    assert len(cache.local) == 3
+    assert cache.get_stats()['totals']['evictions'] == 2
+
+
+def test_lru_eviction_by_bytes():
+    cache = make_cache(max_entries=100, max_bytes=4000)
+    for i in range(10):
+        cache.set('ns', i, 'x' * 1000)
+    assert cache.local.current_bytes <= 4000
+    assert cache.get('ns', 9) is not None
+
+
+def test_namespace_ttl_expiry():
+    cache = make_cache()
+    cache.configure_namespace('short', 1)
+    cache.set('short', 'k', 'v')
+    assert cache.get('short', 'k') == 'v'
+    time.sleep(1.1)
+    assert cache.get('short', 'k') is None
+
+
+def test_shared_tier_visible_to_other_worker():
+    remote = RedisTier(LocalRedis())
+    worker_a = TieredCache(remote=remote)
+    worker_b = TieredCache(remote=remote)
+    worker_a.set('ns', 'k', {'a': 1})
+    assert worker_b.get('ns', 'k') == {'a': 1}
+    assert worker_b.get_stats()['totals']['remote_hits'] == 1
+
+
+def test_clear_namespace_only():
+    cache = make_cache(shared=True)
+    cache.set('one', 'k', 1)
+    cache.set('two', 'k', 2)
+    cache.clear('one')
+    assert cache.get('one', 'k') is None
+    assert cache.get('two', 'k') == 2
+
+
+def test_single_flight_recompute():
+    cache = make_cache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'expensive'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_set('ns', 'k', compute)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == ['expensive'] * 8
+    assert len(calls) == 1
+    assert cache.get_stats()['totals']['coalesced'] == 7
+
+
+def test_tag_invalidation_across_workers():
+    tag_dir = tempfile.mkdtemp()
+    worker_a = TieredCache(tag_versions=FileTagVersions(tag_dir))
+    worker_b = TieredCache(tag_versions=FileTagVersions(tag_dir))
+    worker_a.set('homepage', 'data', 'old', tags=('clinic:42', 'packages'))
+    worker_a.set('homepage', 'other', 'kept', tags=('clinic:7',))
+    assert worker_a.get('homepage', 'data') == 'old'
+
+    worker_b.invalidate_tags('clinic:42')
+    assert worker_a.get('homepage', 'data') is None
+    assert worker_a.get('homepage', 'other') == 'kept'
+
+
+def test_tag_invalidation_during_compute_is_not_lost():
+    remote = RedisTier(LocalRedis())
+    cache = TieredCache(remote=remote)
+
+    def compute():
+        # An edit commits while the value is being computed
+        cache.invalidate_tags('package:1')
+        return 'computed-before-edit'
+
+    assert cache.get_or_set('ns', 'k', compute, tags=('package:1',)) == 'computed-before-edit'
+    assert cache.get('ns', 'k') is None
+
+
+def main():
+    """Run all tests."""
+    tests = [name for name in globals() if name.startswith('test_')]
+    passed = 0
+    for name in tests:
+        try:
+            globals()[name]()
+            print(f"✅ {name}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the clinic daily rollups.
+
+    python test_clinic_rollups.py
+
+The rollup SQL needs PostgreSQL, so lead_analytics runs against a stub
+session that records the statement and returns canned GROUP BY ROLLUP
+rows; the funnel maths is checked directly.
+"""
+
+import os
+import re
+from decimal import Decimal
+from types import SimpleNamespace
+
+import clinic_rollups
+from clinic_rollups import LEAD_COLUMNS, LEADS_SOURCE, ROLLUP_TABLE, _funnel, lead_analytics
+
+MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations',
+                         '007_create_clinic_daily_rollups.py')
+
+
+class StubSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        return SimpleNamespace(fetchall=lambda: [SimpleNamespace(_mapping=row) for row in self.rows])
+
+
+def rollup_row(clinic_id, leads, contacted, converted, credits, value):
+    return dict(clinic_id=clinic_id, leads=leads, pending_leads=leads - contacted, contacted_leads=contacted,
+                converted_leads=converted, lead_credits=credits, conversion_value=value)
+
+
+def test_funnel_rates_and_roi():
+    funnel = _funnel(rollup_row(1, 8, 4, 2, 400, Decimal('1000.50')))
+    assert (funnel['contact_rate'], funnel['conversion_rate']) == (50.0, 25.0)
+    assert funnel['total_revenue'] == 1000.5
+    assert funnel['roi'] == 150.12
+    assert funnel['avg_lead_value'] == 500.25
+
+    empty = _funnel({})
+    assert empty['total_leads'] == 0 and empty['conversion_rate'] == 0.0 and empty['roi'] == 0.0
+    assert _funnel({'leads': None, 'lead_credits': None})['total_credits_spent'] == 0
+
+
+def test_leads_source_fallback():
+    rows = [rollup_row(1, 2, 1, 0, 100, 0), rollup_row(2, 5, 5, 1, 250, 500), rollup_row(None, 7, 6, 1, 350, 500)]
+    clinics = [{'id': 1, 'name': 'A', 'credit_balance': 10}, {'id': 2, 'name': 'B', 'credit_balance': 0},
+               {'id': 3, 'name': 'C', 'credit_balance': 0}]
+    original = clinic_rollups._rollups_available
+    try:
+        clinic_rollups._rollups_available = False
+        session = StubSession(rows)
+        analytics, clinic_metrics = lead_analytics(clinics=clinics, session=session)
+        sql, params = session.statements[0]
+        assert LEADS_SOURCE in sql, "Without the migration the funnel is aggregated from leads"
+        assert 'GROUP BY ROLLUP (r.clinic_id)' in sql and params == {}
+
+        assert (analytics['total_leads'], analytics['converted_leads']) == (7, 1)
+        assert [m['id'] for m in clinic_metrics] == [2, 1, 3], "Busiest clinic first"
+        assert clinic_metrics[0]['roi_percentage'] == 100.0 and 'roi' not in clinic_metrics[0]
+        assert clinic_metrics[2]['total_leads'] == 0
+
+        clinic_rollups._rollups_available = True
+        session = StubSession(rows)
+        lead_analytics(clinics=clinics, clinic_id=2, session=session)
+        sql, params = session.statements[0]
+        assert f"FROM {ROLLUP_TABLE} r" in sql and params == {'clinic_id': 2}
+    finally:
+        clinic_rollups._rollups_available = original
+
+
+def test_leads_source_matches_rollup_table():
+    with open(MIGRATION) as f:
+        migration = f.read()
+    table = re.search(r"CREATE TABLE IF NOT EXISTS clinic_daily_rollups \((.*?)PRIMARY KEY", migration, re.S).group(1)
+    columns = re.findall(r"^\s*(\w+) (?:INTEGER|DATE|BIGINT|NUMERIC)", table, re.M)
+    assert re.findall(r"AS (\w+)", LEADS_SOURCE) == columns
+    assert set(LEAD_COLUMNS) <= set(columns)
+
+    # A NULL lead status must count as not pending rather than write NULL into a NOT NULL column
+    assert "COALESCE(status = 'new', false)::int AS pending_leads" in LEADS_SOURCE
+    assert "-COALESCE(OLD.status = 'new', false)::int" in migration
+    assert "COALESCE(NEW.status = 'new', false)::int" in migration
+    assert "(NEW.status = 'new')::int" not in migration
+    # Credits without a status count as completed, as in credit_ledger
+    assert migration.count("COALESCE(OLD.status, 'completed') = 'completed'") == 1
+    assert migration.count("COALESCE(NEW.status, 'completed') = 'completed'") == 1
+
+
+def main():
+    tests = [test_funnel_rates_and_roi, test_leads_source_fallback, test_leads_source_matches_rollup_table]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
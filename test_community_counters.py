@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the denormalised community counters.
+
+    python test_community_counters.py
+
+Creates only the community tables in a scratch in-memory SQLite database
+(Postgres ARRAY columns are rendered as TEXT there) and checks that reply
+and vote rows keep the thread's counter columns in step, both in the
+database and on the thread object already loaded in the session.
+"""
+
+import sys
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.types import ARRAY
+
+from models import (
+    Community, CommunityReply, ThreadVote, CommunityModeration, CommunityTagging, ThreadSave
+)
+from community_counters import register_community_counters, reconcile
+
+
+@compiles(ARRAY, 'sqlite')
+def _array_as_text(element, compiler, **kw):
+    return 'TEXT'
+
+
+def make_session():
+    register_community_counters()
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        for table in ('users', 'categories', 'procedures'):
+            conn.execute(text(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO users (id) VALUES (1), (2), (3)"))
+    for model in (Community, CommunityReply, ThreadVote, CommunityModeration, CommunityTagging, ThreadSave):
+        model.__table__.create(engine)
+    session = Session(engine)
+    thread = Community(user_id=1, title='Rhinoplasty recovery', content='How long?')
+    session.add(thread)
+    session.commit()
+    return session, thread
+
+
+def stored(session, thread_id):
+    return tuple(session.execute(text(
+        "SELECT reply_count, upvotes, downvotes, total_votes FROM community WHERE id = :id"
+    ), {'id': thread_id}).fetchone())
+
+
+def test_replies_bump_reply_count():
+    session, thread = make_session()
+    session.add(Community(user_id=2, title='Re', content='Two weeks', parent_id=thread.id))
+    session.add(CommunityReply(thread_id=thread.id, user_id=3, content='Six for me'))
+    session.flush()
+    assert thread.reply_count == 2  # Loaded object follows the UPDATE
+    session.commit()
+
+    session.delete(session.query(CommunityReply).first())
+    session.commit()
+    assert stored(session, thread.id)[0] == 1
+    assert reconcile(session=session) == []
+
+
+def test_votes_bump_vote_columns():
+    session, thread = make_session()
+    up = ThreadVote(user_id=2, thread_id=thread.id, vote_type='upvote')
+    session.add_all([up, ThreadVote(user_id=3, thread_id=thread.id, vote_type='upvote')])
+    session.commit()
+    assert stored(session, thread.id)[1:] == (2, 0, 2)
+
+    up.vote_type = 'downvote'  # Flip after commit, old value not loaded yet
+    session.flush()
+    assert (thread.upvotes, thread.downvotes, thread.total_votes) == (1, 1, 0)
+    session.commit()
+
+    session.delete(up)
+    session.commit()
+    assert stored(session, thread.id)[1:] == (1, 0, 1)
+
+
+def test_reconcile_fixes_bulk_writes():
+    session, thread = make_session()
+    session.add(CommunityReply(thread_id=thread.id, user_id=2, content='Hi'))
+    session.commit()
+    session.execute(text("UPDATE community SET reply_count = 7 WHERE id = :id"), {'id': thread.id})
+    session.commit()
+
+    drifted = reconcile(fix=True, session=session)
+    assert [(row['id'], row['stored'], row['counted']) for row in drifted] == [(thread.id, 7, 1)]
+    assert stored(session, thread.id)[0] == 1
+
+
+def main():
+    tests = [test_replies_bump_reply_count, test_votes_bump_vote_columns, test_reconcile_fixes_bulk_writes]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
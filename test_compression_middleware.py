@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for the compression middleware.
+
+    python test_compression_middleware.py
+
+Builds a throwaway Flask app over a temporary static folder, so the real
+``static/`` tree is never precompressed by the tests.
+"""
+
+import os
+import gzip
+import tempfile
+
+from flask import Flask, Response
+
+from compression_middleware import enable_compression, negotiate_encoding, static_variants
+
+CSS = b'body { color: #333; margin: 0 auto; }\n' * 200
+LINES = [f'row {i}: '.encode() + b'x' * 80 + b'\n' for i in range(200)]
+
+
+def make_app():
+    static_folder = tempfile.mkdtemp()
+    os.makedirs(os.path.join(static_folder, 'css'))
+    with open(os.path.join(static_folder, 'css', 'site.css'), 'wb') as f:
+        f.write(CSS)
+    with open(os.path.join(static_folder, 'tiny.js'), 'wb') as f:
+        f.write(b'var a = 1;')
+
+    app = Flask(__name__, static_folder=static_folder, static_url_path='/static')
+    app.config['COMPRESS_PRECOMPRESS_STATIC'] = True  # Boot-time build step, as the Docker image runs it
+
+    @app.route('/sitemap.xml')
+    def sitemap():
+        return Response('<url><loc>https://example.com/</loc></url>' * 200, mimetype='application/xml')
+
+    @app.route('/export')
+    def export():
+        return Response(iter(LINES), mimetype='text/plain')
+
+    compression = enable_compression(app)
+    return app, compression
+
+
+def test_negotiation():
+    assert negotiate_encoding('gzip, deflate, br', ('br', 'gzip')) == 'br'
+    assert negotiate_encoding('br;q=0.5, gzip', ('br', 'gzip')) == 'gzip'
+    assert negotiate_encoding('gzip;q=0', ('gzip',)) is None
+    assert negotiate_encoding('*', ('br', 'gzip')) == 'br'
+    assert negotiate_encoding('identity', ('br', 'gzip')) is None
+    assert negotiate_encoding('', ('gzip',)) is None
+
+
+def test_static_served_from_sibling():
+    app, compression = make_app()
+    folder = app.static_folder
+    assert os.path.exists(os.path.join(folder, 'css', 'site.css.gz'))
+    assert not os.path.exists(os.path.join(folder, 'tiny.js.gz'))  # Below COMPRESS_MIN_SIZE
+
+    client = app.test_client()
+    response = client.get('/static/css/site.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.mimetype == 'text/css'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == CSS
+    assert compression.counters['static'] == 1
+
+    plain = client.get('/static/css/site.css')
+    assert 'Content-Encoding' not in plain.headers and plain.data == CSS
+
+
+def test_boot_leaves_static_untouched_by_default():
+    os.environ.pop('COMPRESS_PRECOMPRESS_STATIC', None)
+    static_folder = tempfile.mkdtemp()
+    with open(os.path.join(static_folder, 'site.css'), 'wb') as f:
+        f.write(CSS)
+    enable_compression(Flask(__name__, static_folder=static_folder))
+    assert os.listdir(static_folder) == ['site.css']
+
+
+def test_stale_sibling_not_indexed():
+    app, _ = make_app()
+    source = os.path.join(app.static_folder, 'css', 'site.css')
+    stat = os.stat(source)
+    os.utime(source + '.gz', (stat.st_atime, stat.st_mtime - 10))  # Source edited after the build
+    static_variants.scan(app.static_folder)
+    assert static_variants.encodings('css/site.css') == frozenset()
+
+    static_variants.precompress(app.static_folder)
+    static_variants.scan(app.static_folder)
+    assert 'gzip' in static_variants.encodings('css/site.css')
+
+
+def test_streamed_response_compressed_per_chunk():
+    app, compression = make_app()
+    response = app.test_client().get('/export', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gzip.decompress(response.data) == b''.join(LINES)
+    assert compression.counters['streamed'] == 1
+
+
+def test_repeated_sitemap_uses_compressed_cache():
+    app, compression = make_app()
+    client = app.test_client()
+    bodies = [client.get('/sitemap.xml', headers={'Accept-Encoding': 'gzip'}).data for _ in range(3)]
+    assert len(set(bodies)) == 1
+    assert gzip.decompress(bodies[0]).startswith(b'<url>')
+    assert compression.counters['cache_hits'] == 2
+
+
+def main():
+    tests = [test_negotiation, test_static_served_from_sibling, test_boot_leaves_static_untouched_by_default,
+             test_stale_sibling_not_indexed, test_streamed_response_compressed_per_chunk,
+             test_repeated_sitemap_uses_compressed_cache]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
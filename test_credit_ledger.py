@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for the credit ledger.
+
+    python test_credit_ledger.py
+
+Runs against a scratch database: the ``credit_ledger_test`` schema of
+DATABASE_URL when it points at PostgreSQL, otherwise a temporary SQLite file
+(writers serialise on the database lock instead of row locks, but the
+statements are the same). Only minimal ``clinics`` and
+``credit_transactions`` tables are created; the application tables are never
+touched.
+
+Many threads post lead deductions, top-ups and replayed webhooks at once;
+afterwards every materialised balance must equal both the ledger sum and the
+expected total, and each idempotency key must have posted exactly once.
+"""
+
+import os
+import sys
+import random
+import tempfile
+import threading
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from cache_invalidation import register_cache_invalidation
+from credit_ledger import CreditLedger, InsufficientCredits
+
+THREADS = 8
+POSTS_PER_THREAD = 50
+SCHEMA = 'credit_ledger_test'
+
+ledger = CreditLedger()
+
+
+def make_engine():
+    database_url = os.environ.get('DATABASE_URL', '')
+    if database_url.startswith('postgres'):
+        database_url = database_url.replace('postgres://', 'postgresql://', 1)
+        engine = create_engine(database_url, pool_size=THREADS * 2,
+                               connect_args={'options': f'-csearch_path={SCHEMA}'})
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        id_column = 'SERIAL PRIMARY KEY'
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'credit_ledger.db')
+        engine = create_engine(f'sqlite:///{path}', connect_args={'timeout': 30, 'check_same_thread': False})
+
+        @event.listens_for(engine, 'connect')
+        def _connect(dbapi_connection, connection_record):
+            # Let SQLAlchemy manage transactions so SAVEPOINT works
+            dbapi_connection.isolation_level = None
+            dbapi_connection.execute('PRAGMA journal_mode=WAL')
+
+        @event.listens_for(engine, 'begin')
+        def _begin(conn):
+            # Take the write lock up front, like a Postgres row lock would
+            conn.exec_driver_sql('BEGIN IMMEDIATE')
+
+        id_column = 'INTEGER PRIMARY KEY'
+
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE clinics (
+                id INTEGER PRIMARY KEY,
+                credit_balance INTEGER DEFAULT 0,
+                total_credits_purchased INTEGER DEFAULT 0,
+                total_credits_used INTEGER DEFAULT 0
+            )
+        """))
+        conn.execute(text(f"""
+            CREATE TABLE credit_transactions (
+                id {id_column},
+                clinic_id INTEGER NOT NULL REFERENCES clinics (id),
+                transaction_type VARCHAR(30) NOT NULL,
+                amount INTEGER NOT NULL,
+                description TEXT,
+                idempotency_key VARCHAR(100) UNIQUE,
+                status VARCHAR(20),
+                created_at TIMESTAMP,
+                processed_at TIMESTAMP,
+                lead_id INTEGER,
+                order_id VARCHAR(100),
+                payment_id VARCHAR(100),
+                monetary_value INTEGER,
+                created_by INTEGER,
+                reference_id VARCHAR(50),
+                payment_method VARCHAR(50),
+                transaction_reference VARCHAR(100)
+            )
+        """))
+    return engine
+
+
+ENGINE = None
+Session = None
+
+
+def setup_module(module=None):
+    global ENGINE, Session
+    if ENGINE is None:
+        ENGINE = make_engine()
+        Session = sessionmaker(bind=ENGINE)
+        register_cache_invalidation(Session)
+
+
+def add_clinic(clinic_id, balance=0):
+    with Session() as session:
+        session.execute(text("INSERT INTO clinics (id, credit_balance) VALUES (:id, 0)"), {'id': clinic_id})
+        if balance:
+            ledger.post(clinic_id, balance, 'purchase', 'Opening balance', session=session)
+        session.commit()
+
+
+def run_threads(target, count=THREADS):
+    errors = []
+
+    def guarded(index):
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=guarded, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, f"{len(errors)} threads failed: {errors[0]!r}"
+
+
+def test_concurrent_postings_keep_balance_in_step():
+    setup_module()
+    clinic_ids = (101, 102)
+    for clinic_id in clinic_ids:
+        add_clinic(clinic_id)
+    expected = {clinic_id: 0 for clinic_id in clinic_ids}
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(index)
+        for n in range(POSTS_PER_THREAD):
+            clinic_id = rng.choice(clinic_ids)
+            if rng.random() < 0.7:
+                amount, transaction_type, key = -rng.choice((100, 180, 250)), 'deduction', f'lead:{index}:{n}'
+            else:
+                amount, transaction_type, key = 1000, 'purchase', f'payment:{index}:{n}'
+            with Session() as session:
+                ledger.post(clinic_id, amount, transaction_type, idempotency_key=key, session=session)
+                session.commit()
+            with lock:
+                expected[clinic_id] += amount
+
+    run_threads(worker)
+
+    with Session() as session:
+        for clinic_id in clinic_ids:
+            materialised = ledger.materialised_balance(clinic_id, session=session)
+            assert materialised == expected[clinic_id], (clinic_id, materialised, expected[clinic_id])
+            assert ledger.ledger_balance(clinic_id, session=session) == expected[clinic_id]
+        assert ledger.find_drift(session=session) == []
+        rows = session.execute(text("SELECT COUNT(*) FROM credit_transactions WHERE clinic_id IN (101, 102)")).scalar()
+        assert rows == THREADS * POSTS_PER_THREAD
+
+
+def test_webhook_replay_posts_once():
+    setup_module()
+    add_clinic(201)
+    results = []
+
+    def worker(index):
+        with Session() as session:
+            results.append(ledger.post(201, 2500, 'credit', 'Razorpay payment',
+                                       idempotency_key='razorpay:pay_replayed', payment_id='pay_replayed',
+                                       session=session))
+            session.commit()
+
+    run_threads(worker, count=THREADS * 2)
+
+    assert sum(not result['duplicate'] for result in results) == 1
+    assert len({result['transaction_id'] for result in results}) == 1
+    with Session() as session:
+        assert ledger.materialised_balance(201, session=session) == 2500
+        assert session.execute(text("SELECT total_credits_purchased FROM clinics WHERE id = 201")).scalar() == 2500
+        rows = session.execute(text("SELECT COUNT(*) FROM credit_transactions WHERE clinic_id = 201")).scalar()
+        assert rows == 1
+
+
+def test_guarded_debits_never_overdraw():
+    setup_module()
+    add_clinic(301, balance=1000)
+    outcomes = []
+
+    def worker(index):
+        for _ in range(5):
+            with Session() as session:
+                try:
+                    ledger.post(301, -100, 'debit_adjustment', allow_negative=False, session=session)
+                    session.commit()
+                    outcomes.append(True)
+                except InsufficientCredits:
+                    session.rollback()
+                    outcomes.append(False)
+
+    run_threads(worker)
+
+    assert outcomes.count(True) == 10
+    with Session() as session:
+        assert ledger.materialised_balance(301, session=session) == 0
+        assert ledger.ledger_balance(301, session=session) == 0
+
+
+def test_reconcile_repairs_drift():
+    setup_module()
+    add_clinic(401, balance=500)
+    with Session() as session:
+        # A write that bypassed the ledger
+        session.execute(text("UPDATE clinics SET credit_balance = credit_balance + 75 WHERE id = 401"))
+        session.commit()
+
+        drifted = [entry for entry in ledger.reconcile(session=session) if entry['clinic_id'] == 401]
+        assert drifted and drifted[0]['drift'] == 75
+        assert ledger.materialised_balance(401, session=session) == 575
+
+        ledger.reconcile(fix=True, session=session)
+        assert ledger.materialised_balance(401, session=session) == 500
+        assert ledger.find_drift(session=session) == []
+
+
+def test_cached_balance_follows_commits():
+    setup_module()
+    add_clinic(501, balance=300)
+    with Session() as session:
+        assert ledger.balance(501, session=session) == 300
+        ledger.post(501, -120, 'deduction', session=session)
+        assert ledger.balance(501, session=session) == 300  # Still cached until commit
+        session.commit()
+        assert ledger.balance(501, session=session) == 180
+
+
+def test_failed_payment_reversed_through_ledger():
+    setup_module()
+    add_clinic(601)
+    with Session() as session:
+        ledger.post(601, 2000, 'purchase', idempotency_key='razorpay:pay_failed', payment_id='pay_failed',
+                    session=session)
+        session.execute(text("""
+            INSERT INTO credit_transactions (clinic_id, transaction_type, amount, status, payment_id)
+            VALUES (601, 'purchase', 500, 'pending', 'pay_failed')
+        """))
+        session.commit()
+
+        for _ in range(2):  # Replayed webhook
+            ledger.fail_payment('pay_failed', session=session)
+            session.commit()
+
+        assert ledger.materialised_balance(601, session=session) == 0
+        assert ledger.ledger_balance(601, session=session) == 0
+        assert ledger.find_drift(session=session) == []
+        statuses = session.execute(text(
+            "SELECT transaction_type, status FROM credit_transactions WHERE clinic_id = 601 ORDER BY id"
+        )).fetchall()
+        assert [tuple(row) for row in statuses] == [('purchase', 'completed'), ('purchase', 'failed'),
+                                                    ('reversal', 'completed')]
+
+
+def main():
+    setup_module()
+    print(f"Database: {ENGINE.dialect.name}")
+    tests = [test_concurrent_postings_keep_balance_in_step, test_webhook_replay_posts_once,
+             test_guarded_debits_never_overdraw, test_reconcile_repairs_drift,
+             test_cached_balance_follows_commits, test_failed_payment_reversed_through_ledger]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
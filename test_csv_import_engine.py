@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for the chunked, resumable CSV import engine.
+
+    python test_csv_import_engine.py
+
+Imports a small generated CSV into SQLite with a handler that writes each
+chunk with one executemany, and checks per-chunk commits, resume from the
+checkpoint file, row-by-row isolation of a failing chunk and runs capped
+with max_rows.
+"""
+
+import os
+import csv
+import sqlite3
+import tempfile
+
+from csv_import_engine import ImportCheckpoint, ChunkResult, run_import
+
+
+def write_csv(rows):
+    fd, path = tempfile.mkstemp(suffix='.csv')
+    with os.fdopen(fd, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['email', 'name'])
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def connect():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE clinics (email TEXT PRIMARY KEY, name TEXT NOT NULL)")
+    return conn
+
+
+def insert_chunk(conn, chunk):
+    conn.executemany("INSERT INTO clinics (email, name) VALUES (?, ?)",
+                     [(row['email'], row['name'] or None) for _, row in chunk])
+    return ChunkResult(inserted=len(chunk))
+
+
+def count(conn):
+    return conn.execute("SELECT COUNT(*) FROM clinics").fetchone()[0]
+
+
+def test_chunks_commit_and_report_throughput():
+    path = write_csv([{'email': f'c{i}@example.com', 'name': f'Clinic {i}'} for i in range(25)])
+    conn = connect()
+    stats = run_import(path, conn, insert_chunk, chunk_size=10, required_columns=['email', 'name'])
+    assert count(conn) == 25
+    assert (stats.rows, stats.inserted, stats.chunks) == (25, 25, 3)
+    assert stats.as_dict()['rows_per_second'] > 0
+    assert not os.path.exists(ImportCheckpoint(path).path), "A finished import leaves no checkpoint"
+
+
+def test_resume_after_interruption():
+    path = write_csv([{'email': f'c{i}@example.com', 'name': f'Clinic {i}'} for i in range(25)])
+    conn = connect()
+    calls = []
+
+    def crash_on_third_chunk(conn, chunk):
+        calls.append(chunk[0][0])
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return insert_chunk(conn, chunk)
+
+    try:
+        run_import(path, conn, crash_on_third_chunk, chunk_size=10)
+    except KeyboardInterrupt:
+        pass
+    assert count(conn) == 20
+    assert ImportCheckpoint(path).load() == 20
+
+    stats = run_import(path, conn, insert_chunk, chunk_size=10)
+    assert (stats.resumed_from, stats.rows) == (20, 5)
+    assert count(conn) == 25
+
+
+def test_bad_row_only_fails_itself():
+    rows = [{'email': f'c{i}@example.com', 'name': f'Clinic {i}'} for i in range(10)]
+    rows[4]['name'] = ''  # NOT NULL violation
+    path = write_csv(rows)
+    conn = connect()
+    stats = run_import(path, conn, insert_chunk, chunk_size=10)
+    assert count(conn) == 9
+    assert stats.failed == 1 and stats.errors[0].startswith('Row 6:')
+
+
+def test_max_rows_stops_and_keeps_checkpoint():
+    path = write_csv([{'email': f'c{i}@example.com', 'name': f'Clinic {i}'} for i in range(25)])
+    conn = connect()
+    stats = run_import(path, conn, insert_chunk, chunk_size=10, max_rows=12)
+    assert (stats.rows, stats.chunks, stats.finished, count(conn)) == (12, 2, False, 12)
+    assert ImportCheckpoint(path).load() == 12, "The next run continues after the rows done"
+
+    stats = run_import(path, conn, insert_chunk, chunk_size=10, max_rows=13)
+    assert (stats.resumed_from, stats.rows, stats.finished, count(conn)) == (12, 13, True, 25)
+    assert not os.path.exists(ImportCheckpoint(path).path), "Reaching the end exactly still finishes"
+
+
+def main():
+    tests = [test_chunks_commit_and_report_throughput, test_resume_after_interruption,
+             test_bad_row_only_fails_itself, test_max_rows_stops_and_keeps_checkpoint]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
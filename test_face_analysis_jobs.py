@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Tests for the face analysis job queue and its routes.
+
+    python test_face_analysis_jobs.py
+
+Runs the queue with FACE_ANALYSIS_EXECUTOR=local (in-process threads)
+against a scratch SQLite database. The analysis job itself is replaced by
+functions returning canned outcomes, so the tests cover queueing,
+persistence and the status endpoint, not Gemini or MediaPipe.
+"""
+
+import os
+import time
+import base64
+import tempfile
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ['FACE_ANALYSIS_EXECUTOR'] = 'local'
+
+from flask import Flask
+from flask_login import LoginManager
+
+from app import db
+from models import FaceAnalysis, FaceAnalysisRecommendation
+import face_analysis_routes
+from face_analysis_jobs import (FaceAnalysisJobQueue, face_analysis_jobs, expire_if_stale, STALE_AFTER,
+                                QUEUED, COMPLETED, FAILED, REJECTED, PENDING_STATUSES)
+
+VALIDATION = {'is_valid': True, 'validation_score': 0.9, 'issues': [], 'recommendations': []}
+OUTCOMES = {
+    COMPLETED: {'status': COMPLETED, 'validation': VALIDATION, 'result': {
+        'has_geometric_analysis': False,
+        'skin_analysis': [{'name': 'Acne scarring', 'severity': 0.4, 'details': 'Mild', 'treatments': 'Laser'}],
+    }},
+    FAILED: {'status': FAILED, 'result': {'error': 'Gemini returned no analysis'}},
+    REJECTED: {'status': REJECTED, 'validation': dict(VALIDATION, is_valid=False, validation_score=0.2,
+                                                      issues=['No face detected'])},
+}
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'jobs.db')}",
+                      SECRET_KEY='test', WTF_CSRF_ENABLED=False)
+    db.init_app(app)
+    LoginManager(app).user_loader(lambda user_id: None)  # Every request is anonymous
+    app.register_blueprint(face_analysis_routes.face_analysis)
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[FaceAnalysis.__table__, FaceAnalysisRecommendation.__table__])
+    return app
+
+
+def queued_analysis(**columns):
+    analysis = FaceAnalysis(image_path='upload.jpg', analysis_data={}, status=QUEUED, **columns)
+    db.session.add(analysis)
+    db.session.commit()
+    return analysis.id
+
+
+def canned_job(analysis_id, file_path, user_info):
+    return dict(OUTCOMES[user_info['outcome']], file_path=file_path)
+
+
+def wait_for(analysis_id, timeout=5):
+    deadline = time.time() + timeout
+    while True:
+        db.session.remove()
+        analysis = db.session.get(FaceAnalysis, analysis_id)
+        if analysis.status not in PENDING_STATUSES or time.time() > deadline:
+            return analysis
+        time.sleep(0.02)
+
+
+def test_outcomes_persisted():
+    app = make_app()
+    jobs = FaceAnalysisJobQueue(mode='local', workers=2, job=canned_job)
+    with app.app_context():
+        ids = {outcome: queued_analysis() for outcome in OUTCOMES}
+        for outcome, analysis_id in ids.items():
+            assert jobs.submit(analysis_id, 'optimized.jpg', {'outcome': outcome})
+
+        completed = wait_for(ids[COMPLETED])
+        assert completed.status == COMPLETED and completed.image_path == 'optimized.jpg'
+        assert [r.feature_name for r in completed.recommendations] == ['Acne scarring']
+
+        failed = wait_for(ids[FAILED])
+        assert failed.status == FAILED and failed.status_message == 'Gemini returned no analysis'
+
+        rejected = wait_for(ids[REJECTED])
+        assert rejected.status == REJECTED
+        assert rejected.analysis_data['image_validation']['issues'] == ['No face detected']
+        assert jobs.pending() == 0
+
+
+def test_crashed_job_fails_and_frees_its_slot():
+    def crash(analysis_id, file_path, user_info):
+        raise MemoryError("analysis worker died")
+
+    app = make_app()
+    jobs = FaceAnalysisJobQueue(mode='local', workers=1, job=crash)
+    with app.app_context():
+        analysis_id = queued_analysis()
+        assert jobs.submit(analysis_id, 'upload.jpg', {})
+        analysis = wait_for(analysis_id)
+        assert analysis.status == FAILED and 'analysis worker died' in analysis.status_message
+        assert jobs.pending() == 0
+
+
+def test_broken_pool_replaced():
+    def dead_worker():
+        raise RuntimeError("analysis worker died at boot")
+
+    app = make_app()
+    jobs = FaceAnalysisJobQueue(mode='local', workers=1, max_pending=1, job=canned_job)
+    with app.app_context():
+        jobs._ensure_started()
+        jobs._executor = ThreadPoolExecutor(1, initializer=dead_worker)  # Breaks on its first job
+        first = queued_analysis()
+        assert jobs.submit(first, 'upload.jpg', {'outcome': COMPLETED})
+        assert wait_for(first).status == FAILED
+
+        # The broken pool would reject this upload; it is replaced and the job runs
+        second = queued_analysis()
+        assert jobs.submit(second, 'upload.jpg', {'outcome': COMPLETED})
+        assert wait_for(second).status == COMPLETED
+
+        jobs._executor.shutdown()  # Not a broken pool: the job cannot be queued at all
+        third = queued_analysis()
+        assert jobs.submit(third, 'upload.jpg', {'outcome': COMPLETED})
+        assert wait_for(third).status == FAILED, "A job that could not be queued never stays queued"
+        assert jobs.pending() == 0
+
+
+def test_expire_if_stale():
+    app = make_app()
+    with app.app_context():
+        old = datetime.utcnow() - STALE_AFTER - timedelta(minutes=1)
+        stale = db.session.get(FaceAnalysis, queued_analysis(created_at=old))
+        fresh = db.session.get(FaceAnalysis, queued_analysis())
+        finished = db.session.get(FaceAnalysis, queued_analysis(created_at=old))
+        finished.status = COMPLETED
+
+        assert expire_if_stale(db, stale).status == FAILED
+        assert 'timed out' in stale.analysis_data['error']
+        assert expire_if_stale(db, fresh).status == QUEUED
+        assert expire_if_stale(db, finished).status == COMPLETED
+
+
+def test_status_endpoint():
+    app = make_app()
+    client = app.test_client()
+    with app.app_context():
+        pending_id = queued_analysis()
+        body = client.get(f'/face-analysis/status/{pending_id}').get_json()
+        assert (body['status'], body['done'], body['redirect_url']) == (QUEUED, False, None)
+
+        stale_id = queued_analysis(created_at=datetime.utcnow() - STALE_AFTER - timedelta(minutes=1))
+        body = client.get(f'/face-analysis/status/{stale_id}').get_json()
+        assert body['status'] == FAILED and body['done']
+        assert body['redirect_url'] == f'/face-analysis/results/{stale_id}?fresh=1'
+        assert client.get('/face-analysis/status/999').status_code == 404
+
+
+def test_upload_rejected_over_capacity():
+    app = make_app()
+    client = app.test_client()
+    face_analysis_routes.UPLOAD_FOLDER = tempfile.mkdtemp()
+    image_data = 'data:image/jpeg;base64,' + base64.b64encode(b'\xff\xd8\xff\xe0 not really a jpeg').decode()
+    max_pending = face_analysis_jobs.max_pending
+    face_analysis_jobs.max_pending = 0
+    try:
+        response = client.post('/face-analysis/upload', data={'image_data': image_data})
+    finally:
+        face_analysis_jobs.max_pending = max_pending
+    assert response.status_code == 302 and response.location.endswith('/face-analysis/')
+    with app.app_context():
+        analysis = db.session.query(FaceAnalysis).one()
+        assert analysis.status == FAILED and analysis.status_message == 'Too many analyses in progress'
+    assert face_analysis_jobs.pending() == 0
+
+
+def main():
+    tests = [test_outcomes_persisted, test_crashed_job_fails_and_frees_its_slot, test_broken_pool_replaced,
+             test_expire_if_stale, test_status_endpoint, test_upload_rejected_over_capacity]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
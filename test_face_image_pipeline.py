@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the single-decode face image pipeline.
+
+    python test_face_image_pipeline.py              # correctness checks
+    python test_face_image_pipeline.py --benchmark  # per-upload CPU time and peak memory
+
+The benchmark compares the previous upload flow (validation, landmark
+detection and geometric analysis each decoding the file, plus a separate
+PIL open/resize/save for compression and a disk re-read for Gemini) with one
+FaceImage decode. FaceMesh itself is left out of both sides so the numbers
+show the decode/resize overhead; it ran twice per upload before and once now.
+Peak memory is what tracemalloc sees (NumPy buffers and Python objects).
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+from utils.face_image_pipeline import FaceImage, ANALYSIS_WIDTH
+
+EXIF_ORIENTATION = 0x0112
+
+
+def make_jpeg(path, width, height, orientation=None, quality=95):
+    """Noisy gradient JPEG (noise keeps the file size realistic for a phone photo)."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                     np.full((height, width), 128, np.float32)], axis=-1)
+    pixels = np.clip(base + rng.normal(0, 40, base.shape), 0, 255).astype(np.uint8)
+    exif = Image.Exif()
+    if orientation:
+        exif[EXIF_ORIENTATION] = orientation
+    Image.fromarray(pixels).save(path, format='JPEG', quality=quality, exif=exif.tobytes())
+    return path
+
+
+def test_small_image_kept_as_is():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_jpeg(os.path.join(tmp, 'small.jpg'), 800, 600)
+        face = FaceImage.open(path)
+        assert not face.resized
+        assert (face.width, face.height) == (800, 600)
+        assert face.jpeg_bytes() == face.raw
+        assert face.save_optimized() == path
+
+
+def test_large_image_downsampled_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_jpeg(os.path.join(tmp, 'large.jpg'), 4000, 3000)
+        face = FaceImage.open(path)
+        assert face.resized
+        assert face.original_size == (4000, 3000)
+        assert (face.width, face.height) == (ANALYSIS_WIDTH, 750)
+        optimized = face.save_optimized()
+        assert optimized.endswith('large_optimized.jpg')
+        with Image.open(optimized) as saved:
+            assert saved.size == (ANALYSIS_WIDTH, 750)
+
+
+def test_exif_rotation_applied():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_jpeg(os.path.join(tmp, 'rotated.jpg'), 1600, 1200, orientation=6)
+        face = FaceImage.open(path)
+        assert face.original_size == (1200, 1600)
+        assert (face.width, face.height) == (1200, 1600)
+
+
+def test_gray_matches_rgb():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = make_jpeg(os.path.join(tmp, 'gray.jpg'), 640, 480)
+        face = FaceImage.open(path)
+        assert face.gray.shape == (480, 640)
+        expected = face.rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], np.float32)
+        assert np.abs(face.gray.astype(np.float32) - expected).max() <= 1.0
+
+
+# ---- benchmark ---------------------------------------------------------------
+
+def _decode_full(path):
+    try:
+        import cv2
+        return cv2.imread(path)
+    except ImportError:
+        with Image.open(path) as image:
+            return np.asarray(image.convert('RGB'))
+
+
+def legacy_upload(path):
+    from utils.image_compression import optimize_face_analysis_image
+    _decode_full(path)                      # validation: cv2.imread
+    _decode_full(path)                      # validation: landmark detector
+    path = optimize_face_analysis_image(path)
+    with open(path, 'rb') as image_file:    # Gemini base64 encode
+        image_file.read()
+    _decode_full(path)                      # geometric analysis: landmark detector
+
+
+def pipeline_upload(path):
+    face = FaceImage.open(path)
+    face.gray                               # validation lighting/blur
+    face.save_optimized()
+    face.jpeg_bytes()                       # Gemini
+
+
+def measure(upload, source, tmp, runs):
+    cpu, peaks = [], []
+    for i in range(runs):
+        path = os.path.join(tmp, f'upload_{upload.__name__}_{i}.jpg')
+        shutil.copy(source, path)
+        tracemalloc.start()
+        start = time.process_time()
+        upload(path)
+        cpu.append(time.process_time() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sorted(cpu)[len(cpu) // 2] * 1000, max(peaks) / 1024 / 1024
+
+
+def benchmark(runs=5):
+    with tempfile.TemporaryDirectory() as tmp:
+        for width, height in ((1080, 1350), (4032, 3024)):
+            source = make_jpeg(os.path.join(tmp, f'source_{width}.jpg'), width, height)
+            size_mb = os.path.getsize(source) / 1024 / 1024
+            print(f"\n{width}x{height} JPEG ({size_mb:.1f}MB), median of {runs} uploads")
+            for label, upload in (('before', legacy_upload), ('after', pipeline_upload)):
+                cpu_ms, peak_mb = measure(upload, source, tmp, runs)
+                print(f"  {label:<7} cpu {cpu_ms:8.1f} ms   peak {peak_mb:7.1f} MB")
+
+
+def main():
+    if '--benchmark' in sys.argv:
+        benchmark()
+        return
+
+    tests = [test_small_image_kept_as_is, test_large_image_downsampled_once,
+             test_exif_rotation_applied, test_gray_matches_rgb]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
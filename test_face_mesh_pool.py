@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-process FaceMesh graph pools.
+
+    python test_face_mesh_pool.py
+
+Pools are built with a fake graph factory, so these check checkout and
+return, lazy creation, exhaustion timeouts, fork resets and warm-up without
+loading MediaPipe.
+"""
+
+import os
+import time
+import threading
+
+from utils import face_mesh_pool
+from utils.face_mesh_pool import FaceMeshPool
+
+
+class FakeFaceMesh:
+    def __init__(self, **options):
+        self.options = options
+        self.frames = 0
+
+    def process(self, image):
+        self.frames += 1
+
+
+def make_pool(size=2, timeout=5.0):
+    built = []
+
+    def factory(**options):
+        built.append(FakeFaceMesh(**options))
+        return built[-1]
+
+    return FaceMeshPool('test', {'max_num_faces': 1}, size=size, timeout=timeout, factory=factory), built
+
+
+def test_checkout_returns_graph_to_pool():
+    pool, built = make_pool()
+    with pool.checkout() as first:
+        assert first.options == {'max_num_faces': 1}
+        assert pool.stats()['in_use'] == 1
+    with pool.checkout() as second:
+        assert second is first, "A returned graph is reused instead of building another"
+    stats = pool.stats()
+    assert (len(built), stats['graphs'], stats['idle'], stats['in_use']) == (1, 1, 1, 0)
+    assert (stats['checkouts'], stats['created']) == (2, 1)
+
+
+def test_graphs_created_lazily_up_to_size():
+    pool, built = make_pool(size=3)
+    assert pool.stats()['graphs'] == 0, "Nothing is built before the first checkout"
+    with pool.checkout() as a, pool.checkout() as b:
+        assert a is not b and len(built) == 2
+        with pool.checkout() as c:
+            assert len(built) == 3 and c not in (a, b)
+    assert pool.stats()['graphs'] == 3 and len(pool.stats()['load_ms']) == 3
+
+    def failing(**options):
+        raise RuntimeError('model missing')
+
+    pool = FaceMeshPool('broken', {}, size=1, timeout=0.1, factory=failing)
+    for _ in range(2):
+        try:
+            with pool.checkout():
+                pass
+            assert False, "Expected the factory error"
+        except RuntimeError:
+            pass
+    assert pool.stats()['graphs'] == 0 and pool.counters['errors'] == 2, "A failed build frees its slot"
+
+
+def test_checkout_times_out_when_exhausted():
+    pool, built = make_pool(size=1, timeout=0.2)
+    with pool.checkout():
+        start_time = time.perf_counter()
+        try:
+            with pool.checkout():
+                pass
+            assert False, "Expected TimeoutError"
+        except TimeoutError:
+            pass
+        assert time.perf_counter() - start_time >= 0.2
+    assert pool.counters['timeouts'] == 1 and len(built) == 1
+
+
+def test_waiting_checkout_gets_returned_graph():
+    pool, built = make_pool(size=1, timeout=5.0)
+    got = []
+
+    def borrow():
+        with pool.checkout() as face_mesh:
+            got.append(face_mesh)
+
+    with pool.checkout() as held:
+        waiter = threading.Thread(target=borrow)
+        waiter.start()
+        time.sleep(0.1)
+        assert not got, "The pool is full, so the second checkout waits"
+    waiter.join(2)
+    assert got == [held] and len(built) == 1
+    assert pool.counters['waited'] == 1 and pool.stats()['wait_ms']['max'] >= 50
+
+
+def test_pool_reset_after_fork():
+    pool, built = make_pool(size=1)
+    with pool.checkout():
+        pass
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            before = pool.stats()['graphs']
+            with pool.checkout() as face_mesh:
+                fresh = face_mesh is not built[0]
+            os.write(write_fd, f"{before},{int(fresh)},{pool.stats()['graphs']}".encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    result = os.read(read_fd, 64).decode()
+    os.close(read_fd)
+    assert result == '0,1,1', f"The child builds its own graph (got {result})"
+    with pool.checkout() as face_mesh:
+        assert face_mesh is built[0], "The parent keeps its graph"
+
+
+def test_warm_up_primes_both_pools():
+    pool, built = make_pool(size=2)
+    assert pool.warm_up(5) == 2, "Warm-up stops at the pool size"
+    assert [face_mesh.frames for face_mesh in built] == [1, 1]
+
+    static_pool, static_built = make_pool()
+    stream_pool, stream_built = make_pool()
+    saved = face_mesh_pool.static_face_meshes, face_mesh_pool.stream_face_meshes, face_mesh_pool._warm_up_pid
+    face_mesh_pool.static_face_meshes, face_mesh_pool.stream_face_meshes = static_pool, stream_pool
+    face_mesh_pool._warm_up_pid = None
+    try:
+        face_mesh_pool.warm_up_in_background()
+        face_mesh_pool.warm_up_in_background()  # Once per process
+        deadline = time.time() + 2
+        while (len(static_built), len(stream_built)) != (1, 1) and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert (len(static_built), len(stream_built)) == (1, 1), "Web workers warm both pools"
+        stats = face_mesh_pool.stats()
+        assert stats['static']['graphs'] == stats['stream']['graphs'] == 1
+    finally:
+        face_mesh_pool.static_face_meshes, face_mesh_pool.stream_face_meshes, face_mesh_pool._warm_up_pid = saved
+
+
+def main():
+    tests = [test_checkout_returns_graph_to_pool, test_graphs_created_lazily_up_to_size,
+             test_checkout_times_out_when_exhausted, test_waiting_checkout_gets_returned_graph,
+             test_pool_reset_after_fork, test_warm_up_primes_both_pools]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
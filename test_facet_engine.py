@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for the faceted filter counts.
+
+    python test_facet_engine.py
+
+The GROUPING SETS query needs PostgreSQL, so these check the SQL the package
+facets build (the directory's own filters, each facet leaving out its own)
+and how result rows become facet counts.
+"""
+
+import sqlite3
+from types import SimpleNamespace
+
+from facet_engine import package_facets, doctor_facets, cumulative, PACKAGE_PRICE_BUCKET_EXPR
+from package_directory_query import PackageDirectoryQuery, filter_predicates, PRESET_PRICE_RANGES
+
+
+def row(**values):
+    return SimpleNamespace(_mapping=values)
+
+
+def group_row(engine, index, value, count):
+    """A row of facet ``index``'s grouping set."""
+    values = {}
+    for i in range(len(engine.facets)):
+        values[f"f{i}"] = value if i == index else None
+        values[f"g{i}"] = 0 if i == index else 1
+        values[f"c{i}"] = count if i == index else 0
+    values['total'] = 0
+    values.update({f"stat_{name}": None for name in engine.stats})
+    return row(**values)
+
+
+def total_row(engine, total, **stats):
+    values = {f"g{i}": 1 for i in range(len(engine.facets))}
+    values.update({f"f{i}": None for i in range(len(engine.facets))})
+    values.update({f"c{i}": total for i in range(len(engine.facets))})
+    values['total'] = total
+    values.update({f"stat_{name}": stats.get(name) for name in engine.stats})
+    return row(**values)
+
+
+def test_package_facets_use_directory_filters():
+    filters = {'category': 'Botox', 'location': 'Mumbai', 'search': 'lip', 'price_range': '0-50000'}
+    sql, params = package_facets.query(filters)
+    predicates, directory_params = filter_predicates(filters)
+    assert params == directory_params
+    for predicate in predicates.values():
+        assert predicate in sql
+    assert 'package_categories pc WHERE pc.category_name ILIKE :category' in sql
+    assert f"({predicates['price']}) AS m2" in sql, "Price range is the price facet's own filter"
+    assert f"({predicates['category']}) AS m1" in sql
+    assert f"AND {predicates['search']}" in sql, "Search narrows every facet"
+
+    where, _params = PackageDirectoryQuery(filters).where_clause()
+    assert all(predicate in where for predicate in predicates.values())
+
+
+def test_package_price_and_category_id_filters():
+    sql, params = package_facets.query({'min_price': '10000', 'max_price': '90000', 'price_range': '200000+',
+                                        'category_id': '7', 'category': 'ignored'})
+    assert (params['min_price'], params['max_price'], params['category_id']) == (10000.0, 90000.0, '7')
+    assert 'category' not in params, "category_id takes precedence, as on the directory"
+    assert '> 200000' not in sql, "Explicit bounds override the preset range"
+    assert 'entity_categories' in sql
+    assert 'price_bucket' not in sql
+
+
+def test_price_buckets_are_the_directory_presets():
+    conn = sqlite3.connect(':memory:')
+    for discounted, actual in [(None, None), (49999, 60000), (None, 50000), (100000, None), (None, 199999.5),
+                               (200000, None), (None, 900000)]:
+        prices = "(SELECT ? AS price_discounted, ? AS price_actual) p"
+        bucket = conn.execute(f"SELECT {PACKAGE_PRICE_BUCKET_EXPR} FROM {prices}", (discounted, actual)).fetchone()[0]
+        matching = [label for label, predicate in PRESET_PRICE_RANGES.items()
+                    if conn.execute(f"SELECT {predicate} FROM {prices}", (discounted, actual)).fetchone()[0]]
+        assert matching == [bucket], f"{discounted}/{actual}: bucket {bucket}, presets {matching}"
+        predicates, _params = filter_predicates({'price_range': bucket})
+        assert predicates['price'] == PRESET_PRICE_RANGES[bucket], "A bucket value works as price_range"
+
+
+def test_signature_tracks_directory_filters():
+    base = package_facets.signature({'location': 'Delhi'})
+    assert package_facets.signature({'location': 'Delhi', 'price_range': '0-50000'}) != base
+    assert package_facets.signature({'location': 'Delhi', 'category_id': '3'}) != base
+    assert package_facets.signature({'location': 'Delhi', 'sort': 'price_low'}) == base
+
+
+def test_collect_counts_sorts_and_drops_zero_counts():
+    result = package_facets.collect([
+        group_row(package_facets, 0, 'Pune', 2),
+        group_row(package_facets, 0, 'Mumbai', 5),
+        group_row(package_facets, 0, 'Delhi', 0),
+        group_row(package_facets, 0, None, 3),
+        group_row(package_facets, 2, '200000+', 1),
+        group_row(package_facets, 2, '0-50000', 4),
+        group_row(package_facets, 2, '50000-100000', 0),
+        total_row(package_facets, 7, min_price=1000, max_price=600000),
+    ])
+    assert result['facets']['city'] == [{'value': 'Mumbai', 'count': 5}, {'value': 'Pune', 'count': 2}]
+    assert [e['value'] for e in result['facets']['price']] == ['0-50000', '200000+'], "Buckets keep display order"
+    assert result['facets']['category'] == []
+    assert result['total'] == 7
+    assert (result['stats']['min_price'], result['stats']['max_price']) == (1000, 600000)
+
+
+def test_cumulative_rating_counts():
+    result = doctor_facets.collect([
+        group_row(doctor_facets, 4, '4.5', 2),
+        group_row(doctor_facets, 4, '3.5', 1),
+        total_row(doctor_facets, 3),
+    ])
+    assert cumulative(result['facets']['rating'], ['4.5', '4.0', '3.5', '3.0']) == [
+        {'value': '4.5', 'count': 2}, {'value': '4.0', 'count': 2},
+        {'value': '3.5', 'count': 3}, {'value': '3.0', 'count': 3},
+    ]
+
+
+def main():
+    tests = [test_package_facets_use_directory_filters, test_package_price_and_category_id_filters,
+             test_price_buckets_are_the_directory_presets, test_signature_tracks_directory_filters, test_collect_counts_sorts_and_drops_zero_counts,
+             test_cumulative_rating_counts]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
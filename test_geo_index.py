@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for the grid-bucketed clinic geo index.
+
+    python test_geo_index.py
+
+Scatters clinics around a few centres (Mumbai, Tromsø, near the pole and
+across the antimeridian) and checks within_radius and nearest against a
+brute-force haversine over every clinic.
+"""
+
+import numpy as np
+
+from geo_index import CELL_DEGREES, GeoIndex, bounding_box, haversine_km
+
+CENTRES = [(19.07, 72.88), (69.65, 18.96), (89.5, 10.0), (-33.9, 179.95)]
+
+
+def scatter(lat, lng, count=400, spread=3.0, seed=0):
+    rng = np.random.default_rng(seed)
+    lats = np.clip(lat + rng.uniform(-spread, spread, count), -90, 90)
+    lngs = (lng + rng.uniform(-spread * 5, spread * 5, count) + 180) % 360 - 180
+    return GeoIndex(np.arange(1, count + 1), lats, lngs)
+
+
+def brute_force(index, lat, lng):
+    distances = haversine_km(lat, lng, index.lats, index.lngs)
+    order = np.argsort(distances, kind='stable')
+    return [(int(index.ids[i]), float(distances[i])) for i in order]
+
+
+def ranked(hits):
+    # Clinics clipped onto the pole tie on distance; order ties by id
+    return sorted((round(distance, 9), clinic_id) for clinic_id, distance in hits)
+
+
+def test_within_radius_matches_brute_force():
+    for seed, (lat, lng) in enumerate(CENTRES):
+        index = scatter(lat, lng, seed=seed)
+        everything = brute_force(index, lat, lng)
+        for radius_km in (1, 25, 150, 600):
+            expected = [hit for hit in everything if hit[1] <= radius_km]
+            total, hits = index.within_radius(lat, lng, radius_km)
+            assert total == len(expected), f"({lat}, {lng}) r={radius_km}: {total} != {len(expected)}"
+            assert ranked(hits) == ranked(expected), f"({lat}, {lng}) r={radius_km}"
+
+
+def test_within_radius_pages_and_boundary():
+    index = GeoIndex([1, 2, 3], [19.0, 19.0, 19.0], [72.0, 72.1, 72.2])
+    edge_km = float(haversine_km(19.0, 72.0, 19.0, 72.1))
+    total, hits = index.within_radius(19.0, 72.0, edge_km)
+    assert total == 2 and [i for i, _ in hits] == [1, 2], "A clinic exactly on the radius is inside"
+    assert index.within_radius(19.0, 72.0, edge_km * 0.999)[0] == 1
+    total, page = index.within_radius(19.0, 72.0, 100, offset=1, limit=1)
+    assert total == 3 and [i for i, _ in page] == [2]
+    assert index.within_radius(0.0, 0.0, 100) == (0, [])
+
+
+def test_bounding_box_encloses_circle():
+    for lat, radius_km in ((0.0, 200), (45.0, 200), (69.65, 200), (-80.0, 200), (85.0, 500), (89.99, 1)):
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, 10.0, radius_km)
+        bearings = np.radians(np.arange(0, 360, 5))
+        # Points on the circle: destination formula for radius_km along each bearing
+        d = radius_km / 6371.0
+        lat1, lng1 = np.radians(lat), np.radians(10.0)
+        lats = np.arcsin(np.sin(lat1) * np.cos(d) + np.cos(lat1) * np.sin(d) * np.cos(bearings))
+        lngs = lng1 + np.arctan2(np.sin(bearings) * np.sin(d) * np.cos(lat1),
+                                 np.cos(d) - np.sin(lat1) * np.sin(lats))
+        assert np.all((np.degrees(lats) >= min_lat) & (np.degrees(lats) <= max_lat)), f"lat {lat}"
+        assert np.all((np.degrees(lngs) >= min_lng) & (np.degrees(lngs) <= max_lng)), f"lng at lat {lat}"
+
+
+def test_nearest_matches_brute_force():
+    for seed, (lat, lng) in enumerate(CENTRES):
+        index = scatter(lat, lng, seed=seed)
+        everything = brute_force(index, lat, lng)
+        for k in (1, 5, 50):
+            hits = index.nearest(lat, lng, k)
+            assert [round(d, 9) for _, d in hits] == [round(d, 9) for _, d in everything[:k]], f"({lat}, {lng}) k={k}"
+
+
+def test_nearest_far_away_and_capped():
+    index = GeoIndex([1, 2], [19.07, 28.61], [72.88, 77.21])
+    # No clinic within several rings of cells: the search keeps widening
+    assert [i for i, _ in index.nearest(-33.9, 151.2, 2)] == [1, 2]
+    assert index.nearest(19.07, 72.88 + CELL_DEGREES * 3, 2, max_radius_km=50)[0][0] == 1
+    assert len(index.nearest(19.07, 72.88, 2, max_radius_km=50)) == 1
+    assert index.nearest(19.07, 72.88, 0) == []
+    assert GeoIndex([], [], []).nearest(19.07, 72.88) == []
+
+
+def main():
+    tests = [test_within_radius_matches_brute_force, test_within_radius_pages_and_boundary,
+             test_bounding_box_encloses_circle, test_nearest_matches_brute_force, test_nearest_far_away_and_capped]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
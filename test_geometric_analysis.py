@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Equivalence tests for the vectorized geometric face metrics.
+
+    python test_geometric_analysis.py
+
+The reference functions below are the per-point dict formulas the metrics
+used before they were vectorized. Random 478-point landmark sets are scored
+through the dict input, the (1, N, 3) array path and score_batch, and every
+calculate_* output plus the harmony scores must match the reference.
+"""
+
+import math
+
+import numpy as np
+
+from utils.geometric_analysis import FacialGeometricAnalyzer, stack_landmarks
+from utils.facial_landmarks import LANDMARK_COUNT
+
+GOLDEN_RATIO = 1.618
+FACES = 50
+TOLERANCE = 0.1 + 1e-6  # float32 arithmetic may flip a value rounded to one decimal
+
+analyzer = FacialGeometricAnalyzer()
+
+
+def random_landmarks(rng):
+    points = rng.uniform(0, 640, size=(LANDMARK_COUNT, 3)).astype(np.float32)
+    return {i: {'x': float(x), 'y': float(y), 'z': float(z)} for i, (x, y, z) in enumerate(points)}
+
+
+# ---- dict-based reference ------------------------------------------------------
+
+def distance(a, b):
+    return math.sqrt((a['x'] - b['x']) ** 2 + (a['y'] - b['y']) ** 2)
+
+
+def midpoint(a, b):
+    return {'x': (a['x'] + b['x']) / 2, 'y': (a['y'] + b['y']) / 2}
+
+
+def ratio_score(measured, ideal):
+    return min(100, max(0, 100 - abs(measured - ideal) / ideal * 100))
+
+
+def ratio(numerator, denominator):
+    return numerator / denominator if denominator > 0 else 0
+
+
+def ref_golden_ratio(lm):
+    face_length = distance(lm[10], lm[18])
+    eye_width = distance(lm[133], lm[33])
+    mouth_width = distance(lm[61], lm[291])
+    ratios = {
+        'face_length_to_width': ratio(face_length, distance(lm[234], lm[454])),
+        'interpupillary_to_eye_width': ratio(distance(lm[133], lm[362]), eye_width),
+        'mouth_to_nose_width': ratio(mouth_width, distance(lm[220], lm[305])),
+        'face_to_eye_mouth_distance': ratio(face_length, distance(midpoint(lm[133], lm[362]),
+                                                                  midpoint(lm[61], lm[291]))),
+    }
+    measurements = {name: {'ratio': value, 'ideal': GOLDEN_RATIO, 'score': ratio_score(value, GOLDEN_RATIO)}
+                    for name, value in ratios.items()}
+    overall = sum(m['score'] for m in measurements.values()) / len(measurements)
+    return {'overall_score': round(overall, 1), 'measurements': measurements,
+            'interpretation': analyzer._interpret_golden_ratio_score(overall)}
+
+
+def proportions(sections, ideal):
+    total = sum(sections)
+    percentages = [section / total * 100 if total > 0 else 0 for section in sections]
+    deviation = min(100, sum(abs(p - i) for p, i in zip(percentages, ideal)))
+    return percentages, deviation
+
+
+def ref_thirds(lm):
+    hairline_y = lm[10]['y'] - distance(lm[10], lm[9]) * 0.3
+    sections = [abs(hairline_y - lm[9]['y']), abs(lm[9]['y'] - lm[2]['y']), abs(lm[2]['y'] - lm[18]['y'])]
+    percentages, deviation = proportions(sections, analyzer.ideal_thirds)
+    names = ('upper_third', 'middle_third', 'lower_third')
+    measurements = {f'{name}_px': round(section, 1) for name, section in zip(names, sections)}
+    measurements['total_height_px'] = round(sum(sections), 1)
+    return {'proportions': {name: round(p, 1) for name, p in zip(names, percentages)},
+            'measurements': measurements, 'deviation_score': round(deviation, 1),
+            'interpretation': analyzer._interpret_thirds_score(deviation)}
+
+
+def ref_fifths(lm):
+    edge_points = [234, 33, 133, 362, 263, 454]
+    sections = [distance(lm[a], lm[b]) for a, b in zip(edge_points, edge_points[1:])]
+    percentages, deviation = proportions(sections, analyzer.ideal_fifths)
+    measurements = {f'section_{j + 1}_px': round(section, 1) for j, section in enumerate(sections)}
+    measurements['total_width_px'] = round(sum(sections), 1)
+    return {'proportions': {f'section_{j + 1}': round(p, 1) for j, p in enumerate(percentages)},
+            'measurements': measurements, 'deviation_score': round(deviation, 1),
+            'interpretation': analyzer._interpret_fifths_score(deviation)}
+
+
+def ref_symmetry(lm):
+    midline_x = (lm[1]['x'] + lm[18]['x']) / 2
+    scores, details = [], []
+    for left_idx, right_idx in [(33, 362), (133, 263), (61, 291), (234, 454), (205, 425), (172, 397), (46, 276)]:
+        left = abs(lm[left_idx]['x'] - midline_x)
+        right = abs(lm[right_idx]['x'] - midline_x)
+        if max(left, right) > 0:
+            symmetry = 1 - abs(left - right) / max(left, right)
+            scores.append(symmetry)
+            if symmetry < 0.85:
+                details.append({'feature': analyzer._get_feature_name(left_idx, right_idx),
+                                'symmetry_score': round(symmetry * 100, 1),
+                                'left_distance': round(left, 1), 'right_distance': round(right, 1)})
+    overall = sum(scores) / len(scores) * 100 if scores else 0
+    return {'overall_score': round(overall, 1), 'midline_x': round(midline_x, 1),
+            'individual_scores': [round(score * 100, 1) for score in scores], 'asymmetry_details': details,
+            'interpretation': analyzer._interpret_symmetry_score(overall)}
+
+
+def ref_canons(lm):
+    eye_width = distance(lm[133], lm[33])
+    nose_width = distance(lm[220], lm[305])
+    measured = {
+        'eye_separation_to_width': (ratio(distance(lm[133], lm[362]), eye_width), 1.0),
+        'nose_width_to_eye_width': (ratio(nose_width, eye_width), 1.0),
+        'mouth_width_to_nose_width': (ratio(distance(lm[61], lm[291]), nose_width), 1.5),
+        'face_width_to_nose_width': (ratio(distance(lm[234], lm[454]), nose_width), 4.0),
+    }
+    canons = {name: {'measured_ratio': round(value, 2), 'ideal_ratio': ideal, 'score': ratio_score(value, ideal)}
+              for name, (value, ideal) in measured.items()}
+    overall = sum(c['score'] for c in canons.values()) / len(canons)
+    return {'overall_score': round(overall, 1), 'canons': canons,
+            'interpretation': analyzer._interpret_canon_score(overall)}
+
+
+def ref_ogee(lm):
+    def side(cheekbone, jaw):
+        horizontal = abs(cheekbone['x'] - jaw['x'])
+        if horizontal > 0:
+            return ratio_score(abs(cheekbone['y'] - jaw['y']) / horizontal, 1.5)
+        return 50
+    left, right = side(lm[205], lm[172]), side(lm[425], lm[397])
+    overall = (left + right) / 2
+    return {'overall_score': round(overall, 1), 'left_side_score': round(left, 1),
+            'right_side_score': round(right, 1), 'interpretation': analyzer._interpret_ogee_score(overall)}
+
+
+REFERENCE = {
+    'golden_ratio_analysis': (ref_golden_ratio, 'calculate_golden_ratio_score'),
+    'facial_thirds_analysis': (ref_thirds, 'calculate_facial_thirds'),
+    'facial_fifths_analysis': (ref_fifths, 'calculate_facial_fifths'),
+    'symmetry_analysis': (ref_symmetry, 'calculate_facial_symmetry'),
+    'neoclassical_canons': (ref_canons, 'calculate_neoclassical_canons'),
+    'ogee_curve_analysis': (ref_ogee, 'calculate_ogee_curve'),
+}
+
+
+def assert_close(actual, expected, path=''):
+    if isinstance(expected, dict):
+        assert isinstance(actual, dict) and set(actual) == set(expected), f"{path}: keys {actual} != {expected}"
+        for key in expected:
+            assert_close(actual[key], expected[key], f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert len(actual) == len(expected), f"{path}: {actual} != {expected}"
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            assert_close(a, e, f"{path}[{i}]")
+    elif isinstance(expected, (int, float)):
+        assert abs(actual - expected) <= TOLERANCE * max(1, abs(expected) * 1e-3), f"{path}: {actual} != {expected}"
+    else:
+        assert actual == expected, f"{path}: {actual!r} != {expected!r}"
+
+
+def test_calculate_methods_match_reference():
+    rng = np.random.default_rng(478)
+    for _ in range(FACES):
+        landmarks = random_landmarks(rng)
+        array = stack_landmarks([landmarks])
+        for name, (reference, method) in REFERENCE.items():
+            expected = reference(landmarks)
+            assert_close(getattr(analyzer, method)(landmarks), expected, name)
+            assert_close(getattr(analyzer, method)(array), expected, f"{name} (array path)")
+
+
+def test_score_batch_matches_reference_harmony():
+    rng = np.random.default_rng(1618)
+    faces = [random_landmarks(rng) for _ in range(FACES)]
+    batch = analyzer.score_batch(stack_landmarks(faces))
+    assert all(scores.shape == (FACES,) for scores in batch.values())
+    for i, landmarks in enumerate(faces):
+        results = {name: reference(landmarks) for name, (reference, _method) in REFERENCE.items()}
+        expected = analyzer.calculate_facial_harmony(results)
+        for component, score in expected['component_scores'].items():
+            assert_close(float(batch[component][i]), score, f"face {i} {component}")
+        assert_close(float(batch['facial_harmony'][i]), expected['overall_score'], f"face {i} harmony")
+
+
+def test_missing_landmarks_score_nan():
+    rng = np.random.default_rng(7)
+    landmarks = random_landmarks(rng)
+    del landmarks[18]  # Chin
+    batch = analyzer.score_batch(stack_landmarks([landmarks]))
+    assert np.isnan(batch['facial_harmony'][0])
+    assert 'error' in analyzer.calculate_facial_thirds(landmarks)
+
+
+def main():
+    tests = [test_calculate_methods_match_reference, test_score_batch_matches_reference_harmony,
+             test_missing_landmarks_score_nan]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Tests for the background-refreshed homepage snapshot.
+
+    python test_homepage_snapshot.py
+
+Builds snapshots from throwaway packages/clinics tables in a scratch SQLite
+database and serves them through a private TieredCache, covering the two
+build queries, sampling, the cached copy workers share, the fallback when
+no snapshot can be built, and rebuilds after package or clinic edits.
+"""
+
+import os
+import random
+import tempfile
+
+from flask import Flask
+from sqlalchemy import text
+
+from app import db
+import homepage_snapshot as hs
+from homepage_snapshot import HomepageSnapshot, HOMEPAGE_CATEGORIES, EMPTY_SNAPSHOT
+from cache_backend import TieredCache, RedisTier, LocalRedis
+from cache_invalidation import PACKAGES, CLINICS
+
+BOTOX, LASER = HOMEPAGE_CATEGORIES[0], HOMEPAGE_CATEGORIES[2]
+
+
+def make_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'homepage.db')}"
+    db.init_app(app)
+    return app
+
+
+def create_tables():
+    db.session.execute(text("""CREATE TABLE clinics (id INTEGER PRIMARY KEY, name TEXT, slug TEXT, city TEXT,
+                               state TEXT, description TEXT, google_rating REAL, google_review_count INTEGER,
+                               is_approved BOOLEAN)"""))
+    db.session.execute(text("""CREATE TABLE packages (id INTEGER PRIMARY KEY, clinic_id INTEGER, title TEXT,
+                               slug TEXT, category TEXT, description TEXT, price_actual NUMERIC,
+                               price_discounted NUMERIC, duration TEXT, downtime TEXT,
+                               actual_treatment_name TEXT, is_active BOOLEAN)"""))
+    db.session.execute(text("CREATE TABLE package_categories (package_id INTEGER, category_name TEXT)"))
+    db.session.execute(text("INSERT INTO clinics (id, name, slug, google_rating, google_review_count, is_approved)"
+                            " VALUES (1, 'Glow', 'glow', 4.8, 2500, 1), (2, 'Skin', 'skin', 4.9, 1200, 1),"
+                            " (3, 'Small', 'small', 5.0, 40, 1), (4, 'Pending', 'pending', 4.7, 9000, 0)"))
+    for package_id in range(1, 13):
+        add_package(package_id, clinic_id=1 if package_id <= 9 else 2, active=package_id != 12,
+                    categories=[BOTOX] + ([LASER] if package_id % 3 == 0 else []))
+    db.session.commit()
+
+
+def add_package(package_id, clinic_id=1, active=True, categories=(BOTOX,)):
+    db.session.execute(text("INSERT INTO packages (id, clinic_id, title, slug, price_actual, is_active)"
+                            " VALUES (:id, :clinic_id, :title, :slug, 10000, :active)"),
+                       {'id': package_id, 'clinic_id': clinic_id, 'title': f"Package {package_id}",
+                        'slug': f"package-{package_id}", 'active': active})
+    for category in categories:
+        db.session.execute(text("INSERT INTO package_categories VALUES (:id, :category)"),
+                           {'id': package_id, 'category': category})
+
+
+def with_snapshot_cache(test):
+    def run():
+        original_cache, original_refresher = hs.cache, hs.refresher
+        hs.cache = TieredCache(remote=RedisTier(LocalRedis()))
+        hs.refresher = hs.SnapshotRefresher()
+        hs.refresher._pid = os.getpid()  # No background thread; tests refresh explicitly
+        app = make_app()
+        try:
+            with app.app_context():
+                test()
+        finally:
+            hs.cache, hs.refresher = original_cache, original_refresher
+    run.__name__ = test.__name__
+    return run
+
+
+@with_snapshot_cache
+def test_build_materialises_pools_and_clinics():
+    create_tables()
+    snapshot = hs.build_homepage_snapshot()
+    assert snapshot.category_pools[BOTOX] == list(range(1, 12)), "Inactive packages are left out"
+    assert snapshot.category_pools[LASER] == [3, 6, 9]
+    assert snapshot.category_pools[HOMEPAGE_CATEGORIES[1]] == []
+    assert snapshot.packages[10]['clinic_name'] == 'Skin' and 'category_name' not in snapshot.packages[10]
+    assert len(snapshot.packages) == 11, "Packages in two categories are stored once"
+
+    clinics = snapshot.verified_clinic_list()
+    assert [(c['name'], c['package_count']) for c in clinics] == [('Glow', 9), ('Skin', 2)], \
+        "Approved clinics over the review threshold, most reviewed first, with active package counts"
+
+
+def test_sampling_copies_from_pools():
+    packages = {pid: {'id': pid, 'title': f"Package {pid}"} for pid in range(1, 11)}
+    snapshot = HomepageSnapshot({BOTOX: list(range(1, 11)), LASER: [2, 4]}, packages, [{'id': 1}])
+    sample = snapshot.sample_category_packages(rng=random.Random(7))
+    assert len(sample[BOTOX]) == 7 and len({p['id'] for p in sample[BOTOX]}) == 7
+    assert sorted(p['id'] for p in sample[LASER]) == [2, 4], "Small pools are shown whole"
+    assert sample[HOMEPAGE_CATEGORIES[1]] == []
+    assert set(sample) == set(HOMEPAGE_CATEGORIES)
+
+    sample[LASER][0]['title'] = 'Edited by a template'
+    snapshot.verified_clinic_list()[0]['id'] = 99
+    assert packages[sample[LASER][0]['id']]['title'] != 'Edited by a template'
+    assert snapshot.verified_clinics == [{'id': 1}], "Callers get copies of the shared snapshot"
+
+
+@with_snapshot_cache
+def test_snapshot_served_from_cache():
+    create_tables()
+    first = hs.get_homepage_snapshot()
+    assert first.category_pools[BOTOX]
+    add_package(20)
+    db.session.commit()
+    assert hs.get_homepage_snapshot().built_at == first.built_at, "Served from the cache, no rebuild"
+
+    hs.cache.local.clear()
+    other_worker = hs.get_homepage_snapshot()
+    assert other_worker.built_at == first.built_at, "Another worker reads the shared copy"
+
+    refreshed = hs.refresh_homepage_snapshot()
+    assert 20 in refreshed.category_pools[BOTOX]
+    assert hs.get_homepage_snapshot().built_at == refreshed.built_at, "The refresher replaces the cached copy"
+
+
+@with_snapshot_cache
+def test_missing_snapshot_falls_back_to_empty():
+    assert hs.get_homepage_snapshot() is EMPTY_SNAPSHOT, "No tables yet: the homepage renders without these sections"
+    assert EMPTY_SNAPSHOT.sample_category_packages() == {category: [] for category in HOMEPAGE_CATEGORIES}
+    assert EMPTY_SNAPSHOT.verified_clinic_list() == []
+
+    create_tables()
+    assert hs.get_homepage_snapshot().category_pools[BOTOX], "The failed build was not cached"
+
+
+@with_snapshot_cache
+def test_tag_bumps_rebuild_snapshot():
+    create_tables()
+    first = hs.get_homepage_snapshot()
+    for tag, change in ((PACKAGES, "UPDATE packages SET is_active = 0 WHERE id = 1"),
+                        (CLINICS, "UPDATE clinics SET is_approved = 0 WHERE id = 2")):
+        db.session.execute(text(change))
+        db.session.commit()
+        hs.cache.invalidate_tags(tag)
+        rebuilt = hs.get_homepage_snapshot()
+        assert rebuilt.built_at != first.built_at, f"A {tag} bump makes the cached snapshot stale"
+        first = rebuilt
+    assert 1 not in first.category_pools[BOTOX]
+    assert [c['name'] for c in first.verified_clinic_list()] == ['Glow']
+
+
+@with_snapshot_cache
+def test_edit_during_refresh_still_invalidates():
+    create_tables()
+    build = hs.build_homepage_snapshot
+
+    def build_while_edited():
+        snapshot = build()
+        hs.cache.invalidate_tags(PACKAGES)  # An edit commits while the refresh is building
+        return snapshot
+
+    hs.build_homepage_snapshot = build_while_edited
+    try:
+        stale = hs.refresh_homepage_snapshot()
+    finally:
+        hs.build_homepage_snapshot = build
+    assert hs.get_homepage_snapshot().built_at != stale.built_at, \
+        "The refresh is stored under the tag versions from before the edit"
+
+
+def main():
+    tests = [test_build_materialises_pools_and_clinics, test_sampling_copies_from_pools,
+             test_snapshot_served_from_cache, test_missing_snapshot_falls_back_to_empty,
+             test_tag_bumps_rebuild_snapshot, test_edit_during_refresh_still_invalidates]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
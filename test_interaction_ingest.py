@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Tests for the buffered interaction ingestor.
+
+    python test_interaction_ingest.py
+
+Uses a private EventIngestor pointed at a scratch SQLite database (no
+background worker) with two sinks, one of which fails, and checks that
+every kind is written in its own transaction and failed kinds are retried,
+and that a full buffer's drops show up on /health/interaction-ingest.
+"""
+
+import os
+import queue
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+
+import interaction_ingest
+from interaction_ingest import EventIngestor, WRITE_ATTEMPTS, insert_rows
+from health_monitoring import health_bp
+
+
+def make_ingestor():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE lead_events (id INTEGER PRIMARY KEY, source_page TEXT)"))
+    ingestor = EventIngestor()
+    ingestor._app = Flask(__name__)
+    ingestor._engine = engine
+    ingestor._worker_pid = os.getpid()  # Flushed by hand below
+    return ingestor, engine
+
+
+def enqueue(ingestor, kind, event):
+    ingestor._buffer.put_nowait((kind, event))
+
+
+def rows(engine):
+    with engine.connect() as conn:
+        return [tuple(row) for row in conn.execute(text("SELECT id, source_page FROM lead_events ORDER BY id"))]
+
+
+def test_failing_sink_does_not_roll_back_other_kinds():
+    ingestor, engine = make_ingestor()
+    ingestor.register_sink('lead', lambda conn, events: insert_rows(conn, 'lead_events', ('id', 'source_page'), events))
+    ingestor.register_sink('broken', lambda conn, events: conn.execute(text("INSERT INTO missing_table VALUES (1)")))
+
+    enqueue(ingestor, 'lead', {'id': 1, 'source_page': '/a'})
+    enqueue(ingestor, 'broken', {'id': 1})
+    enqueue(ingestor, 'lead', {'id': 2, 'source_page': '/b'})
+    assert ingestor.flush() == 2
+    assert rows(engine) == [(1, '/a'), (2, '/b')]
+    assert ingestor.stats()['retrying'] == 1
+
+
+def test_failed_kind_retried_then_dropped():
+    ingestor, engine = make_ingestor()
+    attempts = []
+
+    def flaky(conn, events):
+        attempts.append(len(events))
+        if len(attempts) == 1:
+            raise RuntimeError("database restarting")
+        insert_rows(conn, 'lead_events', ('id', 'source_page'), events)
+
+    ingestor.register_sink('lead', flaky)
+    enqueue(ingestor, 'lead', {'id': 1, 'source_page': '/a'})
+    ingestor.flush()
+    assert rows(engine) == []
+    ingestor.flush()
+    assert rows(engine) == [(1, '/a')], "The failed batch is written on the next flush"
+
+    ingestor.register_sink('lead', lambda conn, events: conn.execute(text("SELECT * FROM missing_table")))
+    enqueue(ingestor, 'lead', {'id': 2, 'source_page': '/b'})
+    for _ in range(WRITE_ATTEMPTS):
+        ingestor.flush()
+    stats = ingestor.stats()
+    assert (stats['failed'], stats['retrying']) == (1, 0)
+
+
+def test_drops_and_backpressure_on_health_endpoint():
+    ingestor, engine = make_ingestor()
+    ingestor.batch_size = 100  # Keep the worker's wake-up out of it
+    ingestor._buffer = queue.Queue(maxsize=4)
+    ingestor.buffer_size = 4
+    ingestor.register_sink('lead', lambda conn, events: insert_rows(conn, 'lead_events', ('id', 'source_page'),
+                                                                    events))
+    accepted = [ingestor.enqueue('lead', {'id': i, 'source_page': '/a'}) for i in range(6)]
+    assert accepted == [True] * 4 + [False] * 2
+
+    app = Flask(__name__)
+    app.register_blueprint(health_bp)
+    original = interaction_ingest.ingestor
+    interaction_ingest.ingestor = ingestor
+    try:
+        stats = app.test_client().get('/health/interaction-ingest').get_json()
+        assert (stats['enqueued'], stats['dropped'], stats['pending']) == (4, 2, 4)
+        assert (stats['capacity'], stats['backpressure']) == (4, 1.0)
+        ingestor.flush()
+        stats = app.test_client().get('/health/interaction-ingest').get_json()
+        assert (stats['written'], stats['pending'], stats['backpressure']) == (4, 0, 0.0)
+    finally:
+        interaction_ingest.ingestor = original
+
+
+def main():
+    tests = [test_failing_sink_does_not_roll_back_other_kinds, test_failed_kind_retried_then_dropped,
+             test_drops_and_backpressure_on_health_endpoint]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Tests for request validation on the interaction tracking endpoints.
+
+    python test_interaction_tracking.py
+
+Malformed content ids are rejected with a 400 before anything is tracked,
+on both /api/track-interaction and /api/personalization/track.
+"""
+
+from flask import Flask
+
+from api_routes import api_bp
+from personalization_service import PersonalizationService, personalization_bp
+
+
+def make_client():
+    app = Flask(__name__)
+    app.register_blueprint(api_bp)
+    app.register_blueprint(personalization_bp)
+    return app.test_client()
+
+
+def test_parse_target_id():
+    parse = PersonalizationService.parse_target_id
+    assert [parse(value) for value in (None, '', 0, '0', 7, '42', ' 42 ')] == [None, None, None, None, 7, 42, 42]
+    for bad in ('abc', '4.5', '-3', 4.5, True, [1], {'id': 1}, 'undefined'):
+        try:
+            parse(bad)
+            assert False, f"Accepted {bad!r}"
+        except ValueError:
+            pass
+
+
+def test_non_numeric_content_id_is_a_bad_request():
+    client = make_client()
+    interaction = {'fingerprint': 'abc', 'interaction_type': 'view', 'content_type': 'procedure'}
+    for content_id in ('rhinoplasty', '12abc', 'undefined'):
+        response = client.post('/api/track-interaction', json=dict(interaction, content_id=content_id))
+        assert response.status_code == 400, f"{content_id!r}: {response.status_code}"
+        assert response.get_json() == {'success': False, 'error': 'content_id must be an integer'}
+        response = client.post('/api/track-interaction', data=dict(interaction, content_id=content_id))
+        assert response.status_code == 400, "Form posts are validated too"
+
+    response = client.post('/api/personalization/track', json={'type': 'view', 'targetType': 'procedure',
+                                                               'targetId': 'nose-job'})
+    assert response.status_code == 400 and response.get_json()['success'] is False
+
+
+def main():
+    tests = [test_parse_target_id, test_non_numeric_content_id_is_a_bad_request]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
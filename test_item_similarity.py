@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Tests for the offline item similarity build and the memory-mapped lookup.
+
+    python test_item_similarity.py
+
+Builds neighbour records from hand-written documents and visitor histories,
+saves them to a scratch directory and reads them back through ModelHolder.
+"""
+
+import tempfile
+
+import numpy as np
+
+from item_similarity import ModelHolder, REBUILD_INTERVAL, build_neighbors, co_interaction, save_model
+
+DOCUMENTS = {
+    3: "Rhinoplasty nose reshaping surgery",
+    1: "Revision rhinoplasty nose surgery",
+    2: "Breast augmentation implants",
+    4: "Breast lift surgery implants",
+    5: "Hair transplant",
+}
+
+
+def test_text_neighbours_best_first():
+    records = build_neighbors(list(DOCUMENTS), list(DOCUMENTS.values()), k=3)
+    assert list(records['id']) == [1, 2, 3, 4, 5], "Records are sorted by id for binary search"
+    by_id = {int(r['id']): [int(n) for n in r['neighbors'] if n >= 0] for r in records}
+    assert by_id[3][0] == 1
+    assert by_id[2][0] == 4
+    assert 3 not in by_id[3], "An item is never its own neighbour"
+    assert by_id[5] == [], "Nothing shares a term with item 5"
+
+
+def test_co_interaction_links_unrelated_text():
+    visitors = {'a': [2, 5], 'b': [5, 2, 2], 'c': [5], 'd': [1]}
+    positions = {item_id: position for position, item_id in enumerate(DOCUMENTS)}
+    co_scores = co_interaction(visitors, positions)
+    assert co_scores[positions[5]][positions[2]] == 2 / np.sqrt(3 * 2)
+    assert positions[1] not in co_scores, "Pairs seen by fewer than MIN_CO_VISITORS are noise"
+
+    records = build_neighbors(list(DOCUMENTS), list(DOCUMENTS.values()), co_scores, k=3)
+    neighbors = records[records['id'] == 5]['neighbors'][0]
+    assert neighbors[0] == 2
+
+
+def test_mapped_lookup_and_reload():
+    folder = tempfile.mkdtemp()
+    holder = ModelHolder(folder)
+    holder.load()
+    assert holder.get('procedure') is None
+
+    save_model('procedure', build_neighbors(list(DOCUMENTS), list(DOCUMENTS.values()), k=3), folder)
+    holder.load()
+    model = holder.get('procedure')
+    assert isinstance(model.records, np.memmap)
+    assert model.related(3, 1)[0][0] == 1
+    assert model.related(42) == []
+
+
+def test_background_build_only_when_missing_or_old():
+    holder = ModelHolder(tempfile.mkdtemp())
+    holder.load()
+    assert holder.needs_build()
+    holder.maybe_rebuild()
+    assert holder._build_pid is None, "Nothing is built before init_app hands over the app"
+
+    for kind in ('procedure', 'package'):
+        save_model(kind, build_neighbors(list(DOCUMENTS), list(DOCUMENTS.values()), k=3), holder.folder)
+    holder.load()
+    assert not holder.needs_build()
+    for model in holder._models.values():
+        model.mtime -= REBUILD_INTERVAL + 1
+    assert holder.needs_build()
+
+
+def main():
+    tests = [test_text_neighbours_best_first, test_co_interaction_links_unrelated_text,
+             test_mapped_lookup_and_reload, test_background_build_only_when_missing_or_old]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
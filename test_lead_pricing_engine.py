@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the compiled lead pricing table.
+
+    python test_lead_pricing_engine.py              # correctness checks
+    python test_lead_pricing_engine.py --benchmark  # per-lookup and bulk pricing time
+
+The compiled table must price every value exactly like the tier scan it
+replaced in DynamicPricingService.calculate_lead_cost.
+"""
+
+import sys
+import time
+import random
+
+import numpy as np
+
+from lead_pricing_engine import PricingTable, FALLBACK_TABLE, parse_package_value
+
+TIERS = [
+    {'tier_name': 'Basic', 'min_package_value': 0, 'max_package_value': 4999, 'credit_cost': 100},
+    {'tier_name': 'Standard', 'min_package_value': 5000, 'max_package_value': 9999, 'credit_cost': 180},
+    {'tier_name': 'Plus', 'min_package_value': 10000, 'max_package_value': 19999, 'credit_cost': 250},
+    # Gap between 20,000 and 24,999
+    {'tier_name': 'Premium', 'min_package_value': 25000, 'max_package_value': 99999, 'credit_cost': 400},
+    {'tier_name': 'Luxury', 'min_package_value': 100000, 'max_package_value': None, 'credit_cost': 500},
+]
+
+
+def scan_cost(tiers, package_value):
+    """The linear scan previously done on every lead."""
+    for tier in sorted(tiers, key=lambda tier: tier['min_package_value']):
+        if tier['min_package_value'] <= package_value:
+            if tier['max_package_value'] is None or package_value <= tier['max_package_value']:
+                return tier['credit_cost']
+    return max(tiers, key=lambda tier: tier['min_package_value'])['credit_cost']
+
+
+def fallback_cost(package_value):
+    """The hard-coded pricing used when no tier is configured."""
+    if package_value <= 5000:
+        return 100
+    elif package_value <= 10000:
+        return 150
+    elif package_value <= 20000:
+        return 200
+    elif package_value <= 50000:
+        return 300
+    return 400
+
+
+def sample_values(count=5000):
+    rng = random.Random(0)
+    edges = [0, 4999, 5000, 9999, 10000, 19999, 20000, 24999, 25000, 99999, 100000, 5001, 10001, 50000, 50001]
+    return edges + [rng.randint(0, 300000) for _ in range(count)]
+
+
+def test_matches_tier_scan():
+    table = PricingTable(reversed(TIERS))  # Input order must not matter
+    for value in sample_values():
+        assert table.cost(value) == scan_cost(TIERS, value), value
+
+
+def test_gap_uses_highest_tier():
+    assert PricingTable(TIERS).cost(22000) == 500
+
+
+def test_fallback_matches_hardcoded_pricing():
+    for value in sample_values():
+        assert FALLBACK_TABLE.cost(value) == fallback_cost(value), value
+
+
+def test_vectorised_costs_match_scalar():
+    table = PricingTable(TIERS)
+    values = sample_values()
+    assert table.costs(values).tolist() == [table.cost(value) for value in values]
+
+
+def test_preview_default_for_uncovered_values():
+    proposed = PricingTable([{'tier_name': 'Mid', 'min_package_value': 5000,
+                              'max_package_value': 9999, 'credit_cost': 999}])
+    values = np.array([1000, 7000, 50000])
+    current = PricingTable(TIERS).costs(values)
+    assert proposed.costs(values, default=current).tolist() == [100, 999, 400]
+
+
+def test_parse_package_value():
+    assert parse_package_value('12,500') == 12500
+    assert parse_package_value('9999.7') == 9999
+    assert parse_package_value(None) == 0
+    assert parse_package_value('') == 0
+
+
+def benchmark(lookups=200000):
+    table = PricingTable(TIERS)
+    rng = random.Random(1)
+    values = [rng.randint(0, 300000) for _ in range(lookups)]
+
+    start = time.perf_counter()
+    for value in values:
+        scan_cost(TIERS, value)
+    scan_us = (time.perf_counter() - start) / lookups * 1e6
+
+    start = time.perf_counter()
+    for value in values:
+        table.cost(value)
+    table_us = (time.perf_counter() - start) / lookups * 1e6
+
+    start = time.perf_counter()
+    table.costs(values)
+    bulk_ms = (time.perf_counter() - start) * 1000
+
+    print(f"{len(TIERS)} tiers, {lookups:,} lookups")
+    print(f"  tier scan        {scan_us:6.2f} us/lead")
+    print(f"  compiled bisect  {table_us:6.2f} us/lead")
+    print(f"  vectorised bulk  {bulk_ms:6.1f} ms for all {lookups:,}")
+
+
+def main():
+    if '--benchmark' in sys.argv:
+        benchmark()
+        return
+
+    tests = [test_matches_tier_scan, test_gap_uses_highest_tier, test_fallback_matches_hardcoded_pricing,
+             test_vectorised_costs_match_scalar, test_preview_default_for_uncovered_values,
+             test_parse_package_value]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the package directory's keyset cursor and seeded shuffle.
+
+    python test_package_directory_query.py
+
+Pages are fetched from throwaway packages/clinics tables in SQLite, which
+supports the row comparison the cursor relies on; the seeded "mixed" and
+"newest" sort keys use PostgreSQL-only SQL, so those sorts are only checked
+through their cursors.
+"""
+
+import json
+import base64
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from package_directory_query import PackageDirectoryQuery, encode_cursor, decode_cursor
+
+
+def make_db():
+    session = Session(create_engine('sqlite://'))
+    session.execute(text("""CREATE TABLE clinics (id INTEGER PRIMARY KEY, name TEXT, city TEXT, state TEXT,
+                            contact_number TEXT, overall_rating REAL, total_reviews INTEGER)"""))
+    session.execute(text("""CREATE TABLE packages (id INTEGER PRIMARY KEY, clinic_id INTEGER, title TEXT,
+                            description TEXT, category TEXT, is_active BOOLEAN,
+                            price_actual NUMERIC, price_discounted NUMERIC)"""))
+    session.execute(text("INSERT INTO clinics VALUES (1, 'Glow', 'Mumbai', 'MH', '', 4.5, 10),"
+                         " (2, 'Skin', 'Pune', 'MH', '', NULL, 3), (3, 'Face', 'Delhi', 'DL', '', 4.5, NULL)"))
+    # Plenty of ties on every sort key, and an inactive package that must never show up
+    prices = [30000, 30000, None, 75000, 30000, 75000, 150000, None, 30000, 250000, 75000, 30000, 150000]
+    for package_id, price in enumerate(prices, start=1):
+        session.execute(text("INSERT INTO packages (id, clinic_id, title, is_active, price_actual, price_discounted)"
+                             " VALUES (:id, :clinic, :title, :active, :price, NULL)"),
+                        {'id': package_id, 'clinic': package_id % 3 + 1, 'title': f"Package {package_id}",
+                         'active': package_id != 6, 'price': price})
+    return SimpleNamespace(session=session)
+
+
+def all_pages(db, args, limit):
+    query = PackageDirectoryQuery(args)
+    ids, pages = [], 0
+    while True:
+        packages, cursor = query.fetch_page(db, limit=limit)
+        ids.extend(package['id'] for package in packages)
+        pages += 1
+        if not cursor:
+            return ids, pages
+        query = PackageDirectoryQuery(dict(args, cursor=cursor))
+
+
+def test_cursor_round_trips_decimal_and_timestamp_keys():
+    cursor = decode_cursor(encode_cursor('price_low', Decimal('49999.50'), 12, 'abc123'))
+    assert cursor == {'s': 'price_low', 'k': '49999.50', 'i': 12, 'seed': 'abc123'}
+    assert Decimal(cursor['k']) == Decimal('49999.50'), "Decimal keys stay exact"
+
+    created = datetime(2024, 3, 5, 10, 30, 15, 250000)
+    cursor = decode_cursor(encode_cursor('newest', created, 7, 'abc123'))
+    assert datetime.fromisoformat(cursor['k']) == created
+
+    for key in (None, 4.5, 10, 'a1b2'):
+        assert decode_cursor(encode_cursor('rating', key, 3, 's'))['k'] == key
+    assert '=' not in encode_cursor('rating', 4.5, 3, 'seed'), "Cursors are URL-safe without padding"
+
+
+def test_bad_or_tampered_cursors_rejected():
+    def forge(payload):
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    for cursor in (None, '', 'not-a-cursor', '!!!', base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+                   forge([1, 2]), forge({'s': 'rating', 'k': 4.5}), forge({'s': 'rating', 'k': 4.5, 'i': '3'}),
+                   forge({'s': 'rating', 'i': 3}), encode_cursor('rating', 4.5, 3, 's')[:-4]):
+        assert decode_cursor(cursor) is None, f"Accepted {cursor!r}"
+
+    query = PackageDirectoryQuery({'sort': 'rating', 'cursor': 'garbage'})
+    assert query.cursor is None, "A bad cursor starts from the first page"
+
+
+def test_cursor_reset_when_sort_changes():
+    cursor = encode_cursor('price_low', 30000, 5, 'abc')
+    assert PackageDirectoryQuery({'sort': 'price_low', 'cursor': cursor}).cursor['i'] == 5
+    assert PackageDirectoryQuery({'sort': 'price_high', 'cursor': cursor}).cursor is None
+    assert PackageDirectoryQuery({'cursor': cursor}).cursor is None, "No sort means the default mixed order"
+
+    query = PackageDirectoryQuery({'sort': 'bogus', 'cursor': encode_cursor('mixed', 'f00d', 5, 'abc')})
+    assert query.sort == 'mixed' and query.cursor['i'] == 5, "Unknown sorts fall back to mixed"
+
+
+def test_shuffle_seed_carried_over():
+    first = PackageDirectoryQuery({})
+    assert first.seed.isalnum() and len(first.seed) == 8
+
+    later = PackageDirectoryQuery({'cursor': encode_cursor('mixed', 'f00d', 5, first.seed), 'seed': 'other'})
+    assert later.seed == first.seed, "The cursor's seed wins so the shuffle continues"
+    assert PackageDirectoryQuery({'seed': 'abc123'}).seed == 'abc123'
+    for bad in ('x' * 17, 'a;drop', '../'):
+        assert PackageDirectoryQuery({'seed': bad}).seed != bad
+
+
+def test_keyset_pages_have_no_gaps_or_duplicates():
+    db = make_db()
+    for sort in ('price_low', 'price_high', 'rating', 'popularity'):
+        expected, pages = all_pages(db, {'sort': sort}, limit=50)
+        assert pages == 1 and len(expected) == 12 and 6 not in expected
+        for limit in (1, 2, 3, 5):
+            ids, pages = all_pages(db, {'sort': sort}, limit)
+            assert ids == expected, f"{sort} in pages of {limit}: {ids} != {expected}"
+            assert pages == -(-len(expected) // limit), "The last full page has no next cursor"
+
+    ids, _pages = all_pages(db, {'sort': 'price_low', 'price_range': '0-50000'}, limit=2)
+    assert ids == [3, 8, 1, 2, 5, 9, 12], "Filters apply on every page; NULL prices sort as 0"
+
+
+def main():
+    tests = [test_cursor_round_trips_decimal_and_timestamp_keys, test_bad_or_tampered_cursors_rejected,
+             test_cursor_reset_when_sort_changes, test_shuffle_seed_carried_over,
+             test_keyset_pages_have_no_gaps_or_duplicates]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
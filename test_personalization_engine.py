@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Tests for visitor interest profiles and feature-matrix scoring.
+
+    python test_personalization_engine.py
+
+Profiles are folded into a scratch SQLite ``visitor_profiles`` table (the
+upsert needs SQLite 3.24+); scoring runs on a hand-built ItemMatrix.
+"""
+
+import time
+
+from sqlalchemy import create_engine, text
+
+from personalization_engine import (
+    HALF_LIFE_SECONDS, ItemMatrix, Profile, keywords, load_profile, update_profiles
+)
+
+
+def test_decay_halves_weights_per_half_life():
+    profile = Profile()
+    profile.add(1000.0, 1.0, category_id=3, words=['rhinoplasty'])
+    profile.decay_to(1000.0 + HALF_LIFE_SECONDS)
+    assert abs(profile.categories[3] - 0.5) < 1e-9
+    assert abs(profile.keywords['rhinoplasty'] - 0.25) < 1e-9
+
+    profile.decay_to(0.0)  # Never moves backwards
+    assert abs(profile.categories[3] - 0.5) < 1e-9
+
+    profile.decay_to(1000.0 + 20 * HALF_LIFE_SECONDS)
+    assert not profile.compact(), "Weights below MIN_WEIGHT are pruned"
+
+
+def test_top_k_follows_profile_then_popularity():
+    matrix = ItemMatrix(
+        'procedure',
+        [10, 11, 12],
+        [([1], keywords('Rhinoplasty')), ([2], keywords('Breast Augmentation')), ([2], keywords('Breast Lift'))],
+        [5, 50, 100],
+        {10: {'id': 10}, 11: {'id': 11}, 12: {'id': 12}}
+    )
+    assert [item_id for item_id, _ in matrix.top_k(None, 2)] == [12, 11]
+
+    profile = Profile({1: 0.6}, {'rhinoplasty': 0.3}, time.time())
+    assert matrix.top_k(profile, 1)[0][0] == 10
+
+    profile = Profile({2: 0.4}, {'augmentation': 0.4}, time.time())
+    assert [item_id for item_id, _ in matrix.top_k(profile, 3)] == [11, 12, 10]
+
+    unknown = Profile({99: 1.0}, {'unrelated': 1.0}, time.time())
+    assert [item_id for item_id, _ in matrix.top_k(unknown, 3)] == [12, 11, 10]
+
+
+def test_profiles_update_incrementally():
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE visitor_profiles (
+                user_id VARCHAR(32) PRIMARY KEY, categories TEXT NOT NULL DEFAULT '{}',
+                keywords TEXT NOT NULL DEFAULT '{}', as_of DOUBLE PRECISION NOT NULL,
+                interactions INTEGER NOT NULL DEFAULT 0, updated_at TIMESTAMP
+            )
+        """))
+
+    now = time.time()
+    with engine.begin() as conn:
+        update_profiles(conn, [
+            ('42', now, 0.2, 3, ['rhinoplasty']),
+            ('42', now, 0.1, 3, []),
+            ('7', now, 0.1, None, ['botox']),
+        ], None)
+    with engine.begin() as conn:
+        update_profiles(conn, [('42', now, 0.3, 5, [])], None)
+
+    with engine.connect() as conn:
+        profile = load_profile(conn, '42', now)
+        assert profile.interactions == 3
+        assert abs(profile.categories[3] - 0.3) < 1e-6
+        assert abs(profile.categories[5] - 0.3) < 1e-6
+        assert abs(profile.keywords['rhinoplasty'] - 0.1) < 1e-6
+        assert load_profile(conn, '7', now).keywords == {'botox': 0.05}
+        assert load_profile(conn, 'missing', now) is None
+
+
+def main():
+    tests = [test_decay_halves_weights_per_half_life, test_top_k_follows_profile_then_popularity,
+             test_profiles_update_incrementally]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
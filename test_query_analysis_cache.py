@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for the AI query analysis cache.
+
+    python test_query_analysis_cache.py
+
+Checks the cache-key normalisation, the Jaccard similarity threshold and
+that a failing ai_query_analyses store is retried after a backoff instead
+of being given up on (against a scratch SQLite database), and that a
+worker waits out another worker's model call for the same query.
+"""
+
+import os
+import time
+import tempfile
+import threading
+
+from flask import Flask
+from sqlalchemy import text
+
+from app import db
+import cache_backend
+import query_analysis_cache
+from cache_backend import TieredCache, RedisTier, LocalRedis
+from query_analysis_cache import QueryAnalysisCache, SIMILARITY_THRESHOLD, NAMESPACE, jaccard, normalize_query
+
+
+def test_normalize_query_shares_keys():
+    assert normalize_query("Hair loss treatment") == ('hair', 'loss')
+    assert normalize_query("treatment for hair loss") == normalize_query("HAIR-LOSS!!  hair loss?")
+    assert normalize_query("I'm looking for 'laser' help with men's acne") == ('acne', 'laser', "men's")
+    assert normalize_query("What can I do?") == ('can', 'do', 'i', 'what'), "All stop words: keep them all"
+    assert normalize_query("") == normalize_query(None) == normalize_query("?!") == ()
+
+
+def test_jaccard_and_similarity_threshold():
+    assert jaccard(frozenset(), frozenset({'acne'})) == 0.0
+    assert jaccard(frozenset({'acne', 'scar'}), frozenset({'acne', 'scar'})) == 1.0
+    assert SIMILARITY_THRESHOLD == 0.75
+
+    analysis_cache = QueryAnalysisCache()
+    analysis_cache._remember('acne laser removal scar', frozenset({'acne', 'laser', 'removal', 'scar'}))
+    analysis_cache._remember('hair loss', frozenset({'hair', 'loss'}))
+    # 3 of 4 words shared: exactly at the threshold
+    assert analysis_cache._most_similar(frozenset(normalize_query("acne scar removal"))) == 'acne laser removal scar'
+    # 2 of 3 words shared: below it
+    assert analysis_cache._most_similar(frozenset(normalize_query("hair loss in men"))) is None
+    assert analysis_cache._most_similar(frozenset({'rhinoplasty'})) is None
+
+
+def test_store_retried_after_backoff():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'analyses.db')}"
+    db.init_app(app)
+    analysis_cache = QueryAnalysisCache(timeout=5)
+
+    def model_call(query_text):
+        return {'query': query_text}
+
+    with app.app_context():
+        # No ai_query_analyses table yet: served from memory, store skipped for the backoff
+        assert analysis_cache.analyze("backoff rhinoplasty", model_call, dict) == {'query': "backoff rhinoplasty"}
+        assert not analysis_cache._db_ready()
+
+        with db.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE ai_query_analyses (query_key TEXT PRIMARY KEY, analysis TEXT, "
+                              "created_at TIMESTAMP)"))
+        analysis_cache.analyze("backoff liposuction", model_call, dict)
+        assert analysis_cache._load('backoff liposuction') is None, "Still backing off"
+
+        analysis_cache._db_retry_at = 0.0  # Backoff elapsed
+        analysis_cache.analyze("backoff blepharoplasty", model_call, dict)
+        assert analysis_cache._load('backoff blepharoplasty') == {'query': "backoff blepharoplasty"}
+        assert analysis_cache._loaded, "Known queries load once the store is back"
+
+
+def test_other_worker_waits_for_model_budget():
+    shared = LocalRedis()
+    leader, follower = TieredCache(remote=RedisTier(shared)), TieredCache(remote=RedisTier(shared))
+    key = ' '.join(normalize_query("slow model rhinoplasty"))
+    analysis_cache = QueryAnalysisCache(timeout=1.0)
+    analysis_cache._loaded = True  # No store; the follower must not get that far anyway
+    model_calls = []
+
+    def model_call(query_text):
+        model_calls.append(query_text)
+        return {'from': 'follower'}
+
+    # The leading worker's model call takes longer than the generic cross-worker wait
+    assert leader.remote.acquire_lock(leader.full_key(NAMESPACE, key), 30)
+    publish = threading.Timer(0.5, lambda: leader.set(NAMESPACE, key, {'from': 'leader'}, ttl=60))
+    original_cache, original_wait = query_analysis_cache.cache, cache_backend.REMOTE_WAIT
+    query_analysis_cache.cache, cache_backend.REMOTE_WAIT = follower, 0.1
+    try:
+        publish.start()
+        start_time = time.perf_counter()
+        with Flask(__name__).app_context():
+            analysis = analysis_cache.analyze("slow model rhinoplasty", model_call, dict)
+        assert analysis == {'from': 'leader'} and model_calls == [], "Waited for the leader's result"
+        assert time.perf_counter() - start_time < 1.0
+    finally:
+        publish.join()
+        query_analysis_cache.cache, cache_backend.REMOTE_WAIT = original_cache, original_wait
+
+
+def main():
+    tests = [test_normalize_query_shares_keys, test_jaccard_and_similarity_threshold,
+             test_store_retried_after_backoff, test_other_worker_waits_for_model_budget]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
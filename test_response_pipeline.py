@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for the single-pass response pipeline.
+
+    python test_response_pipeline.py
+
+Builds a throwaway Flask app with the same stage registrations create_app
+uses and checks that each concern runs once, in order, with timings.
+"""
+
+import gzip
+
+from flask import Flask, session
+
+from response_pipeline import get_pipeline, register_stage, ORDER_SECURITY
+from security_headers import register_security_middleware, add_security_headers
+from server_performance_optimization import PerformanceOptimizationMiddleware
+from mobile_performance_optimizer import register_mobile_performance_optimization
+from compression_middleware import enable_compression
+
+PAGE = '<html><head></head><body>' + '<p>Rhinoplasty recovery tips</p>' * 100 + '</body></html>'
+IPHONE = 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) Mobile/15E148'
+
+
+def make_app():
+    app = Flask(__name__, static_folder=None)  # Keep the repo's static folder untouched
+    app.secret_key = 'test'
+    register_security_middleware(app)
+    PerformanceOptimizationMiddleware(app)
+    register_mobile_performance_optimization(app)
+    enable_compression(app)
+
+    @app.route('/page')
+    def page():
+        return PAGE
+
+    @app.route('/account')
+    def account():
+        session['seen'] = True
+        return PAGE
+
+    @app.route('/api/items', methods=['GET', 'POST'])
+    def items():
+        return {'items': [1, 2, 3]}
+
+    return app
+
+
+def test_stages_run_once_in_order():
+    app = make_app()
+    pipeline = get_pipeline(app)
+    assert [stage.name for stage in pipeline.stages] == ['security_headers', 'cache_policy', 'mobile_hints', 'compression']
+    # A second registration of the same concern is ignored
+    assert register_stage(app, 'security_headers', add_security_headers, ORDER_SECURITY) is False
+    assert len(app.after_request_funcs[None]) == 1
+
+    response = app.test_client().get('/page', headers={'Accept-Encoding': 'gzip', 'User-Agent': IPHONE})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data).decode() == PAGE  # Compressed once, body not rewritten
+    assert response.headers['X-Frame-Options'] == 'DENY'
+    assert response.headers['X-Mobile-Optimized'] == 'true'
+    assert 'Accept-Encoding' in response.vary
+    assert [entry.split(';')[0] for entry in response.headers['Server-Timing'].split(', ')] == \
+        ['security_headers', 'cache_policy', 'mobile_hints', 'compression', 'total']
+    assert response.headers['X-Response-Time'].endswith('ms')
+
+    stats = pipeline.stats()
+    assert stats['compression']['calls'] == 1 and stats['total']['calls'] == 1
+
+
+def test_cache_policy():
+    app = make_app()
+    client = app.test_client()
+
+    page = client.get('/page')
+    assert page.cache_control.public and page.cache_control.max_age == 60
+    api = client.get('/api/items')
+    assert api.cache_control.public and api.cache_control.max_age == 300
+    # Session-bound pages stay out of shared caches; writes are not cached at all
+    account = client.get('/account')
+    assert account.cache_control.private and not account.cache_control.public
+    assert 'Cache-Control' not in client.post('/api/items').headers
+
+
+def main():
+    tests = [test_stages_run_once_in_order, test_cache_policy]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            print(f"❌ {test.__name__}: {e}")
+    print(f"\n{passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Tests and benchmark for the full-text search engine.
+
+The unit tests need no database. The benchmark seeds a throwaway schema in the
+PostgreSQL database at DATABASE_URL and compares the previous ILIKE search
+with the ranked tsvector search:
+
+    DATABASE_URL=postgresql://... python test_search_engine.py --benchmark [rows]
+"""
+
+import os
+import sys
+import time
+import random
+import statistics
+
+from search_engine import build_tsquery, search_vector_ddl, SEARCH_DOCUMENTS, SearchResult
+
+
+def test_build_tsquery_prefix_matches_last_word():
+    assert build_tsquery('Botox') == 'botox:*'
+    assert build_tsquery('lip  fillers') == 'lip & fillers:*'
+
+
+def test_build_tsquery_strips_operators():
+    # tsquery syntax characters in user input must never reach to_tsquery
+    assert build_tsquery("nose & (job) | !x:*") == 'nose & job & x:*'
+    assert build_tsquery("'; DROP TABLE --") == 'drop & table:*'
+    assert build_tsquery('  ?!  ') is None
+
+
+def test_search_vector_ddl_covers_every_table():
+    ddl = search_vector_ddl()
+    for table in SEARCH_DOCUMENTS:
+        assert any(f"ALTER TABLE {table} " in s and 'GENERATED ALWAYS' in s for s in ddl)
+        assert any(f"ON {table} USING gin(search_vector)" in s for s in ddl)
+    # Titles must outweigh bodies
+    assert "'A')" in ddl[1] and "'C')" in ddl[1]
+
+
+def test_search_result_repr():
+    assert repr(SearchResult('doctor', 3, 0.5)) == '<SearchResult doctor:3 rank=0.5000>'
+
+
+# ---- benchmark ---------------------------------------------------------------
+
+WORDS = ("rhinoplasty botox filler laser hair transplant acne scar peel facelift liposuction "
+         "tummy tuck breast lift eyelid surgery chin implant skin glow pigmentation recovery "
+         "swelling bruising results cost clinic doctor consultation anaesthesia session").split()
+
+BENCHMARK_QUERIES = ['rhinoplasty', 'botox', 'hair transplant', 'scar', 'laser hair removal', 'recovery']
+
+
+def _sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n))
+
+
+def _seed(conn, rows, rng):
+    from sqlalchemy import text
+    conn.execute(text("""
+        CREATE TABLE procedures (id serial PRIMARY KEY, procedure_name text, alternative_names text,
+            short_description text, body_part text, overview text, procedure_details text);
+        CREATE TABLE doctors (id serial PRIMARY KEY, name text, specialty text, bio text, city text);
+        CREATE TABLE threads (id serial PRIMARY KEY, title text, content text, keywords text[]);
+        CREATE TABLE community (id serial PRIMARY KEY, title text, content text, tags text[], parent_id int);
+        CREATE TABLE clinics (id serial PRIMARY KEY, name text, area text, city text, description text,
+            is_approved boolean);
+        CREATE TABLE packages (id serial PRIMARY KEY, title text, category text, actual_treatment_name text,
+            description text, clinic_id int, is_active boolean);
+    """))
+    for table, columns, make in (
+        ('procedures', 'procedure_name, alternative_names, short_description, body_part, overview, procedure_details',
+         lambda i: (f"{_sentence(rng, 2)} {i}", _sentence(rng, 3), _sentence(rng, 12), rng.choice(WORDS),
+                    _sentence(rng, 300), _sentence(rng, 300))),
+        ('doctors', 'name, specialty, bio, city',
+         lambda i: (f"Doctor {i}", _sentence(rng, 2), _sentence(rng, 150), rng.choice(['Mumbai', 'Delhi', 'Pune']))),
+        ('threads', 'title, content, keywords',
+         lambda i: (_sentence(rng, 6), _sentence(rng, 200), _sentence(rng, 3).split())),
+        ('community', 'title, content, tags, parent_id',
+         lambda i: (_sentence(rng, 6), _sentence(rng, 200), _sentence(rng, 3).split(),
+                    rng.randint(1, i) if i > rows // 2 else None)),
+        ('clinics', 'name, area, city, description, is_approved',
+         lambda i: (f"Clinic {i}", rng.choice(WORDS), rng.choice(['Mumbai', 'Delhi']), _sentence(rng, 80), True)),
+        ('packages', 'title, category, actual_treatment_name, description, clinic_id, is_active',
+         lambda i: (_sentence(rng, 4), rng.choice(WORDS), rng.choice(WORDS), _sentence(rng, 120),
+                    rng.randint(1, rows), True)),
+    ):
+        names = [c.strip() for c in columns.split(',')]
+        params = [dict(zip(names, make(i))) for i in range(1, rows + 1)]
+        conn.execute(text(f"INSERT INTO {table} ({columns}) VALUES ({', '.join(':' + n for n in names)})"), params)
+
+
+LEGACY_QUERIES = {
+    'procedures': "SELECT id FROM procedures WHERE procedure_name ILIKE :p OR short_description ILIKE :p "
+                  "OR overview ILIKE :p OR procedure_details ILIKE :p OR body_part ILIKE :p LIMIT 20",
+    'doctors': "SELECT id FROM doctors WHERE name ILIKE :p OR specialty ILIKE :p OR bio ILIKE :p LIMIT 20",
+    'threads': "SELECT id FROM threads WHERE title ILIKE :p OR content ILIKE :p OR keywords::text ILIKE :p LIMIT 10",
+    'community': "SELECT id FROM community WHERE (title ILIKE :p OR content ILIKE :p OR tags::text ILIKE :p) "
+                 "AND parent_id IS NULL LIMIT 20",
+}
+
+FTS_QUERIES = {
+    table: f"SELECT t.id, ts_rank(t.search_vector, q.query) AS rank FROM {table} t, "
+           f"to_tsquery('english', :q) AS q(query) WHERE t.search_vector @@ q.query"
+           f"{' AND t.parent_id IS NULL' if table == 'community' else ''} ORDER BY rank DESC, t.id LIMIT 20"
+    for table in LEGACY_QUERIES
+}
+
+
+def _time_queries(conn, runs, run_one):
+    timings = []
+    for _ in range(runs):
+        for query in BENCHMARK_QUERIES:
+            start = time.perf_counter()
+            run_one(conn, query)
+            timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), sorted(timings)[int(len(timings) * 0.95) - 1]
+
+
+def run_benchmark(rows=20000, runs=5):
+    from sqlalchemy import create_engine, text
+
+    database_url = os.environ.get('DATABASE_URL', '')
+    if not database_url.startswith('postgres'):
+        print("❌ The benchmark needs a PostgreSQL DATABASE_URL")
+        return
+    engine = create_engine(database_url.replace('postgres://', 'postgresql://', 1))
+    rng = random.Random(42)
+
+    with engine.connect() as conn:
+        trans = conn.begin()
+        try:
+            conn.execute(text("CREATE SCHEMA search_benchmark; SET LOCAL search_path TO search_benchmark, public"))
+            print(f"🌱 Seeding {rows} rows per table...")
+            _seed(conn, rows, rng)
+            for statement in search_vector_ddl():
+                conn.execute(text(statement))  # Unqualified names land in search_benchmark
+            conn.execute(text("ANALYZE"))
+
+            def legacy(c, query):
+                # Previous implementation: ILIKE scans plus one reply COUNT per community thread
+                for sql in LEGACY_QUERIES.values():
+                    ids = [r.id for r in c.execute(text(sql), {'p': f"%{query}%"})]
+                for thread_id in ids:
+                    c.execute(text("SELECT COUNT(*) FROM community WHERE parent_id = :id"), {'id': thread_id}).scalar()
+
+            def fts(c, query):
+                for sql in FTS_QUERIES.values():
+                    ids = [r.id for r in c.execute(text(sql), {'q': build_tsquery(query)})]
+                if ids:
+                    c.execute(text("SELECT parent_id, COUNT(*) FROM community WHERE parent_id = ANY(:ids) "
+                                   "GROUP BY parent_id"), {'ids': ids}).fetchall()
+
+            legacy_median, legacy_p95 = _time_queries(conn, runs, legacy)
+            fts_median, fts_p95 = _time_queries(conn, runs, fts)
+            print(f"📊 ILIKE search:     median {legacy_median:8.2f}ms  p95 {legacy_p95:8.2f}ms")
+            print(f"📊 Full-text search: median {fts_median:8.2f}ms  p95 {fts_p95:8.2f}ms")
+            print(f"🚀 Speedup: {legacy_median / fts_median:.1f}x (median)")
+        finally:
+            trans.rollback()  # Drops the seeded schema
+
+
+def main():
+    """Run all tests."""
+    if '--benchmark' in sys.argv:
+        extra = [a for a in sys.argv[1:] if a.isdigit()]
+        run_benchmark(rows=int(extra[0]) if extra else 20000)
+        return
+    tests = [name for name in globals() if name.startswith('test_')]
+    passed = 0
+    for name in tests:
+        try:
+            globals()[name]()
+            print(f"✅ {name}")
+            passed += 1
+        except Exception as e:
+            print(f"❌ {name}: {e}")
+    print(f"📊 Test Results: {passed}/{len(tests)} tests passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ from sqlalchemy import desc, and_, or_, text, func
 from models import db, Clinic, Lead, User, Procedure, Category, Doctor
 from werkzeug.utils import secure_filename
 from google_places_service import google_places_service
+import clinic_rollups
 from datetime import datetime, timedelta
 import logging
 import json
@@ -63,59 +64,13 @@ def get_clinic_for_user(user_id):
         return None
 
 def get_dashboard_metrics(clinic_id):
-    """Get comprehensive dashboard metrics"""
+    """Get comprehensive dashboard metrics (one query over the daily rollups)"""
     try:
-        # Total leads
-        total_leads = db.session.execute(text("""
-            SELECT COUNT(*) FROM leads WHERE clinic_id = :clinic_id
-        """), {'clinic_id': clinic_id}).scalar() or 0
-        
-        # Pending leads
-        pending_leads = db.session.execute(text("""
-            SELECT COUNT(*) FROM leads 
-            WHERE clinic_id = :clinic_id AND status = 'new'
-        """), {'clinic_id': clinic_id}).scalar() or 0
-        
-        # Monthly leads
-        monthly_leads = db.session.execute(text("""
-            SELECT COUNT(*) FROM leads 
-            WHERE clinic_id = :clinic_id 
-            AND created_at >= date_trunc('month', CURRENT_DATE)
-        """), {'clinic_id': clinic_id}).scalar() or 0
-        
-        # Credit balance
-        credit_balance = db.session.execute(text("""
-            SELECT COALESCE(credit_balance, 0) FROM clinics WHERE id = :clinic_id
-        """), {'clinic_id': clinic_id}).scalar() or 0
-        
-        # Package count
-        package_count = db.session.execute(text("""
-            SELECT COUNT(*) FROM packages WHERE clinic_id = :clinic_id AND is_active = true
-        """), {'clinic_id': clinic_id}).scalar() or 0
-        
-        # Doctor count
-        doctor_count = db.session.execute(text("""
-            SELECT COUNT(*) FROM doctors WHERE clinic_id = :clinic_id
-        """), {'clinic_id': clinic_id}).scalar() or 0
-        
-        return {
-            'total_leads': total_leads,
-            'pending_leads': pending_leads,
-            'monthly_leads': monthly_leads,
-            'credit_balance': credit_balance,
-            'package_count': package_count,
-            'doctor_count': doctor_count
-        }
+        return clinic_rollups.get_dashboard_metrics(clinic_id)
     except Exception as e:
         logger.error(f"Error getting dashboard metrics: {e}")
-        return {
-            'total_leads': 0,
-            'pending_leads': 0,
-            'monthly_leads': 0,
-            'credit_balance': 0,
-            'package_count': 0,
-            'doctor_count': 0
-        }
+        db.session.rollback()
+        return dict(clinic_rollups.EMPTY_METRICS)
 
 # ============================================================================
 # MAIN DASHBOARD ROUTE
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Face Image Pipeline
+
+Decodes an uploaded face image once and shares the result with every stage
+of the face analysis flow. Without it the same upload was read from disk
+and decoded separately by validation, compression, landmark detection (twice,
+each with its own FaceMesh) and the Gemini base64 encoder.
+
+A ``FaceImage`` holds:
+
+- the raw file bytes (read once);
+- one RGB NumPy buffer at analysis resolution. Large JPEGs are decoded
+  directly at reduced scale via libjpeg DCT scaling, then resized once;
+- lazily, the grayscale buffer and the FaceMesh landmarks (one pass, on a
+  pooled graph from ``utils.face_mesh_pool``);
+- the JPEG that is saved as the "optimized" upload and sent to Gemini.
+
+The resize rule matches ``optimize_face_analysis_image``: images up to 3MB
+and 1200px wide are analysed as-is, larger ones at 1000px wide, so landmark
+coordinates always match the image that is stored and displayed.
+"""
+
+import io
+import os
+import math
+import logging
+import numpy as np
+from PIL import Image, ImageOps
+from typing import Dict, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+KEEP_MAX_BYTES = 3 * 1024 * 1024
+KEEP_MAX_WIDTH = 1200
+ANALYSIS_WIDTH = 1000
+JPEG_QUALITY = 90
+MIN_JPEG_QUALITY = 20
+
+EXIF_ORIENTATION = 0x0112
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)  # Width and height swap after exif_transpose
+
+def detect_landmarks_rgb(rgb_image: np.ndarray) -> Optional[Dict]:
+    """FaceMesh landmarks for an RGB buffer, on a graph from the shared pool."""
+    from .facial_landmarks import FacialLandmarkDetector
+    return FacialLandmarkDetector().detect_landmarks_rgb(rgb_image)
+
+
+class FaceImage:
+    """One uploaded face image, decoded once and shared by every analysis stage."""
+
+    def __init__(self, path: str, raw: bytes, rgb: np.ndarray, original_size, resized: bool):
+        self.path = path
+        self.raw = raw
+        self.rgb = rgb
+        self.original_size = original_size  # (width, height) after EXIF orientation
+        self.resized = resized
+        self._gray = None
+        self._landmarks = None
+        self._landmarks_done = False
+        self._jpeg = None
+
+    @classmethod
+    def open(cls, path: str) -> 'FaceImage':
+        with open(path, 'rb') as image_file:
+            raw = image_file.read()
+        return cls.from_bytes(raw, path)
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, path: Optional[str] = None) -> 'FaceImage':
+        image = Image.open(io.BytesIO(raw))
+        rotated = image.getexif().get(EXIF_ORIENTATION, 1) in ROTATED_ORIENTATIONS
+        stored_width, stored_height = image.size
+        original_size = (stored_height, stored_width) if rotated else (stored_width, stored_height)
+
+        resize = len(raw) > KEEP_MAX_BYTES or original_size[0] > KEEP_MAX_WIDTH
+        target_size = original_size
+        if resize:
+            target_size = (ANALYSIS_WIDTH, max(1, round(original_size[1] * ANALYSIS_WIDTH / original_size[0])))
+            # Let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of materialising the full image
+            scale = ANALYSIS_WIDTH / original_size[0]
+            image.draft('RGB', (math.ceil(stored_width * scale), math.ceil(stored_height * scale)))
+
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if image.size != target_size:
+            image = image.resize(target_size, Image.Resampling.LANCZOS)
+            logger.info(f"Decoded face image at {target_size[0]}x{target_size[1]} "
+                        f"(original {original_size[0]}x{original_size[1]})")
+
+        rgb = np.asarray(image)
+        return cls(path, raw, rgb, original_size, resize)
+
+    @property
+    def width(self) -> int:
+        return self.rgb.shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.rgb.shape[0]
+
+    @property
+    def gray(self) -> np.ndarray:
+        """Luma buffer (ITU-R 601, the same weights as cv2.COLOR_RGB2GRAY)."""
+        if self._gray is None:
+            self._gray = np.asarray(Image.fromarray(self.rgb).convert('L'))
+        return self._gray
+
+    @property
+    def landmarks(self) -> Optional[Dict]:
+        """``FacialLandmarkDetector`` output for this image; FaceMesh runs at most once."""
+        if not self._landmarks_done:
+            self._landmarks = detect_landmarks_rgb(self.rgb)
+            self._landmarks_done = True
+        return self._landmarks
+
+    def jpeg_bytes(self) -> bytes:
+        """Bytes to store and send to Gemini: the original file unless it was downsampled."""
+        if not self.resized:
+            return self.raw
+        if self._jpeg is None:
+            image = Image.fromarray(self.rgb)
+            quality = JPEG_QUALITY
+            while True:
+                buffer = io.BytesIO()
+                image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+                if buffer.tell() <= KEEP_MAX_BYTES or quality - 10 < MIN_JPEG_QUALITY:
+                    break
+                quality -= 10
+            self._jpeg = buffer.getvalue()
+        return self._jpeg
+
+    def save_optimized(self) -> str:
+        """Write the downsampled JPEG next to the upload; returns the path to analyse and display."""
+        if not self.resized or not self.path:
+            return self.path
+        base, ext = os.path.splitext(self.path)
+        output_path = f"{base}_optimized{ext}"
+        with open(output_path, 'wb') as output_file:
+            output_file.write(self.jpeg_bytes())
+        logger.info(f"Optimized image: {self.width}x{self.height}, {len(self.jpeg_bytes())/1024/1024:.1f}MB")
+        self.path = output_path
+        return output_path
+
+    def positioning(self) -> Dict:
+        """Smart positioning feedback computed from the already detected landmarks."""
+        from .smart_positioning import SmartFacePositioning
+        return SmartFacePositioning().analyze_landmarks(self.landmarks)
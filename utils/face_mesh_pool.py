@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Face Mesh Pool
+
+Loading a MediaPipe FaceMesh graph costs a model load plus tens of MB per
+instance, and a graph must not be used by two threads at once. Instead of
+every detector or positioning object building its own, the face modules
+check graphs out of two per-process pools:
+
+- ``static_face_meshes``: still images (uploads), used by
+  ``FacialLandmarkDetector`` and through it validation, geometric analysis
+  and ``FaceImage.landmarks``;
+- ``stream_face_meshes``: video frames, used by ``SmartFacePositioning``.
+  Graphs keep tracking state between frames, so a graph reused for another
+  stream simply re-detects on its first frame.
+
+Graphs are created lazily up to ``FACE_MESH_POOL_SIZE`` per pool and kept
+for the life of the process. ``warm_up()`` builds and primes graphs in both
+pools ahead of the first request: face analysis workers call it at boot,
+web workers through ``warm_up_in_background()`` on their first face analysis
+request. A checkout
+that waits longer than ``FACE_MESH_CHECKOUT_TIMEOUT`` seconds raises
+``TimeoutError``. ``stats()`` reports checkout wait times per pool.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, ExitStack
+from typing import Dict
+
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.environ.get('FACE_MESH_POOL_SIZE', 2))
+CHECKOUT_TIMEOUT = float(os.environ.get('FACE_MESH_CHECKOUT_TIMEOUT', 30))
+WARMUP_GRAPHS = int(os.environ.get('FACE_MESH_WARMUP', 1))
+STREAM_WARMUP_GRAPHS = int(os.environ.get('FACE_MESH_STREAM_WARMUP', 1))
+WAIT_SAMPLES = 1000
+
+STATIC_OPTIONS = {
+    'static_image_mode': True,
+    'max_num_faces': 1,
+    'refine_landmarks': True,
+    'min_detection_confidence': 0.5,
+}
+
+STREAM_OPTIONS = {
+    'static_image_mode': False,  # For video stream
+    'max_num_faces': 1,
+    'refine_landmarks': True,
+    'min_detection_confidence': 0.7,
+    'min_tracking_confidence': 0.5,
+}
+
+
+def _face_mesh_module():
+    import mediapipe as mp
+    try:
+        return mp.solutions.face_mesh
+    except AttributeError:
+        # Fallback for different MediaPipe versions
+        import mediapipe.python.solutions.face_mesh as mp_face_mesh
+        return mp_face_mesh
+
+
+class FaceMeshPool:
+    """Thread-safe, lazily filled pool of identical FaceMesh graphs."""
+
+    def __init__(self, name: str, options: Dict, size: int = POOL_SIZE, timeout: float = CHECKOUT_TIMEOUT,
+                 factory=None):
+        self.name = name
+        self.options = options
+        self.factory = factory  # Builds a graph from the options; MediaPipe's FaceMesh by default
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._pid = None
+        self._idle = []
+        self._created = 0
+        self.counters = {'checkouts': 0, 'waited': 0, 'timeouts': 0, 'created': 0, 'errors': 0}
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._load_ms = deque(maxlen=self.size)
+
+    def _reset_if_forked(self):
+        # MediaPipe graphs do not survive a fork; each process builds its own
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._created = 0
+
+    def _create(self):
+        start_time = time.perf_counter()
+        factory = self.factory or _face_mesh_module().FaceMesh
+        face_mesh = factory(**self.options)
+        load_ms = (time.perf_counter() - start_time) * 1000
+        self._load_ms.append(load_ms)
+        logger.info(f"Loaded {self.name} FaceMesh graph in {load_ms:.0f}ms")
+        return face_mesh
+
+    @contextmanager
+    def checkout(self):
+        """Borrow a graph for the duration of the block."""
+        start_time = time.perf_counter()
+        deadline = start_time + self.timeout
+        face_mesh = None
+        with self._cond:
+            self._reset_if_forked()
+            waited = False
+            while not self._idle and self._created >= self.size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self.counters['timeouts'] += 1
+                    raise TimeoutError(f"No {self.name} FaceMesh graph free after {self.timeout:g}s")
+                waited = True
+                self._cond.wait(remaining)
+            if self._idle:
+                face_mesh = self._idle.pop()
+            else:
+                self._created += 1  # Reserve the slot; the graph is built outside the lock
+            self.counters['checkouts'] += 1
+            self.counters['waited'] += waited
+            self._waits.append((time.perf_counter() - start_time) * 1000)
+
+        if face_mesh is None:
+            try:
+                face_mesh = self._create()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self.counters['errors'] += 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self.counters['created'] += 1
+
+        try:
+            yield face_mesh
+        finally:
+            with self._cond:
+                if self._pid == os.getpid():
+                    self._idle.append(face_mesh)
+                    self._cond.notify()
+
+    def warm_up(self, count: int = 1) -> int:
+        """Build and prime at least ``count`` graphs now; returns how many exist."""
+        blank = np.zeros((192, 192, 3), dtype=np.uint8)
+        with ExitStack() as stack:
+            # Holding them all at once forces the pool to build any that are missing
+            for _ in range(min(count, self.size)):
+                face_mesh = stack.enter_context(self.checkout())
+                face_mesh.process(blank)  # The first process() call initialises the calculators
+        return self._created
+
+    def stats(self) -> Dict:
+        with self._cond:
+            stats = dict(self.counters)
+            alive = self._pid == os.getpid()
+            stats.update(size=self.size,
+                         graphs=self._created if alive else 0,
+                         idle=len(self._idle) if alive else 0)
+            waits = sorted(self._waits)
+        stats['in_use'] = stats['graphs'] - stats['idle']
+        stats['wait_ms'] = _percentiles(waits)
+        stats['load_ms'] = [round(ms, 1) for ms in self._load_ms]
+        return stats
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': 0.0, 'p95': 0.0, 'max': 0.0, 'samples': 0}
+    return {
+        'p50': round(values[len(values) // 2], 2),
+        'p95': round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+        'max': round(values[-1], 2),
+        'samples': len(values),
+    }
+
+
+def warm_up(count: int = WARMUP_GRAPHS, stream_count: int = STREAM_WARMUP_GRAPHS):
+    """Prime both pools so the first upload or video frame skips the model load."""
+    for pool, graphs in ((static_face_meshes, count), (stream_face_meshes, stream_count)):
+        if graphs <= 0:
+            continue
+        try:
+            pool.warm_up(graphs)
+        except Exception as e:
+            logger.warning(f"{pool.name} FaceMesh warm-up failed, graphs will load on first use: {e}")
+
+
+_warm_up_pid = None
+_warm_up_lock = threading.Lock()
+
+
+def warm_up_in_background():
+    """Run ``warm_up()`` on a daemon thread, once per process; cheap to call on every request."""
+    global _warm_up_pid
+    if _warm_up_pid == os.getpid():
+        return
+    with _warm_up_lock:
+        if _warm_up_pid == os.getpid():
+            return
+        _warm_up_pid = os.getpid()
+    threading.Thread(target=warm_up, name='face-mesh-warm-up', daemon=True).start()
+
+
+def stats() -> Dict:
+    return {'pid': os.getpid(), 'static': static_face_meshes.stats(), 'stream': stream_face_meshes.stats()}
+
+
+static_face_meshes = FaceMeshPool('static', STATIC_OPTIONS)
+stream_face_meshes = FaceMeshPool('stream', STREAM_OPTIONS)
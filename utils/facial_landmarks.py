@@ -12,6 +12,7 @@ import mediapipe as mp
 import numpy as np
 import logging
 from typing import Dict, List, Tuple, Optional
+from .face_mesh_pool import static_face_meshes
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -21,18 +22,34 @@ mp_face_mesh = mp.solutions.face_mesh
 mp_drawing = mp.solutions.drawing_utils
 mp_drawing_styles = mp.solutions.drawing_styles
 
+LANDMARK_COUNT = 478  # Face Mesh with refine_landmarks (468 mesh points + 10 iris points)
+
+
+def landmarks_to_array(landmarks: Dict) -> np.ndarray:
+    """
+    Pack a landmark dict into a (LANDMARK_COUNT, 3) float32 array of x, y, z.
+    
+    Accepts the detector's int keys as well as the string keys of landmarks
+    read back from stored JSON analyses; missing points are NaN.
+    """
+    points = np.full((LANDMARK_COUNT, 3), np.nan, dtype=np.float32)
+    for idx, point in landmarks.items():
+        idx = int(idx)
+        if 0 <= idx < LANDMARK_COUNT:
+            points[idx] = (point['x'], point['y'], point.get('z', 0.0))
+    return points
+
+
+def array_to_landmarks(points: np.ndarray) -> Dict:
+    """Inverse of landmarks_to_array: {index: {'x', 'y', 'z'}} for present points."""
+    return {idx: {'x': float(x), 'y': float(y), 'z': float(z)}
+            for idx, (x, y, z) in enumerate(points.tolist()) if x == x}
+
 class FacialLandmarkDetector:
     """Facial landmark detection using MediaPipe Face Mesh."""
     
     def __init__(self):
-        """Initialize the facial landmark detector."""
-        self.face_mesh = mp_face_mesh.FaceMesh(
-            static_image_mode=True,
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5
-        )
-        
+        """Initialize the facial landmark detector (FaceMesh graphs come from utils.face_mesh_pool)."""
         # Key facial landmark indices for analysis
         self.landmark_indices = {
             # Face outline (jaw line and forehead)
@@ -77,21 +94,32 @@ class FacialLandmarkDetector:
         Returns:
             Dictionary containing normalized landmark coordinates and metadata
         """
-        try:
-            # Read and process image
-            image = cv2.imread(image_path)
-            if image is None:
-                logger.error(f"Could not read image: {image_path}")
-                return None
-            
-            # Convert BGR to RGB
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        # Read and process image
+        image = cv2.imread(image_path)
+        if image is None:
+            logger.error(f"Could not read image: {image_path}")
+            return None
+        
+        # Convert BGR to RGB
+        return self.detect_landmarks_rgb(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    
+    def detect_landmarks_rgb(self, rgb_image: np.ndarray) -> Optional[Dict]:
+        """
+        Detect facial landmarks in an already decoded RGB image.
+        
+        Args:
+            rgb_image: HxWx3 uint8 RGB array (see utils.face_image_pipeline)
             
+        Returns:
+            Same structure as detect_landmarks()
+        """
+        try:
             # Get image dimensions
-            height, width = image.shape[:2]
+            height, width = rgb_image.shape[:2]
             
             # Process image with MediaPipe
-            results = self.face_mesh.process(rgb_image)
+            with static_face_meshes.checkout() as face_mesh:
+                results = face_mesh.process(rgb_image)
             
             if not results.multi_face_landmarks:
                 logger.warning("No face detected in image")
@@ -100,17 +128,13 @@ class FacialLandmarkDetector:
             # Extract landmarks (use first face if multiple detected)
             face_landmarks = results.multi_face_landmarks[0]
             
-            # Convert normalized coordinates to pixel coordinates
-            landmarks = {}
-            for idx, landmark in enumerate(face_landmarks.landmark):
-                landmarks[idx] = {
-                    'x': landmark.x * width,
-                    'y': landmark.y * height,
-                    'z': landmark.z * width  # Relative depth
-                }
+            # Convert normalized coordinates to pixel coordinates (z is relative depth, scaled like x)
+            points = np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks.landmark], dtype=np.float32)
+            points *= np.array([width, height, width], dtype=np.float32)
+            landmarks = array_to_landmarks(points)
             
             # Calculate additional metrics
-            face_bounds = self._calculate_face_bounds(landmarks)
+            face_bounds = self._calculate_face_bounds(points)
             face_center = self._calculate_face_center(landmarks)
             
             return {
@@ -126,18 +150,18 @@ class FacialLandmarkDetector:
             logger.error(f"Error detecting landmarks: {e}")
             return None
     
-    def _calculate_face_bounds(self, landmarks: Dict) -> Dict:
-        """Calculate bounding box of the face."""
-        x_coords = [point['x'] for point in landmarks.values()]
-        y_coords = [point['y'] for point in landmarks.values()]
+    def _calculate_face_bounds(self, points: np.ndarray) -> Dict:
+        """Calculate bounding box of the face from an (N, 3) landmark array."""
+        min_x, min_y = np.nanmin(points[:, :2], axis=0).tolist()
+        max_x, max_y = np.nanmax(points[:, :2], axis=0).tolist()
         
         return {
-            'min_x': min(x_coords),
-            'max_x': max(x_coords),
-            'min_y': min(y_coords),
-            'max_y': max(y_coords),
-            'width': max(x_coords) - min(x_coords),
-            'height': max(y_coords) - min(y_coords)
+            'min_x': min_x,
+            'max_x': max_x,
+            'min_y': min_y,
+            'max_y': max_y,
+            'width': max_x - min_x,
+            'height': max_y - min_y
         }
     
     def _calculate_face_center(self, landmarks: Dict) -> Dict:
@@ -54,13 +54,14 @@ def encode_image_to_base64(image_path):
         logger.error(f"Error encoding image: {e}")
         return None
 
-def analyze_face_image(image_path, user_info=None):
+def analyze_face_image(image_path, user_info=None, image_bytes=None):
     """
     Analyze a facial image using Google's Gemini Pro Vision model.
     
     Args:
         image_path: Path to the facial image
         user_info: Optional dictionary containing user information like age, concerns, etc.
+        image_bytes: JPEG bytes already in memory (FaceImage.jpeg_bytes()); read from image_path if omitted
         
     Returns:
         Dictionary containing analysis results and recommendations
@@ -75,13 +76,16 @@ def analyze_face_image(image_path, user_info=None):
             return {"error": "API key not configured. Contact the administrator."}
             
         # Check if the image file exists
-        if not os.path.exists(image_path):
+        if image_bytes is None and not os.path.exists(image_path):
             logger.error(f"Image file does not exist: {image_path}")
             return {"error": "Image file not found"}
             
         # Encode the image to base64
         logger.info("Encoding image to base64")
-        encoded_image = encode_image_to_base64(image_path)
+        if image_bytes is not None:
+            encoded_image = base64.b64encode(image_bytes).decode('utf-8')
+        else:
+            encoded_image = encode_image_to_base64(image_path)
         if not encoded_image:
             logger.error("Failed to encode image to base64")
             return {"error": "Failed to encode image"}
@@ -299,20 +303,23 @@ def extract_recommendations(analysis_result):
     
     return recommendations
 
-def analyze_face_image_enhanced(image_path, user_info=None):
+def analyze_face_image_enhanced(image_path, user_info=None, face_image=None):
     """
     Enhanced facial image analysis combining Gemini AI with geometric analysis.
     
     Args:
         image_path: Path to the facial image
         user_info: Optional dictionary containing user information
+        face_image: The upload already decoded by utils.face_image_pipeline;
+            its bytes go to Gemini and its landmarks to the geometric analysis
         
     Returns:
         Dictionary containing comprehensive analysis results
     """
     try:
         # Perform Gemini AI analysis
-        gemini_result = analyze_face_image(image_path, user_info)
+        image_bytes = face_image.jpeg_bytes() if face_image is not None else None
+        gemini_result = analyze_face_image(image_path, user_info, image_bytes=image_bytes)
         
         # Import geometric analyzer (avoid circular imports)
         try:
@@ -321,7 +328,8 @@ def analyze_face_image_enhanced(image_path, user_info=None):
             
             # Perform geometric analysis
             geometric_analyzer = FacialGeometricAnalyzer()
-            geometric_result = geometric_analyzer.analyze_face(image_path)
+            landmarks_data = face_image.landmarks if face_image is not None else None
+            geometric_result = geometric_analyzer.analyze_face(image_path, landmarks_data=landmarks_data)
             
             # Generate visualization data
             viz_generator = FacialVisualizationGenerator()
@@ -11,43 +11,119 @@ other geometric measurements for aesthetic assessment.
 import numpy as np
 import logging
 from typing import Dict, List, Tuple, Optional
-from .facial_landmarks import FacialLandmarkDetector
+from .facial_landmarks import landmarks_to_array
+from .face_image_pipeline import FaceImage
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Named Face Mesh landmark groups used by the metrics
+GOLDEN_RATIO_MEASUREMENTS = (
+    'face_length_to_width',
+    'interpupillary_to_eye_width',
+    'mouth_to_nose_width',
+    'face_to_eye_mouth_distance',
+)
+FIFTHS_POINTS = np.array([234, 33, 133, 362, 263, 454])  # Face edge, eye corners, face edge
+SYMMETRY_PAIRS = np.array([
+    (33, 362),    # Inner eye corners
+    (133, 263),   # Outer eye corners
+    (61, 291),    # Mouth corners
+    (234, 454),   # Face edges
+    (205, 425),   # Cheekbone points
+    (172, 397),   # Jaw points
+    (46, 276),    # Eyebrow points
+])
+NEOCLASSICAL_CANONS = (
+    ('eye_separation_to_width', 1.0),
+    ('nose_width_to_eye_width', 1.0),
+    ('mouth_width_to_nose_width', 1.5),
+    ('face_width_to_nose_width', 4.0),
+)
+OGEE_POINTS = np.array([(205, 172), (425, 397)])  # (cheekbone, jaw) for left and right
+
+
+def stack_landmarks(landmark_sets: List[Dict]) -> np.ndarray:
+    """(B, N, 3) float32 batch from landmark dicts, e.g. stored landmarks_data['landmarks']."""
+    return np.stack([landmarks_to_array(landmarks) for landmarks in landmark_sets])
+
+
+def _as_batch(landmarks) -> np.ndarray:
+    """Accept a landmark dict, an (N, 3) array or a (B, N, 3) batch."""
+    if isinstance(landmarks, dict):
+        landmarks = landmarks_to_array(landmarks)
+    points = np.asarray(landmarks, dtype=np.float32)
+    return points[None] if points.ndim == 2 else points
+
+
+def _scalar(values: np.ndarray) -> float:
+    value = float(values[0])
+    if np.isnan(value):
+        raise ValueError("Required landmarks are missing")
+    return value
+
+
+def _distance(points: np.ndarray, a, b) -> np.ndarray:
+    """2D Euclidean distance between landmark(s) a and b for every face in the batch."""
+    return np.linalg.norm(points[:, a, :2] - points[:, b, :2], axis=-1)
+
+
+def _safe_ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """numerator / denominator, 0 where the denominator is not positive."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / denominator,
+                        np.where(np.isnan(denominator), np.nan, 0))
+
+
+def _ratio_scores(measured: np.ndarray, ideal) -> np.ndarray:
+    """How close measured ratios are to the ideal, 0-100."""
+    return np.clip(100 - np.abs(measured - ideal) / ideal * 100, 0, 100)
+
+
 class FacialGeometricAnalyzer:
     """Comprehensive geometric analysis of facial features."""
     
     def __init__(self):
         """Initialize the geometric analyzer."""
-        self.landmark_detector = FacialLandmarkDetector()
-        
         # Golden ratio constant
         self.golden_ratio = 1.618
         
         # Ideal facial proportions
         self.ideal_thirds = [33.33, 33.33, 33.33]  # Upper, middle, lower thirds
         self.ideal_fifths = [20.0, 20.0, 20.0, 20.0, 20.0]  # Five equal horizontal sections
+        
+        # Weighted scoring for overall harmony (weights sum to 1.0)
+        self.harmony_weights = {
+            'golden_ratio': 0.25,
+            'facial_thirds': 0.20,
+            'facial_fifths': 0.15,
+            'symmetry': 0.25,
+            'neoclassical_canons': 0.10,
+            'ogee_curve': 0.05
+        }
     
-    def analyze_face(self, image_path: str) -> Dict:
+    def analyze_face(self, image_path: str, landmarks_data: Optional[Dict] = None) -> Dict:
         """
         Perform comprehensive geometric analysis of a face.
         
         Args:
             image_path: Path to the facial image
+            landmarks_data: Landmarks already detected for this image
+                (FaceImage.landmarks); detected from image_path if omitted
             
         Returns:
             Dictionary containing all geometric analysis results
         """
         try:
             # Detect facial landmarks
-            landmarks_data = self.landmark_detector.detect_landmarks(image_path)
+            if landmarks_data is None:
+                landmarks_data = FaceImage.open(image_path).landmarks
             
             if not landmarks_data:
                 return {'error': 'Could not detect facial landmarks'}
             
-            landmarks = landmarks_data['landmarks']
+            # One (1, N, 3) array shared by every metric
+            landmarks = landmarks_to_array(landmarks_data['landmarks'])[None]
             
             # Perform all geometric analyses
             results = {
@@ -71,7 +147,7 @@ class FacialGeometricAnalyzer:
             logger.error(f"Error in geometric analysis: {e}")
             return {'error': f'Analysis failed: {str(e)}'}
     
-    def calculate_golden_ratio_score(self, landmarks: Dict) -> Dict:
+    def calculate_golden_ratio_score(self, landmarks) -> Dict:
         """
         Calculate golden ratio adherence score.
         
@@ -79,74 +155,16 @@ class FacialGeometricAnalyzer:
         We analyze multiple facial ratios and compare them to the golden ratio.
         """
         try:
-            # Key measurements for golden ratio analysis
-            measurements = {}
-            
-            # 1. Face length to width ratio
-            # Face length: forehead to chin
-            forehead_point = landmarks[10]  # Top of forehead
-            chin_point = landmarks[18]  # Bottom of chin
-            face_length = self.landmark_detector.calculate_distance(forehead_point, chin_point)
+            metrics = self._golden_ratio_arrays(_as_batch(landmarks))
+            overall_score = _scalar(metrics['overall'])
             
-            # Face width: left to right cheekbone
-            left_cheek = landmarks[234]
-            right_cheek = landmarks[454]
-            face_width = self.landmark_detector.calculate_distance(left_cheek, right_cheek)
-            
-            face_ratio = face_length / face_width if face_width > 0 else 0
-            measurements['face_length_to_width'] = {
-                'ratio': face_ratio,
-                'ideal': self.golden_ratio,
-                'score': self._calculate_ratio_score(face_ratio, self.golden_ratio)
-            }
-            
-            # 2. Eye width to interpupillary distance
-            left_eye_inner = landmarks[133]
-            left_eye_outer = landmarks[33]
-            right_eye_inner = landmarks[362]
-            right_eye_outer = landmarks[263]
-            
-            eye_width = self.landmark_detector.calculate_distance(left_eye_inner, left_eye_outer)
-            interpupillary_distance = self.landmark_detector.calculate_distance(left_eye_inner, right_eye_inner)
-            
-            eye_ratio = interpupillary_distance / eye_width if eye_width > 0 else 0
-            measurements['interpupillary_to_eye_width'] = {
-                'ratio': eye_ratio,
-                'ideal': self.golden_ratio,
-                'score': self._calculate_ratio_score(eye_ratio, self.golden_ratio)
-            }
-            
-            # 3. Mouth width to nose width
-            mouth_left = landmarks[61]
-            mouth_right = landmarks[291]
-            nose_left = landmarks[220]
-            nose_right = landmarks[305]
-            
-            mouth_width = self.landmark_detector.calculate_distance(mouth_left, mouth_right)
-            nose_width = self.landmark_detector.calculate_distance(nose_left, nose_right)
-            
-            mouth_nose_ratio = mouth_width / nose_width if nose_width > 0 else 0
-            measurements['mouth_to_nose_width'] = {
-                'ratio': mouth_nose_ratio,
-                'ideal': self.golden_ratio,
-                'score': self._calculate_ratio_score(mouth_nose_ratio, self.golden_ratio)
-            }
-            
-            # 4. Face length to eye-mouth distance
-            eye_center = self.landmark_detector.calculate_midpoint(left_eye_inner, right_eye_inner)
-            mouth_center = self.landmark_detector.calculate_midpoint(mouth_left, mouth_right)
-            eye_mouth_distance = self.landmark_detector.calculate_distance(eye_center, mouth_center)
-            
-            face_eye_mouth_ratio = face_length / eye_mouth_distance if eye_mouth_distance > 0 else 0
-            measurements['face_to_eye_mouth_distance'] = {
-                'ratio': face_eye_mouth_ratio,
-                'ideal': self.golden_ratio,
-                'score': self._calculate_ratio_score(face_eye_mouth_ratio, self.golden_ratio)
-            }
-            
-            # Calculate overall golden ratio score
-            scores = [m['score'] for m in measurements.values()]
-            overall_score = sum(scores) / len(scores) if scores else 0
+            measurements = {}
+            for j, name in enumerate(GOLDEN_RATIO_MEASUREMENTS):
+                measurements[name] = {
+                    'ratio': float(metrics['ratios'][0, j]),
+                    'ideal': self.golden_ratio,
+                    'score': float(metrics['scores'][0, j])
+                }
             
             return {
                 'overall_score': round(overall_score, 1),
@@ -158,7 +176,7 @@ class FacialGeometricAnalyzer:
             logger.error(f"Error calculating golden ratio score: {e}")
             return {'error': str(e)}
     
-    def calculate_facial_thirds(self, landmarks: Dict) -> Dict:
+    def calculate_facial_thirds(self, landmarks) -> Dict:
         """
         Calculate facial thirds proportion analysis.
         
@@ -168,49 +186,22 @@ class FacialGeometricAnalyzer:
         3. Nose base to chin (lower third)
         """
         try:
-            # Key reference points
-            # Approximate hairline (extend above forehead)
-            forehead_point = landmarks[10]
-            eyebrow_point = landmarks[9]  # Between eyebrows
-            nose_base = landmarks[2]  # Nose base
-            chin_point = landmarks[18]  # Chin bottom
-            
-            # Estimate hairline position (typically 1.2-1.3 times forehead height above eyebrows)
-            forehead_eyebrow_distance = self.landmark_detector.calculate_distance(forehead_point, eyebrow_point)
-            hairline_y = forehead_point['y'] - (forehead_eyebrow_distance * 0.3)
-            hairline_point = {'x': forehead_point['x'], 'y': hairline_y}
-            
-            # Calculate the three sections
-            upper_third = abs(hairline_point['y'] - eyebrow_point['y'])
-            middle_third = abs(eyebrow_point['y'] - nose_base['y'])
-            lower_third = abs(nose_base['y'] - chin_point['y'])
-            
-            total_height = upper_third + middle_third + lower_third
-            
-            # Calculate percentages
-            if total_height > 0:
-                upper_percentage = (upper_third / total_height) * 100
-                middle_percentage = (middle_third / total_height) * 100
-                lower_percentage = (lower_third / total_height) * 100
-            else:
-                upper_percentage = middle_percentage = lower_percentage = 0
-            
-            proportions = [upper_percentage, middle_percentage, lower_percentage]
-            
-            # Calculate deviation from ideal
-            deviation_score = self._calculate_proportion_deviation(proportions, self.ideal_thirds)
+            metrics = self._proportion_arrays(_as_batch(landmarks), 'thirds')
+            deviation_score = _scalar(metrics['deviation'])
+            sections = metrics['sections'][0].tolist()
+            percentages = metrics['percentages'][0].tolist()
             
             return {
                 'proportions': {
-                    'upper_third': round(upper_percentage, 1),
-                    'middle_third': round(middle_percentage, 1),
-                    'lower_third': round(lower_percentage, 1)
+                    'upper_third': round(percentages[0], 1),
+                    'middle_third': round(percentages[1], 1),
+                    'lower_third': round(percentages[2], 1)
                 },
                 'measurements': {
-                    'upper_third_px': round(upper_third, 1),
-                    'middle_third_px': round(middle_third, 1),
-                    'lower_third_px': round(lower_third, 1),
-                    'total_height_px': round(total_height, 1)
+                    'upper_third_px': round(sections[0], 1),
+                    'middle_third_px': round(sections[1], 1),
+                    'lower_third_px': round(sections[2], 1),
+                    'total_height_px': round(sum(sections), 1)
                 },
                 'deviation_score': round(deviation_score, 1),
                 'interpretation': self._interpret_thirds_score(deviation_score)
@@ -220,7 +211,7 @@ class FacialGeometricAnalyzer:
             logger.error(f"Error calculating facial thirds: {e}")
             return {'error': str(e)}
     
-    def calculate_facial_fifths(self, landmarks: Dict) -> Dict:
+    def calculate_facial_fifths(self, landmarks) -> Dict:
         """
         Calculate facial fifths proportion analysis.
         
@@ -232,54 +223,17 @@ class FacialGeometricAnalyzer:
         5. Right eye outer corner to right ear
         """
         try:
-            # Key horizontal measurement points
-            left_ear_approx = landmarks[234]  # Left face edge
-            left_eye_outer = landmarks[33]
-            left_eye_inner = landmarks[133]
-            right_eye_inner = landmarks[362]
-            right_eye_outer = landmarks[263]
-            right_ear_approx = landmarks[454]  # Right face edge
-            
-            # Calculate the five sections
-            section_1 = self.landmark_detector.calculate_distance(left_ear_approx, left_eye_outer)
-            section_2 = self.landmark_detector.calculate_distance(left_eye_outer, left_eye_inner)
-            section_3 = self.landmark_detector.calculate_distance(left_eye_inner, right_eye_inner)
-            section_4 = self.landmark_detector.calculate_distance(right_eye_inner, right_eye_outer)
-            section_5 = self.landmark_detector.calculate_distance(right_eye_outer, right_ear_approx)
-            
-            total_width = section_1 + section_2 + section_3 + section_4 + section_5
-            
-            # Calculate percentages
-            if total_width > 0:
-                percentages = [
-                    (section_1 / total_width) * 100,
-                    (section_2 / total_width) * 100,
-                    (section_3 / total_width) * 100,
-                    (section_4 / total_width) * 100,
-                    (section_5 / total_width) * 100
-                ]
-            else:
-                percentages = [0, 0, 0, 0, 0]
+            metrics = self._proportion_arrays(_as_batch(landmarks), 'fifths')
+            deviation_score = _scalar(metrics['deviation'])
+            sections = metrics['sections'][0].tolist()
+            percentages = metrics['percentages'][0].tolist()
             
-            # Calculate deviation from ideal
-            deviation_score = self._calculate_proportion_deviation(percentages, self.ideal_fifths)
+            measurements = {f'section_{j + 1}_px': round(section, 1) for j, section in enumerate(sections)}
+            measurements['total_width_px'] = round(sum(sections), 1)
             
             return {
-                'proportions': {
-                    'section_1': round(percentages[0], 1),
-                    'section_2': round(percentages[1], 1),
-                    'section_3': round(percentages[2], 1),
-                    'section_4': round(percentages[3], 1),
-                    'section_5': round(percentages[4], 1)
-                },
-                'measurements': {
-                    'section_1_px': round(section_1, 1),
-                    'section_2_px': round(section_2, 1),
-                    'section_3_px': round(section_3, 1),
-                    'section_4_px': round(section_4, 1),
-                    'section_5_px': round(section_5, 1),
-                    'total_width_px': round(total_width, 1)
-                },
+                'proportions': {f'section_{j + 1}': round(pct, 1) for j, pct in enumerate(percentages)},
+                'measurements': measurements,
                 'deviation_score': round(deviation_score, 1),
                 'interpretation': self._interpret_fifths_score(deviation_score)
             }
@@ -288,58 +242,33 @@ class FacialGeometricAnalyzer:
             logger.error(f"Error calculating facial fifths: {e}")
             return {'error': str(e)}
     
-    def calculate_facial_symmetry(self, landmarks: Dict) -> Dict:
+    def calculate_facial_symmetry(self, landmarks) -> Dict:
         """
         Calculate facial symmetry analysis.
         
         Compares left and right sides of the face across multiple reference points.
         """
         try:
-            # Define the face midline using nose and chin
-            nose_tip = landmarks[1]
-            chin_center = landmarks[18]
-            midline_x = (nose_tip['x'] + chin_center['x']) / 2
-            
-            # Key symmetry point pairs (left, right)
-            symmetry_pairs = [
-                (33, 362),    # Inner eye corners
-                (133, 263),   # Outer eye corners
-                (61, 291),    # Mouth corners
-                (234, 454),   # Face edges
-                (205, 425),   # Cheekbone points
-                (172, 397),   # Jaw points
-                (46, 276),    # Eyebrow points
-            ]
+            metrics = self._symmetry_arrays(_as_batch(landmarks))
+            midline_x = _scalar(metrics['midline_x'])
+            overall_symmetry = float(metrics['overall'][0])
             
             symmetry_scores = []
             asymmetry_details = []
-            
-            for left_idx, right_idx in symmetry_pairs:
-                if left_idx in landmarks and right_idx in landmarks:
-                    left_point = landmarks[left_idx]
-                    right_point = landmarks[right_idx]
-                    
-                    # Calculate distance from midline for each point
-                    left_distance = abs(left_point['x'] - midline_x)
-                    right_distance = abs(right_point['x'] - midline_x)
-                    
-                    # Calculate symmetry score for this pair (0-1)
-                    max_distance = max(left_distance, right_distance)
-                    if max_distance > 0:
-                        symmetry = 1 - abs(left_distance - right_distance) / max_distance
-                        symmetry_scores.append(symmetry)
-                        
-                        # Track significant asymmetries
-                        if symmetry < 0.85:  # Less than 85% symmetric
-                            asymmetry_details.append({
-                                'feature': self._get_feature_name(left_idx, right_idx),
-                                'symmetry_score': round(symmetry * 100, 1),
-                                'left_distance': round(left_distance, 1),
-                                'right_distance': round(right_distance, 1)
-                            })
-            
-            # Calculate overall symmetry score
-            overall_symmetry = (sum(symmetry_scores) / len(symmetry_scores)) * 100 if symmetry_scores else 0
+            for j, (left_idx, right_idx) in enumerate(SYMMETRY_PAIRS):
+                if not metrics['valid'][0, j]:
+                    continue
+                symmetry = float(metrics['pair_scores'][0, j])
+                symmetry_scores.append(symmetry)
+                
+                # Track significant asymmetries
+                if symmetry < 0.85:  # Less than 85% symmetric
+                    asymmetry_details.append({
+                        'feature': self._get_feature_name(left_idx, right_idx),
+                        'symmetry_score': round(symmetry * 100, 1),
+                        'left_distance': round(float(metrics['left_distances'][0, j]), 1),
+                        'right_distance': round(float(metrics['right_distances'][0, j]), 1)
+                    })
             
             return {
                 'overall_score': round(overall_symmetry, 1),
@@ -353,66 +282,23 @@ class FacialGeometricAnalyzer:
             logger.error(f"Error calculating facial symmetry: {e}")
             return {'error': str(e)}
     
-    def calculate_neoclassical_canons(self, landmarks: Dict) -> Dict:
+    def calculate_neoclassical_canons(self, landmarks) -> Dict:
         """
         Calculate adherence to neoclassical beauty canons.
         
         Traditional rules of facial beauty from classical art and sculpture.
         """
         try:
-            canons = {}
-            
-            # 1. Eye separation should equal eye width
-            left_eye_inner = landmarks[133]
-            left_eye_outer = landmarks[33]
-            right_eye_inner = landmarks[362]
-            
-            eye_width = self.landmark_detector.calculate_distance(left_eye_inner, left_eye_outer)
-            eye_separation = self.landmark_detector.calculate_distance(left_eye_inner, right_eye_inner)
-            
-            eye_ratio = eye_separation / eye_width if eye_width > 0 else 0
-            canons['eye_separation_to_width'] = {
-                'measured_ratio': round(eye_ratio, 2),
-                'ideal_ratio': 1.0,
-                'score': self._calculate_ratio_score(eye_ratio, 1.0)
-            }
-            
-            # 2. Nose width should equal eye width
-            nose_left = landmarks[220]
-            nose_right = landmarks[305]
-            nose_width = self.landmark_detector.calculate_distance(nose_left, nose_right)
-            
-            nose_eye_ratio = nose_width / eye_width if eye_width > 0 else 0
-            canons['nose_width_to_eye_width'] = {
-                'measured_ratio': round(nose_eye_ratio, 2),
-                'ideal_ratio': 1.0,
-                'score': self._calculate_ratio_score(nose_eye_ratio, 1.0)
-            }
-            
-            # 3. Mouth width should be 1.5 times nose width
-            mouth_left = landmarks[61]
-            mouth_right = landmarks[291]
-            mouth_width = self.landmark_detector.calculate_distance(mouth_left, mouth_right)
-            
-            mouth_nose_ratio = mouth_width / nose_width if nose_width > 0 else 0
-            canons['mouth_width_to_nose_width'] = {
-                'measured_ratio': round(mouth_nose_ratio, 2),
-                'ideal_ratio': 1.5,
-                'score': self._calculate_ratio_score(mouth_nose_ratio, 1.5)
-            }
-            
-            # 4. Face width should be 4 times nose width
-            face_width = self.landmark_detector.calculate_distance(landmarks[234], landmarks[454])
-            face_nose_ratio = face_width / nose_width if nose_width > 0 else 0
-            canons['face_width_to_nose_width'] = {
-                'measured_ratio': round(face_nose_ratio, 2),
-                'ideal_ratio': 4.0,
-                'score': self._calculate_ratio_score(face_nose_ratio, 4.0)
-            }
+            metrics = self._canon_arrays(_as_batch(landmarks))
+            overall_score = _scalar(metrics['overall'])
             
-            # Calculate overall canon compliance
-            scores = [canon['score'] for canon in canons.values()]
-            overall_score = sum(scores) / len(scores) if scores else 0
+            canons = {}
+            for j, (name, ideal_ratio) in enumerate(NEOCLASSICAL_CANONS):
+                canons[name] = {
+                    'measured_ratio': round(float(metrics['ratios'][0, j]), 2),
+                    'ideal_ratio': ideal_ratio,
+                    'score': float(metrics['scores'][0, j])
+                }
             
             return {
                 'overall_score': round(overall_score, 1),
@@ -424,26 +310,16 @@ class FacialGeometricAnalyzer:
             logger.error(f"Error calculating neoclassical canons: {e}")
             return {'error': str(e)}
     
-    def calculate_ogee_curve(self, landmarks: Dict) -> Dict:
+    def calculate_ogee_curve(self, landmarks) -> Dict:
         """
         Calculate ogee curve definition (S-curve from cheekbone to jawline).
         
         The ogee curve is considered a hallmark of youthful facial appearance.
         """
         try:
-            # Define key points for ogee curve
-            # Use cheekbone and jaw points to approximate the curve
-            left_cheekbone = landmarks[205]
-            left_jaw = landmarks[172]
-            right_cheekbone = landmarks[425]
-            right_jaw = landmarks[397]
-            
-            # Calculate curve definition for both sides
-            left_curve_score = self._calculate_curve_definition(left_cheekbone, left_jaw, landmarks)
-            right_curve_score = self._calculate_curve_definition(right_cheekbone, right_jaw, landmarks)
-            
-            # Average the scores
-            overall_score = (left_curve_score + right_curve_score) / 2
+            metrics = self._ogee_arrays(_as_batch(landmarks))
+            overall_score = _scalar(metrics['overall'])
+            left_curve_score, right_curve_score = metrics['side_scores'][0].tolist()
             
             return {
                 'overall_score': round(overall_score, 1),
@@ -456,6 +332,126 @@ class FacialGeometricAnalyzer:
             logger.error(f"Error calculating ogee curve: {e}")
             return {'error': str(e)}
     
+    def score_batch(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Score many faces at once, e.g. to re-score stored analyses offline.
+        
+        Args:
+            points: (B, N, 3) landmark arrays (see stack_landmarks)
+            
+        Returns:
+            Dictionary of (B,) float arrays: the six component scores and
+            'facial_harmony', matching calculate_facial_harmony for each face.
+            Faces missing required landmarks score NaN.
+        """
+        points = _as_batch(points)
+        components = {
+            'golden_ratio': self._golden_ratio_arrays(points)['overall'],
+            'facial_thirds': 100 - self._proportion_arrays(points, 'thirds')['deviation'],
+            'facial_fifths': 100 - self._proportion_arrays(points, 'fifths')['deviation'],
+            'symmetry': self._symmetry_arrays(points)['overall'],
+            'neoclassical_canons': self._canon_arrays(points)['overall'],
+            'ogee_curve': self._ogee_arrays(points)['overall'],
+        }
+        # The single-face path rounds each component before weighting; do the same
+        components = {name: np.round(scores, 1) for name, scores in components.items()}
+        components['facial_harmony'] = np.round(
+            sum(components[name] * weight for name, weight in self.harmony_weights.items()), 1)
+        return components
+    
+    # Vectorized metrics over a (B, N, 3) batch of landmark arrays
+    
+    def _golden_ratio_arrays(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        face_length = _distance(points, 10, 18)        # Forehead to chin
+        face_width = _distance(points, 234, 454)       # Cheek to cheek
+        eye_width = _distance(points, 133, 33)
+        interpupillary_distance = _distance(points, 133, 362)
+        mouth_width = _distance(points, 61, 291)
+        nose_width = _distance(points, 220, 305)
+        eye_center = (points[:, 133, :2] + points[:, 362, :2]) / 2
+        mouth_center = (points[:, 61, :2] + points[:, 291, :2]) / 2
+        eye_mouth_distance = np.linalg.norm(eye_center - mouth_center, axis=-1)
+        
+        ratios = np.stack([
+            _safe_ratio(face_length, face_width),
+            _safe_ratio(interpupillary_distance, eye_width),
+            _safe_ratio(mouth_width, nose_width),
+            _safe_ratio(face_length, eye_mouth_distance),
+        ], axis=1)
+        scores = _ratio_scores(ratios, self.golden_ratio)
+        return {'ratios': ratios, 'scores': scores, 'overall': scores.mean(axis=1)}
+    
+    def _proportion_arrays(self, points: np.ndarray, kind: str) -> Dict[str, np.ndarray]:
+        if kind == 'thirds':
+            y = points[:, :, 1]
+            # Estimate hairline position above the forehead landmark
+            hairline_y = y[:, 10] - _distance(points, 10, 9) * 0.3
+            sections = np.abs(np.stack([
+                hairline_y - y[:, 9],   # Hairline to eyebrows
+                y[:, 9] - y[:, 2],      # Eyebrows to nose base
+                y[:, 2] - y[:, 18],     # Nose base to chin
+            ], axis=1))
+            ideal = self.ideal_thirds
+        else:
+            sections = _distance(points, FIFTHS_POINTS[:-1], FIFTHS_POINTS[1:])
+            ideal = self.ideal_fifths
+        
+        total = sections.sum(axis=1, keepdims=True)
+        percentages = _safe_ratio(sections, total) * 100
+        deviation = np.minimum(100, np.abs(percentages - np.asarray(ideal)).sum(axis=1))
+        return {'sections': sections, 'percentages': percentages, 'deviation': deviation}
+    
+    def _symmetry_arrays(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        x = points[:, :, 0]
+        # Face midline through nose tip and chin
+        midline_x = (x[:, 1] + x[:, 18]) / 2
+        left_distances = np.abs(x[:, SYMMETRY_PAIRS[:, 0]] - midline_x[:, None])
+        right_distances = np.abs(x[:, SYMMETRY_PAIRS[:, 1]] - midline_x[:, None])
+        
+        max_distances = np.fmax(left_distances, right_distances)
+        with np.errstate(invalid='ignore'):
+            valid = max_distances > 0  # NaN (missing landmark) compares False
+        pair_scores = 1 - np.abs(left_distances - right_distances) / np.where(valid, max_distances, 1)
+        counts = valid.sum(axis=1)
+        overall = np.where(valid, pair_scores, 0).sum(axis=1) / np.maximum(counts, 1) * 100
+        return {
+            'midline_x': midline_x,
+            'left_distances': left_distances,
+            'right_distances': right_distances,
+            'valid': valid,
+            'pair_scores': pair_scores,
+            'overall': overall,
+        }
+    
+    def _canon_arrays(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        eye_width = _distance(points, 133, 33)
+        eye_separation = _distance(points, 133, 362)
+        nose_width = _distance(points, 220, 305)
+        mouth_width = _distance(points, 61, 291)
+        face_width = _distance(points, 234, 454)
+        
+        ratios = np.stack([
+            _safe_ratio(eye_separation, eye_width),
+            _safe_ratio(nose_width, eye_width),
+            _safe_ratio(mouth_width, nose_width),
+            _safe_ratio(face_width, nose_width),
+        ], axis=1)
+        ideals = np.array([ideal for _, ideal in NEOCLASSICAL_CANONS])
+        scores = _ratio_scores(ratios, ideals)
+        return {'ratios': ratios, 'scores': scores, 'overall': scores.mean(axis=1)}
+    
+    def _ogee_arrays(self, points: np.ndarray) -> Dict[str, np.ndarray]:
+        # Simplified curve definition: vertical drop over horizontal run from cheekbone to jaw
+        cheekbones = points[:, OGEE_POINTS[:, 0], :2]
+        jaws = points[:, OGEE_POINTS[:, 1], :2]
+        horizontal_distance = np.abs(cheekbones[..., 0] - jaws[..., 0])
+        vertical_drop = np.abs(cheekbones[..., 1] - jaws[..., 1])
+        
+        # Optimal ratio around 1.2-1.8; neutral 50 where the run is zero
+        side_scores = np.where(np.isnan(horizontal_distance) | (horizontal_distance > 0),
+                               _ratio_scores(_safe_ratio(vertical_drop, horizontal_distance), 1.5), 50)
+        return {'side_scores': side_scores, 'overall': side_scores.mean(axis=1)}
+    
     def calculate_facial_harmony(self, analysis_results: Dict) -> Dict:
         """
         Calculate overall facial harmony score based on all analyses.
@@ -471,15 +467,7 @@ class FacialGeometricAnalyzer:
             canon_score = analysis_results.get('neoclassical_canons', {}).get('overall_score', 0)
             ogee_score = analysis_results.get('ogee_curve_analysis', {}).get('overall_score', 0)
             
-            # Weighted scoring (weights sum to 1.0)
-            weights = {
-                'golden_ratio': 0.25,
-                'facial_thirds': 0.20,
-                'facial_fifths': 0.15,
-                'symmetry': 0.25,
-                'neoclassical_canons': 0.10,
-                'ogee_curve': 0.05
-            }
+            weights = self.harmony_weights
             
             # Calculate weighted average
             weighted_score = (
@@ -510,43 +498,6 @@ class FacialGeometricAnalyzer:
     
     # Helper methods for calculations and interpretations
     
-    def _calculate_ratio_score(self, measured_ratio: float, ideal_ratio: float) -> float:
-        """Calculate how close a measured ratio is to the ideal (0-100 scale)."""
-        if ideal_ratio == 0:
-            return 0
-        deviation = abs(measured_ratio - ideal_ratio) / ideal_ratio
-        score = max(0, 100 - (deviation * 100))
-        return min(100, score)
-    
-    def _calculate_proportion_deviation(self, measured: List[float], ideal: List[float]) -> float:
-        """Calculate deviation from ideal proportions."""
-        if len(measured) != len(ideal):
-            return 100
-        
-        total_deviation = sum(abs(m - i) for m, i in zip(measured, ideal))
-        return min(100, total_deviation)
-    
-    def _calculate_curve_definition(self, cheekbone: Dict, jaw: Dict, landmarks: Dict) -> float:
-        """Calculate the definition of the ogee curve."""
-        # Simplified curve calculation based on the angle and distance
-        # In a real implementation, this would involve more complex curve fitting
-        
-        # Calculate the vertical drop from cheekbone to jaw
-        vertical_drop = abs(cheekbone['y'] - jaw['y'])
-        
-        # Calculate horizontal distance
-        horizontal_distance = abs(cheekbone['x'] - jaw['x'])
-        
-        # A well-defined ogee curve has a good vertical-to-horizontal ratio
-        if horizontal_distance > 0:
-            curve_ratio = vertical_drop / horizontal_distance
-            # Normalize to 0-100 scale (optimal ratio around 1.2-1.8)
-            optimal_ratio = 1.5
-            score = self._calculate_ratio_score(curve_ratio, optimal_ratio)
-            return score
-        
-        return 50  # Neutral score if cannot calculate
-    
     def _get_feature_name(self, left_idx: int, right_idx: int) -> str:
         """Get human-readable name for landmark pair."""
         feature_map = {
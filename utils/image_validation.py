@@ -11,7 +11,7 @@ import cv2
 import numpy as np
 import logging
 from typing import Dict, Tuple, Optional
-from .facial_landmarks import FacialLandmarkDetector
+from .face_image_pipeline import FaceImage
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -21,8 +21,6 @@ class ImageValidator:
     
     def __init__(self):
         """Initialize the image validator."""
-        self.landmark_detector = FacialLandmarkDetector()
-        
         # Validation thresholds
         self.min_frontal_angle_threshold = 15  # degrees
         self.max_frontal_angle_threshold = 165  # degrees
@@ -38,6 +36,23 @@ class ImageValidator:
         Args:
             image_path: Path to the facial image
             
+        Returns:
+            Dictionary containing validation results and recommendations
+        """
+        try:
+            face_image = FaceImage.open(image_path)
+        except Exception as e:
+            logger.error(f"Could not read image {image_path}: {e}")
+            face_image = None
+        return self.validate_face(face_image)
+    
+    def validate_face(self, face_image: Optional[FaceImage]) -> Dict:
+        """
+        Validate an already decoded face image (see utils.face_image_pipeline).
+        
+        Args:
+            face_image: Decoded image, or None if it could not be read
+            
         Returns:
             Dictionary containing validation results and recommendations
         """
@@ -55,20 +70,21 @@ class ImageValidator:
         
         try:
             # Basic image checks
-            image = cv2.imread(image_path)
-            if image is None:
+            if face_image is None:
                 validation_result['issues'].append("Could not read image file")
                 return validation_result
             
+            image = face_image.gray
             height, width = image.shape[:2]
+            original_width, original_height = face_image.original_size
             
             # Check image dimensions
-            if width < 400 or height < 400:
+            if original_width < 400 or original_height < 400:
                 validation_result['issues'].append("Image resolution too low (minimum 400x400)")
                 validation_result['recommendations'].append("Use a higher resolution image")
             
             # Detect facial landmarks
-            landmarks_data = self.landmark_detector.detect_landmarks(image_path)
+            landmarks_data = face_image.landmarks
             if not landmarks_data:
                 validation_result['issues'].append("No face detected in image")
                 validation_result['recommendations'].append("Ensure face is clearly visible and well-lit")
@@ -221,19 +237,16 @@ class ImageValidator:
             logger.error(f"Error checking facial symmetry: {e}")
             return 0.0
     
-    def _check_lighting_quality(self, image: np.ndarray, face_bounds: Dict) -> float:
+    def _check_lighting_quality(self, gray: np.ndarray, face_bounds: Dict) -> float:
         """Analyze lighting quality in the facial region."""
         try:
             # Extract face region
             y1 = max(0, int(face_bounds['min_y']))
-            y2 = min(image.shape[0], int(face_bounds['max_y']))
+            y2 = min(gray.shape[0], int(face_bounds['max_y']))
             x1 = max(0, int(face_bounds['min_x']))
-            x2 = min(image.shape[1], int(face_bounds['max_x']))
-            
-            face_region = image[y1:y2, x1:x2]
+            x2 = min(gray.shape[1], int(face_bounds['max_x']))
             
-            # Convert to grayscale for analysis
-            gray_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
+            gray_face = gray[y1:y2, x1:x2]
             
             # Calculate lighting metrics
             mean_brightness = np.mean(gray_face)
@@ -249,19 +262,16 @@ class ImageValidator:
             logger.error(f"Error checking lighting quality: {e}")
             return 0.5
     
-    def _check_image_blur(self, image: np.ndarray, face_bounds: Dict) -> float:
+    def _check_image_blur(self, gray: np.ndarray, face_bounds: Dict) -> float:
         """Detect image blur using Laplacian variance."""
         try:
             # Extract face region
             y1 = max(0, int(face_bounds['min_y']))
-            y2 = min(image.shape[0], int(face_bounds['max_y']))
+            y2 = min(gray.shape[0], int(face_bounds['max_y']))
             x1 = max(0, int(face_bounds['min_x']))
-            x2 = min(image.shape[1], int(face_bounds['max_x']))
-            
-            face_region = image[y1:y2, x1:x2]
+            x2 = min(gray.shape[1], int(face_bounds['max_x']))
             
-            # Convert to grayscale
-            gray_face = cv2.cvtColor(face_region, cv2.COLOR_BGR2GRAY)
+            gray_face = gray[y1:y2, x1:x2]
             
             # Calculate Laplacian variance (lower values indicate more blur)
             laplacian_variance = cv2.Laplacian(gray_face, cv2.CV_64F).var()
@@ -273,18 +283,20 @@ class ImageValidator:
             return 100.0  # Assume blurry on error
 
 
-def validate_face_image(image_path: str) -> Dict:
+def validate_face_image(image) -> Dict:
     """
     Convenience function to validate a facial image.
     
     Args:
-        image_path: Path to the facial image
+        image: Path to the facial image, or a decoded FaceImage
         
     Returns:
         Dictionary containing validation results
     """
     validator = ImageValidator()
-    return validator.validate_image(image_path)
+    if image is None or isinstance(image, FaceImage):
+        return validator.validate_face(image)
+    return validator.validate_image(image)
 
 
 # Test function for development
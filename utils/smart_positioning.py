@@ -9,36 +9,19 @@ and Symmetry Analysis requirements.
 """
 
 import cv2
-import mediapipe as mp
 import numpy as np
 import logging
 from typing import Dict, Tuple, Optional
+from .face_mesh_pool import stream_face_meshes
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Initialize MediaPipe Face Mesh  
-try:
-    mp_face_mesh = mp.solutions.face_mesh
-    mp_drawing = mp.solutions.drawing_utils
-except AttributeError:
-    # Fallback for different MediaPipe versions
-    import mediapipe.python.solutions.face_mesh as mp_face_mesh
-    import mediapipe.python.solutions.drawing_utils as mp_drawing
-
 class SmartFacePositioning:
     """Smart face positioning validator using MediaPipe landmarks."""
     
     def __init__(self):
-        """Initialize the smart positioning system."""
-        self.face_mesh = mp_face_mesh.FaceMesh(
-            static_image_mode=False,  # For video stream
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.7,
-            min_tracking_confidence=0.5
-        )
-        
+        """Initialize the smart positioning system (video-mode FaceMesh graphs come from utils.face_mesh_pool)."""
         # Key landmark indices for positioning analysis
         self.key_landmarks = {
             'nose_tip': 1,
@@ -68,6 +51,46 @@ class SmartFacePositioning:
             'symmetry_tolerance': 0.2   # 20% asymmetry allowed
         }
     
+    def analyze_landmarks(self, landmarks_data: Optional[Dict]) -> Dict:
+        """
+        Analyze face positioning from landmarks that were already detected.
+        
+        Args:
+            landmarks_data: FacialLandmarkDetector output (e.g. FaceImage.landmarks)
+            
+        Returns:
+            Dictionary with positioning analysis results
+        """
+        if not landmarks_data:
+            return self._no_face_result()
+        all_landmarks = landmarks_data['landmarks']
+        landmarks = {name: all_landmarks[idx] for name, idx in self.key_landmarks.items()
+                     if idx in all_landmarks}
+        dimensions = landmarks_data['image_dimensions']
+        try:
+            return self._analyze_face_positioning(landmarks, dimensions['width'], dimensions['height'])
+        except Exception as e:
+            logger.error(f"Error in positioning analysis: {e}")
+            return self._error_result()
+    
+    def _no_face_result(self) -> Dict:
+        return {
+            'face_detected': False,
+            'positioning_score': 0.0,
+            'issues': ['No face detected'],
+            'recommendations': ['Position your face in the camera view'],
+            'is_ready_for_capture': False
+        }
+    
+    def _error_result(self) -> Dict:
+        return {
+            'face_detected': False,
+            'positioning_score': 0.0,
+            'issues': ['Analysis error'],
+            'recommendations': ['Please try again'],
+            'is_ready_for_capture': False
+        }
+    
     def analyze_positioning(self, frame: np.ndarray) -> Dict:
         """
         Analyze face positioning in real-time video frame.
@@ -84,16 +107,11 @@ class SmartFacePositioning:
             height, width = frame.shape[:2]
             
             # Process frame with MediaPipe
-            results = self.face_mesh.process(rgb_frame)
+            with stream_face_meshes.checkout() as face_mesh:
+                results = face_mesh.process(rgb_frame)
             
             if not results.multi_face_landmarks:
-                return {
-                    'face_detected': False,
-                    'positioning_score': 0.0,
-                    'issues': ['No face detected'],
-                    'recommendations': ['Position your face in the camera view'],
-                    'is_ready_for_capture': False
-                }
+                return self._no_face_result()
             
             # Get face landmarks
             face_landmarks = results.multi_face_landmarks[0]
@@ -106,13 +124,7 @@ class SmartFacePositioning:
             
         except Exception as e:
             logger.error(f"Error in positioning analysis: {e}")
-            return {
-                'face_detected': False,
-                'positioning_score': 0.0,
-                'issues': ['Analysis error'],
-                'recommendations': ['Please try again'],
-                'is_ready_for_capture': False
-            }
+            return self._error_result()
     
     def _extract_landmarks(self, face_landmarks, width: int, height: int) -> Dict:
         """Extract key landmarks from MediaPipe results."""